@@ -63,6 +63,10 @@ type LogStreamConfig struct {
 	BufferSize    int    `mapstructure:"buffer_size"`    // 单个连接最大缓冲日志条数
 	BatchSize     int    `mapstructure:"batch_size"`     // 达到多少条时批量发送
 	FlushInterval int    `mapstructure:"flush_interval"` // 刷新间隔（毫秒）
+	// 按 execution_id 分片写入 <key>:<execution_id>，控制面读取单个执行日志时无需扫描统一流
+	ShardByExecution bool  `mapstructure:"shard_by_execution"`
+	ShardMaxLen      int64 `mapstructure:"shard_max_len"` // 单个分片流近似最大长度（MAXLEN ~）
+	ShardTTL         int   `mapstructure:"shard_ttl"`     // 分片流过期时间（秒）
 }
 
 // ResultStreamConfig Redis Stream 写任务结果配置
@@ -169,6 +173,9 @@ func setDefaults() {
 	viper.SetDefault("log_stream.buffer_size", 1000)    // 单个连接最大缓冲日志条数
 	viper.SetDefault("log_stream.batch_size", 50)       // 达到多少条时批量发送
 	viper.SetDefault("log_stream.flush_interval", 2000) // 刷新间隔（毫秒）
+	viper.SetDefault("log_stream.shard_by_execution", true)
+	viper.SetDefault("log_stream.shard_max_len", 200000)
+	viper.SetDefault("log_stream.shard_ttl", 7*24*3600) // 7 天
 
 	// Result Stream 默认值
 	viper.SetDefault("result_stream.enabled", true)
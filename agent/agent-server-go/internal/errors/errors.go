@@ -85,6 +85,8 @@ var (
 	ErrInvalidToken            = errors.New("invalid token")
 	ErrWebSocketUpgradeFailed  = errors.New("websocket upgrade failed")
 	ErrAgentConnectFailed      = errors.New("connect agent failed")
+	ErrScriptNotCached         = errors.New("script not cached")
+	ErrScriptHashMismatch      = errors.New("script sha256 mismatch")
 )
 
 // ServerError 服务器错误
@@ -5,6 +5,7 @@ import (
 	"context"
 	"fmt"
 	"sync"
+	"time"
 
 	"ops-job-agent-server/internal/config"
 
@@ -16,6 +17,11 @@ type StreamWriter struct {
 	client *redis.Client
 	key    string // 固定的 Stream key，如 "agent_logs"
 
+	// 按执行分片：额外写入 <key>:<execution_id>
+	shard       bool
+	shardMaxLen int64
+	shardTTL    time.Duration
+
 	mu   sync.Mutex
 	rbuf *ring.Ring
 	size int
@@ -33,10 +39,13 @@ func NewStreamWriter(rdb *redis.Client, cfg *config.Config) (*StreamWriter, erro
 	}
 	const defaultCap = 1000
 	return &StreamWriter{
-		client: rdb,
-		key:    cfg.LogStream.Key,
-		rbuf:   ring.New(defaultCap),
-		cap:    defaultCap,
+		client:      rdb,
+		key:         cfg.LogStream.Key,
+		shard:       cfg.LogStream.ShardByExecution,
+		shardMaxLen: cfg.LogStream.ShardMaxLen,
+		shardTTL:    time.Duration(cfg.LogStream.ShardTTL) * time.Second,
+		rbuf:        ring.New(defaultCap),
+		cap:         defaultCap,
 	}, nil
 }
 
@@ -75,7 +84,12 @@ func (w *StreamWriter) bufferFailed(entries []map[string]interface{}) {
 	}
 }
 
-// PushLogsByExecutionID 按 execution_id 写入日志到统一流（失败时 ring 缓存，成功清空缓存）
+// shardKey 返回执行分片流的 key
+func (w *StreamWriter) shardKey(executionID string) string {
+	return fmt.Sprintf("%s:%s", w.key, executionID)
+}
+
+// PushLogsByExecutionID 按 execution_id 写入日志到统一流及执行分片流（失败时 ring 缓存，成功清空缓存）
 func (w *StreamWriter) PushLogsByExecutionID(ctx context.Context, executionID string, entries []map[string]interface{}) error {
 	if w == nil || w.client == nil || len(entries) == 0 {
 		return nil
@@ -86,12 +100,33 @@ func (w *StreamWriter) PushLogsByExecutionID(ctx context.Context, executionID st
 	w.mu.Unlock()
 
 	pipe := w.client.Pipeline()
+	shardKeys := make(map[string]struct{})
 	for _, entry := range all {
-		entry["execution_id"] = executionID
+		// 缓冲条目可能来自其他执行，保留其原有 execution_id
+		entryExecutionID, _ := entry["execution_id"].(string)
+		if entryExecutionID == "" {
+			entryExecutionID = executionID
+			entry["execution_id"] = executionID
+		}
 		pipe.XAdd(ctx, &redis.XAddArgs{
 			Stream: w.key, // 使用固定 key
 			Values: entry,
 		})
+		if w.shard {
+			key := w.shardKey(entryExecutionID)
+			pipe.XAdd(ctx, &redis.XAddArgs{
+				Stream: key,
+				MaxLen: w.shardMaxLen,
+				Approx: w.shardMaxLen > 0,
+				Values: entry,
+			})
+			shardKeys[key] = struct{}{}
+		}
+	}
+	if w.shardTTL > 0 {
+		for key := range shardKeys {
+			pipe.Expire(ctx, key, w.shardTTL)
+		}
 	}
 
 	if _, err := pipe.Exec(ctx); err != nil {
@@ -39,10 +39,14 @@ func (s *Server) setupControlPlaneIngressRoutes() {
 		api.POST("/agents/:id/tasks", s.handlePushTask)
 		// 批量推送任务到指定 Agent
 		api.POST("/agents/:id/tasks/batch", s.handlePushTasksBatch)
+		// 跨 Agent 批量推送任务（控制面按 Agent-Server 合并下发）
+		api.POST("/tasks/batch", s.handleDispatchTasksBulk)
 		// 取消指定 Agent 的任务
 		api.POST("/agents/:id/tasks/:task_id/cancel", s.handleCancelTask)
 		// 批量取消指定 Agent 的任务
 		api.POST("/agents/:id/tasks/cancel/batch", s.handleCancelTasksBatch)
+		// 跨 Agent 批量取消任务（控制面按 Agent-Server 合并取消）
+		api.POST("/tasks/cancel/batch", s.handleCancelTasksBulk)
 		// 控制指定 Agent（start/stop/restart）
 		api.POST("/agents/:id/control", s.handleAgentControl)
 		// 升级指定 Agent
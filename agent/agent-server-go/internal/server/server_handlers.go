@@ -128,6 +128,10 @@ func (s *Server) handlePushTask(c *gin.Context) {
 			writeError(c, http.StatusNotFound, serrors.ErrCodeNotFound, serrors.ErrAgentNotFound.Error())
 			return
 		}
+		if errors.Is(err, serrors.ErrScriptNotCached) {
+			writeError(c, http.StatusConflict, serrors.ErrCodeInvalidParam, err.Error())
+			return
+		}
 		if errors.Is(err, serrors.ErrAgentNotFound) {
 			writeError(c, http.StatusServiceUnavailable, serrors.ErrCodeConnectionFailed, serrors.ErrAgentConnectionClosed.Error())
 			return
@@ -169,6 +173,10 @@ func (s *Server) handlePushTasksBatch(c *gin.Context) {
 	taskPtrs := make([]*api.TaskSpec, len(taskSpecs))
 	for i := range taskSpecs {
 		taskPtrs[i] = &taskSpecs[i]
+		if err := s.taskDispatcher.ResolveScript(taskPtrs[i]); err != nil {
+			writeError(c, http.StatusConflict, serrors.ErrCodeInvalidParam, err.Error())
+			return
+		}
 	}
 
 	// 批量发送任务
@@ -205,6 +213,60 @@ func (s *Server) handlePushTasksBatch(c *gin.Context) {
 	})
 }
 
+// handleDispatchTasksBulk 跨 Agent 批量推送任务
+// 每个任务走与单任务推送相同的分发逻辑（在线直推、离线/队列满持久化），逐任务返回结果
+func (s *Server) handleDispatchTasksBulk(c *gin.Context) {
+	var req api.BulkDispatchRequest
+	if err := c.ShouldBindJSON(&req); err != nil {
+		writeError(c, http.StatusBadRequest, serrors.ErrCodeInvalidParam, err.Error())
+		return
+	}
+	if len(req.Tasks) == 0 {
+		writeError(c, http.StatusBadRequest, serrors.ErrCodeInvalidParam, serrors.ErrTasksArrayEmpty.Error())
+		return
+	}
+
+	if invalid := s.taskDispatcher.CacheScripts(req.Scripts); len(invalid) > 0 {
+		logger.GetLogger().WithField("scripts", invalid).Warn("bulk dispatch scripts sha256 mismatch")
+	}
+
+	results := make([]api.BulkDispatchResult, 0, len(req.Tasks))
+	dispatched := 0
+	// 缓存中没有的脚本哈希，控制面据此补发脚本内容后重试对应任务
+	missingScripts := make([]string, 0)
+	missingSeen := make(map[string]bool)
+	for _, item := range req.Tasks {
+		if item.Task == nil || item.AgentID == "" {
+			results = append(results, api.BulkDispatchResult{AgentID: item.AgentID, Error: "agent_id and task are required"})
+			continue
+		}
+		result := api.BulkDispatchResult{TaskID: item.Task.ID, AgentID: item.AgentID}
+		if err := s.taskDispatcher.DispatchTaskToAgent(item.AgentID, item.Task); err != nil {
+			result.Error = err.Error()
+			if errors.Is(err, serrors.ErrScriptNotCached) && !missingSeen[item.Task.ScriptSHA256] {
+				missingSeen[item.Task.ScriptSHA256] = true
+				missingScripts = append(missingScripts, item.Task.ScriptSHA256)
+			}
+		} else {
+			result.Status = constants.StatusDispatched
+			dispatched++
+		}
+		results = append(results, result)
+	}
+
+	logger.GetLogger().WithFields(map[string]interface{}{
+		"task_count": len(req.Tasks),
+		"dispatched": dispatched,
+	}).Info("bulk tasks dispatched")
+
+	c.JSON(http.StatusOK, gin.H{
+		"results":         results,
+		"count":           len(req.Tasks),
+		"dispatched":      dispatched,
+		"missing_scripts": missingScripts,
+	})
+}
+
 // handleCancelTask 处理取消任务请求
 // 支持两种情况：
 // 1. Agent 在线：通过 WebSocket 发送取消消息
@@ -399,6 +461,80 @@ func (s *Server) handleCancelTasksBatch(c *gin.Context) {
 	})
 }
 
+// handleCancelTasksBulk 跨 Agent 批量取消任务
+// 按 Agent 分组：在线的 Agent 通过 WebSocket 一次发送该 Agent 的全部取消消息，
+// 离线或发送失败时逐个从待处理任务存储中删除，逐任务返回结果
+func (s *Server) handleCancelTasksBulk(c *gin.Context) {
+	var req api.BulkCancelRequest
+	if err := c.ShouldBindJSON(&req); err != nil {
+		writeError(c, http.StatusBadRequest, serrors.ErrCodeInvalidParam, err.Error())
+		return
+	}
+	if len(req.Tasks) == 0 {
+		writeError(c, http.StatusBadRequest, serrors.ErrCodeInvalidParam, serrors.ErrTaskIDsArrayEmpty.Error())
+		return
+	}
+
+	results := make([]api.BulkCancelResult, 0, len(req.Tasks))
+	byAgent := make(map[string][]string)
+	agentOrder := make([]string, 0)
+	for _, item := range req.Tasks {
+		if item.AgentID == "" || item.TaskID == "" {
+			results = append(results, api.BulkCancelResult{TaskID: item.TaskID, AgentID: item.AgentID, Error: "agent_id and task_id are required"})
+			continue
+		}
+		if _, ok := byAgent[item.AgentID]; !ok {
+			agentOrder = append(agentOrder, item.AgentID)
+		}
+		byAgent[item.AgentID] = append(byAgent[item.AgentID], item.TaskID)
+	}
+
+	cancelled := 0
+	for _, agentID := range agentOrder {
+		taskIDs := byAgent[agentID]
+		if conn, exists := s.agentManager.Get(agentID); exists && conn.Status == constants.StatusActive && conn.Conn != nil {
+			err := conn.SendCancelTasks(taskIDs)
+			if err == nil {
+				for _, taskID := range taskIDs {
+					results = append(results, api.BulkCancelResult{
+						TaskID: taskID, AgentID: agentID, Status: constants.StatusCancelled, Source: "websocket",
+					})
+				}
+				cancelled += len(taskIDs)
+				continue
+			}
+			logger.GetLogger().WithError(err).WithFields(map[string]interface{}{
+				"agent_id":   agentID,
+				"task_count": len(taskIDs),
+			}).Error("send cancel tasks message failed")
+		}
+
+		for _, taskID := range taskIDs {
+			result := api.BulkCancelResult{TaskID: taskID, AgentID: agentID}
+			if err := s.cancelTaskFromQueue(agentID, taskID); err != nil {
+				result.Error = err.Error()
+			} else {
+				result.Status = constants.StatusCancelled
+				result.Source = "pending_store"
+				cancelled++
+			}
+			results = append(results, result)
+		}
+	}
+
+	logger.GetLogger().WithFields(map[string]interface{}{
+		"task_count":  len(req.Tasks),
+		"agent_count": len(agentOrder),
+		"cancelled":   cancelled,
+	}).Info("bulk cancel tasks completed")
+
+	c.JSON(http.StatusOK, gin.H{
+		"results":   results,
+		"count":     len(req.Tasks),
+		"cancelled": cancelled,
+	})
+}
+
 // cancelTaskFromQueue 从待处理任务存储中取消任务
 func (s *Server) cancelTaskFromQueue(agentID, taskID string) error {
 	if s.pendingTaskStore == nil {
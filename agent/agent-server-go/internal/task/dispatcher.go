@@ -20,6 +20,7 @@ import (
 type Dispatcher struct {
 	agentManager     *agent.Manager
 	pendingTaskStore *PendingTaskStore // 待处理任务持久化存储（唯一持久化方案）
+	scriptCache      *ScriptCache      // 按哈希缓存的脚本内容
 }
 
 // NewDispatcher 创建任务分发器（仅支持控制面主动推送，不再轮询拉取）
@@ -28,6 +29,7 @@ func NewDispatcher(agentMgr *agent.Manager, pendingStore *PendingTaskStore) *Dis
 	d := &Dispatcher{
 		agentManager:     agentMgr,
 		pendingTaskStore: pendingStore,
+		scriptCache:      NewScriptCache(0),
 	}
 
 	return d
@@ -36,6 +38,11 @@ func NewDispatcher(agentMgr *agent.Manager, pendingStore *PendingTaskStore) *Dis
 // DispatchTaskToAgent 直接分发任务到指定 Agent（用于控制面主动推送）
 // 实现混合模式：Agent在线时直接推送，离线时持久化到 pendingTaskStore
 func (d *Dispatcher) DispatchTaskToAgent(agentID string, task *api.TaskSpec) error {
+	// 只带脚本哈希的任务先补全内容，持久化与下发给 Agent 的都是完整任务
+	if err := d.scriptCache.Resolve(task); err != nil {
+		return err
+	}
+
 	agentConn, exists := d.agentManager.Get(agentID)
 	if !exists {
 		// Agent不存在，持久化到 pendingTaskStore（如果有）
@@ -115,6 +122,22 @@ func (d *Dispatcher) DispatchTaskToAgent(agentID string, task *api.TaskSpec) err
 	}
 }
 
+// ResolveScript 按哈希补全任务的脚本内容（不经 DispatchTaskToAgent 直接下发的路径使用）
+func (d *Dispatcher) ResolveScript(task *api.TaskSpec) error {
+	return d.scriptCache.Resolve(task)
+}
+
+// CacheScripts 缓存控制面随批量请求发送的脚本 {sha256: content}，返回校验失败的哈希
+func (d *Dispatcher) CacheScripts(scripts map[string]string) []string {
+	var invalid []string
+	for sha, content := range scripts {
+		if err := d.scriptCache.Put(sha, content); err != nil {
+			invalid = append(invalid, sha)
+		}
+	}
+	return invalid
+}
+
 // ProcessPendingTasksForAgent 处理指定Agent的待处理任务（Agent上线时调用）
 // 从 PendingTaskStore 获取任务进行补发
 func (d *Dispatcher) ProcessPendingTasksForAgent(agentID string) error {
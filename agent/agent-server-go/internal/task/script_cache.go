@@ -0,0 +1,96 @@
+package task
+
+import (
+	"container/list"
+	"crypto/sha256"
+	"encoding/hex"
+	"sync"
+
+	serrors "ops-job-agent-server/internal/errors"
+	"ops-job-agent-server/pkg/api"
+)
+
+// DefaultScriptCacheBytes 脚本缓存默认容量（按脚本内容字节数计）
+const DefaultScriptCacheBytes = 64 << 20
+
+// ScriptCache 按 SHA-256 缓存脚本内容（LRU，按总字节数淘汰）
+// 控制面下发的 TaskSpec 只携带 script_sha256，同一脚本在多次执行/多个步骤间只需传输一次
+type ScriptCache struct {
+	mu       sync.Mutex
+	maxBytes int
+	bytes    int
+	order    *list.List               // 最近使用在前
+	entries  map[string]*list.Element // sha256 -> element(*scriptEntry)
+}
+
+type scriptEntry struct {
+	sha     string
+	content string
+}
+
+// NewScriptCache 创建脚本缓存，maxBytes <= 0 时使用默认容量
+func NewScriptCache(maxBytes int) *ScriptCache {
+	if maxBytes <= 0 {
+		maxBytes = DefaultScriptCacheBytes
+	}
+	return &ScriptCache{
+		maxBytes: maxBytes,
+		order:    list.New(),
+		entries:  make(map[string]*list.Element),
+	}
+}
+
+// Put 校验哈希后写入缓存
+func (c *ScriptCache) Put(sha, content string) error {
+	sum := sha256.Sum256([]byte(content))
+	if hex.EncodeToString(sum[:]) != sha {
+		return serrors.ErrScriptHashMismatch
+	}
+
+	c.mu.Lock()
+	defer c.mu.Unlock()
+	if elem, ok := c.entries[sha]; ok {
+		c.order.MoveToFront(elem)
+		return nil
+	}
+	c.entries[sha] = c.order.PushFront(&scriptEntry{sha: sha, content: content})
+	c.bytes += len(content)
+	// 至少保留刚写入的脚本
+	for c.bytes > c.maxBytes && c.order.Len() > 1 {
+		oldest := c.order.Back()
+		entry := oldest.Value.(*scriptEntry)
+		c.order.Remove(oldest)
+		delete(c.entries, entry.sha)
+		c.bytes -= len(entry.content)
+	}
+	return nil
+}
+
+// Get 按哈希读取脚本内容
+func (c *ScriptCache) Get(sha string) (string, bool) {
+	c.mu.Lock()
+	defer c.mu.Unlock()
+	elem, ok := c.entries[sha]
+	if !ok {
+		return "", false
+	}
+	c.order.MoveToFront(elem)
+	return elem.Value.(*scriptEntry).content, true
+}
+
+// Resolve 补全任务的脚本内容：Command 为空时按 ScriptSHA256 取缓存，
+// 同时携带内容与哈希的任务顺带写入缓存
+func (c *ScriptCache) Resolve(task *api.TaskSpec) error {
+	if task.ScriptSHA256 == "" {
+		return nil
+	}
+	if task.Command != "" {
+		return c.Put(task.ScriptSHA256, task.Command)
+	}
+	content, ok := c.Get(task.ScriptSHA256)
+	if !ok {
+		return serrors.ErrScriptNotCached
+	}
+	task.Command = content
+	return nil
+}
@@ -0,0 +1,59 @@
+package task
+
+import (
+	"crypto/sha256"
+	"encoding/hex"
+	"errors"
+	"testing"
+
+	serrors "ops-job-agent-server/internal/errors"
+	"ops-job-agent-server/pkg/api"
+)
+
+func digest(content string) string {
+	sum := sha256.Sum256([]byte(content))
+	return hex.EncodeToString(sum[:])
+}
+
+func TestScriptCacheResolveFillsCommand(t *testing.T) {
+	cache := NewScriptCache(0)
+	sha := digest("echo hi")
+	if err := cache.Put(sha, "echo hi"); err != nil {
+		t.Fatalf("put: %v", err)
+	}
+
+	task := &api.TaskSpec{ID: "t1", ScriptSHA256: sha}
+	if err := cache.Resolve(task); err != nil {
+		t.Fatalf("resolve: %v", err)
+	}
+	if task.Command != "echo hi" {
+		t.Fatalf("command = %q, want echo hi", task.Command)
+	}
+
+	missing := &api.TaskSpec{ID: "t2", ScriptSHA256: digest("other")}
+	if err := cache.Resolve(missing); !errors.Is(err, serrors.ErrScriptNotCached) {
+		t.Fatalf("resolve missing err = %v, want ErrScriptNotCached", err)
+	}
+}
+
+func TestScriptCacheRejectsMismatchedHash(t *testing.T) {
+	cache := NewScriptCache(0)
+	if err := cache.Put(digest("a"), "b"); !errors.Is(err, serrors.ErrScriptHashMismatch) {
+		t.Fatalf("put err = %v, want ErrScriptHashMismatch", err)
+	}
+}
+
+func TestScriptCacheEvictsLeastRecentlyUsed(t *testing.T) {
+	cache := NewScriptCache(8)
+	_ = cache.Put(digest("aaaa"), "aaaa")
+	_ = cache.Put(digest("bbbb"), "bbbb")
+	cache.Get(digest("aaaa"))
+	_ = cache.Put(digest("cccc"), "cccc")
+
+	if _, ok := cache.Get(digest("bbbb")); ok {
+		t.Fatalf("expected bbbb evicted")
+	}
+	if _, ok := cache.Get(digest("aaaa")); !ok {
+		t.Fatalf("expected aaaa kept")
+	}
+}
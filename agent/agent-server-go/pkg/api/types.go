@@ -48,6 +48,48 @@ type TaskSpec struct {
 	IsRetry      bool   `json:"is_retry,omitempty"`       // 是否为重试任务
 	RetryCount   int    `json:"retry_count,omitempty"`    // 当前重试次数
 	ParentTaskID string `json:"parent_task_id,omitempty"` // 父任务ID（用于重试链）
+	// 脚本内容哈希；Command 为空时由 Agent-Server 按哈希从脚本缓存补全
+	ScriptSHA256 string `json:"script_sha256,omitempty"`
+}
+
+// BulkDispatchItem 跨 Agent 批量下发中的单个任务
+type BulkDispatchItem struct {
+	AgentID string    `json:"agent_id"`
+	Task    *TaskSpec `json:"task"`
+}
+
+// BulkDispatchRequest 跨 Agent 批量下发请求
+type BulkDispatchRequest struct {
+	Tasks   []BulkDispatchItem `json:"tasks"`
+	Scripts map[string]string  `json:"scripts,omitempty"` // 本批任务引用的脚本 {sha256: content}，同一脚本只随请求发送一次
+}
+
+// BulkDispatchResult 单个任务的下发结果，Error 非空表示失败
+type BulkDispatchResult struct {
+	TaskID  string `json:"task_id"`
+	AgentID string `json:"agent_id"`
+	Status  string `json:"status,omitempty"`
+	Error   string `json:"error,omitempty"`
+}
+
+// BulkCancelItem 跨 Agent 批量取消中的单个任务
+type BulkCancelItem struct {
+	AgentID string `json:"agent_id"`
+	TaskID  string `json:"task_id"`
+}
+
+// BulkCancelRequest 跨 Agent 批量取消请求
+type BulkCancelRequest struct {
+	Tasks []BulkCancelItem `json:"tasks"`
+}
+
+// BulkCancelResult 单个任务的取消结果，Error 非空表示失败
+type BulkCancelResult struct {
+	TaskID  string `json:"task_id"`
+	AgentID string `json:"agent_id"`
+	Status  string `json:"status,omitempty"`
+	Source  string `json:"source,omitempty"`
+	Error   string `json:"error,omitempty"`
 }
 
 // FileTransferSpec 文件传输规范（artifact 上传）
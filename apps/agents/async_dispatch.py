@@ -0,0 +1,146 @@
+"""
+Agent 任务异步下发引擎
+
+并行策略原本通过 GlobalThreadPool 逐个推送任务，并发度受线程池大小限制，且与工作流线程共用。
+本模块在单个事件循环中用 aiohttp 并发推送：
+ - 全局在途请求数上限（AGENT_ASYNC_DISPATCH_MAX_IN_FLIGHT）
+ - 每个 Agent-Server 的速率上限（AGENT_ASYNC_DISPATCH_RATE_PER_SERVER，次/秒，0 为不限）
+
+对外接口：
+ - AsyncTaskDispatcher.dispatch(items, agent_server_id) -> {task_id: 推送结果}
+"""
+import asyncio
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+from django.conf import settings
+
+from apps.agents.models import Agent, AgentServer
+from apps.executor.script_store import inline_script
+from utils.agent_server_client import sign_headers
+from utils.async_runner import run_coroutine
+
+logger = logging.getLogger(__name__)
+
+
+class _RateLimiter:
+    """按固定间隔放行请求（单事件循环内使用，无需加锁）"""
+
+    def __init__(self, rate_per_second: float):
+        self.interval = 1.0 / rate_per_second if rate_per_second and rate_per_second > 0 else 0.0
+        self._next = 0.0
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        now = asyncio.get_running_loop().time()
+        wait = self._next - now
+        self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class AsyncTaskDispatcher:
+    """
+    基于 asyncio 的并发任务推送
+
+    每个任务仍调用 /api/agents/<id>/tasks，结果结构与 AgentExecutionService.push_task_to_agent 一致。
+    """
+
+    def __init__(self, max_in_flight: Optional[int] = None, rate_per_server: Optional[float] = None,
+                 timeout: Optional[float] = None):
+        if max_in_flight is None:
+            max_in_flight = getattr(settings, 'AGENT_ASYNC_DISPATCH_MAX_IN_FLIGHT', 1000)
+        if rate_per_server is None:
+            rate_per_server = getattr(settings, 'AGENT_ASYNC_DISPATCH_RATE_PER_SERVER', 0)
+        if timeout is None:
+            timeout = getattr(settings, 'AGENT_SERVER_TIMEOUT', 10)
+        self.max_in_flight = max(1, max_in_flight)
+        self.rate_per_server = rate_per_server
+        self.timeout = timeout
+
+    def dispatch(self, items: List[Tuple[Agent, Dict[str, Any]]], agent_server_id: int = None) -> Dict[str, Dict[str, Any]]:
+        """
+        并发推送任务（同步接口，在调用线程内运行事件循环）
+
+        Args:
+            items: [(Agent, task_spec), ...]
+            agent_server_id: 默认 Agent-Server ID，Agent 自身绑定了 agent_server 时优先使用
+        """
+        results: Dict[str, Dict[str, Any]] = {}
+        server_ids = {agent_server_id or agent.agent_server_id for agent, _ in items} - {None}
+        servers = AgentServer.objects.filter(id__in=list(server_ids), is_active=True).in_bulk()
+        override_agent_id = getattr(settings, "AGENT_ID_OVERRIDE", None)
+
+        jobs = []
+        for agent, task_spec in items:
+            server_id = agent_server_id or agent.agent_server_id
+            server = servers.get(server_id)
+            error = None
+            if not server_id:
+                error = '请先选择 Agent-Server'
+            elif not server:
+                error = 'Agent-Server 未注册或已禁用'
+            elif not server.shared_secret:
+                error = 'Agent-Server 未配置 shared_secret'
+            if error:
+                results[task_spec['id']] = {'success': False, 'task_id': task_spec['id'], 'error': error}
+                continue
+            jobs.append((server, str(override_agent_id or agent.host_id), inline_script(task_spec)))
+
+        if jobs:
+            results.update(run_coroutine(self._dispatch_all(jobs), thread_name="agent-async-dispatch"))
+        return results
+
+    async def _dispatch_all(self, jobs) -> Dict[str, Dict[str, Any]]:
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        limiters = {server.id: _RateLimiter(self.rate_per_server) for server, _, _ in jobs}
+        connector = aiohttp.TCPConnector(limit=self.max_in_flight, limit_per_host=self.max_in_flight)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            pushed = await asyncio.gather(*(
+                self._push(session, semaphore, limiters[server.id], server, agent_id, task_spec)
+                for server, agent_id, task_spec in jobs
+            ))
+
+        results = {item['task_id']: item for item in pushed}
+        logger.info(
+            f"异步推送任务完成: tasks={len(jobs)}, "
+            f"dispatched={sum(1 for r in pushed if r['success'])}, "
+            f"elapsed={loop.time() - started:.2f}s"
+        )
+        return results
+
+    async def _push(self, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore, limiter: _RateLimiter,
+                    server: AgentServer, agent_id: str, task_spec: Dict[str, Any]) -> Dict[str, Any]:
+        task_id = task_spec['id']
+        url = f"{server.base_url}/api/agents/{agent_id}/tasks"
+        body = json.dumps(task_spec, separators=(",", ":")).encode("utf-8")
+
+        await limiter.acquire()
+        async with semaphore:
+            # 签名时间戳在真正发送前生成，避免排队过久导致签名过期
+            headers = sign_headers(server.shared_secret, "POST", url, body, {"Content-Type": "application/json"})
+            try:
+                async with session.post(url, data=body, headers=headers) as response:
+                    text = await response.text()
+                    status_code = response.status
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.error(f"异步推送任务异常: task_id={task_id}, agent_id={agent_id}, error={e!r}")
+                return {'success': False, 'task_id': task_id, 'error': f'推送任务异常: {e!r}'}
+
+        if status_code != 200:
+            error_msg = text or f"HTTP {status_code}"
+            logger.error(f"异步推送任务失败: task_id={task_id}, agent_id={agent_id}, error={error_msg}")
+            return {'success': False, 'task_id': task_id, 'error': f'推送任务失败: {error_msg}'}
+
+        try:
+            status = json.loads(text).get('status', 'dispatched')
+        except ValueError:
+            status = 'dispatched'
+        return {'success': True, 'task_id': task_id, 'agent_id': agent_id, 'status': status}
@@ -6,7 +6,7 @@ import logging
 import uuid
 import time
 import redis
-from typing import Dict, Any, List, Optional
+from typing import Callable, Dict, Any, List, Optional, Tuple
 from datetime import datetime, timezone as dt_timezone
 from functools import wraps
 from django.utils import timezone
@@ -14,6 +14,9 @@ from django.db import transaction, DatabaseError
 
 from apps.executor.models import ExecutionRecord, ExecutionStep
 from apps.executor.services import ExecutionRecordService
+from apps.executor.abortable_tasks import check_task_cancellation
+from apps.executor.progress import get_progress_counter
+from apps.executor.script_store import compact_script_params, get_script_store, inline_script, resolve_script_content
 from apps.hosts.models import Host
 from apps.agents.models import Agent, AgentServer
 from utils.realtime_logs import realtime_log_service
@@ -175,6 +178,7 @@ class AgentExecutionService:
         parent_task_id: str = None,
         run_as: str = None,  # 执行用户（用户名）
         file_transfer: Dict[str, Any] = None,
+        script_sha256: str = None,
     ) -> Dict[str, Any]:
         """
         创建任务规范（TaskSpec）
@@ -195,6 +199,7 @@ class AgentExecutionService:
             is_retry: 是否为重试任务
             retry_count: 当前重试次数
             parent_task_id: 父任务ID
+            script_sha256: 脚本内容哈希（脚本已存入 ScriptStore 时 command 可留空，由 Agent-Server 按哈希补全）
         
         Returns:
             Dict: TaskSpec字典
@@ -221,6 +226,8 @@ class AgentExecutionService:
             task_spec["run_as"] = run_as
         if file_transfer:
             task_spec["file_transfer"] = file_transfer
+        if script_sha256:
+            task_spec["script_sha256"] = script_sha256
         return task_spec
 
     @staticmethod
@@ -268,11 +275,12 @@ class AgentExecutionService:
 
             api_url = f"{server.base_url}/api/agents/{agent_identifier}/tasks"
 
-            # 构造带 HMAC 签名的请求
-            from utils.agent_server_client import AgentServerClient
+            # 复用该 Agent-Server 的长连接客户端（带 HMAC 签名）
+            from utils.agent_server_client import get_agent_server_client
 
-            client = AgentServerClient(shared_secret=server.shared_secret)
-            response = client.post(api_url, json=task_spec)
+            client = get_agent_server_client(server)
+            # 单任务推送不走批量请求的脚本缓存协商，直接带上脚本内容
+            response = client.post(api_url, json=inline_script(task_spec))
 
             if response.status_code == 200:
                 result = response.json()
@@ -298,6 +306,178 @@ class AgentExecutionService:
                 'error': f'推送任务异常: {str(e)}'
             }
 
+    @staticmethod
+    def push_tasks_bulk(
+        items: List[Tuple[Agent, Dict[str, Any]]],
+        agent_server_id: int = None,
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        批量推送任务：按 Agent-Server 分组，每组按 AGENT_SERVER_BULK_DISPATCH_SIZE 分片，
+        每片一次签名请求，复用该 Agent-Server 的长连接
+
+        Args:
+            items: [(Agent, task_spec), ...]
+            agent_server_id: 默认 Agent-Server ID，Agent 自身绑定了 agent_server 时优先使用
+
+        Returns:
+            Dict[str, Dict]: {task_id: 推送结果}，结构与 push_task_to_agent 一致
+        """
+        from django.conf import settings
+        from utils.agent_server_client import get_agent_server_client
+
+        results: Dict[str, Dict[str, Any]] = {}
+        groups: Dict[int, List[Tuple[Agent, Dict[str, Any]]]] = {}
+        for agent, task_spec in items:
+            server_id = agent_server_id or agent.agent_server_id
+            if not server_id:
+                results[task_spec['id']] = {'success': False, 'task_id': task_spec['id'], 'error': '请先选择 Agent-Server'}
+                continue
+            groups.setdefault(server_id, []).append((agent, task_spec))
+        if not groups:
+            return results
+
+        servers = AgentServer.objects.filter(id__in=list(groups), is_active=True).in_bulk()
+        override_agent_id = getattr(settings, "AGENT_ID_OVERRIDE", None)
+        chunk_size = max(1, getattr(settings, 'AGENT_SERVER_BULK_DISPATCH_SIZE', 500))
+
+        for server_id, group in groups.items():
+            server = servers.get(server_id)
+            error = None
+            if not server:
+                error = 'Agent-Server 未注册或已禁用'
+            elif not server.shared_secret:
+                error = 'Agent-Server 未配置 shared_secret'
+            if error:
+                for _, task_spec in group:
+                    results[task_spec['id']] = {'success': False, 'task_id': task_spec['id'], 'error': error}
+                continue
+
+            client = get_agent_server_client(server)
+            agent_ids = {task_spec['id']: override_agent_id or agent.host_id for agent, task_spec in group}
+            for start in range(0, len(group), chunk_size):
+                chunk = group[start:start + chunk_size]
+                payload = [{'agent_id': str(agent_ids[task_spec['id']]), 'task': task_spec} for _, task_spec in chunk]
+                results.update(AgentExecutionService._send_bulk_chunk(client, server, payload))
+
+        return results
+
+    @staticmethod
+    def _scripts_to_send(client, payload: List[Dict[str, Any]]) -> Dict[str, str]:
+        """分片引用的脚本中该 Agent-Server 尚未缓存的部分 {sha256: content}"""
+        store = get_script_store()
+        scripts = {}
+        for item in payload:
+            sha = item['task'].get('script_sha256')
+            if not sha or sha in scripts or sha in client.known_scripts:
+                continue
+            content = store.get(sha)
+            if content is not None:
+                scripts[sha] = content
+        return scripts
+
+    @staticmethod
+    def _send_bulk_chunk(client, server: AgentServer, payload: List[Dict[str, Any]],
+                         resend_missing: bool = True) -> Dict[str, Dict[str, Any]]:
+        """发送一个批量分片，并将响应拆分为逐任务结果"""
+        task_ids = [item['task']['id'] for item in payload]
+        scripts = AgentExecutionService._scripts_to_send(client, payload)
+        try:
+            response = client.dispatch_tasks(server.base_url, payload, scripts=scripts)
+        except Exception as e:
+            logger.error(f"批量推送任务到 Agent-Server 异常: server={server.base_url}, tasks={len(payload)}, error={e}")
+            return {tid: {'success': False, 'task_id': tid, 'error': f'推送任务异常: {str(e)}'} for tid in task_ids}
+
+        if response.status_code != 200:
+            error_msg = response.text or f"HTTP {response.status_code}"
+            logger.error(f"批量推送任务到 Agent-Server 失败: server={server.base_url}, tasks={len(payload)}, error={error_msg}")
+            return {tid: {'success': False, 'task_id': tid, 'error': f'推送任务失败: {error_msg}'} for tid in task_ids}
+
+        body = response.json()
+        client.known_scripts.update(scripts)
+        results: Dict[str, Dict[str, Any]] = {}
+        agent_by_task = {item['task']['id']: item['agent_id'] for item in payload}
+        for item in body.get('results') or []:
+            tid = item.get('task_id')
+            if tid not in agent_by_task:
+                continue
+            if item.get('error'):
+                results[tid] = {'success': False, 'task_id': tid, 'error': f"推送任务失败: {item['error']}"}
+            else:
+                results[tid] = {
+                    'success': True,
+                    'task_id': tid,
+                    'agent_id': agent_by_task[tid],
+                    'status': item.get('status', 'dispatched'),
+                }
+        for tid in task_ids:
+            results.setdefault(tid, {'success': False, 'task_id': tid, 'error': '推送任务失败: Agent-Server 未返回结果'})
+
+        # Agent-Server 重启或淘汰了缓存的脚本：补发脚本内容后重推这些任务（只重试一次）
+        missing = set(body.get('missing_scripts') or [])
+        if missing and resend_missing:
+            client.known_scripts.difference_update(missing)
+            retry_payload = [item for item in payload if item['task'].get('script_sha256') in missing]
+            logger.info(f"Agent-Server 缺少脚本缓存，补发后重推: server={server.base_url}, scripts={len(missing)}, tasks={len(retry_payload)}")
+            results.update(AgentExecutionService._send_bulk_chunk(client, server, retry_payload, resend_missing=False))
+
+        logger.info(
+            f"批量推送任务到 Agent-Server: server={server.base_url}, "
+            f"tasks={len(payload)}, dispatched={sum(1 for r in results.values() if r['success'])}"
+        )
+        return results
+
+    @staticmethod
+    def _register_host_tasks(execution_record: ExecutionRecord, step_id: Optional[str], target_hosts: List[Host]) -> Dict[int, str]:
+        """
+        预先生成各主机的 task_id 并写入主机结果表（pending）
+
+        步骤执行期间即可按结果表取消任务、统计进度，不必等步骤结束后写回 host_results。
+        Returns:
+            {host_id: task_id}
+        """
+        step_key = step_id or 'main'
+        task_ids = {
+            host.id: f"{execution_record.execution_id}_{step_key}_{host.id}_{uuid.uuid4().hex[:8]}"
+            for host in target_hosts
+        }
+        step = None
+        if step_id and step_id != 'main':
+            step = ExecutionStep.objects.filter(id=step_id, execution_record=execution_record).first()
+        try:
+            ExecutionRecordService.upsert_host_results(
+                execution_record,
+                [{
+                    'host_id': host.id,
+                    'host_name': host.name,
+                    'host_ip': host.ip_address or '',
+                    'task_id': task_ids[host.id],
+                    'status': 'pending',
+                    'exit_code': None,
+                    'error': '',
+                    'started_at': None,
+                    'finished_at': None,
+                } for host in target_hosts],
+                step=step,
+                step_key=step_key,
+            )
+        except Exception as e:
+            logger.warning(f"写入主机结果失败: execution_id={execution_record.execution_id}, step={step_key}, error={e}")
+        get_progress_counter().register(execution_record.execution_id, step_key, task_ids)
+        return task_ids
+
+    @staticmethod
+    def _mark_hosts_dispatched(execution_record: ExecutionRecord, task_ids: List[str]) -> None:
+        """
+        推送成功的主机结果由 pending 标记为 running
+
+        取消时仍为 pending 的主机即尚未下发，可直接关闭；结果先于此处落库的行不受影响。
+        """
+        now = timezone.now()
+        for i in range(0, len(task_ids), 500):
+            execution_record.host_task_results.filter(
+                task_id__in=task_ids[i:i + 500], status='pending'
+            ).update(status='running', started_at=now)
+
     @staticmethod
     def execute_script_via_agent(
         execution_record: ExecutionRecord,
@@ -313,7 +493,10 @@ class AgentExecutionService:
         execution_mode: str = 'parallel',  # 执行模式: parallel/serial/rolling
         rolling_batch_size: int = 1,  # 滚动执行批次大小
         rolling_batch_delay: int = 0,  # 滚动执行批次延迟（秒）
+        rolling_max_fail_percent: Optional[float] = None,  # 滑动窗口失败百分比阈值
+        rolling_group_limit: int = 0,  # 滑动窗口每个分组的在途主机上限
         ignore_error: bool = False,  # 是否忽略错误继续执行
+        wait_for_results: bool = True,  # False 时只推送不等待（仅并行模式），由结果消费者收尾
     ) -> Dict[str, Any]:
         """
         通过Agent执行脚本
@@ -329,10 +512,14 @@ class AgentExecutionService:
             agent_server_id: Agent-Server ID
             account_id: 执行账号ID
             file_sources: 文件源列表
-            execution_mode: 执行模式 (parallel/serial/rolling)
-            rolling_batch_size: 滚动执行批次大小
+            execution_mode: 执行模式 (parallel/serial/rolling/sliding)
+            rolling_batch_size: 滚动执行批次大小（sliding 为窗口大小）
             rolling_batch_delay: 滚动执行批次延迟（秒）
+            rolling_max_fail_percent: 滑动窗口模式失败主机超过该百分比时停止
+            rolling_group_limit: 滑动窗口模式每个分组（可用区/地域）同时在途的主机上限
             ignore_error: 是否忽略错误继续执行
+            wait_for_results: 是否等待所有主机结果；为 False 时推送后立即返回，
+                执行记录由 handle_task_result 在全部主机结束后收尾（需先标记 execution_parameters.async_dispatch）
 
         Returns:
             Dict: 执行结果
@@ -352,14 +539,18 @@ class AgentExecutionService:
                 except Exception as e:
                     logger.warning(f"获取执行账号失败: account_id={account_id}, 错误: {str(e)}，将使用Agent默认用户")
 
+            task_ids = AgentExecutionService._register_host_tasks(execution_record, step_id, target_hosts)
+            # 脚本只存一份，各主机的 TaskSpec 只携带哈希
+            script_sha256 = get_script_store().put(script_content)
+
             # 创建任务规范的函数
             def task_creator(host: Host) -> Dict[str, Any]:
-                task_id = f"{execution_record.execution_id}_{step_id or 'main'}_{host.id}_{uuid.uuid4().hex[:8]}"
+                task_id = task_ids[host.id]
                 return AgentExecutionService.create_task_spec(
                     task_id=task_id,
                     name=f"{execution_record.name} - {host.name}",
                     task_type="script",
-                    command=script_content,
+                    script_sha256=script_sha256,
                     script_type=script_type,
                     env=global_variables or {},
                     timeout_sec=timeout,
@@ -377,15 +568,30 @@ class AgentExecutionService:
                     agent_server_id=agent_server_id,
                 )
 
+            # 批量推送：按 Agent-Server 合并为少量请求
+            def bulk_pusher(items: List[Tuple[Agent, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+                return AgentExecutionService.push_tasks_bulk(items, agent_server_id=agent_server_id)
+
             # 获取执行策略
             strategy = get_execution_strategy(
                 mode=execution_mode,
                 batch_size=rolling_batch_size,
                 batch_delay=rolling_batch_delay,
+                agent_server_id=agent_server_id,
+                max_fail_percent=rolling_max_fail_percent,
+                group_limit=rolling_group_limit,
+                on_pushed=lambda pushed: AgentExecutionService._mark_hosts_dispatched(execution_record, pushed),
             )
 
             logger.info(f"使用执行策略: {execution_mode}, 目标主机数: {len(target_hosts)}")
 
+            if not wait_for_results:
+                if hasattr(strategy, 'dispatch'):
+                    return AgentExecutionService._dispatch_without_waiting(
+                        execution_record, strategy, target_hosts, task_creator, task_pusher, bulk_pusher, step_id
+                    )
+                logger.warning(f"执行模式 {execution_mode} 需要逐批等待结果，不支持仅推送，按同步方式执行")
+
             # 执行任务
             exec_result = strategy.execute(
                 hosts=target_hosts,
@@ -393,6 +599,8 @@ class AgentExecutionService:
                 task_pusher=task_pusher,
                 timeout=timeout,
                 ignore_error=ignore_error,
+                bulk_pusher=bulk_pusher,
+                should_stop=lambda: check_task_cancellation(execution_record.execution_id),
             )
 
             # 转换结果格式
@@ -424,6 +632,102 @@ class AgentExecutionService:
                 'error': f'执行异常: {str(e)}'
             }
 
+    @staticmethod
+    def _dispatch_without_waiting(
+        execution_record: ExecutionRecord,
+        strategy,
+        target_hosts: List[Host],
+        task_creator,
+        task_pusher,
+        bulk_pusher,
+        step_id: Optional[str],
+    ) -> Dict[str, Any]:
+        """只推送任务并返回，推送失败的主机直接记为失败，其余主机的结果由结果消费者落库"""
+        exec_result = strategy.dispatch(target_hosts, task_creator, task_pusher, bulk_pusher)
+        step_key = step_id or 'main'
+
+        if exec_result.results:
+            ExecutionRecordService.upsert_host_results(
+                execution_record,
+                [{
+                    'host_id': hr.host_id,
+                    'status': 'failed',
+                    'error': hr.error or '推送失败',
+                    'finished_at': timezone.now(),
+                } for hr in exec_result.results],
+                step_key=step_key,
+            )
+            counter = get_progress_counter()
+            for hr in exec_result.results:
+                counter.record(execution_record.execution_id, step_key, hr.host_id, 'failed')
+
+        # 全部推送失败或结果先于此处到达时，由这里完成收尾
+        AgentExecutionService._finalize_async_execution(execution_record)
+
+        logger.info(
+            f"任务已推送，不等待结果: execution_id={execution_record.execution_id}, "
+            f"pushed={len(exec_result.pending_task_ids)}, failed={exec_result.failed_count}"
+        )
+        return {
+            'success': exec_result.success,
+            'pending': True,
+            'pending_count': len(exec_result.pending_task_ids),
+            'success_count': 0,
+            'failed_count': exec_result.failed_count,
+            'results': [{
+                'host_id': hr.host_id,
+                'host_name': hr.host_name,
+                'task_id': hr.task_id,
+                'success': False,
+                'error': hr.error,
+            } for hr in exec_result.results],
+            'error': None if exec_result.success else '所有主机任务推送失败',
+        }
+
+    @staticmethod
+    def _finalize_async_execution(execution_record: ExecutionRecord) -> bool:
+        """
+        仅推送模式的执行记录收尾：全部主机结束后汇总结果并更新记录状态
+
+        多个结果并发到达时通过条件更新保证只收尾一次。
+        Returns:
+            是否由本次调用完成收尾
+        """
+        counts = ExecutionRecordService.summarize_host_results(execution_record=execution_record, step_key='main')
+        if not counts or counts.get('pending') or counts.get('running'):
+            return False
+
+        total = sum(counts.values())
+        success = counts.get('success', 0)
+        failed = total - success
+        final_status = 'success' if failed == 0 else 'failed'
+
+        claimed = ExecutionRecord.objects.filter(
+            id=execution_record.id, status__in=['pending', 'running']
+        ).update(status=final_status)
+        if not claimed:
+            return False
+
+        record = ExecutionRecord.objects.get(id=execution_record.id)
+        host_rows = record.host_task_results.filter(step_key='main').order_by('host_id')
+        results = record.execution_results or {}
+        results.update({
+            'summary': {
+                'total_hosts': total,
+                'success_hosts': success,
+                'failed_hosts': failed,
+            },
+            'hosts': [dict(row.as_dict(), success=row.status == 'success') for row in host_rows],
+        })
+        ExecutionRecordService.update_execution_status(
+            execution_record=record,
+            status=final_status,
+            error_message=f'{failed} 台主机执行失败' if failed else None,
+            execution_results=results,
+        )
+        logger.info(f"执行已收尾: execution_id={record.execution_id}, status={final_status}, total={total}, failed={failed}")
+        return True
+
     @staticmethod
     def execute_file_transfer_via_agent(
         execution_record: ExecutionRecord,
@@ -442,6 +746,8 @@ class AgentExecutionService:
         execution_mode: str = 'parallel',  # 执行模式: parallel/serial/rolling
         rolling_batch_size: int = 1,  # 滚动执行批次大小
         rolling_batch_delay: int = 0,  # 滚动执行批次延迟（秒）
+        rolling_max_fail_percent: Optional[float] = None,  # 滑动窗口失败百分比阈值
+        rolling_group_limit: int = 0,  # 滑动窗口每个分组的在途主机上限
         ignore_error: bool = False,  # 是否忽略错误继续执行
     ) -> Dict[str, Any]:
         """
@@ -460,9 +766,11 @@ class AgentExecutionService:
             step_id: 步骤ID（如果是工作流）
             agent_server_id: Agent-Server ID
             file_sources: 可选，包含 server 源，需先 HTTP 拉取入库后再下发
-            execution_mode: 执行模式 (parallel/serial/rolling)
-            rolling_batch_size: 滚动执行批次大小
+            execution_mode: 执行模式 (parallel/serial/rolling/sliding)
+            rolling_batch_size: 滚动执行批次大小（sliding 为窗口大小）
             rolling_batch_delay: 滚动执行批次延迟（秒）
+            rolling_max_fail_percent: 滑动窗口模式失败主机超过该百分比时停止
+            rolling_group_limit: 滑动窗口模式每个分组（可用区/地域）同时在途的主机上限
             ignore_error: 是否忽略错误继续执行
 
         Returns:
@@ -493,9 +801,11 @@ class AgentExecutionService:
                 'auth_headers': auth_headers or {},
             }
 
+            task_ids = AgentExecutionService._register_host_tasks(execution_record, step_id, target_hosts)
+
             # 创建任务规范的函数
             def task_creator(host: Host) -> Dict[str, Any]:
-                task_id = f"{execution_record.execution_id}_{step_id or 'main'}_{host.id}_{uuid.uuid4().hex[:8]}"
+                task_id = task_ids[host.id]
                 return AgentExecutionService.create_task_spec(
                     task_id=task_id,
                     name=f"{execution_record.name} - {host.name} (file_transfer)",
@@ -516,11 +826,19 @@ class AgentExecutionService:
                     agent_server_id=agent_server_id,
                 )
 
+            # 批量推送：按 Agent-Server 合并为少量请求
+            def bulk_pusher(items: List[Tuple[Agent, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+                return AgentExecutionService.push_tasks_bulk(items, agent_server_id=agent_server_id)
+
             # 获取执行策略
             strategy = get_execution_strategy(
                 mode=execution_mode,
                 batch_size=rolling_batch_size,
                 batch_delay=rolling_batch_delay,
+                agent_server_id=agent_server_id,
+                max_fail_percent=rolling_max_fail_percent,
+                group_limit=rolling_group_limit,
+                on_pushed=lambda pushed: AgentExecutionService._mark_hosts_dispatched(execution_record, pushed),
             )
 
             logger.info(f"文件传输使用执行策略: {execution_mode}, 目标主机数: {len(target_hosts)}")
@@ -532,6 +850,8 @@ class AgentExecutionService:
                 task_pusher=task_pusher,
                 timeout=timeout,
                 ignore_error=ignore_error,
+                bulk_pusher=bulk_pusher,
+                should_stop=lambda: check_task_cancellation(execution_record.execution_id),
             )
 
             # 转换结果格式
@@ -619,8 +939,12 @@ class AgentExecutionService:
         execution_mode: str = 'parallel',
         rolling_batch_size: int = 1,
         rolling_batch_delay: int = 0,
+        rolling_max_fail_percent: Optional[float] = None,
+        rolling_group_limit: int = 0,
         start_step_order: int = 1,
         agent_server_id: int = None,
+        resume: bool = False,
+        should_stop: Optional[Callable[[], bool]] = None,
     ) -> Dict[str, Any]:
         """
         通过Agent执行工作流
@@ -630,274 +954,83 @@ class AgentExecutionService:
             plan_steps: 计划步骤列表
             target_hosts: 目标主机列表
             global_parameters: 全局参数
-            execution_mode: 执行模式（parallel/serial/rolling）
-            rolling_batch_size: 滚动批次大小
+            execution_mode: 执行模式（parallel/serial/rolling/sliding）
+            rolling_batch_size: 滚动批次大小（sliding 为窗口大小）
             rolling_batch_delay: 滚动批次延迟
+            rolling_max_fail_percent: 滑动窗口失败百分比阈值
+            rolling_group_limit: 滑动窗口每个分组的在途主机上限
             start_step_order: 起始步骤顺序
             agent_server_id: Agent-Server ID
+            resume: 断点续跑，已结束的步骤（ExecutionStep）不再执行，中断的步骤复用原记录重新执行
+            should_stop: 可选的停止检查（如工作流执行器失去租约），返回 True 时不再启动后续步骤，
+                也不写入执行记录的最终状态（由接管的执行器负责）
         
         Returns:
             Dict: 执行结果
         """
         try:
             from apps.executor.services import ExecutionRecordService
-            from apps.executor.models import ExecutionStep
-
-            overall_success = True
-            all_results = []
-
-            def collect_step_host_ids(step_data: Dict[str, Any]) -> set:
-                host_ids = set()
-                # Direct hosts
-                for host in step_data.get('target_hosts') or []:
-                    if isinstance(host, dict):
-                        host_id = host.get('id') or host.get('host_id')
-                    else:
-                        host_id = host
-                    if host_id:
-                        host_ids.add(host_id)
-
-                # Groups -> expand to hosts when available; fallback to DB lookup by group id
-                group_ids_without_hosts = []
-                for group in step_data.get('target_groups') or []:
-                    if isinstance(group, dict):
-                        group_hosts = group.get('hosts') or []
-                        if group_hosts:
-                            for h in group_hosts:
-                                if isinstance(h, dict):
-                                    h_id = h.get('id') or h.get('host_id')
-                                else:
-                                    h_id = h
-                                if h_id:
-                                    host_ids.add(h_id)
-                        else:
-                            group_id = group.get('id')
-                            if group_id:
-                                group_ids_without_hosts.append(group_id)
-                    else:
-                        # group might be an id
-                        group_ids_without_hosts.append(group)
-
-                if group_ids_without_hosts:
-                    from apps.hosts.models import HostGroup
-                    for group in HostGroup.objects.filter(id__in=group_ids_without_hosts).prefetch_related('host_set'):
-                        host_ids.update(group.host_set.values_list('id', flat=True))
-
-                return host_ids
 
-            # 按步骤顺序执行
+            steps = []
             for step_index, step_data in enumerate(plan_steps):
                 step_order = step_data.get('order', step_index + 1)
-                
                 # 跳过指定步骤之前的步骤
                 if step_order < start_step_order:
                     continue
+                steps.append((step_order, step_data))
 
-                step_name = step_data.get('step_name', f'步骤{step_order}')
-                step_type = step_data.get('step_type', 'script')
+            def stopped() -> bool:
+                return bool(should_stop and should_stop())
 
-                logger.info(f"执行工作流步骤: {step_name} (类型: {step_type}, 顺序: {step_order})")
-
-                # 创建执行步骤记录
-                step = ExecutionRecordService.create_execution_step(
+            def run_step(step_order: int, step_data: Dict[str, Any]) -> Dict[str, Any]:
+                if stopped():
+                    logger.warning(f"工作流已停止，不再执行步骤: execution_id={execution_record.execution_id}, order={step_order}")
+                    return {'status': 'aborted', 'entry': None, 'failed': False, 'stop': True}
+                return AgentExecutionService._run_workflow_step(
                     execution_record=execution_record,
-                    step_name=step_name,
-                    step_type=step_type,
+                    step_data=step_data,
                     step_order=step_order,
-                    step_parameters=step_data
+                    target_hosts=target_hosts,
+                    global_parameters=global_parameters,
+                    execution_mode=execution_mode,
+                    rolling_batch_size=rolling_batch_size,
+                    rolling_batch_delay=rolling_batch_delay,
+                    rolling_max_fail_percent=rolling_max_fail_percent,
+                    rolling_group_limit=rolling_group_limit,
+                    agent_server_id=agent_server_id,
+                    resume=resume,
                 )
 
-                # 更新步骤状态为运行中
-                ExecutionRecordService.update_step_status(step, 'running')
-
-                if step_type == 'script':
-                    # 脚本执行步骤
-                    # 获取步骤的目标主机
-                    step_target_hosts = []
-                    step_host_ids = collect_step_host_ids(step_data)
-                    
-                    # 如果没有指定步骤主机，使用所有目标主机
-                    if not step_host_ids:
-                        step_target_hosts = target_hosts
-                    else:
-                        step_target_hosts = [h for h in target_hosts if h.id in step_host_ids]
-
-                    if not step_target_hosts:
-                        logger.warning(f"步骤 {step_name} 没有目标主机，跳过")
-                        ExecutionRecordService.update_step_status(
-                            step, 'skipped',
-                            error_message='没有目标主机'
-                        )
-                        continue
-
-                    # 合并全局变量和步骤变量
-                    step_global_variables = (global_parameters or {}).copy()
-                    step_global_variables.update(step_data.get('execution_parameters', {}))
-
-                    # 通过Agent执行脚本
-                    result = AgentExecutionService.execute_script_via_agent(
-                        execution_record=execution_record,
-                        script_content=step_data.get('script_content', ''),
-                        script_type=step_data.get('script_type', 'shell'),
-                        target_hosts=step_target_hosts,
-                        timeout=step_data.get('timeout', 300),
-                        global_variables=step_global_variables,
-                        step_id=str(step.id),
-                        agent_server_id=agent_server_id,
-                        account_id=step_data.get('account_id'),  # 传递执行账号ID
-                        execution_mode=execution_mode,  # 传递执行模式
-                        rolling_batch_size=rolling_batch_size,  # 传递滚动批次大小
-                        rolling_batch_delay=rolling_batch_delay,  # 传递滚动批次延迟
-                        ignore_error=step_data.get('ignore_error', False),  # 传递忽略错误标志
-                    )
-
-                    # 更新步骤结果
-                    host_results = []
-                    for r in result.get('results', []):
-                        host_results.append({
-                            'host_id': r.get('host_id'),
-                            'host_name': r.get('host_name'),
-                            'task_id': r.get('task_id'),  # 存储task_id用于取消任务
-                            'status': 'success' if r.get('success') else 'failed',
-                            'error': r.get('error'),
-                        })
-
-                    if result['success'] and result.get('failed_count', 0) == 0:
-                        step_status = 'success'
-                    else:
-                        step_status = 'failed'
-                        overall_success = False
+            if any(isinstance(step_data.get('depends_on'), list) for _, step_data in steps):
+                # 声明了依赖：按 DAG 并发执行就绪步骤
+                from apps.agents.workflow_dag import run_step_graph
 
-                    ExecutionRecordService.update_step_status(
-                        step, step_status,
-                        host_results=host_results,
-                        error_message=None if step_status == 'success' else '部分主机执行失败'
-                    )
+                host_counts = {}
 
-                    all_results.append({
-                        'step_name': step_name,
-                        'step_type': step_type,
-                        'result': result
-                    })
+                def step_host_count(step_data: Dict[str, Any]) -> int:
+                    key = id(step_data)
+                    if key not in host_counts:
+                        host_ids = AgentExecutionService._collect_step_host_ids(step_data)
+                        host_counts[key] = len([h for h in target_hosts if h.id in host_ids]) if host_ids else len(target_hosts)
+                    return host_counts[key]
 
-                    # 如果步骤失败且不允许忽略错误，停止执行
-                    if step_status == 'failed' and not step_data.get('ignore_error', False):
-                        logger.error(f"工作流步骤失败: {step_name}，停止执行")
+                outcomes = run_step_graph(steps, run_step, host_count=step_host_count)
+            else:
+                # 按步骤顺序执行
+                outcomes = []
+                for step_order, step_data in steps:
+                    outcome = run_step(step_order, step_data)
+                    outcomes.append(outcome)
+                    if outcome['stop']:
+                        logger.error(f"工作流步骤失败: {step_data.get('step_name', f'步骤{step_order}')}，停止执行")
                         break
 
-                elif step_type == 'file_transfer':
-                    # 文件传输步骤
-                    # 获取步骤的目标主机
-                    step_target_hosts = []
-                    step_host_ids = collect_step_host_ids(step_data)
-                    
-                    # 如果没有指定步骤主机，使用所有目标主机
-                    if not step_host_ids:
-                        step_target_hosts = target_hosts
-                    else:
-                        step_target_hosts = [h for h in target_hosts if h.id in step_host_ids]
-
-                    if not step_target_hosts:
-                        logger.warning(f"步骤 {step_name} 没有目标主机，跳过")
-                        ExecutionRecordService.update_step_status(
-                            step, 'skipped',
-                            error_message='没有目标主机'
-                        )
-                        continue
-
-                    # 如果步骤包含 file_sources（多来源），仅支持 server/artifact，server 会先 HTTP 拉取入库
-                    file_sources = step_data.get('file_sources') or []
-                    if file_sources:
-                        overall_results = {'success_count': 0, 'failed_count': 0, 'results': []}
-                        for src in file_sources:
-                            remote_path_src = src.get('remote_path') or step_data.get('remote_path', '')
-                            res = AgentExecutionService.execute_file_transfer_via_agent(
-                                execution_record=execution_record,
-                                remote_path=remote_path_src,
-                                target_hosts=step_target_hosts,
-                                timeout=step_data.get('timeout', 300),
-                                bandwidth_limit=step_data.get('bandwidth_limit', 0),
-                                download_url=src.get('download_url'),
-                                checksum=src.get('sha256'),
-                                size=src.get('size'),
-                                auth_headers=src.get('auth_headers') or {},
-                                step_id=str(step.id),
-                                agent_server_id=agent_server_id,
-                                account_id=step_data.get('account_id'),  # 传递执行账号ID
-                                file_sources=[src],  # server 源将先落库
-                            )
-
-                            overall_results['success_count'] += res.get('success_count', 0)
-                            overall_results['failed_count'] += res.get('failed_count', 0)
-                            overall_results['results'].extend(res.get('results', []))
-
-                        # 将 overall_results 转换为统一 result
-                        if overall_results['success_count'] > 0:
-                            result = {
-                                'success': True,
-                                'success_count': overall_results['success_count'],
-                                'failed_count': overall_results['failed_count'],
-                                'results': overall_results['results']
-                            }
-                        else:
-                            result = {
-                                'success': False,
-                                'success_count': overall_results['success_count'],
-                                'failed_count': overall_results['failed_count'],
-                                'results': overall_results['results']
-                            }
-                    else:
-                        ExecutionRecordService.update_step_status(
-                            step, 'failed',
-                            error_message='file_sources required for file_transfer step'
-                        )
-                        overall_success = False
-                        result = {'success': False, 'results': [], 'failed_count': len(step_target_hosts)}
-
-                    # 更新步骤结果
-                    host_results = []
-                    for r in result.get('results', []):
-                        host_results.append({
-                            'host_id': r.get('host_id'),
-                            'host_name': r.get('host_name'),
-                            'task_id': r.get('task_id'),  # 存储task_id用于取消任务
-                            'status': 'success' if r.get('success') else 'failed',
-                            'error': r.get('error'),
-                        })
-
-                    if result['success'] and result.get('failed_count', 0) == 0:
-                        step_status = 'success'
-                    else:
-                        step_status = 'failed'
-                        overall_success = False
-
-                    ExecutionRecordService.update_step_status(
-                        step, step_status,
-                        host_results=host_results,
-                        error_message=None if step_status == 'success' else '部分主机执行失败'
-                    )
-
-                    all_results.append({
-                        'step_name': step_name,
-                        'step_type': step_type,
-                        'result': result
-                    })
-
-                    # 如果步骤失败且不允许忽略错误，停止执行
-                    if step_status == 'failed' and not step_data.get('ignore_error', False):
-                        logger.error(f"工作流步骤失败: {step_name}，停止执行")
-                        break
+            if stopped():
+                logger.warning(f"工作流已停止，不写入最终状态: execution_id={execution_record.execution_id}")
+                return {'success': False, 'aborted': True, 'message': '工作流已停止执行'}
 
-                else:
-                    # 其他步骤类型暂未实现
-                    logger.warning(f"步骤类型暂未实现: {step_type}")
-                    ExecutionRecordService.update_step_status(
-                        step, 'failed',
-                        error_message=f'步骤类型 {step_type} 暂未实现'
-                    )
-                    if not step_data.get('ignore_error', False):
-                        overall_success = False
-                        break
+            overall_success = not any(outcome['failed'] for outcome in outcomes)
+            all_results = [outcome['entry'] for outcome in outcomes if outcome.get('entry')]
 
             # 更新执行记录状态
             if overall_success:
@@ -925,16 +1058,247 @@ class AgentExecutionService:
 
         except Exception as e:
             logger.error(f"通过Agent执行工作流异常: {str(e)}", exc_info=True)
-            ExecutionRecordService.update_execution_status(
-                execution_record=execution_record,
-                status='failed',
-                error_message=f'工作流执行异常: {str(e)}'
-            )
+            if not (should_stop and should_stop()):
+                ExecutionRecordService.update_execution_status(
+                    execution_record=execution_record,
+                    status='failed',
+                    error_message=f'工作流执行异常: {str(e)}'
+                )
             return {
                 'success': False,
                 'error': f'执行异常: {str(e)}'
             }
 
+    @staticmethod
+    def _collect_step_host_ids(step_data: Dict[str, Any]) -> set:
+        """收集步骤的目标主机ID（直接主机 + 分组主机）"""
+        host_ids = set()
+        # Direct hosts
+        for host in step_data.get('target_hosts') or []:
+            if isinstance(host, dict):
+                host_id = host.get('id') or host.get('host_id')
+            else:
+                host_id = host
+            if host_id:
+                host_ids.add(host_id)
+
+        # Groups -> expand to hosts when available; fallback to DB lookup by group id
+        group_ids_without_hosts = []
+        for group in step_data.get('target_groups') or []:
+            if isinstance(group, dict):
+                group_hosts = group.get('hosts') or []
+                if group_hosts:
+                    for h in group_hosts:
+                        if isinstance(h, dict):
+                            h_id = h.get('id') or h.get('host_id')
+                        else:
+                            h_id = h
+                        if h_id:
+                            host_ids.add(h_id)
+                else:
+                    group_id = group.get('id')
+                    if group_id:
+                        group_ids_without_hosts.append(group_id)
+            else:
+                # group might be an id
+                group_ids_without_hosts.append(group)
+
+        if group_ids_without_hosts:
+            from apps.hosts.models import HostGroup
+            for group in HostGroup.objects.filter(id__in=group_ids_without_hosts).prefetch_related('host_set'):
+                host_ids.update(group.host_set.values_list('id', flat=True))
+
+        return host_ids
+
+    @staticmethod
+    def _run_workflow_step(
+        execution_record: ExecutionRecord,
+        step_data: Dict[str, Any],
+        step_order: int,
+        target_hosts: List[Host],
+        global_parameters: Dict[str, Any] = None,
+        execution_mode: str = 'parallel',
+        rolling_batch_size: int = 1,
+        rolling_batch_delay: int = 0,
+        rolling_max_fail_percent: Optional[float] = None,
+        rolling_group_limit: int = 0,
+        agent_server_id: int = None,
+        resume: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        执行工作流中的单个步骤
+
+        Returns:
+            Dict: {'status': 步骤状态, 'entry': 步骤结果（汇总用，可为 None）,
+                   'failed': 是否计为工作流失败, 'stop': 是否终止后续步骤}
+        """
+        from apps.executor.services import ExecutionRecordService
+        from apps.executor.models import ExecutionStep
+
+        step_name = step_data.get('step_name', f'步骤{step_order}')
+        step_type = step_data.get('step_type', 'script')
+        ignore_error = step_data.get('ignore_error', False)
+
+        logger.info(f"执行工作流步骤: {step_name} (类型: {step_type}, 顺序: {step_order})")
+
+        step = None
+        if resume:
+            step = ExecutionStep.objects.filter(
+                execution_record=execution_record, step_order=step_order
+            ).order_by('-id').first()
+            if step and step.status in ('success', 'failed', 'skipped'):
+                logger.info(f"断点续跑: 步骤已结束，跳过 {step_name} (状态: {step.status})")
+                if step.status == 'skipped':
+                    return {'status': 'skipped', 'entry': None, 'failed': False, 'stop': False}
+                failed = step.status == 'failed'
+                return {
+                    'status': step.status,
+                    'entry': {
+                        'step_name': step_name,
+                        'step_type': step_type,
+                        'result': {'success': step.status == 'success'},
+                    },
+                    'failed': failed,
+                    'stop': failed and not ignore_error,
+                }
+
+        if step is None:
+            # 创建执行步骤记录
+            step = ExecutionRecordService.create_execution_step(
+                execution_record=execution_record,
+                step_name=step_name,
+                step_type=step_type,
+                step_order=step_order,
+                step_parameters=compact_script_params(step_data)
+            )
+        else:
+            logger.warning(f"断点续跑: 步骤 {step_name} 执行中断，重新执行")
+
+        # 更新步骤状态为运行中
+        ExecutionRecordService.update_step_status(step, 'running')
+
+        if step_type not in ('script', 'file_transfer'):
+            # 其他步骤类型暂未实现
+            logger.warning(f"步骤类型暂未实现: {step_type}")
+            ExecutionRecordService.update_step_status(
+                step, 'failed',
+                error_message=f'步骤类型 {step_type} 暂未实现'
+            )
+            return {'status': 'failed', 'entry': None, 'failed': not ignore_error, 'stop': not ignore_error}
+
+        # 获取步骤的目标主机，未指定步骤主机时使用所有目标主机
+        step_host_ids = AgentExecutionService._collect_step_host_ids(step_data)
+        if not step_host_ids:
+            step_target_hosts = target_hosts
+        else:
+            step_target_hosts = [h for h in target_hosts if h.id in step_host_ids]
+
+        if not step_target_hosts:
+            logger.warning(f"步骤 {step_name} 没有目标主机，跳过")
+            ExecutionRecordService.update_step_status(
+                step, 'skipped',
+                error_message='没有目标主机'
+            )
+            return {'status': 'skipped', 'entry': None, 'failed': False, 'stop': False}
+
+        if step_type == 'script':
+            # 合并全局变量和步骤变量
+            step_global_variables = (global_parameters or {}).copy()
+            step_global_variables.update(step_data.get('execution_parameters', {}))
+
+            # 通过Agent执行脚本
+            result = AgentExecutionService.execute_script_via_agent(
+                execution_record=execution_record,
+                script_content=step_data.get('script_content', ''),
+                script_type=step_data.get('script_type', 'shell'),
+                target_hosts=step_target_hosts,
+                timeout=step_data.get('timeout', 300),
+                global_variables=step_global_variables,
+                step_id=str(step.id),
+                agent_server_id=agent_server_id,
+                account_id=step_data.get('account_id'),  # 传递执行账号ID
+                execution_mode=execution_mode,  # 传递执行模式
+                rolling_batch_size=rolling_batch_size,  # 传递滚动批次大小
+                rolling_batch_delay=rolling_batch_delay,  # 传递滚动批次延迟
+                rolling_max_fail_percent=rolling_max_fail_percent,
+                rolling_group_limit=rolling_group_limit,
+                ignore_error=ignore_error,  # 传递忽略错误标志
+            )
+        else:
+            # 如果步骤包含 file_sources（多来源），仅支持 server/artifact，server 会先 HTTP 拉取入库
+            file_sources = step_data.get('file_sources') or []
+            if file_sources:
+                overall_results = {'success_count': 0, 'failed_count': 0, 'results': []}
+                for src in file_sources:
+                    remote_path_src = src.get('remote_path') or step_data.get('remote_path', '')
+                    res = AgentExecutionService.execute_file_transfer_via_agent(
+                        execution_record=execution_record,
+                        remote_path=remote_path_src,
+                        target_hosts=step_target_hosts,
+                        timeout=step_data.get('timeout', 300),
+                        bandwidth_limit=step_data.get('bandwidth_limit', 0),
+                        download_url=src.get('download_url'),
+                        checksum=src.get('sha256'),
+                        size=src.get('size'),
+                        auth_headers=src.get('auth_headers') or {},
+                        step_id=str(step.id),
+                        agent_server_id=agent_server_id,
+                        account_id=step_data.get('account_id'),  # 传递执行账号ID
+                        file_sources=[src],  # server 源将先落库
+                    )
+
+                    overall_results['success_count'] += res.get('success_count', 0)
+                    overall_results['failed_count'] += res.get('failed_count', 0)
+                    overall_results['results'].extend(res.get('results', []))
+
+                # 将 overall_results 转换为统一 result
+                result = {
+                    'success': overall_results['success_count'] > 0,
+                    'success_count': overall_results['success_count'],
+                    'failed_count': overall_results['failed_count'],
+                    'results': overall_results['results']
+                }
+            else:
+                ExecutionRecordService.update_step_status(
+                    step, 'failed',
+                    error_message='file_sources required for file_transfer step'
+                )
+                result = {'success': False, 'results': [], 'failed_count': len(step_target_hosts)}
+
+        # 更新步骤结果
+        host_results = []
+        for r in result.get('results', []):
+            host_results.append({
+                'host_id': r.get('host_id'),
+                'host_name': r.get('host_name'),
+                'task_id': r.get('task_id'),  # 存储task_id用于取消任务
+                'status': 'success' if r.get('success') else 'failed',
+                'error': r.get('error'),
+            })
+
+        if result['success'] and result.get('failed_count', 0) == 0:
+            step_status = 'success'
+        else:
+            step_status = 'failed'
+
+        ExecutionRecordService.update_step_status(
+            step, step_status,
+            host_results=host_results,
+            error_message=None if step_status == 'success' else '部分主机执行失败'
+        )
+
+        # 如果步骤失败且不允许忽略错误，停止执行
+        return {
+            'status': step_status,
+            'entry': {
+                'step_name': step_name,
+                'step_type': step_type,
+                'result': result
+            },
+            'failed': step_status == 'failed',
+            'stop': step_status == 'failed' and not ignore_error,
+        }
+
     @staticmethod
     def handle_task_result(
         task_id: str,
@@ -947,7 +1311,7 @@ class AgentExecutionService:
         Args:
             task_id: 任务ID
             result: 任务结果
-            progress: 进度信息（可选，从 agent_results stream 聚合计算得出）
+            progress: 进度信息（可选，agent-server 附带的聚合值；进度以 Redis 计数器为准，此参数不再写库）
 
         Returns:
             Dict: 处理结果
@@ -964,114 +1328,104 @@ class AgentExecutionService:
             step_id = parts[1] if len(parts) > 1 else None
             host_id = int(parts[2]) if len(parts) > 2 and parts[2].isdigit() else None
 
-            # 查找ExecutionRecord
+            # 查找ExecutionRecord（不加载大字段，下方只按列更新）
             try:
-                execution_record = ExecutionRecord.objects.get(execution_id=execution_id)
+                execution_record = ExecutionRecord.objects.defer(
+                    'execution_results', 'execution_parameters'
+                ).get(execution_id=execution_id)
             except ExecutionRecord.DoesNotExist:
                 logger.warning(f"执行记录不存在: {execution_id}")
                 return {'success': False, 'error': '执行记录不存在'}
 
-            # 更新执行记录状态
             status = result.get('status', 'failed')
-            if status == 'success':
-                execution_record.status = 'success'
-            elif status == 'failed':
-                execution_record.status = 'failed'
-                execution_record.error_message = result.get('error_msg', '任务执行失败')
-            elif status == 'cancelled':
-                execution_record.status = 'cancelled'
-
-            # 保存日志指针/大小到 execution_results，供历史页回源
-            log_pointer = result.get('log_pointer')
-            log_size = result.get('log_size')
-            if log_pointer or log_size is not None:
-                results_meta = execution_record.execution_results or {}
-                meta_logs = results_meta.get('logs_meta', {})
-                meta_logs.update({
-                    'log_pointer': log_pointer,
-                    'log_size': log_size,
-                })
-
-                results_meta['logs_meta'] = meta_logs
-                execution_record.execution_results = results_meta
-
-            # 处理进度信息（从 agent_results stream 聚合计算）
-            if progress:
-                exec_results = execution_record.execution_results or {}
-                exec_results['progress'] = {
-                    'progress': progress.get('progress'),
-                    'total_hosts': progress.get('total_hosts'),
-                    'success_hosts': progress.get('success_hosts'),
-                    'failed_hosts': progress.get('failed_hosts'),
-                    'running_hosts': progress.get('running_hosts'),
-                    'pending_hosts': progress.get('pending_hosts'),
-                    'updated_at': datetime.now(tz=timezone.utc).isoformat(),
-                }
-                execution_record.execution_results = exec_results
-
+            finished_at = timezone.now()
             # 使用传入的时间戳（Unix 秒），如果不存在则使用当前时间
             finished_at_ts = result.get('finished_at')
             if finished_at_ts:
                 try:
-                    execution_record.finished_at = datetime.fromtimestamp(
-                        int(finished_at_ts), tz=dt_timezone.utc
-                    )
+                    finished_at = datetime.fromtimestamp(int(finished_at_ts), tz=dt_timezone.utc)
                 except (ValueError, TypeError, OSError):
-                    execution_record.finished_at = timezone.now()
-            else:
-                execution_record.finished_at = timezone.now()
-            
-            execution_record.save()
+                    pass
 
-            # 如果是工作流，更新步骤状态和主机结果
+            step = None
             if step_id and step_id != 'main':
-                try:
-                    step = ExecutionStep.objects.get(id=step_id, execution_record=execution_record)
-                    step.status = status
-                    if status == 'failed':
-                        step.error_message = result.get('error_msg', '步骤执行失败')
-                    
-                    # 使用传入的时间戳（Unix 秒），如果不存在则使用当前时间
-                    finished_at_ts = result.get('finished_at')
-                    if finished_at_ts:
-                        try:
-                            step.finished_at = datetime.fromtimestamp(
-                                int(finished_at_ts), tz=dt_timezone.utc
-                            )
-                        except (ValueError, TypeError, OSError):
-                            step.finished_at = timezone.now()
-                    else:
-                        step.finished_at = timezone.now()
-                    
-                    # 更新主机结果
-                    if host_id:
-                        host_results = step.host_results or []
-                        updated = False
-                        for hr in host_results:
-                            if hr.get('host_id') == host_id:
-                                hr['status'] = status
-                                hr['error'] = result.get('error_msg', '') if status == 'failed' else None
-                                updated = True
-                                break
-                        if not updated:
-                            # 添加新的主机结果
-                            from apps.hosts.models import Host
-                            try:
-                                host = Host.objects.get(id=host_id)
-                                host_results.append({
-                                    'host_id': host_id,
-                                    'host_name': host.name,
-                                    'status': status,
-                                    'error': result.get('error_msg', '') if status == 'failed' else None,
-                                })
-                            except Host.DoesNotExist:
-                                pass
-                        step.host_results = host_results
-                    
-                    step.save()
-                except ExecutionStep.DoesNotExist:
+                step = ExecutionStep.objects.filter(id=step_id, execution_record=execution_record).first()
+                if step is None:
                     logger.warning(f"执行步骤不存在: {step_id}")
 
+            # 主机结果按 (执行记录, 步骤, 主机) 单行 upsert，步骤/记录状态由结果表聚合得出
+            if host_id and (step is not None or not step_id or step_id == 'main'):
+                host_result = {
+                    'host_id': host_id,
+                    'task_id': task_id,
+                    'status': status,
+                    'error': result.get('error_msg', '') if status == 'failed' else '',
+                    'finished_at': finished_at,
+                }
+                if result.get('exit_code') is not None:
+                    host_result['exit_code'] = result.get('exit_code')
+                if result.get('started_at'):
+                    host_result['started_at'] = result.get('started_at')
+                if result.get('log_pointer'):
+                    host_result['log_pointer'] = result.get('log_pointer')
+                if result.get('log_size') is not None:
+                    host_result['log_size'] = result.get('log_size')
+                ExecutionRecordService.upsert_host_results(
+                    execution_record, [host_result], step=step, step_key=step_id or 'main'
+                )
+                get_progress_counter().record(execution_id, step_id or 'main', host_id, status)
+                scope = {'step': step} if step is not None else {'execution_record': execution_record, 'step_key': 'main'}
+                if status == 'success' and ExecutionRecordService.summarize_host_results(
+                    status__in=['failed', 'timeout'], **scope
+                ):
+                    # 已有主机失败时，后到的成功结果不再把整体状态改回成功
+                    status = 'failed'
+
+            # 仅推送模式：全部主机结束后再由 _finalize_async_execution 统一收尾，不逐条改写记录状态
+            async_dispatch = step is None and ExecutionRecord.objects.filter(
+                id=execution_record.id, execution_parameters__async_dispatch=True
+            ).exists()
+
+            update_fields = []
+            if not async_dispatch:
+                # 更新执行记录状态
+                if status == 'success':
+                    execution_record.status = 'success'
+                elif status == 'failed':
+                    execution_record.status = 'failed'
+                    execution_record.error_message = result.get('error_msg', '任务执行失败')
+                elif status == 'cancelled':
+                    execution_record.status = 'cancelled'
+                execution_record.finished_at = finished_at
+                update_fields = ['status', 'error_message', 'finished_at']
+
+            # 日志指针/大小只在首次写入 execution_results 供历史页回源，主机级指针保存在主机结果表
+            log_pointer = result.get('log_pointer')
+            log_size = result.get('log_size')
+            if (log_pointer or log_size is not None) and not ExecutionRecord.objects.filter(
+                id=execution_record.id, execution_results__has_key='logs_meta'
+            ).exists():
+                results_meta = execution_record.execution_results or {}
+                results_meta['logs_meta'] = {
+                    'log_pointer': log_pointer,
+                    'log_size': log_size,
+                }
+                execution_record.execution_results = results_meta
+                update_fields.append('execution_results')
+
+            if update_fields:
+                execution_record.save(update_fields=update_fields)
+            if async_dispatch:
+                AgentExecutionService._finalize_async_execution(execution_record)
+
+            # 如果是工作流，更新步骤状态（只写步骤自身的列，不再读改写 host_results）
+            if step is not None:
+                step.status = status
+                if status == 'failed':
+                    step.error_message = result.get('error_msg', '步骤执行失败')
+                step.finished_at = finished_at
+                step.save(update_fields=['status', 'error_message', 'finished_at'])
+
             return {
                 'success': True,
                 'execution_record_id': execution_record.id,
@@ -1228,7 +1582,7 @@ class AgentExecutionService:
 
                     params = execution_record.execution_parameters
                     script_data = {
-                        'script_content': params.get('script_content'),
+                        'script_content': resolve_script_content(params),
                         'script_type': params.get('script_type', 'shell'),
                         'timeout': params.get('timeout', 300),
                         'execution_mode': params.get('execution_mode', 'parallel'),
@@ -1397,10 +1751,11 @@ class AgentExecutionService:
                     }
 
                 # 根据重试类型确定要重试的主机
+                step_host_results = ExecutionRecordService.get_host_results(step)
                 if ip_list:
                     # 基于IP列表的重试
                     target_hosts = [
-                        host for host in step.host_results
+                        host for host in step_host_results
                         if host.get('host_ip') in ip_list
                     ]
                     if not target_hosts:
@@ -1410,11 +1765,11 @@ class AgentExecutionService:
                         }
                 elif failed_only:
                     target_hosts = [
-                        host for host in step.host_results
+                        host for host in step_host_results
                         if host.get('status') in ['failed', 'timeout']
                     ]
                 else:
-                    target_hosts = step.host_results
+                    target_hosts = step_host_results
 
                 if not target_hosts:
                     return {
@@ -1429,6 +1784,7 @@ class AgentExecutionService:
                 step.error_message = None
                 step.host_results = []
                 step.save()
+                step.host_task_results.filter(host_id__in=[h.get('host_id') for h in target_hosts]).delete()
 
                 # 更新执行记录状态
                 execution_record.status = 'running'
@@ -1438,7 +1794,6 @@ class AgentExecutionService:
 
                 # 重新执行步骤（通过Agent）
                 from apps.hosts.models import Host
-                from apps.executor.services import ExecutionRecordService
 
                 # 获取主机对象
                 host_ids = [h.get('host_id') for h in target_hosts if isinstance(h, dict) and h.get('host_id')]
@@ -1472,7 +1827,7 @@ class AgentExecutionService:
                     # 脚本步骤重试
                     result = AgentExecutionService.execute_script_via_agent(
                         execution_record=execution_record,
-                        script_content=step_params.get('script_content', ''),
+                        script_content=resolve_script_content(step_params),
                         script_type=step_params.get('script_type', 'shell'),
                         target_hosts=online_hosts,
                         timeout=step_params.get('timeout', 300),
@@ -1551,33 +1906,47 @@ class AgentExecutionService:
             task_ids = []
             agent_task_map = {}  # {agent_id: [task_ids]}
             
-            # 从ExecutionStep的host_results中收集task_id
-            steps = ExecutionStep.objects.filter(execution_record=execution_record)
-            for step in steps:
-                host_results = step.host_results or []
-                for hr in host_results:
-                    task_id = hr.get('task_id')
-                    host_id = hr.get('host_id')
-                    if task_id and host_id:
-                        # 获取Agent
-                        try:
-                            host = Host.objects.get(id=host_id)
-                            if hasattr(host, 'agent') and host.agent:
-                                agent_id = host.agent.host_id
-                                if agent_id not in agent_task_map:
-                                    agent_task_map[agent_id] = {
-                                        'agent': host.agent,
-                                        'tasks': []
-                                    }
-                                agent_task_map[agent_id]['tasks'].append({
-                                    'task_id': task_id,
-                                    'host_id': host_id,
-                                })
-                                task_ids.append(task_id)
-                        except Host.DoesNotExist:
-                            logger.warning(f"主机不存在: {host_id}")
+            # 从主机结果表收集已下发未结束的任务；没有结果表数据的历史记录回退到 ExecutionStep.host_results
+            from apps.executor.models import ExecutionHostResult
+
+            open_results = ExecutionHostResult.objects.filter(execution_record=execution_record).exclude(
+                status__in=['success', 'failed', 'cancelled', 'timeout', 'skipped']
+            )
+            # 取消标志已设置，执行策略不再下发后续主机；仍为 pending 的主机尚未推送，直接关闭
+            skipped_count = open_results.filter(status='pending').update(status='cancelled', finished_at=timezone.now())
+            pending_tasks = list(open_results.exclude(task_id='').values_list('task_id', 'host_id'))
+            if not pending_tasks and not ExecutionHostResult.objects.filter(execution_record=execution_record).exists():
+                for step in ExecutionStep.objects.filter(execution_record=execution_record):
+                    for hr in step.host_results or []:
+                        if hr.get('task_id') and hr.get('host_id'):
+                            pending_tasks.append((hr['task_id'], hr['host_id']))
+
+            hosts = Host.objects.filter(id__in={host_id for _, host_id in pending_tasks}).select_related('agent').in_bulk()
+            for task_id, host_id in pending_tasks:
+                host = hosts.get(host_id)
+                if host is None:
+                    logger.warning(f"主机不存在: {host_id}")
+                    continue
+                if hasattr(host, 'agent') and host.agent:
+                    agent_id = host.agent.host_id
+                    if agent_id not in agent_task_map:
+                        agent_task_map[agent_id] = {
+                            'agent': host.agent,
+                            'tasks': []
+                        }
+                    agent_task_map[agent_id]['tasks'].append({
+                        'task_id': task_id,
+                        'host_id': host_id,
+                    })
+                    task_ids.append(task_id)
             
             if not task_ids:
+                if skipped_count:
+                    return {
+                        'success': True,
+                        'message': f'已取消 {skipped_count} 台尚未下发的主机',
+                        'cancelled_count': 0
+                    }
                 logger.warning(f"执行记录 {execution_record.execution_id} 没有找到需要取消的任务")
                 return {
                     'success': True,
@@ -1592,10 +1961,17 @@ class AgentExecutionService:
                     'success': False,
                     'error': '请先选择Agent-Server'
                 }
-            return AgentExecutionService._cancel_tasks_via_agent_server(
+            result = AgentExecutionService._cancel_tasks_via_agent_server(
                 agent_task_map=agent_task_map,
                 agent_server_id=server_id,
             )
+            cancelled_task_ids = result.pop('cancelled_task_ids', None)
+            if cancelled_task_ids is not None:
+                # 只关闭 Agent 已确认取消的任务；取消失败的任务可能仍会上报结果
+                now = timezone.now()
+                for i in range(0, len(cancelled_task_ids), 500):
+                    open_results.filter(task_id__in=cancelled_task_ids[i:i + 500]).update(status='cancelled', finished_at=now)
+            return result
         
         except Exception as e:
             logger.error(f"取消Agent任务异常: {str(e)}", exc_info=True)
@@ -1611,17 +1987,23 @@ class AgentExecutionService:
     ) -> Dict[str, Any]:
         """
         通过Agent-Server取消任务
-        
+
+        按 AGENT_SERVER_BULK_DISPATCH_SIZE 分片调用跨 Agent 批量取消接口，各分片并发发送
+        （并发数 AGENT_SERVER_CANCEL_CONCURRENCY）；Agent-Server 不支持批量取消接口时
+        回退为按 Agent 并发调用 /agents/:id/tasks/cancel/batch。
+
         Args:
             agent_task_map: Agent和任务映射 {agent_id: {'agent': Agent, 'tasks': [{'task_id': str, 'host_id': int}]}}
             agent_server_id: Agent-Server ID
-        
+
         Returns:
-            Dict: 取消结果
+            Dict: 取消结果（cancelled_task_ids 为 Agent 已确认取消的任务）
         """
         try:
+            from concurrent.futures import ThreadPoolExecutor
             from django.conf import settings
-            
+            from utils.agent_server_client import get_agent_server_client
+
             server = AgentServer.objects.filter(id=agent_server_id, is_active=True).first()
             if not server:
                 return {
@@ -1633,66 +2015,122 @@ class AgentExecutionService:
                     'success': False,
                     'error': 'Agent-Server 未配置 shared_secret'
                 }
-            
-            # 获取Agent-Server的认证Token（如果需要）
-            agent_server_token = getattr(settings, 'AGENT_SERVER_TOKEN', None)
-            
-            headers_base = {
-                'Content-Type': 'application/json',
-            }
-            if agent_server_token:
-                headers_base['Authorization'] = f'Bearer {agent_server_token}'
-            
-            cancelled_count = 0
-            failed_count = 0
-            errors = []
-            
-            # 为每个Agent取消任务
-            for agent_id, agent_info in agent_task_map.items():
-                agent = agent_info['agent']
-                tasks = agent_info['tasks']
-                
-                for task_info in tasks:
-                    task_id = task_info['task_id']
-                    host_id = task_info['host_id']
-                    
-                    # 调用Agent-Server的取消任务API
-                    api_url = f"{server.base_url}/api/agents/{agent_id}/tasks/{task_id}/cancel"
-                    
-                    try:
-                        # 使用 HMAC 客户端发起请求
-                        from utils.agent_server_client import AgentServerClient
-
-                        client = AgentServerClient(shared_secret=server.shared_secret)
-                        response = client.post(api_url, json=None, headers=headers_base)
-                        
-                        if response.status_code == 200:
-                            cancelled_count += 1
-                            logger.info(f"成功取消任务: task_id={task_id}, agent_id={agent_id}, host_id={host_id}")
-                        else:
-                            failed_count += 1
-                            error_msg = response.text or f"HTTP {response.status_code}"
-                            errors.append(f"取消任务失败 (task_id={task_id}, agent_id={agent_id}): {error_msg}")
-                            logger.error(f"取消任务失败: task_id={task_id}, agent_id={agent_id}, 状态码={response.status_code}, 错误={error_msg}")
-                    
-                    except Exception as e:
-                        failed_count += 1
-                        error_msg = f"请求异常: {str(e)}"
-                        errors.append(f"取消任务异常 (task_id={task_id}, agent_id={agent_id}): {error_msg}")
-                        logger.error(f"取消任务异常: task_id={task_id}, agent_id={agent_id}, 错误={str(e)}", exc_info=True)
-            
+
+            client = get_agent_server_client(server)
+            override_agent_id = getattr(settings, "AGENT_ID_OVERRIDE", None)
+            chunk_size = max(1, getattr(settings, 'AGENT_SERVER_BULK_DISPATCH_SIZE', 500))
+            concurrency = max(1, getattr(settings, 'AGENT_SERVER_CANCEL_CONCURRENCY', 16))
+
+            items = [
+                {'agent_id': str(override_agent_id or agent_id), 'task_id': task_info['task_id']}
+                for agent_id, agent_info in agent_task_map.items()
+                for task_info in agent_info['tasks']
+            ]
+            chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+            def run_concurrently(func, jobs):
+                if not jobs:
+                    return []
+                with ThreadPoolExecutor(max_workers=min(concurrency, len(jobs)), thread_name_prefix="agent-cancel") as pool:
+                    return list(pool.map(func, jobs))
+
+            outcomes: List[Dict[str, Any]] = []
+            unsupported: List[Dict[str, str]] = []
+            for chunk, chunk_outcomes in zip(
+                chunks, run_concurrently(lambda chunk: AgentExecutionService._send_cancel_chunk(client, server, chunk), chunks)
+            ):
+                if chunk_outcomes is None:
+                    unsupported.extend(chunk)
+                else:
+                    outcomes.extend(chunk_outcomes)
+
+            if unsupported:
+                logger.info(f"Agent-Server 不支持跨 Agent 批量取消，按 Agent 并发取消: server={server.base_url}, tasks={len(unsupported)}")
+                by_agent: Dict[str, List[str]] = {}
+                for item in unsupported:
+                    by_agent.setdefault(item['agent_id'], []).append(item['task_id'])
+                for agent_outcomes in run_concurrently(
+                    lambda job: AgentExecutionService._cancel_agent_tasks(client, server, job[0], job[1]),
+                    list(by_agent.items()),
+                ):
+                    outcomes.extend(agent_outcomes)
+
+            cancelled_task_ids = [o['task_id'] for o in outcomes if not o.get('error')]
+            cancelled_count = len(cancelled_task_ids)
+            failed_count = len(outcomes) - cancelled_count
+            errors = [
+                f"取消任务失败 (task_id={o['task_id']}, agent_id={o['agent_id']}): {o['error']}"
+                for o in outcomes if o.get('error')
+            ]
+            logger.info(
+                f"通过Agent-Server取消任务: server={server.base_url}, "
+                f"cancelled={cancelled_count}, failed={failed_count}"
+            )
+
             return {
                 'success': cancelled_count > 0,
                 'cancelled_count': cancelled_count,
                 'failed_count': failed_count,
                 'total_count': cancelled_count + failed_count,
-                'errors': errors if errors else None,
-                'message': f'成功取消 {cancelled_count} 个任务，失败 {failed_count} 个'
+                'errors': errors[:100] if errors else None,
+                'message': f'成功取消 {cancelled_count} 个任务，失败 {failed_count} 个',
+                'cancelled_task_ids': cancelled_task_ids,
             }
-        
+
         except Exception as e:
             logger.error(f"通过Agent-Server取消任务异常: {str(e)}", exc_info=True)
             return {
                 'success': False,
                 'error': f'取消任务异常: {str(e)}'
             }
+
+    @staticmethod
+    def _send_cancel_chunk(client, server: AgentServer, chunk: List[Dict[str, str]]) -> Optional[List[Dict[str, Any]]]:
+        """发送一个批量取消分片，返回逐任务结果；Agent-Server 不支持该接口时返回 None"""
+        try:
+            response = client.cancel_tasks(server.base_url, chunk)
+        except Exception as e:
+            logger.error(f"批量取消任务异常: server={server.base_url}, tasks={len(chunk)}, error={e}")
+            return [dict(item, error=f'请求异常: {str(e)}') for item in chunk]
+
+        if response.status_code in (404, 405):
+            return None
+        if response.status_code != 200:
+            error_msg = response.text or f"HTTP {response.status_code}"
+            logger.error(f"批量取消任务失败: server={server.base_url}, tasks={len(chunk)}, error={error_msg}")
+            return [dict(item, error=error_msg) for item in chunk]
+
+        returned = {item.get('task_id'): item for item in response.json().get('results') or []}
+        outcomes = []
+        for item in chunk:
+            result = returned.get(item['task_id'])
+            if result is None:
+                outcomes.append(dict(item, error='Agent-Server 未返回结果'))
+            else:
+                outcomes.append(dict(item, error=result.get('error') or None))
+        return outcomes
+
+    @staticmethod
+    def _cancel_agent_tasks(client, server: AgentServer, agent_id: str, task_ids: List[str]) -> List[Dict[str, Any]]:
+        """调用单个 Agent 的批量取消接口（兼容不支持跨 Agent 批量取消的 Agent-Server）"""
+        api_url = f"{server.base_url}/api/agents/{agent_id}/tasks/cancel/batch"
+        try:
+            response = client.post(api_url, json={'task_ids': task_ids})
+        except Exception as e:
+            logger.error(f"取消任务异常: agent_id={agent_id}, tasks={len(task_ids)}, 错误={str(e)}")
+            return [{'agent_id': agent_id, 'task_id': task_id, 'error': f'请求异常: {str(e)}'} for task_id in task_ids]
+
+        if response.status_code != 200:
+            error_msg = response.text or f"HTTP {response.status_code}"
+            logger.error(f"取消任务失败: agent_id={agent_id}, 状态码={response.status_code}, 错误={error_msg}")
+            return [{'agent_id': agent_id, 'task_id': task_id, 'error': error_msg} for task_id in task_ids]
+
+        returned = {item.get('task_id'): item for item in response.json().get('results') or []}
+        return [
+            {
+                'agent_id': agent_id,
+                'task_id': task_id,
+                'error': (returned.get(task_id) or {'error': 'Agent-Server 未返回结果'}).get('error') or None,
+            }
+            for task_id in task_ids
+        ]
@@ -1,20 +1,24 @@
 """
 执行策略模块
 
-定义执行模式策略，包括并行、串行和滚动执行。
+定义执行模式策略，包括并行、串行、滚动和滑动窗口滚动执行。
 """
 import logging
 import time
 from abc import ABC, abstractmethod
+from collections import Counter, deque
 from dataclasses import dataclass, field
-from typing import Any, Callable, Dict, List, Optional
-from concurrent.futures import Future, as_completed
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+from concurrent.futures import FIRST_COMPLETED, Future, as_completed, wait
 
 from apps.hosts.models import Host
 from apps.agents.models import Agent
 
 logger = logging.getLogger(__name__)
 
+# 批量推送函数：参数为 [(Agent, task_spec), ...]，返回 {task_id: 推送结果}
+BulkPusher = Callable[[List[Tuple[Agent, Dict[str, Any]]]], Dict[str, Dict[str, Any]]]
+
 
 @dataclass
 class HostResult:
@@ -38,6 +42,7 @@ class ExecutionResult:
     failed_count: int
     results: List[HostResult] = field(default_factory=list)
     stopped_early: bool = False  # 是否因错误提前终止
+    pending_task_ids: List[str] = field(default_factory=list)  # 仅推送未等待结果的任务
 
 
 class ExecutionStrategy(ABC):
@@ -47,6 +52,9 @@ class ExecutionStrategy(ABC):
     定义执行多主机任务的策略接口。
     """
 
+    # 任务推送成功后的回调，参数为本次推送成功的 task_id 列表（如将主机结果标记为执行中）
+    on_pushed: Optional[Callable[[List[str]], None]] = None
+
     @abstractmethod
     def execute(
         self,
@@ -56,6 +64,8 @@ class ExecutionStrategy(ABC):
         on_result: Optional[Callable[[Host, Dict[str, Any]], None]] = None,
         timeout: int = 300,
         ignore_error: bool = False,
+        bulk_pusher: Optional[BulkPusher] = None,
+        should_stop: Optional[Callable[[], bool]] = None,
     ) -> ExecutionResult:
         """
         执行任务
@@ -67,52 +77,44 @@ class ExecutionStrategy(ABC):
             on_result: 收到结果时的回调函数，参数为 (Host, result_dict)
             timeout: 任务超时时间（秒）
             ignore_error: 是否忽略错误继续执行
+            bulk_pusher: 可选的批量推送函数，提供时并行/滚动策略一次推送整批任务
+            should_stop: 可选的停止检查（如执行已被取消），返回 True 时不再下发尚未开始的主机
 
         Returns:
             ExecutionResult: 执行结果
         """
         pass
 
+    def _notify_pushed(self, task_ids: List[str]) -> None:
+        if not self.on_pushed or not task_ids:
+            return
+        try:
+            self.on_pushed(task_ids)
+        except Exception as e:
+            logger.error(f"推送回调执行失败: tasks={len(task_ids)}, error={e}")
 
-class ParallelExecutionStrategy(ExecutionStrategy):
-    """
-    并行执行策略
-
-    同时向所有主机推送任务，并行等待所有结果。
-    """
-
-    def execute(
+    def _push_hosts(
         self,
         hosts: List[Host],
         task_creator: Callable[[Host], Dict[str, Any]],
         task_pusher: Callable[[Agent, Dict[str, Any]], Dict[str, Any]],
-        on_result: Optional[Callable[[Host, Dict[str, Any]], None]] = None,
-        timeout: int = 300,
-        ignore_error: bool = False,
-    ) -> ExecutionResult:
-        if not hosts:
-            return ExecutionResult(
-                success=True,
-                total=0,
-                success_count=0,
-                failed_count=0,
-                results=[]
-            )
-
-        from utils.thread_pool import get_global_thread_pool
-        from utils.task_result_waiter import get_task_result_waiter
+        bulk_pusher: Optional[BulkPusher] = None,
+    ) -> Tuple[List[str], Dict[str, Host], List[HostResult]]:
+        """
+        向一组主机推送任务
 
-        pool = get_global_thread_pool()
-        waiter = get_task_result_waiter()
+        有 bulk_pusher 时整组合并为批量请求，否则通过全局线程池逐个推送。
 
-        results: List[HostResult] = []
+        Returns:
+            (已推送的 task_id 列表, task_id -> Host, 推送失败的 HostResult 列表)
+        """
+        failed: List[HostResult] = []
         task_id_to_host: Dict[str, Host] = {}
-        push_futures: Dict[Future, Host] = {}
+        pending: List[Tuple[Host, Agent, Dict[str, Any]]] = []
 
-        # 并发推送任务
         for host in hosts:
             if not hasattr(host, 'agent') or not host.agent:
-                results.append(HostResult(
+                failed.append(HostResult(
                     host_id=host.id,
                     host_name=host.name,
                     task_id='',
@@ -123,7 +125,7 @@ class ParallelExecutionStrategy(ExecutionStrategy):
 
             agent = host.agent
             if agent.status != 'online':
-                results.append(HostResult(
+                failed.append(HostResult(
                     host_id=host.id,
                     host_name=host.name,
                     task_id='',
@@ -134,12 +136,11 @@ class ParallelExecutionStrategy(ExecutionStrategy):
 
             try:
                 task_spec = task_creator(host)
-                future = pool.submit(task_pusher, agent, task_spec)
-                push_futures[future] = host
+                pending.append((host, agent, task_spec))
                 task_id_to_host[task_spec['id']] = host
             except Exception as e:
                 logger.error(f"创建任务规范失败: host={host.name}, error={e}")
-                results.append(HostResult(
+                failed.append(HostResult(
                     host_id=host.id,
                     host_name=host.name,
                     task_id='',
@@ -147,34 +148,88 @@ class ParallelExecutionStrategy(ExecutionStrategy):
                     error=f'创建任务失败: {str(e)}'
                 ))
 
-        # 等待所有推送完成
-        pushed_task_ids: List[str] = []
-        for future in as_completed(push_futures.keys()):
-            host = push_futures[future]
+        push_results: List[Tuple[Host, Dict[str, Any]]] = []
+        if bulk_pusher is not None and pending:
             try:
-                push_result = future.result()
-                if push_result.get('success'):
-                    task_id = push_result.get('task_id')
-                    pushed_task_ids.append(task_id)
-                    logger.debug(f"任务推送成功: host={host.name}, task_id={task_id}")
-                else:
-                    results.append(HostResult(
-                        host_id=host.id,
-                        host_name=host.name,
-                        task_id=push_result.get('task_id', ''),
-                        success=False,
-                        error=push_result.get('error', '推送失败')
-                    ))
+                by_task = bulk_pusher([(agent, task_spec) for _, agent, task_spec in pending])
             except Exception as e:
-                logger.error(f"任务推送异常: host={host.name}, error={e}")
-                results.append(HostResult(
+                logger.error(f"批量推送任务异常: hosts={len(pending)}, error={e}")
+                by_task = {}
+                push_error = f'推送异常: {str(e)}'
+            else:
+                push_error = '推送失败'
+            for host, _, task_spec in pending:
+                push_results.append((host, by_task.get(task_spec['id']) or {
+                    'success': False, 'task_id': task_spec['id'], 'error': push_error,
+                }))
+        elif pending:
+            from utils.thread_pool import get_global_thread_pool
+
+            pool = get_global_thread_pool()
+            push_futures: Dict[Future, Host] = {
+                pool.submit(task_pusher, agent, task_spec): host for host, agent, task_spec in pending
+            }
+            for future in as_completed(push_futures.keys()):
+                host = push_futures[future]
+                try:
+                    push_results.append((host, future.result()))
+                except Exception as e:
+                    logger.error(f"任务推送异常: host={host.name}, error={e}")
+                    push_results.append((host, {'success': False, 'task_id': '', 'error': f'推送异常: {str(e)}'}))
+
+        pushed_task_ids: List[str] = []
+        for host, push_result in push_results:
+            if push_result.get('success'):
+                task_id = push_result.get('task_id')
+                pushed_task_ids.append(task_id)
+                logger.debug(f"任务推送成功: host={host.name}, task_id={task_id}")
+            else:
+                failed.append(HostResult(
                     host_id=host.id,
                     host_name=host.name,
-                    task_id='',
+                    task_id=push_result.get('task_id', ''),
                     success=False,
-                    error=f'推送异常: {str(e)}'
+                    error=push_result.get('error', '推送失败')
                 ))
 
+        self._notify_pushed(pushed_task_ids)
+        return pushed_task_ids, task_id_to_host, failed
+
+
+class ParallelExecutionStrategy(ExecutionStrategy):
+    """
+    并行执行策略
+
+    同时向所有主机推送任务，并行等待所有结果。
+    """
+
+    def execute(
+        self,
+        hosts: List[Host],
+        task_creator: Callable[[Host], Dict[str, Any]],
+        task_pusher: Callable[[Agent, Dict[str, Any]], Dict[str, Any]],
+        on_result: Optional[Callable[[Host, Dict[str, Any]], None]] = None,
+        timeout: int = 300,
+        ignore_error: bool = False,
+        bulk_pusher: Optional[BulkPusher] = None,
+        should_stop: Optional[Callable[[], bool]] = None,
+    ) -> ExecutionResult:
+        if not hosts:
+            return ExecutionResult(
+                success=True,
+                total=0,
+                success_count=0,
+                failed_count=0,
+                results=[]
+            )
+
+        from utils.task_result_waiter import get_task_result_waiter
+
+        waiter = get_task_result_waiter()
+
+        # 推送任务（批量或并发）
+        pushed_task_ids, task_id_to_host, results = self._push_hosts(hosts, task_creator, task_pusher, bulk_pusher)
+
         # 等待所有任务结果
         if pushed_task_ids:
             task_results = waiter.wait_for_results(pushed_task_ids, timeout=timeout)
@@ -213,6 +268,55 @@ class ParallelExecutionStrategy(ExecutionStrategy):
         )
 
 
+    def dispatch(
+        self,
+        hosts: List[Host],
+        task_creator: Callable[[Host], Dict[str, Any]],
+        task_pusher: Callable[[Agent, Dict[str, Any]], Dict[str, Any]],
+        bulk_pusher: Optional[BulkPusher] = None,
+    ) -> ExecutionResult:
+        """
+        只推送任务，不等待结果
+
+        结果由结果消费者（handle_task_result）异步落库，返回值的 results 只包含推送失败的主机，
+        已推送的任务在 pending_task_ids 中。
+        """
+        pushed_task_ids, _, results = self._push_hosts(hosts, task_creator, task_pusher, bulk_pusher)
+        return ExecutionResult(
+            success=bool(pushed_task_ids) or not hosts,
+            total=len(hosts),
+            success_count=0,
+            failed_count=len(results),
+            results=results,
+            stopped_early=False,
+            pending_task_ids=pushed_task_ids,
+        )
+
+
+class AsyncParallelExecutionStrategy(ParallelExecutionStrategy):
+    """
+    异步并行执行策略
+
+    与并行策略相同，但推送阶段在事件循环中用 aiohttp 并发完成，
+    不占用全局线程池，在途请求数与每个 Agent-Server 的速率由 AsyncTaskDispatcher 控制。
+    """
+
+    def __init__(self, agent_server_id: Optional[int] = None, dispatcher=None):
+        self.agent_server_id = agent_server_id
+        self.dispatcher = dispatcher
+
+    def _push_hosts(self, hosts, task_creator, task_pusher, bulk_pusher=None):
+        from apps.agents.async_dispatch import AsyncTaskDispatcher
+
+        dispatcher = self.dispatcher or AsyncTaskDispatcher()
+        return super()._push_hosts(
+            hosts,
+            task_creator,
+            task_pusher,
+            lambda items: dispatcher.dispatch(items, agent_server_id=self.agent_server_id),
+        )
+
+
 class SerialExecutionStrategy(ExecutionStrategy):
     """
     串行执行策略
@@ -228,6 +332,8 @@ class SerialExecutionStrategy(ExecutionStrategy):
         on_result: Optional[Callable[[Host, Dict[str, Any]], None]] = None,
         timeout: int = 300,
         ignore_error: bool = False,
+        bulk_pusher: Optional[BulkPusher] = None,
+        should_stop: Optional[Callable[[], bool]] = None,
     ) -> ExecutionResult:
         if not hosts:
             return ExecutionResult(
@@ -245,6 +351,11 @@ class SerialExecutionStrategy(ExecutionStrategy):
         stopped_early = False
 
         for host in hosts:
+            if should_stop and should_stop():
+                logger.warning("串行执行已取消，不再下发后续主机")
+                stopped_early = True
+                break
+
             # 检查主机是否有可用的 Agent
             if not hasattr(host, 'agent') or not host.agent:
                 host_result = HostResult(
@@ -298,6 +409,7 @@ class SerialExecutionStrategy(ExecutionStrategy):
                     continue
 
                 task_id = push_result.get('task_id')
+                self._notify_pushed([task_id])
 
                 # 等待任务完成
                 result = waiter.wait_for_result(task_id, timeout=timeout)
@@ -379,6 +491,8 @@ class RollingExecutionStrategy(ExecutionStrategy):
         on_result: Optional[Callable[[Host, Dict[str, Any]], None]] = None,
         timeout: int = 300,
         ignore_error: bool = False,
+        bulk_pusher: Optional[BulkPusher] = None,
+        should_stop: Optional[Callable[[], bool]] = None,
     ) -> ExecutionResult:
         if not hosts:
             return ExecutionResult(
@@ -389,10 +503,8 @@ class RollingExecutionStrategy(ExecutionStrategy):
                 results=[]
             )
 
-        from utils.thread_pool import get_global_thread_pool
         from utils.task_result_waiter import get_task_result_waiter
 
-        pool = get_global_thread_pool()
         waiter = get_task_result_waiter()
 
         results: List[HostResult] = []
@@ -409,75 +521,16 @@ class RollingExecutionStrategy(ExecutionStrategy):
 
         for batch_index, batch_hosts in enumerate(batches):
             batch_num = batch_index + 1
+            if should_stop and should_stop():
+                logger.warning(f"滚动执行已取消，第 {batch_num}/{total_batches} 批及之后的批次不再下发")
+                stopped_early = True
+                break
             logger.info(f"开始执行第 {batch_num}/{total_batches} 批 ({len(batch_hosts)} 个主机)")
 
-            batch_results: List[HostResult] = []
-            task_id_to_host: Dict[str, Host] = {}
-            push_futures: Dict[Future, Host] = {}
-
-            # 并发推送当前批次的任务
-            for host in batch_hosts:
-                if not hasattr(host, 'agent') or not host.agent:
-                    batch_results.append(HostResult(
-                        host_id=host.id,
-                        host_name=host.name,
-                        task_id='',
-                        success=False,
-                        error='主机没有 Agent'
-                    ))
-                    continue
-
-                agent = host.agent
-                if agent.status != 'online':
-                    batch_results.append(HostResult(
-                        host_id=host.id,
-                        host_name=host.name,
-                        task_id='',
-                        success=False,
-                        error=f'Agent 状态为 {agent.status}'
-                    ))
-                    continue
-
-                try:
-                    task_spec = task_creator(host)
-                    future = pool.submit(task_pusher, agent, task_spec)
-                    push_futures[future] = host
-                    task_id_to_host[task_spec['id']] = host
-                except Exception as e:
-                    logger.error(f"创建任务规范失败: host={host.name}, error={e}")
-                    batch_results.append(HostResult(
-                        host_id=host.id,
-                        host_name=host.name,
-                        task_id='',
-                        success=False,
-                        error=f'创建任务失败: {str(e)}'
-                    ))
-
-            # 等待推送完成
-            pushed_task_ids: List[str] = []
-            for future in as_completed(push_futures.keys()):
-                host = push_futures[future]
-                try:
-                    push_result = future.result()
-                    if push_result.get('success'):
-                        task_id = push_result.get('task_id')
-                        pushed_task_ids.append(task_id)
-                    else:
-                        batch_results.append(HostResult(
-                            host_id=host.id,
-                            host_name=host.name,
-                            task_id=push_result.get('task_id', ''),
-                            success=False,
-                            error=push_result.get('error', '推送失败')
-                        ))
-                except Exception as e:
-                    batch_results.append(HostResult(
-                        host_id=host.id,
-                        host_name=host.name,
-                        task_id='',
-                        success=False,
-                        error=f'推送异常: {str(e)}'
-                    ))
+            # 推送当前批次的任务（批量或并发）
+            pushed_task_ids, task_id_to_host, batch_results = self._push_hosts(
+                batch_hosts, task_creator, task_pusher, bulk_pusher
+            )
 
             # 等待当前批次的所有任务结果
             if pushed_task_ids:
@@ -531,26 +584,240 @@ class RollingExecutionStrategy(ExecutionStrategy):
         )
 
 
+class SlidingWindowExecutionStrategy(ExecutionStrategy):
+    """
+    滑动窗口滚动执行策略
+
+    始终保持 window_size 个任务在途，任一主机结束立即补位下一台，
+    不再等待整批中最慢的主机，也没有批次间延迟。
+    """
+
+    def __init__(
+        self,
+        window_size: int = 1,
+        max_fail_percent: Optional[float] = None,
+        group_limit: int = 0,
+        group_key: Optional[Callable[[Host], Any]] = None,
+    ):
+        """
+        初始化滑动窗口滚动执行策略
+
+        Args:
+            window_size: 同时在途的主机数，默认为 1
+            max_fail_percent: 失败主机超过总数的该百分比时停止补位（已在途的任务继续等待结果）；
+                为 None 时与滚动执行一致：不忽略错误则首个失败即停止
+            group_limit: 每个分组同时在途的主机数上限，0 表示不限制
+            group_key: 主机分组函数，默认按可用区（无可用区时按地域）
+        """
+        self.window_size = max(1, window_size)
+        self.max_fail_percent = max_fail_percent
+        self.group_limit = max(0, group_limit or 0)
+        self.group_key = group_key or self.default_group_key
+
+    @staticmethod
+    def default_group_key(host: Host) -> str:
+        return getattr(host, 'zone', None) or getattr(host, 'region', None) or ''
+
+    def _take_ready(self, queue: Deque[Host], in_flight: int, group_running: Counter) -> List[Host]:
+        """按队列顺序取出可启动的主机，分组已满的主机保留原位等待下次补位"""
+        slots = self.window_size - in_flight
+        ready: List[Host] = []
+        skipped: List[Host] = []
+        planned: Counter = Counter()
+        while queue and len(ready) < slots:
+            host = queue.popleft()
+            group = self.group_key(host)
+            if self.group_limit and group_running[group] + planned[group] >= self.group_limit:
+                skipped.append(host)
+                continue
+            planned[group] += 1
+            ready.append(host)
+        queue.extendleft(reversed(skipped))
+        return ready
+
+    def _should_stop(self, results: List[HostResult], total: int, ignore_error: bool) -> bool:
+        failed = sum(1 for r in results if not r.success)
+        if not failed:
+            return False
+        if self.max_fail_percent is not None:
+            return failed * 100 > self.max_fail_percent * total
+        return not ignore_error
+
+    def execute(
+        self,
+        hosts: List[Host],
+        task_creator: Callable[[Host], Dict[str, Any]],
+        task_pusher: Callable[[Agent, Dict[str, Any]], Dict[str, Any]],
+        on_result: Optional[Callable[[Host, Dict[str, Any]], None]] = None,
+        timeout: int = 300,
+        ignore_error: bool = False,
+        bulk_pusher: Optional[BulkPusher] = None,
+        should_stop: Optional[Callable[[], bool]] = None,
+    ) -> ExecutionResult:
+        if not hosts:
+            return ExecutionResult(
+                success=True,
+                total=0,
+                success_count=0,
+                failed_count=0,
+                results=[]
+            )
+
+        from utils.task_result_waiter import get_task_result_waiter
+
+        waiter = get_task_result_waiter()
+        total = len(hosts)
+        queue: Deque[Host] = deque(hosts)
+        results: List[HostResult] = []
+        # Future -> (task_id, host, 截止时间)
+        in_flight: Dict[Future, Tuple[str, Host, float]] = {}
+        group_running: Counter = Counter()
+        stopped_early = False
+
+        logger.info(
+            f"滑动窗口滚动执行: 共 {total} 个主机，窗口 {self.window_size}，"
+            f"失败阈值 {'不限' if self.max_fail_percent is None else f'{self.max_fail_percent}%'}，"
+            f"分组上限 {self.group_limit or '不限'}"
+        )
+
+        while True:
+            if not stopped_early and queue and should_stop and should_stop():
+                stopped_early = True
+                logger.warning(f"滑动窗口执行已取消，不再下发剩余 {len(queue)} 个主机")
+            if not stopped_early:
+                launch = self._take_ready(queue, len(in_flight), group_running)
+                if launch:
+                    pushed_task_ids, task_id_to_host, push_failed = self._push_hosts(
+                        launch, task_creator, task_pusher, bulk_pusher
+                    )
+                    results.extend(push_failed)
+                    futures = waiter.watch_results(pushed_task_ids)
+                    if futures is None:
+                        futures = {}
+                        results.extend(HostResult(
+                            host_id=task_id_to_host[task_id].id,
+                            host_name=task_id_to_host[task_id].name,
+                            task_id=task_id,
+                            success=False,
+                            error='Redis 连接不可用'
+                        ) for task_id in pushed_task_ids)
+                    deadline = time.monotonic() + timeout
+                    for task_id, future in futures.items():
+                        host = task_id_to_host[task_id]
+                        in_flight[future] = (task_id, host, deadline)
+                        group_running[self.group_key(host)] += 1
+
+                    if self._should_stop(results, total, ignore_error):
+                        stopped_early = True
+                        logger.warning(f"滑动窗口执行失败数超过阈值，停止补位，等待 {len(in_flight)} 个在途任务")
+                    elif len(futures) < len(launch):
+                        # 推送失败空出的窗口立即补位
+                        continue
+
+            if not in_flight:
+                if stopped_early or not queue:
+                    break
+                continue
+
+            next_deadline = min(deadline for _, _, deadline in in_flight.values())
+            done, _ = wait(
+                list(in_flight), timeout=max(next_deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED
+            )
+
+            for future in done:
+                task_id, host, _ = in_flight.pop(future)
+                group_running[self.group_key(host)] -= 1
+                result = future.result()
+                results.append(HostResult(
+                    host_id=host.id,
+                    host_name=host.name,
+                    task_id=task_id,
+                    success=result.get('success', False),
+                    exit_code=result.get('exit_code'),
+                    error=result.get('error_msg'),
+                    started_at=result.get('started_at'),
+                    finished_at=result.get('finished_at')
+                ))
+                if on_result:
+                    try:
+                        on_result(host, result)
+                    except Exception as e:
+                        logger.error(f"结果回调执行失败: host={host.name}, error={e}")
+
+            now = time.monotonic()
+            expired = {future: item for future, item in in_flight.items() if item[2] <= now and not future.done()}
+            if expired:
+                waiter.unwatch_results({task_id: future for future, (task_id, _, _) in expired.items()})
+                for future, (task_id, host, _) in expired.items():
+                    del in_flight[future]
+                    group_running[self.group_key(host)] -= 1
+                    logger.warning(f"任务 {task_id} 等待超时")
+                    results.append(HostResult(
+                        host_id=host.id,
+                        host_name=host.name,
+                        task_id=task_id,
+                        success=False,
+                        exit_code=-1,
+                        error=f'等待结果超时 ({timeout}秒)'
+                    ))
+
+            if not stopped_early and self._should_stop(results, total, ignore_error):
+                stopped_early = True
+                logger.warning(f"滑动窗口执行失败数超过阈值，停止补位，等待 {len(in_flight)} 个在途任务")
+
+        success_count = sum(1 for r in results if r.success)
+        failed_count = len(results) - success_count
+        tolerated = ignore_error or self.max_fail_percent is not None
+
+        return ExecutionResult(
+            success=(failed_count == 0 or tolerated) and not stopped_early,
+            total=total,
+            success_count=success_count,
+            failed_count=failed_count,
+            results=results,
+            stopped_early=stopped_early
+        )
+
+
 def get_execution_strategy(
     mode: str,
     batch_size: int = 1,
-    batch_delay: int = 0
+    batch_delay: int = 0,
+    agent_server_id: Optional[int] = None,
+    max_fail_percent: Optional[float] = None,
+    group_limit: int = 0,
+    on_pushed: Optional[Callable[[List[str]], None]] = None,
 ) -> ExecutionStrategy:
     """
     根据执行模式获取对应的策略实例
 
     Args:
-        mode: 执行模式 ('parallel', 'serial', 'rolling')
-        batch_size: 滚动模式的批次大小
+        mode: 执行模式 ('parallel', 'serial', 'rolling', 'sliding')
+        batch_size: 滚动模式的批次大小（滑动窗口模式为窗口大小）
         batch_delay: 滚动模式的批次延迟
+        agent_server_id: Agent-Server ID（异步并行策略推送时使用）
+        max_fail_percent: 滑动窗口模式的失败百分比阈值
+        group_limit: 滑动窗口模式每个分组的在途主机上限
+        on_pushed: 任务推送成功后的回调，参数为已推送的 task_id 列表
 
     Returns:
         ExecutionStrategy: 策略实例
     """
     if mode == 'serial':
-        return SerialExecutionStrategy()
+        strategy = SerialExecutionStrategy()
     elif mode == 'rolling':
-        return RollingExecutionStrategy(batch_size=batch_size, batch_delay=batch_delay)
+        strategy = RollingExecutionStrategy(batch_size=batch_size, batch_delay=batch_delay)
+    elif mode == 'sliding':
+        strategy = SlidingWindowExecutionStrategy(
+            window_size=batch_size, max_fail_percent=max_fail_percent, group_limit=group_limit
+        )
     else:
-        # 默认并行
-        return ParallelExecutionStrategy()
+        # 默认并行；AGENT_DISPATCH_ENGINE=asyncio 时使用异步推送
+        from django.conf import settings
+
+        if getattr(settings, 'AGENT_DISPATCH_ENGINE', 'bulk') == 'asyncio':
+            strategy = AsyncParallelExecutionStrategy(agent_server_id=agent_server_id)
+        else:
+            strategy = ParallelExecutionStrategy()
+    strategy.on_pushed = on_pushed
+    return strategy
@@ -0,0 +1,185 @@
+"""
+Agent 心跳合并写入。
+
+agent_status 流中绝大多数消息只是刷新 last_heartbeat_at，逐条 get + save 会产生大量单行 UPDATE。
+本模块在内存中按 agent 合并心跳，每个窗口用一次 bulk_update 写入；
+只有状态真正变化（online/offline/...）时才立即写库并失效状态缓存。
+
+对外接口：
+ - parse_heartbeat_timestamp(value) -> datetime
+ - HeartbeatCoalescer.record(agent_id, status, timestamp, error_code) -> bool
+ - HeartbeatCoalescer.flush() -> int
+ - get_heartbeat_coalescer()
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+VALID_STATUSES = ('online', 'offline', 'pending', 'disabled')
+
+
+def parse_heartbeat_timestamp(value) -> datetime:
+    """解析心跳时间：支持秒/毫秒时间戳（含字符串形式）与 ISO8601"""
+    if value is None or value == '':
+        return timezone.now()
+    if isinstance(value, datetime):
+        return value if timezone.is_aware(value) else timezone.make_aware(value)
+
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        number = None
+    if number is not None:
+        # agent-server 推送的是毫秒时间戳
+        if number > 1e11:
+            number = number / 1000
+        return datetime.fromtimestamp(number, tz=timezone.get_current_timezone())
+
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return timezone.now()
+    return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+
+
+class HeartbeatCoalescer:
+    """
+    心跳合并器（线程安全）
+    - 已知状态缓存在内存中，窗口刷新时一次查询校准，避免逐条读库
+    - 状态变化立即写入并失效缓存；纯心跳在窗口结束时批量写入
+    """
+
+    def __init__(self, window_seconds: Optional[float] = None):
+        if window_seconds is None:
+            window_seconds = getattr(settings, 'AGENT_HEARTBEAT_FLUSH_INTERVAL', 5)
+        self.window_seconds = window_seconds
+        self._lock = threading.Lock()
+        # agent_id -> (last_heartbeat_at, error_code)
+        self._pending: Dict[int, Tuple[datetime, str]] = {}
+        # agent_id -> 最近一次写入/读取的状态，None 表示 Agent 不存在
+        self._known_status: Dict[int, Optional[str]] = {}
+        self._last_flush = time.monotonic()
+        self._flusher: Optional[threading.Thread] = None
+
+    def record(self, agent_id: int, status: str, timestamp: datetime, error_code: str = '') -> bool:
+        """
+        记录一次心跳
+        Returns:
+            bool: 是否触发了立即写入（状态变化）
+        """
+        if status not in VALID_STATUSES:
+            return False
+
+        with self._lock:
+            known = self._known_status.get(agent_id, ...)
+        if known is ...:
+            known = self._load_status(agent_id)
+        if known is None:
+            logger.warning(f"Agent状态更新失败：Agent不存在 agent_id={agent_id}")
+            return False
+
+        if known != status:
+            self._write_transition(agent_id, status, timestamp, error_code)
+            return True
+
+        with self._lock:
+            self._pending[agent_id] = (timestamp, error_code)
+        self._ensure_flusher()
+        if time.monotonic() - self._last_flush >= self.window_seconds:
+            self.flush()
+        return False
+
+    def flush(self) -> int:
+        """批量写入窗口内合并的心跳，返回写入的 agent 数"""
+        from .models import Agent
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+
+        # 一次查询校准状态：被其他路径改写（如对账置为 offline）的 agent 走状态变化写入
+        current = dict(Agent.objects.filter(id__in=list(pending)).values_list('id', 'status'))
+        now = timezone.now()
+        agents = []
+        for agent_id, (timestamp, error_code) in pending.items():
+            if agent_id not in current:
+                with self._lock:
+                    self._known_status[agent_id] = None
+                continue
+            with self._lock:
+                expected = self._known_status.get(agent_id)
+            if current[agent_id] != expected and expected is not None:
+                self._write_transition(agent_id, expected, timestamp, error_code)
+                continue
+            agents.append(Agent(id=agent_id, last_heartbeat_at=timestamp, last_error_code=error_code or '', updated_at=now))
+
+        if agents:
+            batch_size = getattr(settings, 'AGENT_HEARTBEAT_BULK_BATCH', 500)
+            Agent.objects.bulk_update(agents, ['last_heartbeat_at', 'last_error_code', 'updated_at'], batch_size=batch_size)
+        logger.debug(f"批量写入Agent心跳: {len(agents)} 个")
+        return len(agents)
+
+    def _load_status(self, agent_id: int) -> Optional[str]:
+        from .models import Agent
+
+        status = Agent.objects.filter(id=agent_id).values_list('status', flat=True).first()
+        with self._lock:
+            self._known_status[agent_id] = status
+        return status
+
+    def _write_transition(self, agent_id: int, status: str, timestamp: datetime, error_code: str):
+        from .models import Agent
+        from .status import invalidate_agent_status_cache
+
+        Agent.objects.filter(id=agent_id).update(
+            status=status,
+            last_heartbeat_at=timestamp,
+            last_error_code=error_code or '',
+            updated_at=timezone.now(),
+        )
+        with self._lock:
+            self._known_status[agent_id] = status
+            self._pending.pop(agent_id, None)
+        invalidate_agent_status_cache(agent_id)
+        logger.info(f"Agent状态变化: agent_id={agent_id}, status={status}")
+
+    def _ensure_flusher(self):
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher is not None and self._flusher.is_alive():
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name="agent-heartbeat-flusher", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.window_seconds)
+            if time.monotonic() - self._last_flush < self.window_seconds:
+                continue
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception as e:
+                logger.error(f"定时写入Agent心跳失败: {e}")
+
+
+_heartbeat_coalescer: Optional[HeartbeatCoalescer] = None
+
+
+def get_heartbeat_coalescer() -> HeartbeatCoalescer:
+    """获取进程内共享的心跳合并器"""
+    global _heartbeat_coalescer
+    if _heartbeat_coalescer is None:
+        _heartbeat_coalescer = HeartbeatCoalescer()
+    return _heartbeat_coalescer
@@ -0,0 +1,453 @@
+"""
+批量安装 Agent 流水线
+
+batch_install_agents 原先逐台主机处理：get_or_create Agent、签发 token、upsert 安装记录、生成脚本，
+再阻塞执行 SSH 安装，然后才轮到下一台。本模块把安装拆成三个阶段：
+ - 准备：一次性查询主机/Agent/安装记录，bulk_create/bulk_update 写入 Agent 状态、token 与安装记录，
+   安装包下载地址按操作系统只解析一次
+ - 执行：并发执行 SSH 安装（AGENT_INSTALL_CONCURRENCY），每台主机单独计算命令超时；
+   已安装 asyncssh 时使用 AsyncSSHEngine，否则线程池 + fabric_ssh_manager；内网 IP 失败时回退外网 IP
+ - 收尾：一次 bulk_update 写回安装结果
+进度按时间间隔节流汇总推送到 agent_install_status:<install_task_id>。
+
+对外接口：
+ - AgentInstallPipeline(...).run(host_ids) -> dict（结构同 AgentService.batch_install_agents）
+ - InstallProgress(task_id, interval, action)：安装/卸载共用的节流进度推送
+"""
+import copy
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from apps.hosts.async_ssh_engine import ASYNCSSH_AVAILABLE, AsyncSSHEngine, SSHJob
+from apps.hosts.models import Host
+from utils.realtime_logs import realtime_log_service
+from .models import Agent, AgentInstallRecord
+
+logger = logging.getLogger(__name__)
+
+INSTALL_LOG_STREAM = "agent_install_logs"
+
+# 安装结束后写回安装记录的字段
+RESULT_FIELDS = ['status', 'message', 'error_message', 'error_detail']
+
+
+@dataclass
+class InstallTarget:
+    """单台主机的安装上下文"""
+    host: Host
+    agent: Optional[Agent] = None
+    record: Optional[AgentInstallRecord] = None
+    script_content: str = ''
+    script_type: str = 'shell'
+    # 准备阶段失败时的错误信息（不再执行 SSH）
+    error: str = ''
+    result: Dict[str, Any] = field(default_factory=dict)
+
+
+class AgentInstallPipeline:
+    """
+    批量安装流水线
+    - record_fields: 写入安装记录的配置字段（安装模式、Agent-Server 地址、WS 参数等）
+    - script_options: 透传给 AgentService.generate_install_script 的参数（不含 host/agent_token）
+    - concurrency: 同时进行的 SSH 安装数，默认 AGENT_INSTALL_CONCURRENCY
+    """
+
+    def __init__(self, *, install_task_id: str, user, install_type: str, account_id: Optional[int],
+                 record_fields: Dict[str, Any], script_options: Dict[str, Any], endpoint: str,
+                 config_summary: str, ssh_timeout: int = 300, allow_reinstall: bool = False,
+                 concurrency: Optional[int] = None, progress_interval: float = 0.5):
+        self.install_task_id = install_task_id
+        self.user = user
+        self.install_type = install_type
+        self.account_id = account_id
+        self.record_fields = record_fields
+        self.script_options = script_options
+        self.endpoint = endpoint
+        self.config_summary = config_summary
+        self.allow_reinstall = allow_reinstall
+        self.timeout = max(60, min(ssh_timeout or 300, 900))
+        self.concurrency = max(1, concurrency or getattr(settings, 'AGENT_INSTALL_CONCURRENCY', 50))
+        self.install_target = 'Agent-Server' if install_type == 'agent-server' else 'Agent'
+        self.progress = InstallProgress(install_task_id, progress_interval)
+        self._download_urls: Dict[str, Any] = {}
+
+    def run(self, host_ids: List[int]) -> Dict[str, Any]:
+        started = time.time()
+        hosts = list(Host.objects.filter(id__in=host_ids).select_related('agent', 'account'))
+        self.progress.total = len(hosts)
+        self.progress.push('running', '开始批量安装 Agent', force=True)
+
+        targets = self._prepare(hosts)
+        for target in targets:
+            if target.error:
+                self._finish(target, {'success': False, 'message': target.error, 'stderr': target.error, 'prepare_failed': True})
+        runnable = [target for target in targets if not target.error]
+        if runnable:
+            if ASYNCSSH_AVAILABLE:
+                self._execute_async(runnable)
+            else:
+                self._execute_threaded(runnable)
+
+        records = [target.record for target in targets if target.record is not None]
+        AgentInstallRecord.objects.bulk_update(records, RESULT_FIELDS, batch_size=500)
+
+        progress = self.progress
+        final_status = 'completed' if progress.failed == 0 else 'completed_with_errors'
+        progress.push(final_status, f'批量安装完成：成功 {progress.success} 个，失败 {progress.failed} 个', force=True)
+        logger.info(
+            f"批量安装 Agent 完成: install_task_id={self.install_task_id}, hosts={len(targets)}, "
+            f"success={progress.success}, failed={progress.failed}, elapsed={time.time() - started:.2f}s"
+        )
+        results = [target.result for target in targets]
+        return {
+            'results': results,
+            'total': len(results),
+            'success_count': progress.success,
+            'failed_count': progress.failed,
+            'install_task_id': self.install_task_id,
+        }
+
+    # ------------------------------------------------------------------ 准备
+
+    def _prepare(self, hosts: List[Host]) -> List[InstallTarget]:
+        """批量写入 Agent、token 与安装记录，并生成每台主机的安装脚本"""
+        targets = [InstallTarget(host=host) for host in hosts]
+        if self.install_type == 'agent-server' and not self.record_fields.get('control_plane_url'):
+            for target in targets:
+                target.error = '安装失败: CONTROL_PLANE_URL 未配置，无法生成 Agent-Server 安装脚本'
+            return targets
+
+        for target in targets:
+            agent = getattr(target.host, 'agent', None)
+            if agent and agent.agent_type == self.install_type and agent.status == 'online' and not self.allow_reinstall:
+                target.error = f'该主机已有在线 {agent.get_agent_type_display()}，需要允许覆盖安装才能重新安装'
+        eligible = [target for target in targets if not target.error]
+        if not eligible:
+            return targets
+
+        agents = self._upsert_agents([target.host for target in eligible])
+        from .services import AgentService
+        tokens = AgentService.issue_tokens(list(agents.values()), self.user, note="Agent 安装")
+        records = self._upsert_records(agents)
+
+        for target in eligible:
+            target.agent = agents[target.host.id]
+            target.record = records[target.host.id]
+            try:
+                self._render_script(target, tokens[target.agent.id])
+            except Exception as e:
+                target.error = f'安装失败: {e} | {self._summary_with_ip(target.host.ip_address)}'
+                target.record.status = 'failed'
+                target.record.message = target.error
+                target.record.error_message = f'安装失败: {e}'
+                target.record.error_detail = str(e)
+        return targets
+
+    def _upsert_agents(self, hosts: List[Host]) -> Dict[int, Agent]:
+        now = timezone.now()
+        existing = []
+        missing = []
+        for host in hosts:
+            agent = getattr(host, 'agent', None)
+            if agent is None:
+                missing.append(Agent(host=host, agent_type=self.install_type, status='pending', endpoint=self.endpoint))
+                continue
+            agent.agent_type = self.install_type
+            agent.status = 'pending'
+            agent.endpoint = self.endpoint
+            agent.updated_at = now
+            existing.append(agent)
+        Agent.objects.bulk_update(existing, ['agent_type', 'status', 'endpoint', 'updated_at'], batch_size=500)
+        # 并发请求可能已创建同一主机的 Agent，忽略冲突后按主机重新读取（MySQL 的 bulk_create 不回填主键）
+        Agent.objects.bulk_create(missing, batch_size=500, ignore_conflicts=True)
+        agents = {agent.host_id: agent for agent in existing}
+        if missing:
+            for agent in Agent.objects.filter(host_id__in=[agent.host_id for agent in missing]):
+                agents.setdefault(agent.host_id, agent)
+        return agents
+
+    def _upsert_records(self, agents: Dict[int, Agent]) -> Dict[int, AgentInstallRecord]:
+        records: Dict[int, AgentInstallRecord] = {}
+        pending = AgentInstallRecord.objects.filter(host_id__in=list(agents), status='pending').order_by('id')
+        for record in pending:
+            if record.agent_id == agents[record.host_id].id:
+                records[record.host_id] = record
+        for record in records.values():
+            for name, value in self.record_fields.items():
+                setattr(record, name, value)
+        AgentInstallRecord.objects.bulk_update(list(records.values()), list(self.record_fields), batch_size=500)
+
+        created = [
+            AgentInstallRecord(host_id=host_id, agent=agent, status='pending', installed_by=self.user, **self.record_fields)
+            for host_id, agent in agents.items() if host_id not in records
+        ]
+        AgentInstallRecord.objects.bulk_create(created, batch_size=500)
+        if created:
+            fresh = AgentInstallRecord.objects.filter(
+                install_task_id=self.install_task_id,
+                host_id__in=[record.host_id for record in created],
+                status='pending',
+            ).order_by('id')
+            for record in fresh:
+                records[record.host_id] = record
+        return records
+
+    def _render_script(self, target: InstallTarget, agent_token: str):
+        from .services import AgentService
+
+        host = target.host
+        scripts = AgentService.generate_install_script(
+            host=host,
+            agent_token=agent_token,
+            **{**self.script_options, 'download_url': self._download_url(host)},
+        )
+        os_type = host.os_type.lower() if host.os_type else 'linux'
+        if 'windows' in os_type:
+            target.script_content, target.script_type = scripts.get('windows', ''), 'powershell'
+        else:
+            target.script_content, target.script_type = scripts.get('linux', ''), 'shell'
+
+    def _download_url(self, host: Host) -> str:
+        """安装包下载地址只依赖操作系统，同一批次内按 os_type 缓存"""
+        from .services import AgentService
+
+        if self.script_options.get('download_url'):
+            return self.script_options['download_url']
+        key = (host.os_type or '').lower()
+        if key not in self._download_urls:
+            try:
+                self._download_urls[key] = AgentService.get_download_url(
+                    host,
+                    package_version=self.script_options.get('package_version'),
+                    package_id=self.script_options.get('package_id'),
+                    raise_if_not_found=True,
+                    package_type=self.install_type,
+                )
+            except ValueError as e:
+                self._download_urls[key] = e
+        value = self._download_urls[key]
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    # ------------------------------------------------------------------ 执行
+
+    def _execute_threaded(self, targets: List[InstallTarget]):
+        """线程池 + fabric_ssh_manager 执行（含内网/外网回退）"""
+        workers = min(self.concurrency, len(targets))
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="agent-install") as pool:
+                futures = {pool.submit(self._install_one, target): target for target in targets}
+                for future in as_completed(futures):
+                    target = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = {'success': False, 'exception': e}
+                    self._finish(target, result)
+        except Exception as e:
+            logger.error(f"批量安装执行异常: install_task_id={self.install_task_id}, error={e}", exc_info=True)
+            self._fail_unfinished(targets, e)
+
+    def _install_one(self, target: InstallTarget) -> Dict[str, Any]:
+        from .services import AgentService
+
+        self._push_log(target.host, 'info', f'开始安装 Agent 到主机 {target.host.name} ({target.host.ip_address})')
+        try:
+            return AgentService._execute_install_with_ip_fallback(
+                host=target.host,
+                script_content=target.script_content,
+                script_type=target.script_type,
+                timeout=self.timeout,
+                account_id=self.account_id,
+                install_task_id=self.install_task_id,
+                log_stream_key=INSTALL_LOG_STREAM,
+            )
+        finally:
+            close_old_connections()
+
+    def _execute_async(self, targets: List[InstallTarget]):
+        """AsyncSSHEngine 执行：先走内网 IP，满足回退条件的主机再用外网 IP 执行一轮"""
+        from .services import AgentService
+
+        engine = AsyncSSHEngine(max_concurrency=self.concurrency)
+        attempts = []
+        for target in targets:
+            host = target.host
+            candidates = []
+            if host.internal_ip:
+                candidates.append(('internal', host.internal_ip, 5))
+            if host.public_ip and host.public_ip != host.internal_ip:
+                candidates.append(('public', host.public_ip, 10))
+            if not candidates:
+                self._finish(target, {'success': False, 'message': '缺少可用的SSH IP（内网/外网）',
+                                      'stderr': '缺少可用的SSH IP（内网/外网）', 'exit_code': -1})
+                continue
+            self._push_log(host, 'info', f'开始安装 Agent 到主机 {host.name} ({host.ip_address})')
+            attempts.append((target, candidates))
+
+        while attempts:
+            jobs = [self._ssh_job(target, candidates[0]) for target, candidates in attempts]
+            retry = []
+
+            def on_result(index: int, result: Dict[str, Any]):
+                target, candidates = attempts[index]
+                ip_type, ip, _ = candidates[0]
+                result['used_ip'], result['used_ip_type'] = ip, ip_type
+                result['connection_info'] = {**(result.get('connection_info') or {}), 'ssh_ip': ip, 'ssh_ip_type': ip_type}
+                if len(candidates) > 1 and AgentService._should_fallback_to_public(result):
+                    error_msg = result.get('stderr') or result.get('message') or 'SSH连接失败'
+                    self._push_log(target.host, 'warning',
+                                   f'内网IP {ip} SSH 连接失败，将尝试外网IP {candidates[1][1]}: {error_msg}', host_ip=ip)
+                    retry.append((target, candidates[1:]))
+                else:
+                    self._finish(target, result)
+
+            try:
+                engine.execute_many(jobs, on_result=on_result)
+            except Exception as e:
+                logger.error(f"批量安装执行异常: install_task_id={self.install_task_id}, error={e}", exc_info=True)
+                self._fail_unfinished([target for target, _ in attempts], e)
+                return
+            attempts = retry
+
+    def _ssh_job(self, target: InstallTarget, candidate) -> SSHJob:
+        ip_type, ip, connection_timeout = candidate
+        # 只替换 IP 的副本，不修改流水线持有的主机对象
+        host = copy.copy(target.host)
+        host.internal_ip, host.public_ip = (ip, None) if ip_type == 'internal' else (None, ip)
+        return SSHJob(
+            host=host,
+            script_content=target.script_content,
+            script_type=target.script_type,
+            timeout=self.timeout,
+            task_id=self.install_task_id,
+            account_id=self.account_id,
+            connection_timeout=connection_timeout,
+            log_stream_key=INSTALL_LOG_STREAM,
+        )
+
+    # ------------------------------------------------------------------ 结果
+
+    def _finish(self, target: InstallTarget, result: Dict[str, Any]):
+        """根据执行结果更新安装记录（内存中，收尾时批量写回）、推送日志与进度"""
+        host = target.host
+        record = target.record
+        success = bool(result.get('success'))
+        if result.get('prepare_failed'):
+            message = result['message']
+        elif 'exception' in result:
+            error = result['exception']
+            error_msg = f'SSH 执行失败: {error}'
+            summary = self._summary_with_ip(host.ip_address)
+            message = error_msg
+            if record is not None:
+                record.status = 'failed'
+                record.message = f'{error_msg} | {summary}'
+                record.error_message = error_msg
+                record.error_detail = str(error)
+            self._push_log(host, 'error', f'主机 {host.name} SSH 执行失败: {error} | {summary}')
+        else:
+            used_ip = result.get('used_ip') or host.ip_address
+            summary = self._summary_with_ip(used_ip, result.get('used_ip_type') or ('internal' if host.internal_ip else 'public'))
+            if success:
+                if self.install_type == 'agent-server':
+                    record.status = 'success'
+                    record.message = f'Agent-Server 安装脚本执行成功 | {summary}'
+                else:
+                    # Agent 安装等待首次上线
+                    record.status = 'pending'
+                    record.message = f'安装脚本执行成功，等待 Agent 首次上线 | {summary}'
+                record.error_message = ''
+                record.error_detail = ''
+                self._push_log(host, 'info', f'主机 {host.name} {self.install_target} 安装成功 | {summary}', host_ip=used_ip)
+            else:
+                stderr = (result.get('stderr') or '').strip()
+                error_msg = stderr.splitlines()[0] if stderr else (result.get('message') or '安装失败')
+                record.status = 'failed'
+                record.message = f'安装脚本执行失败：{error_msg} | {summary}'
+                record.error_message = error_msg
+                record.error_detail = stderr or error_msg
+                self._push_log(host, 'error', f'主机 {host.name} Agent 安装失败: {error_msg} | {summary}', host_ip=used_ip)
+            message = record.message
+
+        target.result = {
+            'host_id': host.id,
+            'host_name': host.name,
+            'agent_id': target.agent.id if target.agent else None,
+            'success': success,
+            'message': message,
+        }
+        self.progress.record(success)
+
+    def _fail_unfinished(self, targets: List[InstallTarget], error: Exception):
+        """执行阶段整体异常时，把尚无结果的主机记为失败"""
+        for target in targets:
+            if not target.result:
+                self._finish(target, {'success': False, 'exception': error})
+
+    def _summary_with_ip(self, ip: Optional[str], ip_type: Optional[str] = None) -> str:
+        if not ip:
+            return self.config_summary
+        return f"{self.config_summary} | ssh_ip={ip} ({ip_type})" if ip_type else f"{self.config_summary} | ssh_ip={ip}"
+
+    def _push_log(self, host: Host, log_type: str, content: str, host_ip: Optional[str] = None):
+        realtime_log_service.push_log(self.install_task_id, str(host.id), {
+            'host_name': host.name,
+            'host_ip': host_ip or host.ip_address,
+            'log_type': log_type,
+            'content': content,
+            'step_name': f'安装 {self.install_target}',
+            'step_order': 1,
+        }, stream_key=INSTALL_LOG_STREAM)
+
+
+class InstallProgress:
+    """线程安全地汇总安装/卸载进度，并按时间间隔节流推送到 agent_install_status:<task_id>"""
+
+    def __init__(self, install_task_id: str, interval: float, action: str = '安装'):
+        prefix = getattr(settings, 'INSTALL_STATUS_STREAM_PREFIX', 'agent_install_status:')
+        self.install_task_id = install_task_id
+        self.stream_key = f"{prefix}{install_task_id}"
+        self.interval = interval
+        self.action = action
+        self.total = 0
+        self.success = 0
+        self.failed = 0
+        self._last_push = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, success: bool):
+        with self._lock:
+            if success:
+                self.success += 1
+            else:
+                self.failed += 1
+        completed = self.success + self.failed
+        self.push('running', f'已完成 {completed}/{self.total} 个主机的{self.action}')
+
+    def push(self, status: str, message: str, force: bool = False):
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_push < self.interval:
+                return
+            self._last_push = now
+            completed = self.success + self.failed
+            status_data = {
+                'status': status,
+                'total': self.total,
+                'completed': completed,
+                'success_count': self.success,
+                'failed_count': self.failed,
+                'progress': int(completed * 100 / self.total) if self.total else 100,
+                'message': message,
+            }
+        realtime_log_service.push_status(self.install_task_id, status_data, stream_key=self.stream_key)
@@ -11,10 +11,11 @@ from django.conf import settings
 from django.core.management.base import BaseCommand
 
 from utils.log_consumer_service import StreamConsumerService, StreamConfig
+from utils.redis_stream_consumer import build_redis_client
 from apps.agents.execution_service import AgentExecutionService
+from apps.agents.heartbeat import get_heartbeat_coalescer, parse_heartbeat_timestamp
 from apps.agents.models import Agent, AgentTaskStats
 from apps.executor.models import ExecutionLog
-import redis
 
 
 logger = logging.getLogger(__name__)
@@ -61,6 +62,7 @@ class Command(BaseCommand):
                     group=options["log_group"],
                     consumer_name=consumer_name,
                     handler=self.handle_log,
+                    batch_handler=self.handle_log_batch,
                     dead_letter_key=f"{log_stream}:dlq",
                     count=count,
                     block_ms=block_ms,
@@ -151,28 +153,42 @@ class Command(BaseCommand):
                 logger.warning("log message missing execution_id", extra={"id": msg_id})
                 return True  # 不阻塞
 
-            normalized = {
-                "id": msg_id,
-                "timestamp": fields.get("timestamp") or time.time(),
-                "execution_id": execution_id,
-                "task_id": fields.get("task_id"),  # 可选，用于复杂工作流
-                "host_id": fields.get("host_id"),
-                "host_name": fields.get("host_name"),
-                "host_ip": fields.get("host_ip"),
-                "log_type": fields.get("log_type") or fields.get("stream") or "info",
-                "content": fields.get("content") or "",
-                "step_name": fields.get("step_name"),
-                "step_order": _maybe_int(fields.get("step_order")) or 0,
-                "step_id": fields.get("step_id"),
-                "agent_id": fields.get("agent_id"),
-                "received_at": time.time(),
-            }
-            _store_log(normalized)
+            _store_log(_normalize_log(msg_id, fields))
             return True
         except Exception as exc:
             logger.exception("处理日志消息失败", extra={"id": msg_id, "error": str(exc)})
             return False
 
+    @staticmethod
+    def handle_log_batch(messages: list) -> dict:
+        """
+        批量处理日志消息：整批按执行聚合，一次管道写入 redis 日志缓存。
+        返回 {msg_id: bool}。
+        """
+        outcomes = {}
+        logs = []
+        for msg_id, fields in messages:
+            if not fields.get("execution_id"):
+                logger.warning("log message missing execution_id", extra={"id": msg_id})
+                outcomes[msg_id] = True  # 不阻塞
+                continue
+            try:
+                logs.append((msg_id, _normalize_log(msg_id, fields)))
+            except Exception as exc:
+                logger.exception("处理日志消息失败", extra={"id": msg_id, "error": str(exc)})
+                outcomes[msg_id] = False
+
+        if logs:
+            try:
+                _store_logs([log for _, log in logs])
+                ok = True
+            except Exception as exc:
+                logger.exception("批量写入日志缓存失败", extra={"count": len(logs), "error": str(exc)})
+                ok = False
+            for msg_id, _ in logs:
+                outcomes[msg_id] = ok
+        return outcomes
+
     @staticmethod
     def handle_result(msg_id: str, fields: dict) -> bool:
         """
@@ -185,6 +201,10 @@ class Command(BaseCommand):
             if not execution_id:
                 logger.warning("result message missing execution_id", extra={"id": msg_id})
                 return True  # 不阻塞
+            task_id = fields.get("task_id")
+            if not task_id:
+                logger.warning("result message missing task_id", extra={"id": msg_id})
+                return True  # 不阻塞
 
             # 提取结果基础字段
             result_payload = {
@@ -210,11 +230,11 @@ class Command(BaseCommand):
             }
 
             # 先将redis日志缓存批量刷入db
-            _flush_log_store(execution_id=str(execution_id))
+            _flush_log_store(str(execution_id))
 
             # 调用处理服务，传入结果和进度
             resp = AgentExecutionService.handle_task_result(
-                execution_id=str(execution_id),
+                task_id=task_id,
                 result=result_payload,
                 progress=progress_payload
             )
@@ -236,29 +256,21 @@ class Command(BaseCommand):
                 logger.warning("Agent状态消息缺少agent_id", extra={"msg_id": msg_id, "fields": fields})
                 return True  # 不阻塞处理
 
-            # 查找 Agent
             try:
-                agent = Agent.objects.get(id=int(agent_id))
-            except (Agent.DoesNotExist, ValueError):
-                logger.warning("Agent状态更新失败：Agent不存在", extra={"msg_id": msg_id, "agent_id": agent_id})
+                agent_id = int(agent_id)
+            except ValueError:
+                logger.warning("Agent状态更新失败：agent_id无效", extra={"msg_id": msg_id, "agent_id": agent_id})
                 return True
 
-            # 解析时间戳
-            timestamp = fields.get("timestamp") or fields.get("last_heartbeat") or timezone.now()
-            if isinstance(timestamp, (int, float)):
-                timestamp = datetime.fromtimestamp(timestamp, tz=timezone.get_current_timezone())
-            elif isinstance(timestamp, str) and timestamp.endswith('Z'):
-                timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                if timezone.is_naive(timestamp):
-                    timestamp = timezone.make_aware(timestamp)
-
-            # 更新 Agent 状态
+            # 心跳在内存中合并后批量写入，只有状态变化才立即写库
+            timestamp = parse_heartbeat_timestamp(fields.get("timestamp") or fields.get("last_heartbeat"))
             new_status = fields.get("status", "online")
-            if new_status in ['online', 'offline', 'pending', 'disabled']:
-                agent.status = new_status
-                agent.last_heartbeat_at = timestamp
-                agent.last_error_code = fields.get("error_code") or ""
-                agent.save(update_fields=['status', 'last_heartbeat_at', 'last_error_code', 'updated_at'])
+            get_heartbeat_coalescer().record(
+                agent_id,
+                new_status,
+                timestamp,
+                error_code=fields.get("error_code") or "",
+            )
 
             logger.debug("更新Agent状态", extra={
                 "msg_id": msg_id,
@@ -341,29 +353,59 @@ def _maybe_int(value):
         return value
 
 
+_shared_redis_client = None
+
+
 def _redis_client():
-    return redis.Redis(
-        host=getattr(settings, "REDIS_HOST", "localhost"),
-        port=getattr(settings, "REDIS_PORT", 6379),
-        password=getattr(settings, "REDIS_PASSWORD", None),
-        db=getattr(settings, "REDIS_DB_REALTIME", 3),
-        decode_responses=True,
-        socket_connect_timeout=5,
-        socket_timeout=5,
-        retry_on_timeout=True,
-    )
+    """进程内共享的连接池客户端，避免每条日志新建连接"""
+    global _shared_redis_client
+    if _shared_redis_client is None:
+        _shared_redis_client = build_redis_client(max_connections=50)
+    return _shared_redis_client
+
+
+def _normalize_log(msg_id: str, fields: dict) -> dict:
+    return {
+        "id": msg_id,
+        "timestamp": fields.get("timestamp") or time.time(),
+        "execution_id": fields.get("execution_id"),  # 主要执行标识
+        "task_id": fields.get("task_id"),  # 可选，用于复杂工作流
+        "host_id": fields.get("host_id"),
+        "host_name": fields.get("host_name"),
+        "host_ip": fields.get("host_ip"),
+        "log_type": fields.get("log_type") or fields.get("stream") or "info",
+        "content": fields.get("content") or "",
+        "step_name": fields.get("step_name"),
+        "step_order": _maybe_int(fields.get("step_order")) or 0,
+        "step_id": fields.get("step_id"),
+        "agent_id": fields.get("agent_id"),
+        "received_at": time.time(),
+    }
 
 
 def _store_log(log: dict):
     """将日志追加到每个执行的redis列表中，设置TTL以避免丢弃。"""
-    exec_id = log.get("execution_id")
-    if not exec_id:
-        return
+    _store_logs([log])
+
+
+def _store_logs(logs: list):
+    """按执行聚合后一次管道写入：每个执行一条 RPUSH（多值）和一条 EXPIRE。"""
     key_prefix = getattr(settings, "LOG_STORE_PREFIX", "agent_log_store:")
-    key = f"{key_prefix}{exec_id}"
-    rc = _redis_client()
-    rc.rpush(key, json.dumps(log, ensure_ascii=False))
-    rc.expire(key, getattr(settings, "LOG_STORE_TTL", LOG_STORE_TTL_SECONDS))
+    ttl = getattr(settings, "LOG_STORE_TTL", LOG_STORE_TTL_SECONDS)
+    grouped = {}
+    for log in logs:
+        exec_id = log.get("execution_id")
+        if not exec_id:
+            continue
+        grouped.setdefault(f"{key_prefix}{exec_id}", []).append(json.dumps(log, ensure_ascii=False))
+    if not grouped:
+        return
+
+    pipe = _redis_client().pipeline(transaction=False)
+    for key, values in grouped.items():
+        pipe.rpush(key, *values)
+        pipe.expire(key, ttl)
+    pipe.execute()
 
 
 def _store_log_db(log: dict):
@@ -0,0 +1,41 @@
+"""
+工作流执行器进程 - 领取 WorkflowRun 队列中的工作流并执行，可多进程/多机水平扩展
+"""
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.agents.workflow_runner import WorkflowRunner
+
+
+class Command(BaseCommand):
+    help = "独立进程执行工作流（WORKFLOW_RUNNER_ENABLED=True 时由执行方案入队），进程重启后自动续跑未完成的工作流。"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=getattr(settings, "WORKFLOW_RUNNER_CONCURRENCY", 4))
+        parser.add_argument("--lease-seconds", type=int, default=getattr(settings, "WORKFLOW_RUNNER_LEASE_SECONDS", 60))
+        parser.add_argument("--poll-interval", type=float, default=getattr(settings, "WORKFLOW_RUNNER_POLL_INTERVAL", 2))
+        parser.add_argument("--once", action="store_true", default=False, help="领取一轮并等待执行完成后退出")
+
+    def handle(self, *args, **options):
+        runner = WorkflowRunner(
+            concurrency=options["concurrency"],
+            lease_seconds=options["lease_seconds"],
+            poll_interval=options["poll_interval"],
+        )
+
+        if options["once"]:
+            claimed = runner.run_once()
+            runner.stop()
+            runner.run_forever()
+            self.stdout.write(self.style.SUCCESS(f"已执行 {claimed} 个工作流"))
+            return
+
+        # 收到停止信号后不再领取新工作流，等待进行中的工作流结束（期间持续续约）
+        signal.signal(signal.SIGTERM, lambda *_: runner.stop())
+        signal.signal(signal.SIGINT, lambda *_: runner.stop())
+        self.stdout.write(
+            self.style.SUCCESS(f"启动工作流执行器: runner={runner.runner_id}, concurrency={runner.concurrency}")
+        )
+        runner.run_forever()
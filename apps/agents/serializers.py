@@ -905,6 +905,12 @@ class BatchInstallSerializer(serializers.Serializer):
         default=False,
         help_text="如主机已有agent，是否允许覆盖安装"
     )
+    install_concurrency = serializers.IntegerField(
+        required=False,
+        min_value=1,
+        max_value=500,
+        help_text="同时进行的SSH安装数（可选，默认 AGENT_INSTALL_CONCURRENCY）"
+    )
     package_id = serializers.IntegerField(required=False, allow_null=True, help_text="Agent package ID（可选）")
     package_version = serializers.CharField(required=False, allow_blank=True, max_length=50, help_text="Agent package version（可选）")
     auth_shared_secret = serializers.CharField(
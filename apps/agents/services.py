@@ -2,9 +2,10 @@
 Agent 管理服务
 """
 import hashlib
+import logging
 import secrets
 import string
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from django.db import transaction
 from django.utils import timezone
@@ -13,6 +14,7 @@ from django.conf import settings
 
 from utils.audit_service import AuditLogService
 from apps.hosts.models import Host
+from apps.hosts.async_ssh_engine import ASYNCSSH_AVAILABLE, AsyncSSHEngine, SSHJob
 from apps.hosts.fabric_ssh_manager import fabric_ssh_manager
 from .models import Agent, AgentToken, AgentInstallRecord, AgentUninstallRecord, AgentServer
 from utils.realtime_logs import realtime_log_service
@@ -20,6 +22,9 @@ import uuid
 import base64
 from pathlib import Path
 
+logger = logging.getLogger(__name__)
+
+
 class AgentService:
     """Agent 相关服务"""
 
@@ -31,25 +36,37 @@ class AgentService:
     @classmethod
     def issue_token(cls, agent: Agent, user, expired_at=None, note: str = '') -> Dict[str, Any]:
         """签发新 token，吊销旧 token，返回明文（仅此一次）"""
-        raw = secrets.token_urlsafe(32)
-        token_hash = cls._hash_token(raw)
-        token_last4 = raw[-4:]
+        raw = cls.issue_tokens([agent], user, expired_at=expired_at, note=note)[agent.id]
+        return {'token': raw, 'expired_at': expired_at, 'token_last4': raw[-4:]}
+
+    @classmethod
+    def issue_tokens(cls, agents: List[Agent], user, expired_at=None, note: str = '') -> Dict[int, str]:
+        """批量签发 token（每个 Agent 的旧 token 被吊销），返回 {agent_id: 明文 token}"""
+        if not agents:
+            return {}
         now = timezone.now()
-        with transaction.atomic():
-            AgentToken.objects.filter(agent=agent, revoked_at__isnull=True).update(revoked_at=now)
-            AgentToken.objects.create(
+        raw_tokens = {}
+        new_tokens = []
+        for agent in agents:
+            raw = secrets.token_urlsafe(32)
+            raw_tokens[agent.id] = raw
+            agent.active_token_hash = cls._hash_token(raw)
+            if agent.status == 'disabled':
+                agent.status = 'offline'
+            agent.updated_at = now
+            new_tokens.append(AgentToken(
                 agent=agent,
-                token_hash=token_hash,
-                token_last4=token_last4,
+                token_hash=agent.active_token_hash,
+                token_last4=raw[-4:],
                 issued_by=user,
                 expired_at=expired_at,
                 note=note,
-            )
-            agent.active_token_hash = token_hash
-            if agent.status == 'disabled':
-                agent.status = 'offline'
-            agent.save(update_fields=['active_token_hash', 'status', 'updated_at'])
-        return {'token': raw, 'expired_at': expired_at, 'token_last4': token_last4}
+            ))
+        with transaction.atomic():
+            AgentToken.objects.filter(agent__in=agents, revoked_at__isnull=True).update(revoked_at=now)
+            AgentToken.objects.bulk_create(new_tokens, batch_size=500)
+            Agent.objects.bulk_update(agents, ['active_token_hash', 'status', 'updated_at'], batch_size=500)
+        return raw_tokens
 
     @staticmethod
     def revoke_active_token(agent: Agent) -> bool:
@@ -265,6 +282,7 @@ class AgentService:
             binary_name = "ops-job-agent"
             service_name = "ops-job-agent"
             install_dir = "/opt/ops-job-agent"
+            control_plane_url = ''
         else:  # agent-server
             control_plane_url = getattr(settings, "CONTROL_PLANE_URL", "") or ""
             if not control_plane_url:
@@ -535,7 +553,9 @@ exit 1
                              ws_allowed_origins: list = None,
                              # agent-server auth 配置
                              auth_shared_secret: str = None,
-                             auth_require_signature: bool = None) -> Dict[str, Any]:
+                             auth_require_signature: bool = None,
+                             # SSH 安装并发数（默认 AGENT_INSTALL_CONCURRENCY）
+                             install_concurrency: int = None) -> Dict[str, Any]:
         """
         批量安装 Agent（通过 SSH）
         
@@ -547,369 +567,83 @@ exit 1
             agent_server_url: Agent-Server 地址
             download_url: Agent 二进制下载地址
             install_task_id: 安装任务ID（用于SSE进度推送）
+            install_concurrency: 同时进行的 SSH 安装数
         
         Returns:
             Dict[str, Any]: 安装结果
         """
         if not install_task_id:
             install_task_id = str(uuid.uuid4())
-        agent_server_backup_url = ''  # 备地址暂不支持，强制清空
-        
-        results = []
-        total = len(host_ids)
-        completed = 0
-        success_count = 0
-        failed_count = 0
-        
-        install_status_prefix = "agent_install_status:"
-        install_log_stream = "agent_install_logs"
+        from .install_pipeline import AgentInstallPipeline
 
-        # 推送初始状态
-        realtime_log_service.push_status(install_task_id, {
-            'status': 'running',
-            'total': total,
-            'completed': 0,
-            'success_count': 0,
-            'failed_count': 0,
-            'message': '开始批量安装 Agent'
-        }, stream_prefix=install_status_prefix)
-        
-        # 获取主机列表
-        hosts = Host.objects.filter(id__in=host_ids)
-        
         control_plane_url = getattr(settings, "CONTROL_PLANE_URL", "") or ""
-
-        for host in hosts:
-            try:
-                # 为所有类型的Agent创建/检查记录（agent和agent-server都需要）
-                agent = None
-                reinstall_required = False
-
-                # 检查是否已有Agent
-                if hasattr(host, 'agent') and host.agent:
-                    if host.agent.agent_type == install_type and host.agent.status == 'online':
-                        if not allow_reinstall:
-                            results.append({
-                                'host_id': host.id,
-                                'host_name': host.name,
-                                'success': False,
-                                'message': f'该主机已有在线 {host.agent.get_agent_type_display()}，需要允许覆盖安装才能重新安装'
-                            })
-                            continue
-                        else:
-                            reinstall_required = True
-
-                    # 根据安装类型设置不同的endpoint
-                    endpoint = agent_server_url or ''
-                    if install_type == 'agent-server':
-                        # agent-server的endpoint设置为其监听地址
-                        endpoint = agent_server_listen_addr or '0.0.0.0:8080'
-
-                    agent, agent_created = Agent.objects.get_or_create(
-                        host=host,
-                        defaults={
-                            'agent_type': install_type,
-                            'status': 'pending',
-                            'endpoint': endpoint,
-                        }
-                    )
-
-                    if not agent_created:
-                        # 如果Agent类型不同，更新类型
-                        if agent.agent_type != install_type:
-                            agent.agent_type = install_type
-                        agent.status = 'pending'
-                        # 根据安装类型设置不同的endpoint
-                        if install_type == 'agent-server':
-                            agent.endpoint = agent_server_listen_addr or '0.0.0.0:8080'
-                        else:
-                            agent.endpoint = agent_server_url or ''
-                        agent.save(update_fields=['agent_type', 'status', 'endpoint', 'updated_at'])
-                
-                # 签发 Agent Token
-                token_data = cls.issue_token(agent, user, note="Agent 安装")
-                agent_token = token_data['token']
-                
-                if install_type == 'agent-server' and not control_plane_url:
-                    raise ValueError("CONTROL_PLANE_URL 未配置，无法生成 Agent-Server 安装脚本")
-
-                # 创建或更新安装记录
-                from .models import AgentInstallRecord
-                install_record, created = AgentInstallRecord.objects.get_or_create(
-                    host=host,
-                    agent=agent,
-                    status='pending',
-                    defaults={
-                        'install_mode': install_mode,
-                        'agent_server_url': agent_server_url,
-                        'agent_server_backup_url': '',
-                        'ws_backoff_initial_ms': ws_backoff_initial_ms,
-                        'ws_backoff_max_ms': ws_backoff_max_ms,
-                        'ws_max_retries': ws_max_retries,
-                        'package_id': package_id,
-                        'package_version': package_version,
-                        'control_plane_url': control_plane_url if install_type == 'agent-server' else '',
-                        'installed_by': user,
-                        'install_task_id': install_task_id,
-                        # agent-server WebSocket 配置
-                        'ws_handshake_timeout': ws_handshake_timeout or '10s',
-                        'ws_read_buffer_size': ws_read_buffer_size or 4096,
-                        'ws_write_buffer_size': ws_write_buffer_size or 4096,
-                        'ws_enable_compression': ws_enable_compression if ws_enable_compression is not None else True,
-                        'ws_allowed_origins': ws_allowed_origins or [],
-                    }
-                )
-                if not created:
-                    # 更新现有安装记录的配置（允许重新安装）
-                    install_record.agent = agent
-                    install_record.install_mode = install_mode
-                    install_record.agent_server_url = agent_server_url
-                    install_record.agent_server_backup_url = ''
-                    install_record.ws_backoff_initial_ms = ws_backoff_initial_ms
-                    install_record.ws_backoff_max_ms = ws_backoff_max_ms
-                    install_record.ws_max_retries = ws_max_retries
-                    install_record.package_id = package_id
-                    install_record.package_version = package_version
-                    install_record.control_plane_url = control_plane_url if install_type == 'agent-server' else ''
-                    install_record.status = 'pending'
-                    install_record.install_task_id = install_task_id
-                    # agent-server WebSocket 配置
-                    install_record.ws_handshake_timeout = ws_handshake_timeout or '10s'
-                    install_record.ws_read_buffer_size = ws_read_buffer_size or 4096
-                    install_record.ws_write_buffer_size = ws_write_buffer_size or 4096
-                    install_record.ws_enable_compression = ws_enable_compression if ws_enable_compression is not None else True
-                    install_record.ws_allowed_origins = ws_allowed_origins or []
-                    install_record.save()
-                
-                # 生成安装脚本（使用 Agent Token）
-                scripts = cls.generate_install_script(
-                    host=host,
-                    agent_token=agent_token,
-                    install_type=install_type,
-                    install_mode=install_mode,
-                    agent_server_url=agent_server_url,
-                    download_url=download_url,
-                    ws_backoff_initial_ms=ws_backoff_initial_ms,
-                    ws_backoff_max_ms=ws_backoff_max_ms,
-                    ws_max_retries=ws_max_retries,
-                    agent_server_listen_addr=agent_server_listen_addr,
-                    max_connections=max_connections,
-                    heartbeat_timeout=heartbeat_timeout,
-                    package_version=package_version,
-                    package_id=package_id,
-                    # 最大并发任务数
-                    max_concurrent_tasks=max_concurrent_tasks,
-                    # agent-server WebSocket 配置
-                    ws_handshake_timeout=ws_handshake_timeout,
-                    ws_read_buffer_size=ws_read_buffer_size,
-                    ws_write_buffer_size=ws_write_buffer_size,
-                    ws_enable_compression=ws_enable_compression,
-                    ws_allowed_origins=ws_allowed_origins,
-                    auth_shared_secret=auth_shared_secret,
-                    auth_require_signature=auth_require_signature,
-                )
-                
-                # 根据操作系统选择脚本
-                os_type = host.os_type.lower() if host.os_type else 'linux'
-                if 'windows' in os_type:
-                    script_content = scripts.get('windows', '')
-                    script_type = 'powershell'
-                else:
-                    script_content = scripts.get('linux', '')
-                    script_type = 'shell'
-                
-                # 推送开始安装日志
-                realtime_log_service.push_log(install_task_id, str(host.id), {
-                    'host_name': host.name,
-                    'host_ip': host.ip_address,
-                    'log_type': 'info',
-                    'content': f'开始安装 Agent 到主机 {host.name} ({host.ip_address})',
-                    'step_name': '安装 Agent',
-                    'step_order': 1
-                }, stream_key=install_log_stream)
-                
-                # 通过ssh执行安装脚本
-                if install_type == 'agent-server':
-                    config_summary = f"control_plane={control_plane_url or 'n/a'}, listen={agent_server_listen_addr}"
-                else:
-                    config_summary = f"primary={agent_server_url or 'n/a'}, backoff_initial={ws_backoff_initial_ms}ms, backoff_max={ws_backoff_max_ms}ms, retries={ws_max_retries}"
-                try:
-                    timeout = max(60, min(ssh_timeout or 300, 900))
-                    result = cls._execute_install_with_ip_fallback(
-                        host=host,
-                        script_content=script_content,
-                        script_type=script_type,
-                        timeout=timeout,
-                        account_id=account_id,
-                        install_task_id=install_task_id,
-                        log_stream_key=install_log_stream,
-                    )
-                    used_ip = result.get('used_ip') or host.ip_address
-                    used_ip_type = result.get('used_ip_type') or ('internal' if host.internal_ip else 'public')
-                    ip_note = f"ssh_ip={used_ip} ({used_ip_type})" if used_ip else ""
-                    config_summary_with_ip = f"{config_summary} | {ip_note}" if ip_note else config_summary
-                    if result['success']:
-                        if install_type == 'agent-server':
-                            install_record.status = 'success'
-                            install_record.message = f'Agent-Server 安装脚本执行成功 | {config_summary_with_ip}'
-                        else:
-                            # Agent 安装等待首次上线
-                            install_record.status = 'pending'
-                            install_record.message = f'安装脚本执行成功，等待 Agent 首次上线 | {config_summary_with_ip}'
-                        install_record.error_message = ''
-                        install_record.error_detail = ''
-                        success_count += 1
-                        results.append({
-                            'host_id': host.id,
-                            'host_name': host.name,
-                            'success': True,
-                            'message': install_record.message
-                        })
-                        # 推送成功日志
-                        install_target = 'Agent-Server' if install_type == 'agent-server' else 'Agent'
-                        realtime_log_service.push_log(install_task_id, str(host.id), {
-                            'host_name': host.name,
-                            'host_ip': used_ip or host.ip_address,
-                            'log_type': 'info',
-                            'content': f'主机 {host.name} {install_target} 安装成功 | {config_summary_with_ip}',
-                            'step_name': f'安装 {install_target}',
-                            'step_order': 1
-                        }, stream_key=install_log_stream)
-                    else:
-                        install_record.status = 'failed'
-                        stderr = (result.get('stderr') or '').strip()
-                        error_msg = stderr.splitlines()[0] if stderr else (result.get('message') or '安装失败')
-                        install_record.message = f'安装脚本执行失败：{error_msg} | {config_summary_with_ip}'
-                        install_record.error_message = error_msg
-                        install_record.error_detail = stderr or error_msg
-                        failed_count += 1
-                        results.append({
-                            'host_id': host.id,
-                            'host_name': host.name,
-                            'success': False,
-                            'message': install_record.message
-                        })
-                        # 推送失败日志
-                        realtime_log_service.push_log(install_task_id, str(host.id), {
-                            'host_name': host.name,
-                            'host_ip': used_ip or host.ip_address,
-                            'log_type': 'error',
-                            'content': f'主机 {host.name} Agent 安装失败: {error_msg} | {config_summary_with_ip}',
-                            'step_name': '安装 Agent',
-                            'step_order': 1
-                        }, stream_key=install_log_stream)
-                    
-                    install_record.save()
-                    completed += 1
-                    
-                    # 推送进度更新
-                    realtime_log_service.push_status(install_task_id, {
-                        'status': 'running',
-                        'total': total,
-                        'completed': completed,
-                        'success_count': success_count,
-                        'failed_count': failed_count,
-                        'message': f'已完成 {completed}/{total} 个主机的安装'
-                    }, stream_prefix=install_status_prefix)
-                    
-                except Exception as e:
-                    error_msg = f'SSH 执行失败: {str(e)}'
-                    ip_note = f"ssh_ip={host.ip_address}" if getattr(host, 'ip_address', None) else ''
-                    config_summary_with_ip = f"{config_summary} | {ip_note}" if ip_note else config_summary
-                    install_record.status = 'failed'
-                    install_record.message = f'{error_msg} | {config_summary_with_ip}'
-                    install_record.error_message = error_msg
-                    install_record.error_detail = str(e)
-                    install_record.save()
-                    failed_count += 1
-                    
-                    results.append({
-                        'host_id': host.id,
-                        'host_name': host.name,
-                        'success': False,
-                        'message': error_msg
-                    })
-                    
-                    # 推送失败日志
-                    realtime_log_service.push_log(install_task_id, str(host.id), {
-                        'host_name': host.name,
-                        'host_ip': host.ip_address,
-                        'log_type': 'error',
-                        'content': f'主机 {host.name} SSH 执行失败: {str(e)} | {config_summary_with_ip}',
-                        'step_name': '安装 Agent',
-                        'step_order': 1
-                    }, stream_key=install_log_stream)
-                    
-                    completed += 1
-                    
-                    # 推送进度更新
-                    realtime_log_service.push_status(install_task_id, {
-                        'status': 'running',
-                        'total': total,
-                        'completed': completed,
-                        'success_count': success_count,
-                        'failed_count': failed_count,
-                        'message': f'已完成 {completed}/{total} 个主机的安装'
-                    }, stream_prefix=install_status_prefix)
-                
-            except Exception as e:
-                failed_count += 1
-                host_name = host.name if hasattr(host, 'name') else 'Unknown'
-                error_msg = f'安装失败: {str(e)}'
-                if install_type == 'agent-server':
-                    config_summary = f"control_plane={control_plane_url or 'n/a'}, listen={agent_server_listen_addr}"
-                else:
-                    config_summary = f"primary={agent_server_url or 'n/a'}, backoff_initial={ws_backoff_initial_ms}ms, backoff_max={ws_backoff_max_ms}ms, retries={ws_max_retries}"
-                ip_note = f"ssh_ip={getattr(host, 'ip_address', '')}" if getattr(host, 'ip_address', None) else ''
-                config_summary_with_ip = f"{config_summary} | {ip_note}" if ip_note else config_summary
-                results.append({
-                    'host_id': host.id,
-                    'host_name': host_name,
-                    'success': False,
-                    'message': f'{error_msg} | {config_summary_with_ip}'
-                })
-                
-                # 推送失败日志
-                realtime_log_service.push_log(install_task_id, str(host.id), {
-                    'host_name': host_name,
-                    'host_ip': getattr(host, 'ip_address', ''),
-                    'log_type': 'error',
-                    'content': f'主机 {host_name} 安装失败: {error_msg} | {config_summary_with_ip}',
-                    'step_name': '安装 Agent',
-                    'step_order': 1
-                }, stream_key=install_log_stream)
-                
-                completed += 1
-                
-                # 推送进度更新
-                realtime_log_service.push_status(install_task_id, {
-                    'status': 'running',
-                    'total': total,
-                    'completed': completed,
-                    'success_count': success_count,
-                    'failed_count': failed_count,
-                    'message': f'已完成 {completed}/{total} 个主机的安装'
-                }, stream_prefix=install_status_prefix)
-        
-        # 推送最终状态
-        final_status = 'completed' if failed_count == 0 else 'completed_with_errors'
-        realtime_log_service.push_status(install_task_id, {
-            'status': final_status,
-            'total': total,
-            'completed': completed,
-            'success_count': success_count,
-            'failed_count': failed_count,
-            'message': f'批量安装完成：成功 {success_count} 个，失败 {failed_count} 个'
-        }, stream_prefix=install_status_prefix)
-        
-        return {
-            'results': results,
-            'total': len(results),
-            'success_count': success_count,
-            'failed_count': failed_count,
-            'install_task_id': install_task_id
+        if install_type == 'agent-server':
+            # agent-server的endpoint设置为其监听地址
+            endpoint = agent_server_listen_addr or '0.0.0.0:8080'
+            config_summary = f"control_plane={control_plane_url or 'n/a'}, listen={agent_server_listen_addr}"
+        else:
+            endpoint = agent_server_url or ''
+            config_summary = f"primary={agent_server_url or 'n/a'}, backoff_initial={ws_backoff_initial_ms}ms, backoff_max={ws_backoff_max_ms}ms, retries={ws_max_retries}"
+
+        record_fields = {
+            'install_type': install_type,
+            'install_mode': install_mode,
+            'agent_server_url': agent_server_url,
+            'agent_server_backup_url': '',  # 备地址暂不支持，强制清空
+            'ws_backoff_initial_ms': ws_backoff_initial_ms,
+            'ws_backoff_max_ms': ws_backoff_max_ms,
+            'ws_max_retries': ws_max_retries,
+            'package_id': package_id,
+            'package_version': package_version or '',
+            'control_plane_url': control_plane_url if install_type == 'agent-server' else '',
+            'install_task_id': install_task_id,
+            # agent-server WebSocket 配置
+            'ws_handshake_timeout': ws_handshake_timeout or '10s',
+            'ws_read_buffer_size': ws_read_buffer_size or 4096,
+            'ws_write_buffer_size': ws_write_buffer_size or 4096,
+            'ws_enable_compression': ws_enable_compression if ws_enable_compression is not None else True,
+            'ws_allowed_origins': ws_allowed_origins or [],
+        }
+        script_options = {
+            'install_type': install_type,
+            'install_mode': install_mode,
+            'agent_server_url': agent_server_url,
+            'download_url': download_url,
+            'ws_backoff_initial_ms': ws_backoff_initial_ms,
+            'ws_backoff_max_ms': ws_backoff_max_ms,
+            'ws_max_retries': ws_max_retries,
+            'agent_server_listen_addr': agent_server_listen_addr,
+            'max_connections': max_connections,
+            'heartbeat_timeout': heartbeat_timeout,
+            'package_version': package_version,
+            'package_id': package_id,
+            # 最大并发任务数
+            'max_concurrent_tasks': max_concurrent_tasks,
+            # agent-server WebSocket 配置
+            'ws_handshake_timeout': ws_handshake_timeout,
+            'ws_read_buffer_size': ws_read_buffer_size,
+            'ws_write_buffer_size': ws_write_buffer_size,
+            'ws_enable_compression': ws_enable_compression,
+            'ws_allowed_origins': ws_allowed_origins,
+            'auth_shared_secret': auth_shared_secret,
+            'auth_require_signature': auth_require_signature,
         }
 
+        pipeline = AgentInstallPipeline(
+            install_task_id=install_task_id,
+            user=user,
+            install_type=install_type,
+            account_id=account_id,
+            record_fields=record_fields,
+            script_options=script_options,
+            endpoint=endpoint,
+            config_summary=config_summary,
+            ssh_timeout=ssh_timeout,
+            allow_reinstall=allow_reinstall,
+            concurrency=install_concurrency,
+        )
+        return pipeline.run(host_ids)
+
     @classmethod
     def batch_uninstall_agents(
         cls,
@@ -924,34 +658,39 @@ exit 1
         - 停止/禁用 systemd 服务
         - 删除安装目录 /opt/ops-job-agent
         - 写入 AgentUninstallRecord 并通过 SSE 推送进度
+        - 已安装 asyncssh 时在一个事件循环内并发卸载（AGENT_INSTALL_CONCURRENCY），否则逐台通过 fabric_ssh_manager 执行
         """
+        from .install_pipeline import INSTALL_LOG_STREAM, InstallProgress
+
         if not uninstall_task_id:
             uninstall_task_id = str(uuid.uuid4())
 
-        results = []
-        total = len(agent_ids)
-        completed = 0
-        success_count = 0
-        failed_count = 0
-
-        install_status_prefix = "agent_install_status:"
-        install_log_stream = "agent_install_logs"
-
-        realtime_log_service.push_status(uninstall_task_id, {
-            'status': 'running',
-            'total': total,
-            'completed': 0,
-            'success_count': 0,
-            'failed_count': 0,
-            'message': '开始批量卸载 Agent'
-        }, stream_prefix=install_status_prefix)
-
-        agents = Agent.objects.select_related('host').filter(id__in=agent_ids)
+        agents = list(Agent.objects.select_related('host').filter(id__in=agent_ids))
+        progress = InstallProgress(uninstall_task_id, 0.5, action='卸载')
+        progress.total = len(agents)
+        progress.push('running', '开始批量卸载 Agent', force=True)
 
-        for agent in agents:
+        def push_log(agent, log_type: str, content: str):
+            display_name = 'Agent-Server' if agent.agent_type == 'agent-server' else 'Agent'
+            realtime_log_service.push_log(uninstall_task_id, str(agent.host.id), {
+                'host_name': agent.host.name,
+                'host_ip': agent.host.ip_address,
+                'log_type': log_type,
+                'content': content,
+                'step_name': f'卸载 {display_name}',
+                'step_order': 1
+            }, stream_key=INSTALL_LOG_STREAM)
+
+        # 准备：生成卸载脚本、创建卸载记录
+        results: List[Optional[Dict[str, Any]]] = [None] * len(agents)
+        records: List[Optional[AgentUninstallRecord]] = [None] * len(agents)
+        jobs = []
+        positions = []
+        timeout = max(60, min(ssh_timeout or 300, 900))
+        for index, agent in enumerate(agents):
             host = agent.host
+            display_name = 'Agent-Server' if agent.agent_type == 'agent-server' else 'Agent'
             try:
-                # 根据agent类型生成对应的卸载脚本
                 uninstall_scripts = cls.generate_uninstall_script(agent.agent_type)
                 # 根据操作系统选择脚本
                 os_type = host.os_type.lower() if host.os_type else 'linux'
@@ -962,8 +701,7 @@ exit 1
                     uninstall_script = uninstall_scripts.get('linux', '')
                     script_type = 'shell'
 
-                # 创建卸载记录
-                uninstall_record = AgentUninstallRecord.objects.create(
+                records[index] = AgentUninstallRecord.objects.create(
                     host=host,
                     agent=agent,
                     status='pending',
@@ -971,116 +709,74 @@ exit 1
                     uninstall_task_id=uninstall_task_id,
                     message='开始卸载'
                 )
+            except Exception as e:
+                err = f'{display_name} 卸载失败: {str(e)}'
+                results[index] = {'success': False, 'message': err, 'stderr': str(e), 'exception': True}
+                push_log(agent, 'error', f'主机 {host.name} {display_name} 卸载异常: {err}')
+                progress.record(False)
+                continue
+
+            push_log(agent, 'info', f'开始卸载主机 {host.name} ({host.ip_address}) 的 {display_name}')
+            jobs.append(SSHJob(
+                host=host,
+                script_content=uninstall_script,
+                script_type=script_type,
+                timeout=timeout,
+                task_id=uninstall_task_id,
+                account_id=account_id,
+                connection_timeout=5,
+                log_stream_key=INSTALL_LOG_STREAM,
+            ))
+            positions.append(index)
+
+        # 执行：结果回调只推送日志与进度，数据库写回在收尾阶段统一进行
+        def on_result(position: int, exec_result: Dict[str, Any]):
+            index = positions[position]
+            results[index] = exec_result
+            agent = agents[index]
+            display_name = 'Agent-Server' if agent.agent_type == 'agent-server' else 'Agent'
+            if exec_result.get('success'):
+                push_log(agent, 'info', f'主机 {agent.host.name} {display_name} 卸载成功')
+            else:
+                stderr = exec_result.get('stderr') or exec_result.get('message') or f'{display_name} 卸载失败'
+                push_log(agent, 'error', f'主机 {agent.host.name} {display_name} 卸载失败: {stderr}')
+            progress.record(bool(exec_result.get('success')))
 
-                agent_display_name = 'Agent-Server' if agent.agent_type == 'agent-server' else 'Agent'
-                realtime_log_service.push_log(uninstall_task_id, str(host.id), {
-                    'host_name': host.name,
-                    'host_ip': host.ip_address,
-                    'log_type': 'info',
-                    'content': f'开始卸载主机 {host.name} ({host.ip_address}) 的 {agent_display_name}',
-                    'step_name': f'卸载 {agent_display_name}',
-                    'step_order': 1
-                }, stream_key=install_log_stream)
-
-                timeout = max(60, min(ssh_timeout or 300, 900))
-                exec_result = fabric_ssh_manager.execute_script(
-                    host=host,
-                    script_content=uninstall_script,
-                    script_type=script_type,
-                    timeout=timeout,
-                    account_id=account_id,
-                    task_id=uninstall_task_id,
-                    log_stream_key=install_log_stream,
-                    connection_timeout=5,
-                )
-
-                if exec_result.get('success'):
-                    # 保存agent信息以备后用
-                    agent_id = agent.id
-
-                    # 吊销 token，删除 agent 记录
-                    try:
-                        cls.revoke_active_token(agent)
-                    except Exception:
-                        # 不影响卸载结果
-                        pass
-                    try:
-                        agent.delete()  # 完全删除 agent 记录
-                    except Exception:
-                        # 如果删除失败，至少标记为离线
-                        try:
-                            agent.status = 'offline'
-                            agent.save(update_fields=['status', 'updated_at'])
-                        except Exception:
-                            pass
-
-                    # 在删除agent后更新uninstall_record状态
-                    uninstall_record.status = 'success'
-                    uninstall_record.message = f'{agent_display_name} 卸载脚本执行成功'
-                    success_count += 1
-
-                    # 在删除agent之前保存uninstall_record
-                    uninstall_record.save()
-
-                    results.append({
-                        'agent_id': agent_id,
-                        'host_id': host.id,
-                        'host_name': host.name,
-                        'success': True,
-                        'message': uninstall_record.message
-                    })
-
-                    realtime_log_service.push_log(uninstall_task_id, str(host.id), {
-                        'host_name': host.name,
-                        'host_ip': host.ip_address,
-                        'log_type': 'info',
-                        'content': f'主机 {host.name} {agent_display_name} 卸载成功',
-                        'step_name': f'卸载 {agent_display_name}',
-                        'step_order': 1
-                    }, stream_key=install_log_stream)
-                else:
-                    stderr = exec_result.get('stderr') or exec_result.get('message') or f'{agent_display_name} 卸载失败'
-                    uninstall_record.status = 'failed'
-                    uninstall_record.message = stderr
-                    uninstall_record.error_message = stderr
-                    uninstall_record.error_detail = exec_result.get('stderr', '')
-                    failed_count += 1
-
-                    results.append({
-                        'agent_id': agent.id,  # 失败情况下agent还未删除，所以可以直接使用
-                        'host_id': host.id,
-                        'host_name': host.name,
-                        'success': False,
-                        'message': uninstall_record.message
-                    })
-
-                    realtime_log_service.push_log(uninstall_task_id, str(host.id), {
-                        'host_name': host.name,
-                        'host_ip': host.ip_address,
-                        'log_type': 'error',
-                        'content': f'主机 {host.name} {agent_display_name} 卸载失败: {stderr}',
-                        'step_name': f'卸载 {agent_display_name}',
-                        'step_order': 1
-                    }, stream_key=install_log_stream)
-
-                    uninstall_record.save()
-                    completed += 1
-
-                realtime_log_service.push_status(uninstall_task_id, {
-                    'status': 'running',
-                    'total': total,
-                    'completed': completed,
-                    'success_count': success_count,
-                    'failed_count': failed_count,
-                    'message': f'已完成 {completed}/{total} 个 Agent 的卸载'
-                }, stream_prefix=install_status_prefix)
-
+        if jobs and ASYNCSSH_AVAILABLE:
+            try:
+                AsyncSSHEngine(max_concurrency=getattr(settings, 'AGENT_INSTALL_CONCURRENCY', 50)).execute_many(jobs, on_result=on_result)
             except Exception as e:
-                failed_count += 1
-                completed += 1
-                agent_display_name = 'Agent-Server' if getattr(agent, 'agent_type', None) == 'agent-server' else 'Agent'
-                err = f'{agent_display_name} 卸载失败: {str(e)}'
+                logger.error(f"批量卸载执行异常: uninstall_task_id={uninstall_task_id}, error={e}", exc_info=True)
+                for position, index in enumerate(positions):
+                    if results[index] is None:
+                        on_result(position, {'success': False, 'message': f'执行失败: {e}', 'stderr': str(e)})
+        else:
+            for position, job in enumerate(jobs):
+                try:
+                    exec_result = fabric_ssh_manager.execute_script(
+                        host=job.host,
+                        script_content=job.script_content,
+                        script_type=job.script_type,
+                        timeout=job.timeout,
+                        account_id=job.account_id,
+                        task_id=job.task_id,
+                        log_stream_key=job.log_stream_key,
+                        connection_timeout=job.connection_timeout,
+                    )
+                except Exception as e:
+                    exec_result = {'success': False, 'message': f'执行失败: {e}', 'stderr': str(e)}
+                on_result(position, exec_result)
 
+        # 收尾：成功的主机吊销 token 并删除 Agent 记录，写回卸载记录
+        output = []
+        for agent, record, exec_result in zip(agents, records, results):
+            host = agent.host
+            agent_id = agent.id
+            display_name = 'Agent-Server' if agent.agent_type == 'agent-server' else 'Agent'
+            if exec_result.get('exception'):
+                # 准备阶段失败，未执行 SSH
+                output.append({'agent_id': agent_id, 'host_id': host.id, 'host_name': host.name,
+                               'success': False, 'message': exec_result['message']})
                 try:
                     AgentUninstallRecord.objects.create(
                         host=host,
@@ -1088,54 +784,57 @@ exit 1
                         status='failed',
                         uninstalled_by=user,
                         uninstall_task_id=uninstall_task_id,
-                        message=err,
-                        error_message=err,
-                        error_detail=str(e)
+                        message=exec_result['message'],
+                        error_message=exec_result['message'],
+                        error_detail=exec_result['stderr']
                     )
                 except Exception:
                     pass
+                continue
 
-                results.append({
-                    'agent_id': getattr(agent, 'id', None),
-                    'host_id': getattr(host, 'id', None),
-                    'host_name': getattr(host, 'name', 'Unknown'),
-                    'success': False,
-                    'message': err
-                })
+            if exec_result.get('success'):
+                record.status = 'success'
+                record.message = f'{display_name} 卸载脚本执行成功'
+            else:
+                stderr = exec_result.get('stderr') or exec_result.get('message') or f'{display_name} 卸载失败'
+                record.status = 'failed'
+                record.message = stderr
+                record.error_message = stderr
+                record.error_detail = exec_result.get('stderr', '')
+            # 先保存卸载记录再删除 Agent（删除后记录的 agent 外键置空）
+            record.save()
+
+            if exec_result.get('success'):
+                try:
+                    cls.revoke_active_token(agent)
+                except Exception:
+                    # 不影响卸载结果
+                    pass
+                try:
+                    agent.delete()  # 完全删除 agent 记录
+                except Exception:
+                    # 如果删除失败，至少标记为离线
+                    try:
+                        agent.status = 'offline'
+                        agent.save(update_fields=['status', 'updated_at'])
+                    except Exception:
+                        pass
+            output.append({
+                'agent_id': agent_id,
+                'host_id': host.id,
+                'host_name': host.name,
+                'success': bool(exec_result.get('success')),
+                'message': record.message
+            })
 
-                realtime_log_service.push_log(uninstall_task_id, str(getattr(host, 'id', '0')), {
-                    'host_name': getattr(host, 'name', 'Unknown'),
-                    'host_ip': getattr(host, 'ip_address', ''),
-                    'log_type': 'error',
-                    'content': f'主机 {getattr(host, "name", "Unknown")} {agent_display_name} 卸载异常: {err}',
-                    'step_name': f'卸载 {agent_display_name}',
-                    'step_order': 1
-                }, stream_key=install_log_stream)
-
-                realtime_log_service.push_status(uninstall_task_id, {
-                    'status': 'running',
-                    'total': total,
-                    'completed': completed,
-                    'success_count': success_count,
-                    'failed_count': failed_count,
-                    'message': f'已完成 {completed}/{total} 个 Agent 的卸载'
-                }, stream_prefix=install_status_prefix)
-
-                final_status = 'completed' if failed_count == 0 else 'completed_with_errors'
-        realtime_log_service.push_status(uninstall_task_id, {
-            'status': final_status,
-            'total': total,
-            'completed': completed,
-            'success_count': success_count,
-            'failed_count': failed_count,
-            'message': f'批量卸载完成：成功 {success_count} 个，失败 {failed_count} 个'
-        }, stream_prefix=install_status_prefix)
+        final_status = 'completed' if progress.failed == 0 else 'completed_with_errors'
+        progress.push(final_status, f'批量卸载完成：成功 {progress.success} 个，失败 {progress.failed} 个', force=True)
 
         return {
-            'results': results,
-            'total': len(results),
-            'success_count': success_count,
-            'failed_count': failed_count,
+            'results': output,
+            'total': len(output),
+            'success_count': progress.success,
+            'failed_count': progress.failed,
             'uninstall_task_id': uninstall_task_id
         }
 
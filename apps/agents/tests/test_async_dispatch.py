@@ -0,0 +1,89 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from django.contrib.auth.models import User
+
+from apps.agents.async_dispatch import AsyncTaskDispatcher
+from apps.agents.execution_strategies import AsyncParallelExecutionStrategy, get_execution_strategy
+from apps.agents.models import Agent, AgentServer
+from apps.hosts.models import Host
+
+
+class _SlowAgentServer(BaseHTTPRequestHandler):
+    """本地替身 agent-server：每个推送耗时 50ms，记录最大并发"""
+
+    lock = threading.Lock()
+    in_flight = 0
+    peak = 0
+    paths = []
+
+    def do_POST(self):
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            cls.peak = max(cls.peak, cls.in_flight)
+            cls.paths.append(self.path)
+        self.rfile.read(int(self.headers["Content-Length"]))
+        time.sleep(0.05)
+        with cls.lock:
+            cls.in_flight -= 1
+        data = json.dumps({"status": "dispatched"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def slow_server():
+    _SlowAgentServer.in_flight = _SlowAgentServer.peak = 0
+    _SlowAgentServer.paths = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _SlowAgentServer)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _hosts(user, count):
+    hosts = []
+    for i in range(count):
+        host = Host.objects.create(name=f"async-{i}", os_type="linux", device_type="physical", created_by=user)
+        Agent.objects.create(host=host, agent_type="agent", status="online")
+        hosts.append(Host.objects.select_related("agent").get(id=host.id))
+    return hosts
+
+
+@pytest.mark.django_db
+def test_async_strategy_pushes_with_in_flight_limit(slow_server):
+    user = User.objects.create_user(username="async-user", password="pass")
+    server = AgentServer.objects.create(name="async", base_url=slow_server, shared_secret="s")
+    hosts = _hosts(user, 20)
+    strategy = AsyncParallelExecutionStrategy(agent_server_id=server.id, dispatcher=AsyncTaskDispatcher(max_in_flight=5))
+
+    pushed, task_id_to_host, failed = strategy._push_hosts(
+        hosts, lambda host: {"id": f"t-{host.id}"}, task_pusher=None
+    )
+
+    assert failed == []
+    assert sorted(pushed) == sorted(f"t-{h.id}" for h in hosts)
+    assert len(_SlowAgentServer.paths) == 20
+    assert _SlowAgentServer.peak <= 5
+
+
+@pytest.mark.django_db
+def test_async_dispatch_reports_unknown_server_per_task(settings):
+    settings.AGENT_DISPATCH_ENGINE = "asyncio"
+    user = User.objects.create_user(username="async-user2", password="pass")
+    agent = _hosts(user, 1)[0].agent
+
+    results = AsyncTaskDispatcher().dispatch([(agent, {"id": "t1"})], agent_server_id=999)
+
+    assert results["t1"]["success"] is False
+    assert isinstance(get_execution_strategy("parallel", agent_server_id=1), AsyncParallelExecutionStrategy)
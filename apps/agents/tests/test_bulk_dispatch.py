@@ -0,0 +1,179 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from django.contrib.auth.models import User
+
+from apps.agents.execution_service import AgentExecutionService
+from apps.agents.execution_strategies import get_execution_strategy
+from apps.agents.models import Agent, AgentServer
+from apps.executor.models import ExecutionHostResult, ExecutionRecord
+from apps.hosts.models import Host
+from utils.agent_server_auth import compute_agent_server_hmac
+from utils.agent_server_client import get_agent_server_client
+
+SECRET = "bulk-secret"
+
+
+class _StandInAgentServer(BaseHTTPRequestHandler):
+    """本地替身 agent-server：校验签名，记录请求，离线 agent 返回逐任务错误"""
+
+    requests = []
+    offline = set()
+    legacy = False
+    cancel_failures = set()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        expected = compute_agent_server_hmac(SECRET, "POST", self.path, self.headers["X-Timestamp"], body)
+        assert self.headers["X-Signature"] == expected
+        payload = json.loads(body)
+        if self.path == "/api/tasks/cancel/batch" and self.legacy:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.path.endswith("/tasks/cancel/batch"):
+            task_ids = [item["task_id"] for item in payload["tasks"]] if "tasks" in payload else payload["task_ids"]
+            type(self).requests.append((self.path, len(task_ids)))
+            results = [
+                {"task_id": task_id, "error": "task not found"} if task_id in self.cancel_failures
+                else {"task_id": task_id, "status": "cancelled"}
+                for task_id in task_ids
+            ]
+        else:
+            type(self).requests.append((self.path, len(payload["tasks"])))
+            results = [
+                {"task_id": item["task"]["id"], "agent_id": item["agent_id"], "error": "agent not found"}
+                if item["agent_id"] in self.offline
+                else {"task_id": item["task"]["id"], "agent_id": item["agent_id"], "status": "dispatched"}
+                for item in payload["tasks"]
+            ]
+        data = json.dumps({"results": results}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class _StandInHTTPServer(ThreadingHTTPServer):
+    # 取消回退路径会并发建立多个连接，默认 backlog(5) 可能被打满
+    request_queue_size = 128
+
+
+@pytest.fixture()
+def stand_in_server():
+    _StandInAgentServer.requests = []
+    _StandInAgentServer.legacy = False
+    _StandInAgentServer.cancel_failures = set()
+    _StandInAgentServer.offline = set()
+    httpd = _StandInHTTPServer(("127.0.0.1", 0), _StandInAgentServer)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.mark.django_db
+def test_bulk_dispatch_groups_tasks_into_chunked_requests(settings, stand_in_server):
+    settings.AGENT_SERVER_BULK_DISPATCH_SIZE = 50
+    user = User.objects.create_user(username="bulk-user", password="pass")
+    server = AgentServer.objects.create(name="s1", base_url=stand_in_server, shared_secret=SECRET)
+    items = []
+    for i in range(120):
+        host = Host.objects.create(name=f"bulk-{i}", os_type="linux", device_type="physical", created_by=user)
+        agent = Agent.objects.create(host=host, agent_type="agent", status="online")
+        items.append((agent, {"id": f"task-{i}", "host_id": host.id}))
+    _StandInAgentServer.offline = {str(items[0][0].host_id)}
+
+    results = AgentExecutionService.push_tasks_bulk(items, agent_server_id=server.id)
+
+    assert [count for _, count in _StandInAgentServer.requests] == [50, 50, 20]
+    assert all(path == "/api/tasks/batch" for path, _ in _StandInAgentServer.requests)
+    assert sum(1 for r in results.values() if r["success"]) == 119
+    assert results["task-0"]["success"] is False and "agent not found" in results["task-0"]["error"]
+
+
+@pytest.mark.django_db
+def test_agent_server_client_is_cached_per_server():
+    server = AgentServer.objects.create(name="s2", base_url="http://agent-server.invalid", shared_secret="a")
+
+    client = get_agent_server_client(server)
+    assert get_agent_server_client(server) is client
+
+    server.shared_secret = "b"
+    assert get_agent_server_client(server) is not client
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("legacy", [False, True])
+def test_cancel_batches_tasks_and_closes_pending_hosts(settings, stand_in_server, legacy):
+    settings.AGENT_SERVER_BULK_DISPATCH_SIZE = 50
+    _StandInAgentServer.legacy = legacy
+    user = User.objects.create_user(username="cancel-user", password="pass")
+    server = AgentServer.objects.create(name="s3", base_url=stand_in_server, shared_secret=SECRET)
+    record = ExecutionRecord.objects.create(
+        execution_type="quick_script", name="c", executed_by=user, status="running",
+        execution_parameters={"agent_server_id": server.id},
+    )
+    for i in range(60):
+        host = Host.objects.create(name=f"cancel-{i}", os_type="linux", device_type="physical", created_by=user)
+        Agent.objects.create(host=host, agent_type="agent", status="online")
+        ExecutionHostResult.objects.create(
+            execution_record=record, host_id=host.id, task_id=f"t-{i}", status="success" if i == 0 else "running"
+        )
+
+    result = AgentExecutionService.cancel_task_via_agent(record)
+
+    assert result["cancelled_count"] == 59 and result["failed_count"] == 0
+    if legacy:
+        assert len([p for p, _ in _StandInAgentServer.requests if p.startswith("/api/agents/")]) == 59
+    else:
+        assert sorted(count for _, count in _StandInAgentServer.requests) == [9, 50]
+    assert ExecutionHostResult.objects.filter(execution_record=record, status="cancelled").count() == 59
+
+
+@pytest.mark.django_db
+def test_partial_cancel_leaves_unacknowledged_hosts_open(stand_in_server):
+    user = User.objects.create_user(username="cancel-partial", password="pass")
+    server = AgentServer.objects.create(name="s4", base_url=stand_in_server, shared_secret=SECRET)
+    record = ExecutionRecord.objects.create(
+        execution_type="quick_script", name="p", executed_by=user, status="running",
+        execution_parameters={"agent_server_id": server.id},
+    )
+    hosts = {}
+    for name in ("acked", "failed", "undispatched"):
+        hosts[name] = Host.objects.create(name=name, os_type="linux", device_type="physical", created_by=user)
+        Agent.objects.create(host=hosts[name], agent_type="agent", status="online")
+    task_ids = AgentExecutionService._register_host_tasks(record, None, list(hosts.values()))
+
+    # 前两台已推送；第三台属于尚未开始的后续批次，其 Agent 不认识这个任务
+    strategy = get_execution_strategy(
+        "rolling", on_pushed=lambda pushed: AgentExecutionService._mark_hosts_dispatched(record, pushed)
+    )
+    pushed, _, _ = strategy._push_hosts(
+        [Host.objects.select_related("agent").get(id=hosts[name].id) for name in ("acked", "failed")],
+        lambda host: {"id": task_ids[host.id], "host_id": host.id},
+        None,
+        lambda items: AgentExecutionService.push_tasks_bulk(items, agent_server_id=server.id),
+    )
+    assert len(pushed) == 2
+    _StandInAgentServer.requests = []
+    _StandInAgentServer.cancel_failures = {task_ids[hosts["failed"].id], task_ids[hosts["undispatched"].id]}
+
+    result = AgentExecutionService.cancel_task_via_agent(record)
+
+    assert (result["success"], result["cancelled_count"], result["failed_count"]) == (True, 1, 1)
+    assert "cancelled_task_ids" not in result
+    assert _StandInAgentServer.requests == [("/api/tasks/cancel/batch", 2)]
+    statuses = {
+        name: ExecutionHostResult.objects.get(execution_record=record, host_id=host.id).status
+        for name, host in hosts.items()
+    }
+    assert statuses == {"acked": "cancelled", "failed": "running", "undispatched": "cancelled"}
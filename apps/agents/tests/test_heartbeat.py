@@ -0,0 +1,59 @@
+from datetime import timedelta
+
+import pytest
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.agents.heartbeat import HeartbeatCoalescer, parse_heartbeat_timestamp
+from apps.agents.models import Agent
+from apps.hosts.models import Host
+
+
+def _agent(user, name, status="online"):
+    host = Host.objects.create(name=name, os_type="linux", device_type="physical", created_by=user)
+    return Agent.objects.create(host=host, agent_type="agent", status=status)
+
+
+def test_parse_heartbeat_timestamp_accepts_millis_string():
+    parsed = parse_heartbeat_timestamp("1700000000000")
+    assert parsed.timestamp() == 1700000000
+
+
+@pytest.mark.django_db
+def test_heartbeats_are_coalesced_into_one_bulk_update(monkeypatch):
+    monkeypatch.setattr(HeartbeatCoalescer, "_ensure_flusher", lambda self: None)
+    user = User.objects.create_user(username="hb-user", password="pass")
+    agents = [_agent(user, f"hb-host-{i}") for i in range(3)]
+    coalescer = HeartbeatCoalescer(window_seconds=3600)
+    base = timezone.now()
+
+    for agent in agents:
+        coalescer.record(agent.id, "online", base)
+    with CaptureQueriesContext(connection) as ctx:
+        for offset in range(1, 4):
+            for agent in agents:
+                assert coalescer.record(agent.id, "online", base + timedelta(seconds=offset)) is False
+    assert len(ctx.captured_queries) == 0
+
+    assert coalescer.flush() == 3
+    for agent in agents:
+        agent.refresh_from_db()
+        assert agent.last_heartbeat_at == base + timedelta(seconds=3)
+
+
+@pytest.mark.django_db
+def test_status_transition_is_written_immediately(monkeypatch):
+    monkeypatch.setattr(HeartbeatCoalescer, "_ensure_flusher", lambda self: None)
+    invalidated = []
+    monkeypatch.setattr("apps.agents.status.invalidate_agent_status_cache", invalidated.append)
+    user = User.objects.create_user(username="hb-user2", password="pass")
+    agent = _agent(user, "hb-host-x", status="offline")
+    coalescer = HeartbeatCoalescer(window_seconds=3600)
+
+    assert coalescer.record(agent.id, "online", timezone.now()) is True
+
+    agent.refresh_from_db()
+    assert agent.status == "online"
+    assert invalidated == [agent.id]
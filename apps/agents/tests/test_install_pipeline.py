@@ -0,0 +1,298 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from django.contrib.auth.models import User
+
+from apps.agents import install_pipeline, services
+from apps.agents.models import Agent, AgentInstallRecord, AgentToken, AgentUninstallRecord
+from apps.agents.services import AgentService
+from apps.hosts import async_ssh_engine
+from apps.hosts.models import Host, ServerAccount
+from utils.realtime_logs import realtime_log_service
+
+
+@pytest.fixture()
+def pushed(monkeypatch):
+    statuses = []
+    monkeypatch.setattr(realtime_log_service, "push_status",
+                        lambda task_id, data, stream_key=None, **kwargs: statuses.append((stream_key, data)))
+    monkeypatch.setattr(realtime_log_service, "push_log", lambda *args, **kwargs: None)
+    return statuses
+
+
+def _hosts(user, count, **kwargs):
+    return [
+        Host.objects.create(name=f"h{i}", internal_ip=f"10.0.0.{i + 1}", os_type="linux",
+                            device_type="physical", created_by=user, **kwargs)
+        for i in range(count)
+    ]
+
+
+def _install(host_ids, user, **kwargs):
+    return AgentService.batch_install_agents(
+        host_ids=host_ids, user=user, install_type="agent", agent_server_url="ws://agent-server:8080/ws",
+        download_url="http://repo/agent", install_task_id="install-1", **kwargs,
+    )
+
+
+@pytest.mark.django_db
+def test_hosts_are_installed_concurrently_with_bulk_prepared_state(monkeypatch, pushed):
+    monkeypatch.setattr(install_pipeline, "ASYNCSSH_AVAILABLE", False)
+    user = User.objects.create_user(username="installer", password="pass")
+    online, reinstalled, *fresh = _hosts(user, 6)
+    Agent.objects.create(host=online, agent_type="agent", status="online")
+    old_agent = Agent.objects.create(host=reinstalled, agent_type="agent", status="offline")
+    AgentInstallRecord.objects.create(host=reinstalled, agent=old_agent, status="pending", installed_by=user)
+
+    lock = threading.Lock()
+    running = {"now": 0, "peak": 0}
+
+    def fake_install(cls, *, host, script_content, **kwargs):
+        assert "ws://agent-server:8080/ws" in script_content
+        with lock:
+            running["now"] += 1
+            running["peak"] = max(running["peak"], running["now"])
+        time.sleep(0.2)
+        with lock:
+            running["now"] -= 1
+        if host.name == "h5":
+            return {"success": False, "stderr": "permission denied\nmore", "used_ip": host.internal_ip}
+        return {"success": True, "used_ip": host.internal_ip, "used_ip_type": "internal"}
+
+    monkeypatch.setattr(AgentService, "_execute_install_with_ip_fallback", classmethod(fake_install))
+
+    started = time.time()
+    result = _install([h.id for h in [online, reinstalled, *fresh]], user, install_concurrency=10)
+
+    assert time.time() - started < 0.8
+    assert running["peak"] == 5
+    assert (result["success_count"], result["failed_count"], result["total"]) == (4, 2, 6)
+    by_host = {r["host_name"]: r for r in result["results"]}
+    assert "允许覆盖安装" in by_host["h0"]["message"] and by_host["h0"]["agent_id"] is None
+    assert by_host["h1"]["agent_id"] == old_agent.id
+
+    # 每台待安装主机都有 Agent、唯一有效 token 与一条安装记录
+    for host in [reinstalled, *fresh]:
+        agent = Agent.objects.get(host=host)
+        assert agent.status == "pending" and agent.active_token_hash
+        assert AgentToken.objects.filter(agent=agent, revoked_at__isnull=True).count() == 1
+        record = AgentInstallRecord.objects.get(host=host)
+        assert record.install_task_id == "install-1"
+    assert AgentInstallRecord.objects.get(host__name="h5").status == "failed"
+    assert AgentInstallRecord.objects.get(host__name="h5").error_message == "permission denied"
+    assert not AgentInstallRecord.objects.filter(host=online).exists()
+
+    stream_key, final = pushed[-1]
+    assert stream_key == "agent_install_status:install-1"
+    assert (final["status"], final["completed"], final["failed_count"]) == ("completed_with_errors", 6, 2)
+
+
+class _FakeEngine:
+    """记录每轮执行的主机 IP；内网 IP 一律连接失败"""
+
+    rounds = []
+
+    def __init__(self, max_concurrency=None):
+        self.max_concurrency = max_concurrency
+
+    def execute_many(self, jobs, on_result=None):
+        _FakeEngine.rounds.append([job.host.internal_ip or job.host.public_ip for job in jobs])
+        results = []
+        for index, job in enumerate(jobs):
+            if job.host.internal_ip:
+                result = {"success": False, "exit_code": -1, "message": "执行失败: 连接超时"}
+            else:
+                result = {"success": True}
+            results.append(result)
+            on_result(index, result)
+        return results
+
+
+@pytest.mark.django_db
+def test_async_engine_falls_back_to_public_ip(monkeypatch, pushed):
+    monkeypatch.setattr(install_pipeline, "ASYNCSSH_AVAILABLE", True)
+    monkeypatch.setattr(install_pipeline, "AsyncSSHEngine", _FakeEngine)
+    _FakeEngine.rounds = []
+    user = User.objects.create_user(username="installer", password="pass")
+    dual, internal_only = _hosts(user, 2)
+    dual.public_ip = "1.1.1.1"
+    dual.save()
+
+    result = _install([dual.id, internal_only.id], user)
+
+    assert _FakeEngine.rounds == [["10.0.0.1", "10.0.0.2"], ["1.1.1.1"]]
+    assert (result["success_count"], result["failed_count"]) == (1, 1)
+    record = AgentInstallRecord.objects.get(host=dual)
+    assert "ssh_ip=1.1.1.1 (public)" in record.message
+
+
+class _BrokenEngine(_FakeEngine):
+    """第一台主机回调后整批执行异常"""
+
+    def execute_many(self, jobs, on_result=None):
+        on_result(0, {"success": True})
+        raise RuntimeError("event loop died")
+
+
+@pytest.mark.django_db
+def test_engine_failure_marks_unfinished_hosts_failed(monkeypatch, pushed):
+    monkeypatch.setattr(install_pipeline, "ASYNCSSH_AVAILABLE", True)
+    monkeypatch.setattr(install_pipeline, "AsyncSSHEngine", _BrokenEngine)
+    user = User.objects.create_user(username="installer", password="pass")
+    hosts = _hosts(user, 3)
+
+    result = _install([h.id for h in hosts], user)
+
+    assert (result["success_count"], result["failed_count"]) == (1, 2)
+    assert all(r and r["host_name"] for r in result["results"])
+    failed = AgentInstallRecord.objects.filter(status="failed")
+    assert failed.count() == 2
+    assert all("event loop died" in record.error_message for record in failed)
+    assert pushed[-1][1]["status"] == "completed_with_errors"
+
+
+
+class _FakeProcess:
+    """asyncssh 进程：输出一行后以退出码 0 结束"""
+
+    def __init__(self):
+        self.stdout = _FakeReader(["agent installed\n"])
+        self.stderr = _FakeReader([])
+        self.exit_status = 0
+
+    async def wait_closed(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class _FakeReader:
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+
+    async def read(self, size):
+        return self.chunks.pop(0) if self.chunks else ""
+
+
+class _FakeConnection:
+    def __init__(self, commands):
+        self.commands = commands
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def create_process(self, command, **kwargs):
+        self.commands.append(command)
+        return _FakeProcess()
+
+
+@pytest.mark.django_db
+def test_async_branch_runs_engine_against_mocked_asyncssh(monkeypatch, pushed):
+    connects = []
+    commands = []
+
+    async def fake_connect(**options):
+        connects.append((options["host"], options["username"], options["password"]))
+        await asyncio.sleep(0)
+        if options["host"].startswith("10."):
+            raise OSError("[Errno 113] No route to host")
+        return _FakeConnection(commands)
+
+    fake_asyncssh = SimpleNamespace(connect=fake_connect, PermissionDenied=type("PermissionDenied", (Exception,), {}))
+    monkeypatch.setattr(async_ssh_engine, "asyncssh", fake_asyncssh)
+    monkeypatch.setattr(async_ssh_engine, "ASYNCSSH_AVAILABLE", True)
+    monkeypatch.setattr(install_pipeline, "ASYNCSSH_AVAILABLE", True)
+    monkeypatch.setattr(realtime_log_service, "push_logs_batch", lambda *args, **kwargs: None)
+    user = User.objects.create_user(username="installer", password="pass")
+    account = ServerAccount.objects.create(name="root", username="root", password="secret")
+    dual, internal_only = _hosts(user, 2, account=account)
+    dual.public_ip = "1.1.1.1"
+    dual.save()
+
+    result = _install([dual.id, internal_only.id], user)
+
+    assert sorted(connects) == [("1.1.1.1", "root", "secret"), ("10.0.0.1", "root", "secret"),
+                                ("10.0.0.2", "root", "secret")]
+    assert len(commands) == 1 and "ws://agent-server:8080/ws" in commands[0]
+    assert (result["success_count"], result["failed_count"]) == (1, 1)
+    assert "ssh_ip=1.1.1.1 (public)" in AgentInstallRecord.objects.get(host=dual).message
+    failed = AgentInstallRecord.objects.get(host=internal_only)
+    assert failed.status == "failed" and "No route to host" in failed.error_message
+
+def _uninstall_result(host):
+    if host.name == "h1":
+        return {"success": False, "stderr": "systemctl: permission denied", "exit_code": 1}
+    return {"success": True, "exit_code": 0}
+
+
+class _FakeUninstallEngine:
+    calls = []
+
+    def __init__(self, max_concurrency=None):
+        self.max_concurrency = max_concurrency
+
+    def execute_many(self, jobs, on_result=None):
+        _FakeUninstallEngine.calls.append([job.host.name for job in jobs])
+        results = []
+        for index, job in enumerate(jobs):
+            assert job.task_id == "uninstall-1" and job.connection_timeout == 5
+            results.append(_uninstall_result(job.host))
+            on_result(index, results[-1])
+        return results
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("engine", ["asyncssh", "fabric"])
+def test_batch_uninstall_uses_engine_and_reports_progress(monkeypatch, pushed, engine):
+    fabric_calls = []
+    _FakeUninstallEngine.calls = []
+    monkeypatch.setattr(services, "ASYNCSSH_AVAILABLE", engine == "asyncssh")
+    monkeypatch.setattr(services, "AsyncSSHEngine", _FakeUninstallEngine)
+    monkeypatch.setattr(services.fabric_ssh_manager, "execute_script",
+                        lambda host, **kwargs: fabric_calls.append(host.name) or _uninstall_result(host))
+    user = User.objects.create_user(username="uninstaller", password="pass")
+    ok, failed = _hosts(user, 2)
+    agents = [Agent.objects.create(host=host, agent_type="agent", status="online") for host in (ok, failed)]
+
+    result = AgentService.batch_uninstall_agents([agent.id for agent in agents], user, uninstall_task_id="uninstall-1")
+
+    if engine == "asyncssh":
+        assert _FakeUninstallEngine.calls == [["h0", "h1"]] and fabric_calls == []
+    else:
+        assert _FakeUninstallEngine.calls == [] and fabric_calls == ["h0", "h1"]
+    assert (result["success_count"], result["failed_count"], result["total"]) == (1, 1, 2)
+    assert not Agent.objects.filter(host=ok).exists()
+    assert Agent.objects.filter(host=failed).exists()
+    assert AgentUninstallRecord.objects.get(host=ok).status == "success"
+    assert AgentUninstallRecord.objects.get(host=failed).error_message == "systemctl: permission denied"
+    stream_key, final = pushed[-1]
+    assert stream_key == "agent_install_status:uninstall-1"
+    assert (final["status"], final["completed"]) == ("completed_with_errors", 2)
+
+
+class _BrokenUninstallEngine(_FakeUninstallEngine):
+    def execute_many(self, jobs, on_result=None):
+        on_result(0, {"success": True, "exit_code": 0})
+        raise RuntimeError("event loop died")
+
+
+@pytest.mark.django_db
+def test_batch_uninstall_engine_failure_marks_remaining_hosts_failed(monkeypatch, pushed):
+    monkeypatch.setattr(services, "ASYNCSSH_AVAILABLE", True)
+    monkeypatch.setattr(services, "AsyncSSHEngine", _BrokenUninstallEngine)
+    user = User.objects.create_user(username="uninstaller", password="pass")
+    ok, stranded = _hosts(user, 2)
+    agents = [Agent.objects.create(host=host, agent_type="agent", status="online") for host in (ok, stranded)]
+
+    result = AgentService.batch_uninstall_agents([agent.id for agent in agents], user, uninstall_task_id="uninstall-1")
+
+    assert (result["success_count"], result["failed_count"]) == (1, 1)
+    assert Agent.objects.filter(host=stranded).exists()
+    assert "event loop died" in AgentUninstallRecord.objects.get(host=stranded).error_message
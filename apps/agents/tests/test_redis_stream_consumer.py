@@ -0,0 +1,79 @@
+from utils.redis_stream_consumer import RedisStreamConsumer
+
+
+class FakePipeline:
+    def __init__(self, owner):
+        self.owner = owner
+        self.ops = []
+
+    def xack(self, stream, group, *ids):
+        self.ops.append(("xack", stream, ids))
+
+    def xadd(self, key, fields):
+        self.ops.append(("xadd", key, fields))
+
+    def execute(self):
+        self.owner.pipelines.append(self.ops)
+        return [True] * len(self.ops)
+
+
+class FakeRedis:
+    def __init__(self, messages):
+        self.messages = messages
+        self.pipelines = []
+
+    def xreadgroup(self, **kwargs):
+        return [("agent_logs", self.messages)]
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+    def xack(self, *args):
+        raise AssertionError("acks should go through the pipeline")
+
+
+def _consumer(messages):
+    fake = FakeRedis(messages)
+    consumer = RedisStreamConsumer(
+        stream_key="agent_logs",
+        group="g",
+        consumer_name="c",
+        dead_letter_key="agent_logs:dlq",
+        redis_client=fake,
+    )
+    return consumer, fake
+
+
+def test_batch_handler_acks_in_one_pipeline_and_dead_letters_failures():
+    messages = [("1-0", {"n": "1"}), ("2-0", {"n": "2"}), ("3-0", {"n": "3"})]
+    consumer, fake = _consumer(messages)
+    seen = []
+
+    def batch_handler(batch):
+        seen.append([msg_id for msg_id, _ in batch])
+        return {"1-0": True, "3-0": True}
+
+    consumer.read_and_process(batch_handler=batch_handler)
+
+    assert seen == [["1-0", "2-0", "3-0"]]
+    assert len(fake.pipelines) == 1
+    ops = fake.pipelines[0]
+    assert ops[0] == ("xack", "agent_logs", ("1-0", "3-0"))
+    assert ops[1][0] == "xadd" and ops[1][1] == "agent_logs:dlq"
+    assert ops[1][2]["origin_id"] == "2-0"
+
+
+def test_single_handler_exceptions_are_not_acked():
+    messages = [("1-0", {"n": "1"}), ("2-0", {"n": "2"})]
+    consumer, fake = _consumer(messages)
+
+    def handler(msg_id, fields):
+        if msg_id == "2-0":
+            raise ValueError("boom")
+        return True
+
+    consumer.read_and_process(handler)
+
+    ops = fake.pipelines[0]
+    assert ops[0] == ("xack", "agent_logs", ("1-0",))
+    assert ops[1][2]["error"] == "boom"
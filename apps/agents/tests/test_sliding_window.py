@@ -0,0 +1,119 @@
+import threading
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+from apps.agents import execution_strategies
+from apps.agents.execution_strategies import SlidingWindowExecutionStrategy
+
+
+class _TimedWaiter:
+    """按主机设定的耗时完成结果 Future，并记录同时在途的任务数"""
+
+    def __init__(self, durations, failing=()):
+        self.durations = durations
+        self.failing = set(failing)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+        self.started = []
+        self.finished = []
+
+    def watch_results(self, task_ids, poll_interval=0.5):
+        futures = {}
+        for task_id in task_ids:
+            host_id = int(task_id.split("-")[1])
+            future = Future()
+            futures[task_id] = future
+            with self.lock:
+                self.in_flight += 1
+                self.peak = max(self.peak, self.in_flight)
+                self.started.append(host_id)
+            threading.Timer(self.durations.get(host_id, 0.01), self._complete, (future, task_id, host_id)).start()
+        return futures
+
+    def _complete(self, future, task_id, host_id):
+        with self.lock:
+            self.in_flight -= 1
+            self.finished.append(host_id)
+        future.set_result({"task_id": task_id, "success": host_id not in self.failing, "exit_code": 0})
+
+    def unwatch_results(self, futures):
+        pass
+
+
+def _hosts(count, zone=lambda i: ""):
+    online = SimpleNamespace(status="online")
+    return [SimpleNamespace(id=i, name=f"h{i}", zone=zone(i), region="", agent=online) for i in range(count)]
+
+
+def _run(strategy, hosts, waiter, monkeypatch, **kwargs):
+    monkeypatch.setattr("utils.task_result_waiter.get_task_result_waiter", lambda: waiter)
+    return strategy.execute(
+        hosts=hosts,
+        task_creator=lambda host: {"id": f"task-{host.id}"},
+        task_pusher=lambda agent, spec: {"success": True, "task_id": spec["id"]},
+        **kwargs,
+    )
+
+
+def test_slow_host_does_not_stall_the_window(monkeypatch):
+    waiter = _TimedWaiter({0: 0.3})
+
+    result = _run(SlidingWindowExecutionStrategy(window_size=3), _hosts(12), waiter, monkeypatch)
+
+    # 批次屏障下 host 0 会拖住第一批；滑动窗口在它返回前就完成了其余主机
+    assert result.success and result.success_count == 12
+    assert waiter.peak == 3
+    assert waiter.finished[-1] == 0
+
+
+def test_failure_percentage_threshold_stops_refilling(monkeypatch):
+    waiter = _TimedWaiter({}, failing={0, 1})
+    strategy = SlidingWindowExecutionStrategy(window_size=1, max_fail_percent=10)
+
+    result = _run(strategy, _hosts(10), waiter, monkeypatch)
+
+    # 第 2 台失败时 2/10 > 10%，不再启动后续主机
+    assert result.stopped_early and not result.success
+    assert waiter.started == [0, 1]
+
+
+def test_failures_within_threshold_are_tolerated(monkeypatch):
+    waiter = _TimedWaiter({}, failing={3})
+    result = _run(SlidingWindowExecutionStrategy(window_size=4, max_fail_percent=20), _hosts(10), waiter, monkeypatch)
+    assert result.success and result.failed_count == 1 and len(result.results) == 10
+
+
+def test_group_limit_caps_in_flight_hosts_per_zone(monkeypatch):
+    waiter = _TimedWaiter({i: 0.05 for i in range(8)})
+    hosts = _hosts(8, zone=lambda i: "az-a" if i < 6 else "az-b")
+    original = SlidingWindowExecutionStrategy._take_ready
+    observed = []
+
+    def take_ready(self, queue, in_flight, group_running):
+        ready = original(self, queue, in_flight, group_running)
+        observed.append(group_running["az-a"] + sum(h.zone == "az-a" for h in ready))
+        return ready
+
+    monkeypatch.setattr(SlidingWindowExecutionStrategy, "_take_ready", take_ready)
+    result = _run(SlidingWindowExecutionStrategy(window_size=4, group_limit=2), hosts, waiter, monkeypatch)
+
+    assert result.success_count == 8
+    assert max(observed) == 2
+    # az-b 的主机不必排在 az-a 之后
+    assert waiter.started.index(6) < waiter.started.index(5)
+
+
+def test_factory_builds_sliding_strategy():
+    strategy = execution_strategies.get_execution_strategy("sliding", batch_size=5, max_fail_percent=5, group_limit=2)
+    assert isinstance(strategy, SlidingWindowExecutionStrategy)
+    assert (strategy.window_size, strategy.max_fail_percent, strategy.group_limit) == (5, 5, 2)
+
+
+def test_cancellation_stops_dispatching_remaining_hosts(monkeypatch):
+    waiter = _TimedWaiter({})
+    result = _run(
+        SlidingWindowExecutionStrategy(window_size=2), _hosts(10), waiter, monkeypatch,
+        should_stop=lambda: len(waiter.finished) >= 2,
+    )
+    assert result.stopped_early and len(waiter.started) < 10
@@ -0,0 +1,60 @@
+import pytest
+from django.contrib.auth.models import User
+
+from apps.agents.execution_service import AgentExecutionService
+from apps.executor.models import ExecutionRecord
+from apps.hosts.models import Host
+from utils.log_archive_service import log_archive_service
+from utils.realtime_logs import realtime_log_service
+
+
+@pytest.fixture()
+def async_record(db, monkeypatch):
+    monkeypatch.setattr(realtime_log_service, "push_status", lambda *args, **kwargs: True)
+    monkeypatch.setattr(log_archive_service, "archive_execution_logs", lambda *args, **kwargs: True)
+    user = User.objects.create_user(username="async-user", password="pass")
+    hosts = [
+        Host.objects.create(name=f"async-{i}", os_type="linux", device_type="physical", created_by=user)
+        for i in range(2)
+    ]
+    record = ExecutionRecord.objects.create(
+        execution_type="quick_script", name="async", executed_by=user, status="running",
+        execution_parameters={"async_dispatch": True},
+    )
+    return record, hosts
+
+
+def test_record_finalised_once_all_hosts_report(async_record):
+    record, hosts = async_record
+    task_ids = AgentExecutionService._register_host_tasks(record, None, hosts)
+
+    AgentExecutionService.handle_task_result(task_ids[hosts[0].id], {"status": "success", "exit_code": 0})
+    record.refresh_from_db()
+    assert record.status == "running"
+
+    AgentExecutionService.handle_task_result(task_ids[hosts[1].id], {"status": "failed", "error_msg": "boom"})
+    record.refresh_from_db()
+    assert record.status == "failed"
+    assert record.execution_results["summary"] == {"total_hosts": 2, "success_hosts": 1, "failed_hosts": 1}
+    assert [h["success"] for h in record.execution_results["hosts"]] == [True, False]
+
+    # 重复投递的结果不会再次收尾
+    assert AgentExecutionService._finalize_async_execution(record) is False
+
+
+def test_hosts_without_agent_fail_without_waiting(async_record):
+    record, hosts = async_record
+
+    result = AgentExecutionService.execute_script_via_agent(
+        execution_record=record,
+        script_content="echo hi",
+        script_type="shell",
+        target_hosts=hosts,
+        wait_for_results=False,
+    )
+
+    assert result["pending"] is True and result["success"] is False
+    assert result["pending_count"] == 0 and result["failed_count"] == 2
+    record.refresh_from_db()
+    assert record.status == "failed"
+    assert record.host_task_results.filter(status="failed").count() == 2
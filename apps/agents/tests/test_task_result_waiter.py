@@ -0,0 +1,40 @@
+from utils.task_result_waiter import ResultDispatcher
+
+
+def _result(task_id, status="success"):
+    return {"task_id": task_id, "status": status, "exit_code": "0", "stdout": "ok"}
+
+
+def test_dispatch_resolves_registered_waiter_only():
+    dispatcher = ResultDispatcher(redis_client=None, stream_key="agent_results")
+    futures = dispatcher.register(["t1", "t2"])
+
+    dispatcher.dispatch(_result("t1"))
+    dispatcher.dispatch(_result("other"))
+
+    assert futures["t1"].done()
+    assert futures["t1"].result()["status"] == "success"
+    assert not futures["t2"].done()
+    assert dispatcher.pending_count() == 1
+
+
+def test_result_arriving_before_register_is_served_from_cache():
+    dispatcher = ResultDispatcher(redis_client=None, stream_key="agent_results")
+    dispatcher.dispatch(_result("t1", status="failed"))
+
+    futures = dispatcher.register(["t1"])
+
+    assert futures["t1"].done()
+    assert futures["t1"].result()["status"] == "failed"
+    assert dispatcher.pending_count() == 0
+
+
+def test_unregister_drops_timed_out_waiters():
+    dispatcher = ResultDispatcher(redis_client=None, stream_key="agent_results")
+    futures = dispatcher.register(["t1"])
+
+    dispatcher.unregister(futures)
+
+    assert dispatcher.pending_count() == 0
+    dispatcher.dispatch(_result("t1"))
+    assert not futures["t1"].done()
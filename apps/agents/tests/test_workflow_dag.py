@@ -0,0 +1,71 @@
+import threading
+import time
+
+import pytest
+
+from apps.agents.workflow_dag import resolve_dependencies, run_step_graph, validate_step_dependencies
+
+
+def _step(order, depends_on=None, hosts=1):
+    return order, {"order": order, "step_name": f"step-{order}", "depends_on": depends_on, "hosts": hosts}
+
+
+def _recording_runner(fail=(), delay=0.05):
+    lock = threading.Lock()
+    state = {"running": 0, "peak": 0, "started": [], "finished": []}
+
+    def run_step(order, step_data):
+        with lock:
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+            state["started"].append(order)
+        time.sleep(delay)
+        with lock:
+            state["running"] -= 1
+            state["finished"].append(order)
+        failed = order in fail
+        return {"status": "failed" if failed else "success", "entry": {"order": order}, "failed": failed, "stop": failed}
+
+    return run_step, state
+
+
+def test_undeclared_dependencies_keep_sequential_order():
+    assert resolve_dependencies([_step(1), _step(2), _step(3)]) == {1: set(), 2: {1}, 3: {2}}
+
+
+def test_independent_branches_run_concurrently_and_join():
+    run_step, state = _recording_runner()
+    steps = [_step(1, []), _step(2, []), _step(3, [1, 2])]
+
+    outcomes = run_step_graph(steps, run_step, host_count=lambda s: s["hosts"], max_parallel=4, host_budget=100)
+
+    assert [o["entry"]["order"] for o in outcomes] == [1, 2, 3]
+    assert state["peak"] == 2
+    assert state["started"][-1] == 3 and set(state["finished"][:2]) == {1, 2}
+
+
+def test_host_budget_limits_concurrent_steps():
+    run_step, state = _recording_runner()
+    steps = [_step(1, [], hosts=60), _step(2, [], hosts=60), _step(3, [], hosts=200)]
+
+    run_step_graph(steps, run_step, host_count=lambda s: s["hosts"], max_parallel=4, host_budget=100)
+
+    # 单个步骤超出预算时单独执行，不会饿死
+    assert state["peak"] == 1 and sorted(state["finished"]) == [1, 2, 3]
+
+
+def test_failed_step_stops_launching_new_steps():
+    run_step, state = _recording_runner(fail={1})
+    steps = [_step(1, []), _step(2, [1]), _step(3, [2])]
+
+    outcomes = run_step_graph(steps, run_step, host_count=lambda s: s["hosts"], max_parallel=4, host_budget=100)
+
+    assert state["started"] == [1]
+    assert [o["failed"] for o in outcomes] == [True]
+
+
+def test_cycles_and_unknown_references_are_rejected():
+    with pytest.raises(ValueError):
+        validate_step_dependencies([_step(1, [2]), _step(2, [1])])
+    with pytest.raises(ValueError):
+        validate_step_dependencies([_step(1, []), _step(2, [5])])
@@ -0,0 +1,111 @@
+from concurrent.futures import Future
+from datetime import timedelta
+
+import pytest
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from apps.agents.execution_service import AgentExecutionService
+from apps.agents.workflow_runner import WorkflowRunner, enqueue_workflow
+from apps.executor.models import ExecutionRecord, ExecutionStep, WorkflowRun
+from apps.hosts.models import Host
+from utils.log_archive_service import log_archive_service
+from utils.realtime_logs import realtime_log_service
+
+
+def _step(order):
+    return {"order": order, "step_name": f"step-{order}", "step_type": "script", "script_content": f"echo {order}"}
+
+
+@pytest.fixture()
+def queued_run(db):
+    user = User.objects.create_user(username="runner-user", password="pass")
+    host = Host.objects.create(name="runner-host", os_type="linux", device_type="physical", created_by=user)
+    record = ExecutionRecord.objects.create(execution_type="job_workflow", name="wf", executed_by=user)
+    return enqueue_workflow(record, plan_steps=[_step(1), _step(2)], target_hosts=[host], agent_server_id=1)
+
+
+def test_run_is_claimed_by_one_runner_until_lease_expires(queued_run):
+    first, second = WorkflowRunner(runner_id="a"), WorkflowRunner(runner_id="b")
+
+    assert [run.id for run in first.claim(1)] == [queued_run.id]
+    assert second.claim(1) == []
+
+    WorkflowRun.objects.filter(id=queued_run.id).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+    taken_over = second.claim(1)
+
+    assert [run.id for run in taken_over] == [queued_run.id]
+    assert taken_over[0].runner_id == "b" and taken_over[0].attempts == 2
+
+
+def test_resumed_run_skips_finished_steps(queued_run, monkeypatch):
+    executed = []
+
+    def fake_execute_script(**kwargs):
+        executed.append(kwargs["script_content"])
+        return {"success": True, "success_count": 1, "failed_count": 0, "results": []}
+
+    monkeypatch.setattr(AgentExecutionService, "execute_script_via_agent", staticmethod(fake_execute_script))
+    monkeypatch.setattr(realtime_log_service, "push_status", lambda *args, **kwargs: True)
+    monkeypatch.setattr(log_archive_service, "archive_execution_logs", lambda *args, **kwargs: True)
+    record = queued_run.execution_record
+    ExecutionStep.objects.create(execution_record=record, step_name="step-1", step_type="script", step_order=1, status="success")
+    interrupted = ExecutionStep.objects.create(
+        execution_record=record, step_name="step-2", step_type="script", step_order=2, status="running"
+    )
+    WorkflowRun.objects.filter(id=queued_run.id).update(status="running", lease_expires_at=timezone.now() - timedelta(seconds=1), attempts=1)
+
+    runner = WorkflowRunner(runner_id="restarted")
+    [run] = runner.claim(1)
+    runner.execute(run)
+
+    assert executed == ["echo 2"]
+    interrupted.refresh_from_db()
+    assert interrupted.status == "success"
+    assert record.steps.count() == 2
+    record.refresh_from_db()
+    assert record.status == "success"
+    assert WorkflowRun.objects.get(id=run.id).status == "finished"
+
+
+def test_runner_that_lost_its_lease_stops_between_steps(queued_run, monkeypatch):
+    executed = []
+    statuses = []
+    runner = WorkflowRunner(runner_id="slow")
+    [run] = runner.claim(1)
+
+    def fake_execute_script(**kwargs):
+        executed.append(kwargs["script_content"])
+        # 第一步执行期间租约过期，被另一个执行器接管
+        WorkflowRun.objects.filter(id=run.id).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        WorkflowRunner(runner_id="other").claim(1)
+        return {"success": True, "success_count": 1, "failed_count": 0, "results": []}
+
+    monkeypatch.setattr(AgentExecutionService, "execute_script_via_agent", staticmethod(fake_execute_script))
+    monkeypatch.setattr(realtime_log_service, "push_status", lambda *args, **kwargs: True)
+    monkeypatch.setattr(log_archive_service, "archive_execution_logs", lambda *args, **kwargs: True)
+    from apps.executor.services import ExecutionRecordService
+    original_update = ExecutionRecordService.update_execution_status
+    monkeypatch.setattr(ExecutionRecordService, "update_execution_status", staticmethod(
+        lambda execution_record, status, **kwargs: statuses.append(status) or original_update(
+            execution_record=execution_record, status=status, **kwargs)
+    ))
+
+    runner.execute(run)
+
+    assert executed == ["echo 1"]
+    assert "success" not in statuses and "failed" not in statuses
+    current = WorkflowRun.objects.get(id=run.id)
+    assert (current.runner_id, current.status) == ("other", "running")
+
+
+def test_renew_flags_runs_taken_over_by_another_runner(queued_run):
+    runner = WorkflowRunner(runner_id="a")
+    [run] = runner.claim(1)
+    runner._active[run.id] = Future()
+    assert runner.renew_leases() == 1 and not runner.lease_lost(run.id)
+
+    WorkflowRun.objects.filter(id=run.id).update(runner_id="b", attempts=2)
+
+    assert runner.renew_leases() == 0
+    assert runner._lost[run.id].is_set() and runner.lease_lost(run.id)
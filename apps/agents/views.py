@@ -1246,6 +1246,7 @@ class AgentViewSet(BatchOperationMixin, viewsets.ModelViewSet):
         ssh_timeout = data.get('ssh_timeout', 300)
         allow_reinstall = data.get('allow_reinstall', False)
         max_concurrent_tasks = data.get('max_concurrent_tasks')
+        install_concurrency = data.get('install_concurrency')
         control_plane_url = getattr(settings, "CONTROL_PLANE_URL", "") or ""
 
         if install_type == 'agent' and not agent_server_url:
@@ -1392,6 +1393,7 @@ class AgentViewSet(BatchOperationMixin, viewsets.ModelViewSet):
                     ws_allowed_origins=ws_allowed_origins,
                     auth_shared_secret=auth_shared_secret,
                     auth_require_signature=auth_require_signature,
+                    install_concurrency=install_concurrency,
                 )
 
                 # 记录审日志
@@ -1417,10 +1419,11 @@ class AgentViewSet(BatchOperationMixin, viewsets.ModelViewSet):
                 logger.error(f"批量安装任务失败: install_task_id={install_task_id}, 错误={str(e)}", exc_info=True)
                 # 推送错误状态
                 from utils.realtime_logs import realtime_log_service
+                status_prefix = getattr(settings, "INSTALL_STATUS_STREAM_PREFIX", "agent_install_status:")
                 realtime_log_service.push_status(install_task_id, {
                     'status': 'error',
                     'message': f'批量安装任务失败: {str(e)}'
-                })
+                }, stream_key=f"{status_prefix}{install_task_id}")
 
         # 使用全局线程池提交后台任务
         pool = get_global_thread_pool()
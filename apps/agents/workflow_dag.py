@@ -0,0 +1,148 @@
+"""
+工作流步骤依赖调度
+
+步骤通过 depends_on 声明依赖的步骤顺序（order）：
+ - None（未声明）：依赖上一步，保持原有的顺序执行语义
+ - []：无依赖，可与其他就绪步骤并行
+ - [1, 3]：步骤 1 与 3 都结束后才执行
+
+调度器并发执行所有依赖已满足的步骤，受最大并行步骤数与全局在途主机数预算限制；
+任一步骤失败且不忽略错误时不再启动新步骤，等待进行中的步骤结束后返回。
+
+对外接口：
+ - resolve_dependencies(steps) -> {order: set(依赖 order)}
+ - validate_step_dependencies(steps) -> None，校验失败抛出 ValueError
+ - run_step_graph(steps, run_step, host_count, max_parallel, host_budget) -> [outcome, ...]
+"""
+import logging
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+Step = Tuple[int, Dict[str, Any]]
+
+
+def resolve_dependencies(steps: List[Step]) -> Dict[int, Set[int]]:
+    """
+    解析步骤依赖（steps 为按计划顺序排列的 (order, step_data)）
+    引用不在本次执行范围内的步骤（如断点续跑跳过的步骤）视为已满足。
+    """
+    orders = {order for order, _ in steps}
+    deps: Dict[int, Set[int]] = {}
+    previous = None
+    for order, step_data in steps:
+        declared = step_data.get('depends_on')
+        if declared is None:
+            deps[order] = {previous} if previous is not None else set()
+        else:
+            deps[order] = {int(d) for d in declared if int(d) in orders and int(d) != order}
+        previous = order
+
+    # Kahn 拓扑排序检测循环依赖
+    remaining = {order: set(d) for order, d in deps.items()}
+    while remaining:
+        ready = [order for order, d in remaining.items() if not d]
+        if not ready:
+            raise ValueError(f"步骤依赖存在循环: {sorted(remaining)}")
+        for order in ready:
+            del remaining[order]
+        for d in remaining.values():
+            d.difference_update(ready)
+    return deps
+
+
+def validate_step_dependencies(steps: List[Step]):
+    """校验依赖引用存在且无循环（用于模板保存）"""
+    orders = {order for order, _ in steps}
+    for order, step_data in steps:
+        for dep in step_data.get('depends_on') or []:
+            if dep not in orders:
+                raise ValueError(f"步骤 {order} 依赖的步骤 {dep} 不存在")
+            if dep == order:
+                raise ValueError(f"步骤 {order} 不能依赖自身")
+    resolve_dependencies(steps)
+
+
+def _run_in_thread(run_step: Callable[[int, Dict[str, Any]], Dict[str, Any]], order: int, step_data: Dict[str, Any]):
+    try:
+        return run_step(order, step_data)
+    finally:
+        close_old_connections()
+
+
+def run_step_graph(
+    steps: List[Step],
+    run_step: Callable[[int, Dict[str, Any]], Dict[str, Any]],
+    host_count: Callable[[Dict[str, Any]], int],
+    max_parallel: Optional[int] = None,
+    host_budget: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    按依赖并发执行步骤
+
+    Args:
+        steps: 按计划顺序排列的 (order, step_data)
+        run_step: 执行单个步骤，返回 outcome（需包含 stop：是否终止后续步骤）
+        host_count: 估算步骤的目标主机数，用于在途主机预算
+        max_parallel: 最大并行步骤数（WORKFLOW_MAX_PARALLEL_STEPS）
+        host_budget: 全局在途主机数上限（WORKFLOW_HOST_BUDGET）；单个步骤超出预算时只在无其他步骤运行时执行
+
+    Returns:
+        已执行步骤的 outcome，按计划顺序排列
+    """
+    if max_parallel is None:
+        max_parallel = getattr(settings, 'WORKFLOW_MAX_PARALLEL_STEPS', 4)
+    if host_budget is None:
+        host_budget = getattr(settings, 'WORKFLOW_HOST_BUDGET', 5000)
+    max_parallel = max(1, max_parallel)
+
+    deps = resolve_dependencies(steps)
+    pending: Dict[int, Dict[str, Any]] = dict(steps)
+    done: Set[int] = set()
+    outcomes: Dict[int, Dict[str, Any]] = {}
+    running: Dict[Future, Tuple[int, int]] = {}
+    in_flight_hosts = 0
+    stopped = False
+
+    with ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix="workflow-step") as pool:
+        while True:
+            if not stopped:
+                for order, step_data in list(pending.items()):
+                    if len(running) >= max_parallel:
+                        break
+                    if not deps[order] <= done:
+                        continue
+                    hosts = host_count(step_data)
+                    if running and in_flight_hosts + hosts > host_budget:
+                        continue
+                    del pending[order]
+                    future = pool.submit(_run_in_thread, run_step, order, step_data)
+                    running[future] = (order, hosts)
+                    in_flight_hosts += hosts
+                    logger.info(f"启动工作流步骤: order={order}, hosts={hosts}, running={len(running)}, in_flight_hosts={in_flight_hosts}")
+
+            if not running:
+                break
+
+            finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in finished:
+                order, hosts = running.pop(future)
+                in_flight_hosts -= hosts
+                try:
+                    outcome = future.result()
+                except Exception as e:
+                    logger.error(f"工作流步骤执行异常: order={order}, error={e}", exc_info=True)
+                    outcome = {'status': 'failed', 'entry': None, 'failed': True, 'stop': True}
+                outcomes[order] = outcome
+                done.add(order)
+                if outcome.get('stop') and not stopped:
+                    stopped = True
+                    logger.error(f"工作流步骤失败: order={order}，不再启动后续步骤")
+
+    if pending:
+        logger.warning(f"以下步骤因前序失败未执行: {sorted(pending)}")
+    return [outcomes[order] for order, _ in steps if order in outcomes]
@@ -0,0 +1,260 @@
+"""
+工作流执行器 - 在独立进程中领取并执行工作流
+
+gunicorn worker 会按 max_requests 回收、按 timeout 被杀，长时间运行的工作流不能放在 worker 的线程池里。
+开启 WORKFLOW_RUNNER_ENABLED 后，执行方案/模板调试只把运行参数写入 WorkflowRun 队列，
+由 run_workflows 命令（可多进程、多机部署）领取执行：
+ - 领取：条件 UPDATE 抢占排队中或租约过期的运行，多个执行器之间无需额外的锁
+ - 租约：执行期间定期续约；进程崩溃后租约过期，由其他执行器接管；失去租约的执行器在步骤之间停止，
+   不再写入最终状态
+ - 续跑：步骤进度记录在 ExecutionStep，接管后已结束的步骤不再执行，中断的步骤重新执行
+
+对外接口：
+ - enqueue_workflow(execution_record, plan_steps, target_hosts, ...) -> WorkflowRun
+ - WorkflowRunner.run_once() -> int
+ - WorkflowRunner.run_forever()
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from apps.executor.models import ExecutionRecord, WorkflowRun
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ('success', 'failed', 'cancelled', 'timeout')
+
+
+def default_runner_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+def enqueue_workflow(
+    execution_record: ExecutionRecord,
+    plan_steps: List[Dict[str, Any]],
+    target_hosts,
+    global_parameters: Dict[str, Any] = None,
+    execution_mode: str = 'parallel',
+    rolling_batch_size: int = 1,
+    rolling_batch_delay: int = 0,
+    rolling_max_fail_percent: Optional[float] = None,
+    rolling_group_limit: int = 0,
+    start_step_order: int = 1,
+    agent_server_id: int = None,
+) -> WorkflowRun:
+    """将工作流写入运行队列，参数与 execute_workflow_via_agent 一致（目标主机只保存 ID）"""
+    payload = {
+        'plan_steps': plan_steps,
+        'target_host_ids': [host.id for host in target_hosts],
+        'global_parameters': global_parameters or {},
+        'execution_mode': execution_mode,
+        'rolling_batch_size': rolling_batch_size,
+        'rolling_batch_delay': rolling_batch_delay,
+        'rolling_max_fail_percent': rolling_max_fail_percent,
+        'rolling_group_limit': rolling_group_limit,
+        'start_step_order': start_step_order,
+        'agent_server_id': agent_server_id,
+    }
+    run, _ = WorkflowRun.objects.update_or_create(
+        execution_record=execution_record,
+        defaults={'status': 'queued', 'payload': payload, 'runner_id': '', 'lease_expires_at': None},
+    )
+    logger.info(f"工作流已进入运行队列: execution_id={execution_record.execution_id}")
+    return run
+
+
+class WorkflowRunner:
+    """
+    工作流执行器
+    - concurrency: 单进程同时执行的工作流数（WORKFLOW_RUNNER_CONCURRENCY）
+    - lease_seconds: 租约时长，执行期间每 1/3 租约续约一次（WORKFLOW_RUNNER_LEASE_SECONDS）
+    - poll_interval: 空闲时轮询队列的间隔（WORKFLOW_RUNNER_POLL_INTERVAL）
+    """
+
+    def __init__(self, runner_id: Optional[str] = None, concurrency: Optional[int] = None,
+                 lease_seconds: Optional[int] = None, poll_interval: Optional[float] = None):
+        self.runner_id = runner_id or default_runner_id()
+        self.concurrency = max(1, concurrency or getattr(settings, 'WORKFLOW_RUNNER_CONCURRENCY', 4))
+        self.lease_seconds = lease_seconds or getattr(settings, 'WORKFLOW_RUNNER_LEASE_SECONDS', 60)
+        self.poll_interval = poll_interval or getattr(settings, 'WORKFLOW_RUNNER_POLL_INTERVAL', 2)
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="workflow-runner")
+        self._lock = threading.Lock()
+        self._active: Dict[int, Future] = {}
+        # 每个运行的停止标记，续约发现租约被接管时置位
+        self._lost: Dict[int, threading.Event] = {}
+        self._stopping = threading.Event()
+        self._last_renew = 0.0
+
+    # ------------------------------------------------------------------ 队列
+
+    def _claimable(self, now) -> Q:
+        return Q(status='queued') | Q(status='running', lease_expires_at__lt=now)
+
+    def claim(self, limit: int) -> List[WorkflowRun]:
+        """领取最多 limit 个运行；条件 UPDATE 保证同一运行只被一个执行器领取"""
+        if limit <= 0:
+            return []
+        now = timezone.now()
+        candidates = list(
+            WorkflowRun.objects.filter(self._claimable(now))
+            .order_by('created_at')
+            .values_list('id', flat=True)[:limit * 2]
+        )
+        claimed = []
+        for run_id in candidates:
+            if len(claimed) >= limit:
+                break
+            updated = WorkflowRun.objects.filter(self._claimable(now), id=run_id).update(
+                status='running',
+                runner_id=self.runner_id,
+                lease_expires_at=now + timedelta(seconds=self.lease_seconds),
+                attempts=F('attempts') + 1,
+                updated_at=now,
+            )
+            if updated:
+                claimed.append(run_id)
+        return list(WorkflowRun.objects.filter(id__in=claimed).select_related('execution_record'))
+
+    def renew_leases(self) -> int:
+        with self._lock:
+            run_ids = list(self._active)
+        self._last_renew = time.monotonic()
+        if not run_ids:
+            return 0
+        renewed = WorkflowRun.objects.filter(id__in=run_ids, runner_id=self.runner_id, status='running').update(
+            lease_expires_at=timezone.now() + timedelta(seconds=self.lease_seconds),
+        )
+        if renewed < len(run_ids):
+            # 本执行器已结束的运行 runner_id 不变，其余即为被接管的运行
+            owned = set(WorkflowRun.objects.filter(id__in=run_ids, runner_id=self.runner_id).values_list('id', flat=True))
+            lost = [run_id for run_id in run_ids if run_id not in owned]
+            for run_id in lost:
+                self._lost_event(run_id).set()
+            logger.warning(f"部分工作流租约已被其他执行器接管，停止执行: runner={self.runner_id}, runs={lost}")
+        return renewed
+
+    def _lost_event(self, run_id: int) -> threading.Event:
+        with self._lock:
+            return self._lost.setdefault(run_id, threading.Event())
+
+    def lease_lost(self, run_id: int) -> bool:
+        """运行是否已不归本执行器所有（续约时标记，或查询时发现已被接管）"""
+        event = self._lost_event(run_id)
+        if not event.is_set() and not WorkflowRun.objects.filter(
+            id=run_id, runner_id=self.runner_id, status='running',
+        ).exists():
+            event.set()
+        return event.is_set()
+
+    # ------------------------------------------------------------------ 执行
+
+    def execute(self, run: WorkflowRun):
+        """执行单个运行（在执行器线程中调用）"""
+        from apps.agents.execution_service import AgentExecutionService
+        from apps.executor.services import ExecutionRecordService
+        from apps.hosts.models import Host
+
+        record = run.execution_record
+        try:
+            record.refresh_from_db()
+            if record.status in TERMINAL_STATUSES:
+                logger.info(f"工作流已结束，跳过: execution_id={record.execution_id}, status={record.status}")
+                return
+
+            payload = run.payload or {}
+            host_ids = payload.get('target_host_ids') or []
+            hosts = list(Host.objects.filter(id__in=host_ids).select_related('agent'))
+            resume = run.attempts > 1
+            if record.status != 'running':
+                ExecutionRecordService.update_execution_status(execution_record=record, status='running')
+            logger.info(
+                f"开始执行工作流: execution_id={record.execution_id}, runner={self.runner_id}, "
+                f"attempt={run.attempts}, resume={resume}"
+            )
+
+            AgentExecutionService.execute_workflow_via_agent(
+                execution_record=record,
+                plan_steps=payload.get('plan_steps') or [],
+                target_hosts=hosts,
+                global_parameters=payload.get('global_parameters') or {},
+                execution_mode=payload.get('execution_mode', 'parallel'),
+                rolling_batch_size=payload.get('rolling_batch_size', 1),
+                rolling_batch_delay=payload.get('rolling_batch_delay', 0),
+                rolling_max_fail_percent=payload.get('rolling_max_fail_percent'),
+                rolling_group_limit=payload.get('rolling_group_limit', 0),
+                start_step_order=payload.get('start_step_order', 1),
+                agent_server_id=payload.get('agent_server_id'),
+                resume=resume,
+                should_stop=lambda: self.lease_lost(run.id),
+            )
+        except Exception as e:
+            logger.error(f"工作流执行异常: execution_id={record.execution_id}, error={e}", exc_info=True)
+            if not self.lease_lost(run.id):
+                ExecutionRecordService.update_execution_status(
+                    execution_record=record,
+                    status='failed',
+                    error_message=f'工作流执行异常: {str(e)}'
+                )
+        finally:
+            WorkflowRun.objects.filter(id=run.id, runner_id=self.runner_id).update(
+                status='finished', lease_expires_at=None, updated_at=timezone.now(),
+            )
+            with self._lock:
+                self._lost.pop(run.id, None)
+            close_old_connections()
+
+    def _submit(self, run: WorkflowRun):
+        future = self._executor.submit(self.execute, run)
+        with self._lock:
+            self._active[run.id] = future
+        future.add_done_callback(lambda _: self._release(run.id))
+
+    def _release(self, run_id: int):
+        with self._lock:
+            self._active.pop(run_id, None)
+
+    def active_count(self) -> int:
+        with self._lock:
+            return len(self._active)
+
+    def run_once(self) -> int:
+        """领取空闲槽位数量的运行并提交执行，返回领取数"""
+        runs = self.claim(self.concurrency - self.active_count())
+        for run in runs:
+            self._submit(run)
+        return len(runs)
+
+    def run_forever(self):
+        logger.info(f"工作流执行器启动: runner={self.runner_id}, concurrency={self.concurrency}")
+        while not self._stopping.is_set():
+            try:
+                if time.monotonic() - self._last_renew >= self.lease_seconds / 3:
+                    self.renew_leases()
+                claimed = self.run_once()
+            except Exception as e:
+                logger.error(f"工作流执行器轮询失败: {e}")
+                close_old_connections()
+                claimed = 0
+            if not claimed:
+                self._stopping.wait(self.poll_interval)
+
+        # 停止领取，继续续约直到进行中的工作流结束
+        while self.active_count():
+            self.renew_leases()
+            time.sleep(min(self.poll_interval, self.lease_seconds / 3))
+        self._executor.shutdown(wait=True)
+        logger.info(f"工作流执行器已停止: runner={self.runner_id}")
+
+    def stop(self):
+        self._stopping.set()
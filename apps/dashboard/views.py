@@ -210,34 +210,26 @@ class DashboardViewSet(viewsets.ViewSet):
             # heartbeat_alerts: 简化为离线 agent 数（可扩展为阈值告警）
             # 使用 per-agent 阈值更精确判定（返回详情）
             heartbeat_alerts = heartbeat_alerts_count
-            # 计算 top failure hosts (基于 ExecutionStep.host_results 中的 host_name)
-            from apps.executor.models import ExecutionStep
+            # 计算 top failure hosts（基于主机结果表按主机名聚合）
+            from django.db.models import Max
+            from apps.executor.models import ExecutionHostResult
 
             host_fail_counts = {}
             host_last_failed = {}
             try:
-                failed_steps = ExecutionStep.objects.filter(
-                    created_at__gte=since_24h,
-                    status='failed'
-                ).values('host_results', 'finished_at')
-
-                for step in failed_steps:
-                    host_results = step.get('host_results') or []
-                    finished_at = step.get('finished_at')
-                    
-                    for hr in host_results:
-                        try:
-                            host_name = hr.get('host_name') or hr.get('host') or hr.get('hostname')
-                            status = hr.get('status') or hr.get('result_status') or ''
-                            if not host_name:
-                                continue
-
-                            if status in ('failed', 'error', 'timeout'):
-                                host_fail_counts[host_name] = host_fail_counts.get(host_name, 0) + 1
-                                if finished_at:
-                                    host_last_failed[host_name] = max(host_last_failed.get(host_name) or finished_at, finished_at)
-                        except Exception:
-                            continue
+                failed_rows = (
+                    ExecutionHostResult.objects.filter(
+                        updated_at__gte=since_24h,
+                        status__in=['failed', 'timeout'],
+                    )
+                    .exclude(host_name='')
+                    .values('host_name')
+                    .annotate(fail_count=Count('id'), last_failed_at=Max('finished_at'))
+                    .order_by('-fail_count')[:5]
+                )
+                for row in failed_rows:
+                    host_fail_counts[row['host_name']] = row['fail_count']
+                    host_last_failed[row['host_name']] = row['last_failed_at']
             except Exception:
                 host_fail_counts = {}
                 host_last_failed = {}
@@ -61,6 +61,12 @@ class ExecutionRecord(models.Model):
     execution_results = models.JSONField(default=dict, blank=True, verbose_name="执行结果")
     error_message = models.TextField(blank=True, verbose_name="错误信息")
 
+    # 主机进度计数（实时值在 Redis，由 apps.executor.progress 定期写回）
+    total_hosts = models.IntegerField(default=0, verbose_name="主机总数")
+    success_hosts = models.IntegerField(default=0, verbose_name="成功主机数")
+    failed_hosts = models.IntegerField(default=0, verbose_name="失败主机数")
+    running_hosts = models.IntegerField(default=0, verbose_name="执行中主机数")
+
     # 时间信息
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
     started_at = models.DateTimeField(null=True, blank=True, verbose_name="开始时间")
@@ -216,6 +222,84 @@ class ExecutionStep(models.Model):
         return None
 
 
+class ExecutionHostResult(models.Model):
+    """主机执行结果：每个 (执行记录, 步骤, 主机) 一行，结果消息按行 upsert，避免整步 JSON 读改写"""
+
+    STATUS_CHOICES = [
+        ('pending', '等待中'),
+        ('running', '执行中'),
+        ('success', '成功'),
+        ('failed', '失败'),
+        ('cancelled', '已取消'),
+        ('timeout', '超时'),
+        ('skipped', '已跳过'),
+    ]
+
+    execution_record = models.ForeignKey(
+        ExecutionRecord,
+        on_delete=models.CASCADE,
+        related_name='host_task_results',
+        verbose_name="执行记录"
+    )
+    step = models.ForeignKey(
+        ExecutionStep,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='host_task_results',
+        verbose_name="执行步骤"
+    )
+    # 与 task_id 中的步骤段一致：步骤ID，无步骤的快速执行为 main
+    step_key = models.CharField(max_length=64, default='main', verbose_name="步骤标识")
+    host_id = models.IntegerField(verbose_name="主机ID")
+    host_name = models.CharField(max_length=200, blank=True, verbose_name="主机名称")
+    host_ip = models.CharField(max_length=64, blank=True, verbose_name="主机IP")
+    task_id = models.CharField(max_length=128, blank=True, db_index=True, verbose_name="任务ID")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name="状态")
+    exit_code = models.IntegerField(null=True, blank=True, verbose_name="退出码")
+    error = models.TextField(blank=True, verbose_name="错误信息")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="开始时间")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="结束时间")
+    log_pointer = models.CharField(max_length=255, blank=True, verbose_name="日志指针")
+    log_size = models.BigIntegerField(null=True, blank=True, verbose_name="日志大小")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
+
+    class Meta:
+        verbose_name = "主机执行结果"
+        verbose_name_plural = "主机执行结果"
+        db_table = 'executor_execution_host_result'
+        ordering = ['execution_record', 'step_key', 'host_id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['execution_record', 'step_key', 'host_id'],
+                name='uniq_execution_step_host_result',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['execution_record', 'status']),
+            models.Index(fields=['step', 'status']),
+            models.Index(fields=['status', 'updated_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.execution_record_id} - {self.step_key} - {self.host_id}: {self.status}"
+
+    def as_dict(self):
+        """与 ExecutionStep.host_results 元素相同的结构"""
+        return {
+            'host_id': self.host_id,
+            'host_name': self.host_name,
+            'host_ip': self.host_ip,
+            'task_id': self.task_id,
+            'status': self.status,
+            'exit_code': self.exit_code,
+            'error': self.error or None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'log_pointer': self.log_pointer or None,
+        }
+
+
 class ExecutionLog(models.Model):
     """执行日志条目"""
 
@@ -236,7 +320,65 @@ class ExecutionLog(models.Model):
         indexes = [
             models.Index(fields=["execution_id", "task_id"]),
             models.Index(fields=["created_at"]),
+            # 单主机日志按 id 游标分页
+            models.Index(fields=["execution_id", "step_order", "host_id", "id"]),
+            # 整个执行的日志按 id 游标分页
+            models.Index(fields=["execution_id", "id"]),
         ]
 
     def __str__(self):
         return f"{self.execution_id} {self.task_id} {self.log_type}"
+
+
+class WorkflowRun(models.Model):
+    """工作流运行队列：由 run_workflows 命令领取执行，租约过期后可被其他执行器接管续跑"""
+
+    STATUS_CHOICES = [
+        ('queued', '排队中'),
+        ('running', '执行中'),
+        ('finished', '已结束'),
+    ]
+
+    execution_record = models.OneToOneField(
+        ExecutionRecord,
+        on_delete=models.CASCADE,
+        related_name='workflow_run',
+        verbose_name="执行记录"
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued', verbose_name="状态")
+    # execute_workflow_via_agent 的参数（目标主机仅保存 ID）
+    payload = models.JSONField(default=dict, blank=True, verbose_name="运行参数")
+    runner_id = models.CharField(max_length=128, blank=True, verbose_name="执行器ID")
+    lease_expires_at = models.DateTimeField(null=True, blank=True, verbose_name="租约到期时间")
+    attempts = models.IntegerField(default=0, verbose_name="领取次数")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
+
+    class Meta:
+        verbose_name = "工作流运行"
+        verbose_name_plural = "工作流运行"
+        db_table = 'executor_workflow_run'
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'lease_expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.execution_record.execution_id} - {self.status}"
+
+
+class ScriptBlob(models.Model):
+    """按 SHA-256 去重保存的脚本内容：执行参数、步骤参数与任务下发只引用哈希"""
+
+    sha256 = models.CharField(max_length=64, primary_key=True, verbose_name="SHA-256")
+    content = models.TextField(verbose_name="脚本内容")
+    size = models.IntegerField(default=0, verbose_name="字节数")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+
+    class Meta:
+        verbose_name = "脚本内容"
+        verbose_name_plural = "脚本内容"
+        db_table = 'executor_script_blob'
+
+    def __str__(self):
+        return self.sha256
@@ -0,0 +1,229 @@
+"""
+执行进度计数器 - Redis 哈希实时计数，定期写回数据库
+
+handle_task_result 原先每条主机结果都 save 整条 ExecutionRecord（含体积很大的 execution_results），
+只为更新进度。本模块把进度放在 Redis：
+ - exec_progress:<execution_id>        计数哈希 {total, pending, running, success, failed, ...}
+ - exec_progress:<execution_id>:hosts  主机状态哈希 {<step_key>:<host_id>: status}，重复/乱序的结果不会重复计数
+ - exec_progress:dirty                 有变化待写回的执行集合
+
+计数通过 Lua 脚本原子地 HINCRBY，进度查询/SSE 只需一次 HGETALL；
+后台线程每 EXECUTION_PROGRESS_FLUSH_INTERVAL 秒把变化的计数写回 ExecutionRecord 的计数列（只更新这几列）。
+
+对外接口：
+ - ExecutionProgressCounter.register(execution_id, step_key, host_ids) -> int
+ - ExecutionProgressCounter.record(execution_id, step_key, host_id, status) -> bool
+ - ExecutionProgressCounter.get(execution_id) -> dict | None
+ - ExecutionProgressCounter.flush() -> int
+ - get_progress_counter()
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+FAILED_STATUSES = ('failed', 'timeout', 'cancelled')
+
+# KEYS: 计数哈希, 主机哈希, 待写回集合；ARGV: execution_id, ttl, 主机键...
+_REGISTER_SCRIPT = """
+local added = 0
+for i = 3, #ARGV do
+    if redis.call('HSETNX', KEYS[2], ARGV[i], 'pending') == 1 then
+        added = added + 1
+    end
+end
+if added > 0 then
+    redis.call('HINCRBY', KEYS[1], 'total', added)
+    redis.call('HINCRBY', KEYS[1], 'pending', added)
+    redis.call('SADD', KEYS[3], ARGV[1])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+return added
+"""
+
+# KEYS: 计数哈希, 主机哈希, 待写回集合；ARGV: execution_id, ttl, 主机键, 新状态
+_RECORD_SCRIPT = """
+local old = redis.call('HGET', KEYS[2], ARGV[3])
+if old == ARGV[4] then
+    return 0
+end
+redis.call('HSET', KEYS[2], ARGV[3], ARGV[4])
+if old then
+    redis.call('HINCRBY', KEYS[1], old, -1)
+else
+    redis.call('HINCRBY', KEYS[1], 'total', 1)
+end
+redis.call('HINCRBY', KEYS[1], ARGV[4], 1)
+redis.call('SADD', KEYS[3], ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+return 1
+"""
+
+
+def summarize_counts(counts: Dict[str, Any]) -> Dict[str, int]:
+    """把原始计数折算为进度字段（timeout/cancelled 计入失败）"""
+    values = {key: int(value or 0) for key, value in counts.items()}
+    total = values.get('total', 0)
+    success = values.get('success', 0)
+    failed = sum(values.get(status, 0) for status in FAILED_STATUSES)
+    running = values.get('running', 0)
+    return {
+        'total_hosts': total,
+        'success_hosts': success,
+        'failed_hosts': failed,
+        'running_hosts': running,
+        'pending_hosts': max(total - success - failed - running, 0),
+        'progress': int((success + failed) * 100 / total) if total else 0,
+    }
+
+
+class ExecutionProgressCounter:
+    """
+    执行进度计数器（线程安全）
+    - ttl: 计数键过期时间（EXECUTION_PROGRESS_TTL）
+    - flush_interval: 写回数据库的间隔（EXECUTION_PROGRESS_FLUSH_INTERVAL）
+    """
+
+    KEY_PREFIX = 'exec_progress'
+    DIRTY_KEY = 'exec_progress:dirty'
+
+    def __init__(self, redis_client=None, ttl: Optional[int] = None, flush_interval: Optional[float] = None):
+        self._redis = redis_client
+        self.ttl = ttl or getattr(settings, 'EXECUTION_PROGRESS_TTL', 24 * 60 * 60)
+        self.flush_interval = flush_interval or getattr(settings, 'EXECUTION_PROGRESS_FLUSH_INTERVAL', 2)
+        self._lock = threading.Lock()
+        self._scripts = {}
+        self._flusher: Optional[threading.Thread] = None
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            from utils.realtime_logs import realtime_log_service
+            self._redis = realtime_log_service.redis_client
+        return self._redis
+
+    def _script(self, name: str, source: str):
+        with self._lock:
+            if name not in self._scripts:
+                self._scripts[name] = self.redis.register_script(source)
+            return self._scripts[name]
+
+    def _keys(self, execution_id):
+        key = f"{self.KEY_PREFIX}:{execution_id}"
+        return [key, f"{key}:hosts", self.DIRTY_KEY]
+
+    # ------------------------------------------------------------------ 计数
+
+    def register(self, execution_id, step_key: str, host_ids: Iterable[int]) -> int:
+        """登记待执行的主机（计入 total/pending），已登记的主机不重复计数"""
+        host_keys = [f"{step_key}:{host_id}" for host_id in host_ids]
+        if not host_keys:
+            return 0
+        try:
+            added = self._script('register', _REGISTER_SCRIPT)(
+                keys=self._keys(execution_id), args=[str(execution_id), self.ttl, *host_keys]
+            )
+        except Exception as e:
+            logger.warning(f"登记执行进度失败: execution_id={execution_id}, error={e}")
+            return 0
+        self._ensure_flusher()
+        return int(added or 0)
+
+    def record(self, execution_id, step_key: str, host_id, status: str) -> bool:
+        """记录主机状态变化，返回计数是否变化"""
+        try:
+            changed = self._script('record', _RECORD_SCRIPT)(
+                keys=self._keys(execution_id), args=[str(execution_id), self.ttl, f"{step_key}:{host_id}", status]
+            )
+        except Exception as e:
+            logger.warning(f"更新执行进度失败: execution_id={execution_id}, error={e}")
+            return False
+        self._ensure_flusher()
+        return bool(changed)
+
+    def get(self, execution_id) -> Optional[Dict[str, int]]:
+        """读取实时进度，计数不存在（未登记或已过期）时返回 None"""
+        try:
+            counts = self.redis.hgetall(self._keys(execution_id)[0])
+        except Exception as e:
+            logger.warning(f"读取执行进度失败: execution_id={execution_id}, error={e}")
+            return None
+        return summarize_counts(counts) if counts else None
+
+    # ------------------------------------------------------------------ 写回
+
+    def flush(self, batch_size: int = 500) -> int:
+        """把有变化的执行计数写回 ExecutionRecord，返回写回的执行数"""
+        from apps.executor.models import ExecutionRecord
+
+        execution_ids = self.redis.spop(self.DIRTY_KEY, batch_size) or []
+        if not execution_ids:
+            return 0
+
+        written = 0
+        done = 0
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for execution_id in execution_ids:
+                pipe.hgetall(self._keys(execution_id)[0])
+            all_counts = pipe.execute()
+
+            for execution_id, counts in zip(execution_ids, all_counts):
+                if counts:
+                    summary = summarize_counts(counts)
+                    # 只更新计数列，不读写 execution_results
+                    written += ExecutionRecord.objects.filter(execution_id=int(execution_id)).update(
+                        total_hosts=summary['total_hosts'],
+                        success_hosts=summary['success_hosts'],
+                        failed_hosts=summary['failed_hosts'],
+                        running_hosts=summary['running_hosts'],
+                    )
+                done += 1
+        except Exception:
+            # 未写回的执行放回待写集合，下一轮重试，不必等该执行再有主机上报
+            self._requeue(execution_ids[done:])
+            raise
+        logger.debug(f"写回执行进度: {written} 个执行")
+        return written
+
+    def _requeue(self, execution_ids) -> None:
+        try:
+            self.redis.sadd(self.DIRTY_KEY, *execution_ids)
+        except Exception as e:
+            logger.warning(f"执行进度放回待写集合失败: executions={len(execution_ids)}, error={e}")
+
+    def _ensure_flusher(self):
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher is not None and self._flusher.is_alive():
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name="execution-progress-flusher", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception as e:
+                logger.error(f"定时写回执行进度失败: {e}")
+
+
+_progress_counter: Optional[ExecutionProgressCounter] = None
+
+
+def get_progress_counter() -> ExecutionProgressCounter:
+    """获取进程内共享的进度计数器"""
+    global _progress_counter
+    if _progress_counter is None:
+        _progress_counter = ExecutionProgressCounter()
+    return _progress_counter
@@ -0,0 +1,122 @@
+"""
+脚本内容存储 - 按 SHA-256 去重
+
+同一脚本原先随每次执行写入 execution_parameters/step_parameters，并在每台主机的 TaskSpec 里重复一份。
+本模块把脚本按内容哈希存入 ScriptBlob（每个内容只存一行），执行参数与任务下发只引用哈希：
+ - 执行/步骤参数保存 script_sha256，读取时用 resolve_script_content 取回内容（兼容旧数据里的 script_content）
+ - TaskSpec 只携带 script_sha256，批量下发时每个 Agent-Server 只需收到一次脚本内容，由其按哈希缓存
+
+对外接口：
+ - script_digest(content) -> str
+ - ScriptStore.put(content) -> sha256
+ - ScriptStore.get(sha256) -> str | None
+ - compact_script_params(params) -> dict
+ - resolve_script_content(params) -> str
+ - inline_script(task_spec) -> dict
+ - get_script_store()
+"""
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def script_digest(content: str) -> str:
+    """脚本内容的 SHA-256（十六进制）"""
+    return hashlib.sha256((content or '').encode('utf-8')).hexdigest()
+
+
+class ScriptStore:
+    """
+    脚本内容存储（线程安全）
+    - 数据库 ScriptBlob 为持久层，相同内容只写一次
+    - 进程内 LRU 缓存最近使用的脚本，容量由 SCRIPT_STORE_CACHE_SIZE 控制
+    """
+
+    def __init__(self, cache_size: Optional[int] = None):
+        self.cache_size = cache_size or getattr(settings, 'SCRIPT_STORE_CACHE_SIZE', 256)
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, sha: str, content: str):
+        with self._lock:
+            self._cache[sha] = content
+            self._cache.move_to_end(sha)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def put(self, content: str) -> str:
+        """保存脚本内容并返回其哈希，已存在的内容不重复写入"""
+        from apps.executor.models import ScriptBlob
+
+        content = content or ''
+        sha = script_digest(content)
+        with self._lock:
+            if sha in self._cache:
+                self._cache.move_to_end(sha)
+                return sha
+        ScriptBlob.objects.bulk_create(
+            [ScriptBlob(sha256=sha, content=content, size=len(content.encode('utf-8')))],
+            ignore_conflicts=True,
+        )
+        self._remember(sha, content)
+        return sha
+
+    def get(self, sha: str) -> Optional[str]:
+        """按哈希读取脚本内容，不存在时返回 None"""
+        from apps.executor.models import ScriptBlob
+
+        if not sha:
+            return None
+        with self._lock:
+            if sha in self._cache:
+                self._cache.move_to_end(sha)
+                return self._cache[sha]
+        content = ScriptBlob.objects.filter(sha256=sha).values_list('content', flat=True).first()
+        if content is None:
+            logger.warning(f"脚本内容不存在: sha256={sha}")
+            return None
+        self._remember(sha, content)
+        return content
+
+
+_script_store: Optional[ScriptStore] = None
+
+
+def get_script_store() -> ScriptStore:
+    """获取进程内共享的脚本存储"""
+    global _script_store
+    if _script_store is None:
+        _script_store = ScriptStore()
+    return _script_store
+
+
+def compact_script_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    """把参数中的 script_content 存入脚本存储，返回只含 script_sha256 的副本"""
+    if not isinstance(params, dict) or 'script_content' not in params:
+        return params
+    compacted = dict(params)
+    compacted['script_sha256'] = get_script_store().put(compacted.pop('script_content') or '')
+    return compacted
+
+
+def resolve_script_content(params: Dict[str, Any]) -> str:
+    """从执行/步骤参数取脚本内容（旧数据直接保存 script_content）"""
+    if not isinstance(params, dict):
+        return ''
+    if params.get('script_content'):
+        return params['script_content']
+    return get_script_store().get(params.get('script_sha256')) or ''
+
+
+def inline_script(task_spec: Dict[str, Any]) -> Dict[str, Any]:
+    """单任务推送路径：补全只携带哈希的 TaskSpec 的脚本内容"""
+    sha = task_spec.get('script_sha256')
+    if not sha or task_spec.get('command'):
+        return task_spec
+    return {**task_spec, 'command': get_script_store().get(sha) or ''}
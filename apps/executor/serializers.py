@@ -4,6 +4,7 @@
 from rest_framework import serializers
 from drf_spectacular.utils import extend_schema_field
 from .models import ExecutionRecord, ExecutionStep
+from .script_store import resolve_script_content
 from apps.permissions.models import AuditLog
 
 
@@ -164,7 +165,7 @@ class ExecutionRecordDetailSerializer(serializers.ModelSerializer):
 
     @extend_schema_field(serializers.ListField())
     def get_steps(self, obj):
-        steps_qs = obj.steps.all().order_by('step_order')
+        steps_qs = obj.steps.all().order_by('step_order').prefetch_related('host_task_results')
         return ExecutionStepBriefSerializer(steps_qs, many=True).data
 
     @extend_schema_field(serializers.DictField(allow_null=True))
@@ -189,7 +190,7 @@ class ExecutionRecordDetailSerializer(serializers.ModelSerializer):
 
 
 def _extract_step_host_results(step: ExecutionStep):
-    host_results = step.host_results or []
+    host_results = [row.as_dict() for row in step.host_task_results.all()] or step.host_results or []
     if isinstance(host_results, dict):
         host_results = list(host_results.values())
 
@@ -200,7 +201,8 @@ def _extract_step_host_results(step: ExecutionStep):
     if not isinstance(results, dict):
         return []
 
-    step_logs = results.get('step_logs') or {}
+    archive_index = results.get('log_archive') or {}
+    step_logs = (archive_index.get('steps') if isinstance(archive_index, dict) else None) or results.get('step_logs') or {}
     if not isinstance(step_logs, dict):
         return []
 
@@ -298,6 +300,7 @@ class ExecutionStepContentSerializer(serializers.ModelSerializer):
 
     SYSTEM_PARAM_KEYS = {
         'script_content',
+        'script_sha256',
         'script_type',
         'timeout',
         'ignore_error',
@@ -355,7 +358,7 @@ class ExecutionStepContentSerializer(serializers.ModelSerializer):
         return self._get_step_params(obj).get('script_type') or ''
 
     def get_script_content(self, obj):
-        return self._get_step_params(obj).get('script_content') or ''
+        return resolve_script_content(self._get_step_params(obj))
 
     def get_timeout(self, obj):
         return self._get_step_params(obj).get('timeout')
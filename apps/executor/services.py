@@ -1,10 +1,20 @@
 """
 统一的执行记录服务
 """
+import hashlib
 import logging
+import re
+import threading
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.contrib.contenttypes.models import ContentType
-from .models import ExecutionRecord, ExecutionStep
+from .models import ExecutionHostResult, ExecutionLog, ExecutionRecord, ExecutionStep
+from .script_store import resolve_script_content
 from apps.job_templates.variable_service import build_and_render, mask_secrets, build_builtin_vars, normalize_user_vars, validate_required
 from utils.realtime_logs import realtime_log_service
 from ..system_config.models import ConfigManager
@@ -199,6 +209,9 @@ class ExecutionRecordService:
                     step.error_message = error_message
             
             step.save()
+
+            if host_results and status in ['success', 'failed', 'skipped']:
+                ExecutionRecordService.upsert_host_results(step.execution_record, host_results, step=step)
             
             logger.debug(f"更新步骤状态: {step.execution_record.execution_id} - {step.step_name} -> {status}")
             
@@ -206,6 +219,88 @@ class ExecutionRecordService:
             logger.error(f"更新步骤状态失败: {step.execution_record.execution_id} - {step.step_name} - {e}")
             raise
     
+    HOST_RESULT_FIELDS = (
+        'host_name', 'host_ip', 'task_id', 'status', 'exit_code', 'error',
+        'started_at', 'finished_at', 'log_pointer', 'log_size',
+    )
+
+    @staticmethod
+    def _to_datetime(value):
+        """主机结果中的时间可能是 datetime / ISO 字符串 / Unix 秒"""
+        if value is None or value == '':
+            return None
+        if isinstance(value, datetime):
+            return value
+        if isinstance(value, (int, float)) or (isinstance(value, str) and value.isdigit()):
+            try:
+                return datetime.fromtimestamp(int(value), tz=dt_timezone.utc)
+            except (ValueError, OverflowError, OSError):
+                return None
+        return parse_datetime(str(value))
+
+    @staticmethod
+    def upsert_host_results(execution_record, host_results, step=None, step_key=None):
+        """
+        写入主机执行结果（每个 (执行记录, 步骤, 主机) 一行）
+
+        按唯一键单语句 upsert：已有行只更新本次给出的字段，并发的结果消息互不覆盖。
+        Args:
+            host_results: [{'host_id', 'host_name', 'task_id', 'status', 'error', ...}, ...]
+            step: ExecutionStep，快速执行无步骤时为 None
+            step_key: 步骤标识，默认取 step.id，无步骤时为 main
+        """
+        if step_key is None:
+            step_key = str(step.id) if step is not None else 'main'
+
+        # bulk_create 的 update_fields 对整批生效，按给出的字段分组
+        groups = {}
+        for item in host_results or []:
+            if not isinstance(item, dict) or not item.get('host_id'):
+                continue
+            fields = {}
+            for name in ExecutionRecordService.HOST_RESULT_FIELDS:
+                if name not in item:
+                    continue
+                value = item[name]
+                if name in ('started_at', 'finished_at'):
+                    value = ExecutionRecordService._to_datetime(value)
+                elif name in ('host_name', 'host_ip', 'task_id', 'error', 'log_pointer'):
+                    value = str(value) if value is not None else ''
+                fields[name] = value
+            obj = ExecutionHostResult(
+                execution_record=execution_record,
+                step=step,
+                step_key=step_key,
+                host_id=int(item['host_id']),
+                **fields,
+            )
+            groups.setdefault(tuple(sorted(fields)), []).append(obj)
+
+        for field_names, objs in groups.items():
+            ExecutionHostResult.objects.bulk_create(
+                objs,
+                batch_size=500,
+                update_conflicts=True,
+                unique_fields=['execution_record', 'step_key', 'host_id'],
+                update_fields=['step', *field_names, 'updated_at'],
+            )
+
+    @staticmethod
+    def get_host_results(step):
+        """步骤的主机结果：优先读结果表，没有时回退到 host_results JSON（历史数据）"""
+        rows = [row.as_dict() for row in step.host_task_results.all()]
+        return rows or (step.host_results or [])
+
+    @staticmethod
+    def summarize_host_results(**filters):
+        """按状态统计主机结果，如 summarize_host_results(step=step) -> {'success': 3, 'failed': 1}"""
+        from django.db.models import Count
+
+        return {
+            row['status']: row['count']
+            for row in ExecutionHostResult.objects.filter(**filters).values('status').annotate(count=Count('id'))
+        }
+
     @staticmethod
     def get_execution_statistics(execution_type=None, executed_by=None, days=30):
         """获取执行统计"""
@@ -273,21 +368,22 @@ class ExecutionRecordService:
                 return {'success': False, 'error': '只有失败、跳过或超时的步骤才能重试'}
 
             # 根据重试类型或主机ID列表确定要重试的主机
+            step_host_results = ExecutionRecordService.get_host_results(step)
             if host_ids:
                 # 如果指定了主机ID列表，只重试这些主机
                 target_hosts = [
-                    host for host in step.host_results 
+                    host for host in step_host_results 
                     if host.get('host_id') in host_ids
                 ]
             elif retry_type == 'failed_only':
                 # 只重试失败的主机
                 target_hosts = [
-                    host for host in step.host_results 
+                    host for host in step_host_results 
                     if host.get('status') in ['failed', 'timeout']
                 ]
             else:
                 # 重试所有主机
-                target_hosts = step.host_results
+                target_hosts = step_host_results
 
             if not target_hosts:
                 return {'success': False, 'error': '没有需要重试的主机'}
@@ -299,6 +395,7 @@ class ExecutionRecordService:
             step.error_message = ""  # TextField 不允许 NULL，使用空串清理
             step.host_results = []  # 清空之前的结果
             step.save()
+            step.host_task_results.filter(host_id__in=[h.get('host_id') for h in target_hosts]).delete()
 
             # 更新执行记录状态
             execution_record.status = 'running'
@@ -502,7 +599,7 @@ class ExecutionRecordService:
             # 通过Agent执行脚本
             result = AgentExecutionService.execute_script_via_agent(
                 execution_record=execution_record,
-                script_content=step.step_parameters.get('script_content', ''),
+                script_content=resolve_script_content(step.step_parameters),
                 script_type=step.step_parameters.get('script_type', 'shell'),
                 target_hosts=list(target_hosts),
                 timeout=step.step_parameters.get('timeout', 300),
@@ -616,7 +713,7 @@ class ExecutionRecordService:
             target_host_objs = Host.objects.filter(id__in=host_ids)
 
             # 获取步骤参数
-            script_content = step.step_parameters.get('script_content', '')
+            script_content = resolve_script_content(step.step_parameters)
             script_type = step.step_parameters.get('script_type', 'shell')
             timeout = step.step_parameters.get('timeout', 300)
             global_variables = execution_record.execution_parameters.get('global_variables', {})
@@ -655,7 +752,7 @@ class ExecutionRecordService:
             target_host_objs = Host.objects.filter(id__in=host_ids)
 
             # 获取步骤参数
-            script_content = step.step_parameters.get('script_content', '')
+            script_content = resolve_script_content(step.step_parameters)
             script_type = step.step_parameters.get('script_type', 'shell')
             timeout = step.step_parameters.get('timeout', 300)
             global_variables = execution_record.execution_parameters.get('global_variables', {})
@@ -735,3 +832,382 @@ class ExecutionRecordService:
         except Exception as e:
             logger.error(f"文件传输步骤原地重试失败: {str(e)}", exc_info=True)
             return {'success': False, 'error': f'文件传输步骤重试失败: {str(e)}'}
+
+
+class ExecutionLogService:
+    """
+    基于 ExecutionLog 表的日志读取（keyset 游标分页）
+    Redis 日志流被裁剪/过期后，历史日志从这里读取；每页只扫描索引上的 limit 行。
+    """
+
+    @staticmethod
+    def _parse_cursor(cursor):
+        try:
+            return int(cursor) if cursor not in (None, '') else None
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _page(queryset, cursor, limit):
+        cursor_id = ExecutionLogService._parse_cursor(cursor)
+        if cursor_id is not None:
+            queryset = queryset.filter(id__gt=cursor_id)
+        rows = list(queryset.order_by('id')[:limit + 1])
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = str(rows[-1].id) if has_more and rows else None
+        return rows, next_cursor
+
+    @staticmethod
+    def to_entry(log: ExecutionLog):
+        """转换为与 Redis 日志条目相同的字段结构"""
+        return {
+            'id': str(log.id),
+            'timestamp': log.timestamp.isoformat() if log.timestamp else '',
+            'execution_id': str(log.execution_id),
+            'task_id': log.task_id,
+            'host_id': str(log.host_id) if log.host_id is not None else '',
+            'step_name': log.step_name,
+            'step_order': log.step_order,
+            'log_type': log.log_type,
+            'content': log.content,
+        }
+
+    @staticmethod
+    def iter_logs(execution_id, step_order=None, host_id=None, chunk_size=2000):
+        """按 id 游标逐页遍历日志，内存只保留一页"""
+        queryset = ExecutionLog.objects.filter(execution_id=execution_id)
+        if step_order is not None:
+            queryset = queryset.filter(step_order=step_order)
+        if host_id is not None:
+            queryset = queryset.filter(host_id=host_id)
+        return ExecutionLogService.iter_queryset(queryset, chunk_size=chunk_size)
+
+    @staticmethod
+    def iter_queryset(queryset, chunk_size=2000):
+        cursor = None
+        while True:
+            rows, cursor = ExecutionLogService._page(queryset, cursor, chunk_size)
+            for row in rows:
+                yield ExecutionLogService.to_entry(row)
+            if not cursor:
+                break
+
+    @staticmethod
+    def iter_archived_logs(archive_index, step_order=None, host_id=None):
+        """按步骤顺序遍历归档切片，每个切片流式解压"""
+        from utils.log_segment_archive import log_segment_archive
+
+        steps = sorted(
+            (archive_index.get('steps') or {}).values(),
+            key=lambda step: ExecutionLogService._order_key(step.get('step_order')),
+        )
+        for step in steps:
+            if step_order is not None and str(step.get('step_order')) != str(step_order):
+                continue
+            for current_host_id, host_entry in (step.get('hosts') or {}).items():
+                if host_id is not None and str(current_host_id) != str(host_id):
+                    continue
+                for entry in log_segment_archive.iter_entries(archive_index, host_entry):
+                    entry.update({
+                        'step_name': step.get('step_name', ''),
+                        'step_order': step.get('step_order'),
+                        'host_id': current_host_id,
+                        'host_name': host_entry.get('host_name', ''),
+                    })
+                    yield entry
+
+    @staticmethod
+    def _order_key(value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return 0
+
+    @staticmethod
+    def iter_download_logs(execution_record, step_order=None, host_id=None):
+        """下载日志的数据源：优先分段归档，其次 ExecutionLog 表"""
+        results = execution_record.execution_results or {}
+        archive_index = results.get('log_archive') if isinstance(results, dict) else None
+        if archive_index:
+            return ExecutionLogService.iter_archived_logs(archive_index, step_order=step_order, host_id=host_id)
+        return ExecutionLogService.iter_logs(execution_record.execution_id, step_order=step_order, host_id=host_id)
+
+    @staticmethod
+    def format_log_line(entry):
+        host = entry.get('host_name') or entry.get('host_id') or ''
+        return (
+            f"[{entry.get('timestamp', '')}] [{entry.get('step_name', '')}] [{host}] "
+            f"[{entry.get('log_type', 'info')}] {entry.get('content', '')}\n"
+        )
+
+    @staticmethod
+    def stream_gzip(entries, flush_bytes=64 * 1024):
+        """将日志条目边格式化边 gzip 压缩，按块产出字节"""
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        buffer = []
+        size = 0
+        for entry in entries:
+            line = ExecutionLogService.format_log_line(entry).encode('utf-8')
+            buffer.append(line)
+            size += len(line)
+            if size >= flush_bytes:
+                chunk = compressor.compress(b''.join(buffer))
+                buffer, size = [], 0
+                if chunk:
+                    yield chunk
+        tail = compressor.compress(b''.join(buffer)) + compressor.flush()
+        if tail:
+            yield tail
+
+    @staticmethod
+    def get_host_logs(execution_id, step_order, host_id, cursor=None, limit=500):
+        """
+        单主机单步骤日志分页，走 (execution_id, step_order, host_id, id) 索引
+        Returns:
+            dict: {'logs': [...], 'next_cursor': str|None}
+        """
+        queryset = ExecutionLog.objects.filter(
+            execution_id=execution_id,
+            step_order=step_order,
+            host_id=host_id,
+        )
+        rows, next_cursor = ExecutionLogService._page(queryset, cursor, limit)
+        return {
+            'logs': [ExecutionLogService.to_entry(row) for row in rows],
+            'next_cursor': next_cursor,
+        }
+
+    @staticmethod
+    def get_execution_logs(execution_id, cursor=None, limit=500):
+        """
+        整个执行的日志分页，走 (execution_id, id) 索引
+        Returns:
+            dict: {'logs': [...], 'next_cursor': str|None}
+        """
+        queryset = ExecutionLog.objects.filter(execution_id=execution_id)
+        rows, next_cursor = ExecutionLogService._page(queryset, cursor, limit)
+        return {
+            'logs': [ExecutionLogService.to_entry(row) for row in rows],
+            'next_cursor': next_cursor,
+        }
+
+
+class ExecutionLogSearchService:
+    """
+    执行日志搜索（关键字 / 正则）
+    按 (步骤, 主机) 拆分扫描任务提交到专用的有界线程池（不占用执行调度使用的全局线程池），
+    结果按主机聚合并缓存。用户提交的正则可能回溯失控，搜索超时后通知所有扫描任务停止并返回错误。
+
+    配置项:
+        - LOG_SEARCH_CACHE_TTL: 已结束执行的结果缓存时间（秒），默认 600
+        - LOG_SEARCH_MAX_HITS_PER_HOST: 每个主机最多返回的命中行，默认 20
+        - LOG_SEARCH_MAX_QUERY_LENGTH: 查询串最大长度，默认 200
+        - LOG_SEARCH_REGEX_ENABLED: 是否允许正则搜索，默认关闭
+        - LOG_SEARCH_WORKERS: 搜索线程池大小，默认 4
+        - LOG_SEARCH_TIMEOUT: 单次搜索超时（秒），默认 30
+    """
+
+    RUNNING_CACHE_TTL = 10
+
+    _executor = None
+    _executor_lock = threading.Lock()
+
+    @classmethod
+    def get_executor(cls):
+        """日志搜索专用线程池"""
+        if cls._executor is None:
+            with cls._executor_lock:
+                if cls._executor is None:
+                    cls._executor = ThreadPoolExecutor(
+                        max_workers=max(1, getattr(settings, 'LOG_SEARCH_WORKERS', 4)),
+                        thread_name_prefix='log-search',
+                    )
+        return cls._executor
+
+    @staticmethod
+    def compile(query, regex=False, ignore_case=True):
+        """编译查询，非法正则抛出 ValueError"""
+        max_length = getattr(settings, 'LOG_SEARCH_MAX_QUERY_LENGTH', 200)
+        if not query:
+            raise ValueError('搜索关键字不能为空')
+        if len(query) > max_length:
+            raise ValueError(f'搜索关键字过长（最多 {max_length} 个字符）')
+        if regex and not getattr(settings, 'LOG_SEARCH_REGEX_ENABLED', False):
+            raise ValueError('未启用正则搜索，请使用关键字搜索')
+        flags = re.IGNORECASE if ignore_case else 0
+        try:
+            return re.compile(query if regex else re.escape(query), flags)
+        except re.error as e:
+            raise ValueError(f'正则表达式无效: {e}')
+
+    @staticmethod
+    def _cache_key(execution_id, query, regex, ignore_case, context, step_order):
+        digest = hashlib.sha1(
+            f"{query}|{int(bool(regex))}|{int(bool(ignore_case))}|{context}|{step_order}".encode('utf-8')
+        ).hexdigest()
+        return f"executor:log_search:{execution_id}:{digest}"
+
+    @staticmethod
+    def search(execution_record, query, regex=False, ignore_case=True, context=2, step_order=None):
+        """
+        搜索执行日志
+        Returns:
+            dict: {'total_matches', 'matched_hosts', 'hosts': [...], 'cached'}
+        """
+        from django.core.cache import cache
+
+        pattern = ExecutionLogSearchService.compile(query, regex=regex, ignore_case=ignore_case)
+        context = max(0, min(int(context), 10))
+        cache_key = ExecutionLogSearchService._cache_key(
+            execution_record.execution_id, query, regex, ignore_case, context, step_order
+        )
+        try:
+            cached = cache.get(cache_key)
+        except Exception as e:
+            logger.warning(f"读取日志搜索缓存失败: {e}")
+            cached = None
+        if cached is not None:
+            return {**cached, 'cached': True}
+
+        units = ExecutionLogSearchService._scan_units(execution_record, step_order)
+        max_hits = getattr(settings, 'LOG_SEARCH_MAX_HITS_PER_HOST', 20)
+
+        timeout = getattr(settings, 'LOG_SEARCH_TIMEOUT', 30)
+        cancel = threading.Event()
+        executor = ExecutionLogSearchService.get_executor()
+        futures = [
+            executor.submit(ExecutionLogSearchService._scan_unit_in_worker, unit, pattern, context, max_hits, cancel)
+            for unit in units
+        ]
+        _, not_done = wait(futures, timeout=timeout)
+        if not_done:
+            # 通知仍在扫描的任务停止，尚未开始的任务直接取消
+            cancel.set()
+            for future in not_done:
+                future.cancel()
+            logger.warning(
+                f"日志搜索超时: execution_id={execution_record.execution_id}, query={query!r}, regex={bool(regex)}, "
+                f"未完成 {len(not_done)}/{len(units)}"
+            )
+            raise ValueError(f'日志搜索超时（{timeout} 秒），请缩小搜索范围或简化查询')
+        hosts = [future.result() for future in futures]
+
+        hosts = [host for host in hosts if host['match_count']]
+        hosts.sort(key=lambda host: (-host['match_count'], ExecutionLogService._order_key(host['step_order']), str(host['host_id'])))
+        result = {
+            'query': query,
+            'regex': bool(regex),
+            'total_matches': sum(host['match_count'] for host in hosts),
+            'matched_hosts': len(hosts),
+            'scanned_units': len(units),
+            'hosts': hosts,
+        }
+        ttl = getattr(settings, 'LOG_SEARCH_CACHE_TTL', 600) if execution_record.is_completed else ExecutionLogSearchService.RUNNING_CACHE_TTL
+        try:
+            cache.set(cache_key, result, ttl)
+        except Exception as e:
+            logger.warning(f"写入日志搜索缓存失败: {e}")
+        return {**result, 'cached': False}
+
+    @staticmethod
+    def _scan_units(execution_record, step_order=None):
+        """拆分扫描任务：每个 (步骤, 主机) 一个单元"""
+        results = execution_record.execution_results or {}
+        archive_index = results.get('log_archive') if isinstance(results, dict) else None
+        units = []
+        if archive_index:
+            for step in (archive_index.get('steps') or {}).values():
+                if step_order is not None and str(step.get('step_order')) != str(step_order):
+                    continue
+                for host_id, host_entry in (step.get('hosts') or {}).items():
+                    units.append({
+                        'source': 'archive',
+                        'index': archive_index,
+                        'host_entry': host_entry,
+                        'step_order': step.get('step_order'),
+                        'step_name': step.get('step_name', ''),
+                        'host_id': host_id,
+                        'host_name': host_entry.get('host_name', ''),
+                    })
+            return units
+
+        queryset = ExecutionLog.objects.filter(execution_id=execution_record.execution_id)
+        if step_order is not None:
+            queryset = queryset.filter(step_order=step_order)
+        pairs = queryset.order_by().values_list('step_order', 'host_id', 'step_name').distinct()
+        seen = set()
+        for current_step_order, host_id, step_name in pairs:
+            if (current_step_order, host_id) in seen:
+                continue
+            seen.add((current_step_order, host_id))
+            units.append({
+                'source': 'db',
+                'execution_id': execution_record.execution_id,
+                'step_order': current_step_order,
+                'step_name': step_name,
+                'host_id': host_id,
+                'host_name': '',
+            })
+        return units
+
+    @staticmethod
+    def _scan_unit_in_worker(unit, pattern, context, max_hits, cancel=None):
+        from django.db import close_old_connections
+
+        close_old_connections()
+        try:
+            return ExecutionLogSearchService._scan_unit(unit, pattern, context, max_hits, cancel)
+        finally:
+            close_old_connections()
+
+    @staticmethod
+    def _scan_unit(unit, pattern, context, max_hits, cancel=None):
+        if unit['source'] == 'archive':
+            from utils.log_segment_archive import log_segment_archive
+            entries = log_segment_archive.iter_entries(unit['index'], unit['host_entry'])
+        else:
+            queryset = ExecutionLog.objects.filter(execution_id=unit['execution_id'], step_order=unit['step_order'])
+            if unit['host_id'] is None:
+                queryset = queryset.filter(host_id__isnull=True)
+            else:
+                queryset = queryset.filter(host_id=unit['host_id'])
+            entries = ExecutionLogService.iter_queryset(queryset)
+
+        before = deque(maxlen=context)
+        hits = []
+        waiting_after = []
+        match_count = 0
+        for line_no, entry in enumerate(entries, start=1):
+            if cancel is not None and cancel.is_set():
+                break
+            content = entry.get('content') or ''
+            for hit in waiting_after:
+                hit['after'].append(content)
+            waiting_after = [hit for hit in waiting_after if len(hit['after']) < context]
+
+            if pattern.search(content):
+                match_count += 1
+                if len(hits) < max_hits:
+                    hit = {
+                        'line': line_no,
+                        'timestamp': entry.get('timestamp', ''),
+                        'log_type': entry.get('log_type', ''),
+                        'content': content,
+                        'before': list(before),
+                        'after': [],
+                    }
+                    hits.append(hit)
+                    if context:
+                        waiting_after.append(hit)
+            before.append(content)
+
+        return {
+            'step_order': unit['step_order'],
+            'step_name': unit['step_name'],
+            'host_id': str(unit['host_id']) if unit['host_id'] is not None else '',
+            'host_name': unit['host_name'],
+            'match_count': match_count,
+            'hits': hits,
+            'truncated': match_count > len(hits),
+        }
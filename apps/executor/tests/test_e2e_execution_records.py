@@ -788,12 +788,15 @@ def test_log_pointer_respects_limit(monkeypatch):
     assert [log["content"] for log in logs] == ["c", "d", "e"]
 
 
-def test_archive_logs_preserves_all_entries_on_cancel(monkeypatch, db):
+def test_archive_logs_preserves_all_entries_on_cancel(monkeypatch, db, settings, tmp_path):
     """
     取消后归档：大量日志被截断时，archive_execution_logs 仍应按正序写入全部已产生的日志。
     使用假 Redis 数据模拟 cancel，并校验 log_count / 顺序。
     """
     from utils.log_archive_service import log_archive_service, LogArchiveService
+    from utils.log_segment_archive import log_segment_archive
+
+    settings.EXECUTION_LOGS_DIR = str(tmp_path)
 
     user = User.objects.create_superuser(f"super-{uuid.uuid4().hex[:6]}", "a@example.com", "pass")
     record = ExecutionRecord.objects.create(
@@ -836,18 +839,20 @@ def test_archive_logs_preserves_all_entries_on_cancel(monkeypatch, db):
 
     record.refresh_from_db()
     results = record.execution_results or {}
-    stored_logs = results.get("logs", [])
-    assert len(stored_logs) == len(logs_data)
+    # 执行记录只保存索引，不再内联日志正文
+    assert "logs" not in results and "step_logs" not in results
+    archive_index = results.get("log_archive") or {}
+    assert archive_index.get("total_lines") == len(logs_data)
+    assert archive_index.get("final_status") == "cancelled"
+    first_step = next(iter(archive_index["steps"].values()))
+    hl = first_step["hosts"]["h1"]
+    assert hl.get("log_count") == len(logs_data)
+    assert hl.get("status") == "failed"
+
+    stored_logs = log_segment_archive.read_host_logs(archive_index, "h1", step_order=1)
+    assert [log["content"] for log in stored_logs] == [f"line-{i}" for i in range(200)]
     # 日志按时间正序
     assert stored_logs[0]["timestamp"] <= stored_logs[-1]["timestamp"]
-    step_logs = results.get("step_logs", {})
-    assert step_logs, "step_logs 未生成"
-    first_step = next(iter(step_logs.values()))
-    host_logs = first_step.get("host_logs") or first_step.get("hosts") or {}
-    assert host_logs, "host_logs 未生成"
-    hl = next(iter(host_logs.values()))
-    assert hl.get("log_count") == len(logs_data)
-    assert "cancelled" in json.dumps(results.get("status_updates", status_data))
 
 def test_plan_file_transfer_with_server_source(control_plane_env, api_client, disable_debug_toolbar):
     """
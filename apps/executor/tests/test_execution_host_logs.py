@@ -74,3 +74,129 @@ def test_host_logs_pointer_returns_next(monkeypatch, admin_client):
     assert "next_pointer" in data
     assert "b" in data["logContent"]
     assert data["next_pointer"].startswith("redis:agent_logs/999@")
+
+
+def test_pointer_reads_execution_shard_when_present(monkeypatch):
+    calls = []
+
+    class FakeRedis:
+        def exists(self, key):
+            return 1 if key == "agent_logs:999" else 0
+
+        def xrevrange(self, key, max="+", count=500):
+            calls.append((key, count))
+            return [
+                ("2-0", {"host_id": "1", "step_order": 1, "step_name": "s", "content": "b", "timestamp": "t2"}),
+                ("1-0", {"host_id": "1", "step_order": 1, "step_name": "s", "content": "a", "timestamp": "t1"}),
+            ]
+
+    monkeypatch.setattr(realtime_log_service, "redis_client", FakeRedis())
+    monkeypatch.setattr(realtime_log_service, "log_shard_enabled", True)
+
+    logs = realtime_log_service.get_logs_by_pointer("redis:agent_logs/999@", limit=10)
+
+    assert calls == [("agent_logs:999", 10)]
+    assert [log["content"] for log in logs] == ["a", "b"]
+
+
+def test_pointer_falls_back_to_unified_stream_without_shard(monkeypatch):
+    calls = []
+
+    class FakeRedis:
+        def exists(self, key):
+            return 0
+
+        def xrevrange(self, key, max="+", count=500):
+            calls.append(key)
+            return [
+                ("2-0", {"execution_id": "998", "content": "other", "step_order": 1}),
+                ("1-0", {"execution_id": "999", "content": "mine", "step_order": 1}),
+            ]
+
+    monkeypatch.setattr(realtime_log_service, "redis_client", FakeRedis())
+    monkeypatch.setattr(realtime_log_service, "log_shard_enabled", True)
+
+    logs = realtime_log_service.get_logs_by_pointer("redis:agent_logs/999@", limit=10)
+
+    assert calls == ["agent_logs"]
+    assert [log["content"] for log in logs] == ["mine"]
+
+
+@pytest.mark.django_db
+def test_host_logs_reads_execution_log_table_with_cursor(monkeypatch, admin_client):
+    from apps.executor.models import ExecutionLog
+
+    client, user = admin_client
+    host = Host.objects.create(name="host-db-log", os_type="linux", device_type="physical", created_by=user)
+    record = ExecutionRecord.objects.create(
+        execution_type="quick_script",
+        name="db-log-record",
+        status="success",
+        executed_by=user,
+        execution_results={},
+    )
+    step = ExecutionStep.objects.create(
+        execution_record=record, step_name="step-1", step_type="script", step_order=1, status="success"
+    )
+    ExecutionLog.objects.bulk_create([
+        ExecutionLog(execution_id=record.execution_id, task_id="", host_id=host.id, step_order=1, content=f"line-{i}")
+        for i in range(5)
+    ] + [ExecutionLog(execution_id=record.execution_id, task_id="", host_id=host.id + 1, step_order=1, content="other")])
+
+    url = f"/api/executor/execution-records/{record.id}/steps/{step.id}/hosts/{host.id}/logs/"
+    first = client.get(url, {"limit": 3}).data["content"]
+    assert "line-0" in first["log_context"] and "line-2" in first["log_context"]
+    assert "line-3" not in first["log_context"] and "other" not in first["log_context"]
+    assert first["finished"] is False and first["next_cursor"]
+
+    second = client.get(url, {"limit": 3, "cursor": first["next_cursor"]}).data["content"]
+    assert "line-3" in second["log_context"] and "line-4" in second["log_context"]
+    assert second["finished"] is True and second["next_cursor"] is None
+
+
+@pytest.mark.django_db
+def test_download_logs_streams_gzip_filtered_by_host(admin_client):
+    import gzip
+
+    from apps.executor.models import ExecutionLog
+
+    client, user = admin_client
+    record = ExecutionRecord.objects.create(
+        execution_type="quick_script", name="download-record", status="success", executed_by=user, execution_results={}
+    )
+    ExecutionLog.objects.bulk_create(
+        [ExecutionLog(execution_id=record.execution_id, task_id="", host_id=1, step_order=1, step_name="s", content=f"h1-{i}") for i in range(3)]
+        + [ExecutionLog(execution_id=record.execution_id, task_id="", host_id=2, step_order=1, step_name="s", content="h2-0")]
+    )
+
+    resp = client.get(f"/api/executor/execution-records/{record.id}/logs/download/", {"host_id": 1})
+
+    assert resp.status_code == 200
+    assert resp["Content-Type"] == "application/gzip"
+    text = gzip.decompress(b"".join(resp.streaming_content)).decode()
+    assert [line.rsplit(" ", 1)[-1] for line in text.splitlines()] == ["h1-0", "h1-1", "h1-2"]
+
+
+@pytest.mark.django_db
+def test_download_logs_reads_segment_archive(admin_client, settings, tmp_path):
+    import gzip
+
+    from utils.log_segment_archive import log_segment_archive
+
+    settings.EXECUTION_LOGS_DIR = str(tmp_path)
+    client, user = admin_client
+    record = ExecutionRecord.objects.create(
+        execution_type="quick_script", name="download-archive", status="success", executed_by=user, execution_results={}
+    )
+    logs = [
+        {"timestamp": f"t{i}", "host_id": "5", "host_name": "web-5", "step_order": order, "step_name": f"s{order}", "content": f"{order}-{i}"}
+        for order in (2, 1) for i in range(2)
+    ]
+    record.execution_results = {"log_archive": log_segment_archive.write(record.execution_id, logs)}
+    record.save(update_fields=["execution_results"])
+
+    resp = client.get(f"/api/executor/execution-records/{record.id}/logs/download/")
+
+    text = gzip.decompress(b"".join(resp.streaming_content)).decode()
+    assert [line.rsplit(" ", 1)[-1] for line in text.splitlines()] == ["1-0", "1-1", "2-0", "2-1"]
+    assert "[web-5]" in text
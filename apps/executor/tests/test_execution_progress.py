@@ -0,0 +1,87 @@
+import pytest
+from django.contrib.auth.models import User
+
+from apps.executor.models import ExecutionRecord
+from apps.executor.progress import ExecutionProgressCounter, summarize_counts
+
+
+class _HashStore:
+    """只实现 flush 用到的几个命令"""
+
+    def __init__(self, hashes, dirty):
+        self.hashes = hashes
+        self.dirty = set(dirty)
+
+    def spop(self, key, count):
+        popped = [self.dirty.pop() for _ in range(min(count, len(self.dirty)))]
+        return popped
+
+    def sadd(self, key, *members):
+        self.dirty.update(members)
+
+    def pipeline(self, transaction=False):
+        store = self
+        results = []
+
+        class _Pipe:
+            def hgetall(self, key):
+                results.append(dict(store.hashes.get(key, {})))
+
+            def execute(self):
+                return results
+
+        return _Pipe()
+
+
+def test_summarize_counts_treats_timeout_and_cancelled_as_failed():
+    summary = summarize_counts({"total": "10", "success": "4", "failed": "1", "timeout": "1", "cancelled": "1", "running": "2"})
+    assert summary == {
+        "total_hosts": 10,
+        "success_hosts": 4,
+        "failed_hosts": 3,
+        "running_hosts": 2,
+        "pending_hosts": 1,
+        "progress": 70,
+    }
+    assert summarize_counts({})["progress"] == 0
+
+
+@pytest.mark.django_db
+def test_flush_writes_only_counter_columns():
+    user = User.objects.create_user(username="progress-user", password="pass")
+    record = ExecutionRecord.objects.create(
+        execution_type="quick_script", name="p", executed_by=user, status="running",
+        execution_results={"logs_meta": {"stream": "x"}},
+    )
+    store = _HashStore(
+        {f"exec_progress:{record.execution_id}": {"total": "3", "success": "1", "failed": "1", "running": "1"}},
+        [str(record.execution_id)],
+    )
+
+    assert ExecutionProgressCounter(redis_client=store).flush() == 1
+    assert store.dirty == set()
+
+    record.refresh_from_db()
+    assert (record.total_hosts, record.success_hosts, record.failed_hosts, record.running_hosts) == (3, 1, 1, 1)
+    assert record.execution_results == {"logs_meta": {"stream": "x"}}
+
+
+@pytest.mark.django_db
+def test_failed_flush_puts_executions_back_in_dirty_set(monkeypatch):
+    user = User.objects.create_user(username="progress-retry", password="pass")
+    record = ExecutionRecord.objects.create(execution_type="quick_script", name="p", executed_by=user, status="running")
+    store = _HashStore({f"exec_progress:{record.execution_id}": {"total": "2", "success": "2"}}, [str(record.execution_id)])
+    counter = ExecutionProgressCounter(redis_client=store)
+
+    def broken_update(self, **kwargs):
+        raise RuntimeError("database is down")
+
+    with monkeypatch.context() as patch:
+        patch.setattr("django.db.models.query.QuerySet.update", broken_update)
+        with pytest.raises(RuntimeError):
+            counter.flush()
+    assert store.dirty == {str(record.execution_id)}
+
+    assert counter.flush() == 1
+    record.refresh_from_db()
+    assert (record.total_hosts, record.success_hosts) == (2, 2)
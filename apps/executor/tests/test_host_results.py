@@ -0,0 +1,55 @@
+import pytest
+from django.contrib.auth.models import User
+
+from apps.agents.execution_service import AgentExecutionService
+from apps.executor.models import ExecutionHostResult, ExecutionRecord, ExecutionStep
+from apps.executor.serializers import ExecutionStepResultSerializer
+from apps.hosts.models import Host
+
+
+@pytest.fixture()
+def workflow_step(db):
+    user = User.objects.create_user(username="host-result-user", password="pass")
+    hosts = [
+        Host.objects.create(name=f"hr-{i}", os_type="linux", device_type="physical", created_by=user)
+        for i in range(2)
+    ]
+    record = ExecutionRecord.objects.create(execution_type="job_workflow", name="wf", executed_by=user, status="running")
+    step = ExecutionStep.objects.create(
+        execution_record=record, step_name="step-1", step_type="script", step_order=1, status="running"
+    )
+    return record, step, hosts
+
+
+def _task_id(record, step, host):
+    return f"{record.execution_id}_{step.id}_{host.id}_abcd1234"
+
+
+def test_results_upsert_one_row_per_host(workflow_step):
+    record, step, hosts = workflow_step
+    task_ids = AgentExecutionService._register_host_tasks(record, str(step.id), hosts)
+    assert ExecutionHostResult.objects.filter(step=step, status="pending").count() == 2
+
+    for host in hosts:
+        AgentExecutionService.handle_task_result(task_ids[host.id], {"status": "success", "exit_code": 0, "finished_at": 1700000000})
+    AgentExecutionService.handle_task_result(task_ids[hosts[0].id], {"status": "success", "exit_code": 0})
+
+    rows = ExecutionHostResult.objects.filter(step=step).order_by("host_id")
+    assert [(r.host_id, r.status, r.exit_code, r.host_name) for r in rows] == [
+        (hosts[0].id, "success", 0, "hr-0"),
+        (hosts[1].id, "success", 0, "hr-1"),
+    ]
+    step.refresh_from_db()
+    assert step.status == "success"
+    assert [h["status"] for h in ExecutionStepResultSerializer(step).data["hosts"]] == ["success", "success"]
+
+
+def test_late_success_does_not_hide_failed_host(workflow_step):
+    record, step, hosts = workflow_step
+    AgentExecutionService.handle_task_result(_task_id(record, step, hosts[0]), {"status": "failed", "error_msg": "boom"})
+    AgentExecutionService.handle_task_result(_task_id(record, step, hosts[1]), {"status": "success"})
+
+    step.refresh_from_db()
+    record.refresh_from_db()
+    assert step.status == "failed" and record.status == "failed"
+    assert ExecutionHostResult.objects.get(step=step, host_id=hosts[0].id).error == "boom"
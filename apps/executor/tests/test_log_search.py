@@ -0,0 +1,98 @@
+import time
+
+import pytest
+from django.contrib.auth.models import User
+
+from apps.executor.models import ExecutionLog, ExecutionRecord
+from apps.executor.services import ExecutionLogSearchService
+from utils.log_segment_archive import log_segment_archive
+
+
+@pytest.fixture()
+def locmem_cache(settings):
+    settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "log-search"}}
+    from django.core.cache import cache
+    cache.clear()
+
+
+def _record(name, **kwargs):
+    user = User.objects.create_user(username=f"u-{name}", password="pass")
+    return ExecutionRecord.objects.create(
+        execution_type="quick_script", name=name, status="success", executed_by=user, **kwargs
+    )
+
+
+@pytest.mark.django_db
+def test_search_archive_groups_hosts_by_match_count_and_caches(settings, tmp_path, locmem_cache):
+    settings.EXECUTION_LOGS_DIR = str(tmp_path)
+    record = _record("search-archive", execution_results={})
+    logs = []
+    for host_id, lines in {"1": ["ok", "ok"], "2": ["boot", "Killed: OOM", "ok", "OOM again"], "3": ["OOM", "tail"]}.items():
+        logs += [
+            {"timestamp": f"t{i}", "host_id": host_id, "host_name": f"h{host_id}", "step_order": 1, "step_name": "s", "content": line}
+            for i, line in enumerate(lines)
+        ]
+    record.execution_results = {"log_archive": log_segment_archive.write(record.execution_id, logs)}
+    record.save(update_fields=["execution_results"])
+
+    result = ExecutionLogSearchService.search(record, "oom", context=1)
+
+    assert result["total_matches"] == 3
+    assert [host["host_id"] for host in result["hosts"]] == ["2", "3"]
+    first = result["hosts"][0]["hits"][0]
+    assert first["line"] == 2 and first["before"] == ["boot"] and first["after"] == ["ok"]
+    assert ExecutionLogSearchService.search(record, "oom", context=1)["cached"] is True
+
+
+# 扫描在搜索线程池中进行，需要已提交的数据
+@pytest.mark.django_db(transaction=True)
+def test_search_execution_log_table_with_regex(settings, locmem_cache):
+    settings.LOG_SEARCH_REGEX_ENABLED = True
+    record = _record("search-db", execution_results={})
+    ExecutionLog.objects.bulk_create([
+        ExecutionLog(execution_id=record.execution_id, task_id="", host_id=7, step_order=1, content="exit code 137"),
+        ExecutionLog(execution_id=record.execution_id, task_id="", host_id=7, step_order=1, content="exit code 0"),
+    ])
+
+    result = ExecutionLogSearchService.search(record, r"exit code [1-9]\d*", regex=True, context=0)
+
+    assert result["matched_hosts"] == 1
+    assert result["hosts"][0]["hits"][0]["content"] == "exit code 137"
+
+
+def test_invalid_or_disabled_regex_is_rejected(settings):
+    settings.LOG_SEARCH_REGEX_ENABLED = False
+    with pytest.raises(ValueError, match="未启用正则"):
+        ExecutionLogSearchService.compile("(a+)+$", regex=True)
+    settings.LOG_SEARCH_REGEX_ENABLED = True
+    with pytest.raises(ValueError):
+        ExecutionLogSearchService.compile("(", regex=True)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_search_times_out_and_stops_scanners(settings, monkeypatch, locmem_cache):
+    settings.LOG_SEARCH_TIMEOUT = 0.2
+    record = _record("search-timeout", execution_results={})
+    ExecutionLog.objects.bulk_create([
+        ExecutionLog(execution_id=record.execution_id, task_id="", host_id=host_id, step_order=1, content="line")
+        for host_id in range(3)
+    ])
+    stopped = []
+
+    def stuck_scan(unit, pattern, context, max_hits, cancel=None):
+        # 模拟回溯失控的正则：直到被通知停止
+        cancel.wait(5)
+        stopped.append(unit["host_id"])
+        return {"match_count": 0}
+
+    monkeypatch.setattr(ExecutionLogSearchService, "_scan_unit", staticmethod(stuck_scan))
+
+    started = time.monotonic()
+    with pytest.raises(ValueError, match="超时"):
+        ExecutionLogSearchService.search(record, "line")
+    assert time.monotonic() - started < 1
+
+    deadline = time.monotonic() + 2
+    while len(stopped) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert sorted(stopped) == [0, 1, 2]
@@ -0,0 +1,42 @@
+import gzip
+
+from utils.log_segment_archive import LogSegmentArchive
+
+
+def _logs(step_order, host_id, count, prefix):
+    return [
+        {
+            "timestamp": f"2026-01-01T00:00:{i:02d}",
+            "host_id": host_id,
+            "host_name": f"host-{host_id}",
+            "log_type": "stderr" if i == count - 1 else "stdout",
+            "content": f"{prefix}-{i}",
+            "step_name": f"step-{step_order}",
+            "step_order": step_order,
+        }
+        for i in range(count)
+    ]
+
+
+def test_reads_only_requested_slice_across_rolled_segments(tmp_path, settings):
+    settings.EXECUTION_LOG_SEGMENT_MAX_BYTES = 1
+    archive = LogSegmentArchive(base_dir=str(tmp_path), storage_type="")
+    logs = _logs(1, "1", 5, "a") + _logs(1, "2", 3, "b") + _logs(2, "1", 4, "c")
+
+    index = archive.write(77, logs)
+
+    assert index["total_lines"] == 12
+    assert len(index["segments"]) == 3
+    entry = archive.find_host_entry(index, "2", step_order="1")
+    assert entry["log_count"] == 3 and entry["error_lines"] == 1
+    assert [e["content"] for e in archive.read_entries(index, entry)] == ["b-0", "b-1", "b-2"]
+    assert [e["content"] for e in archive.read_host_logs(index, "1", step_order=2)] == [f"c-{i}" for i in range(4)]
+
+
+def test_segment_file_is_plain_multi_member_gzip(tmp_path):
+    archive = LogSegmentArchive(base_dir=str(tmp_path), storage_type="")
+    index = archive.write(78, _logs(1, "1", 2, "a") + _logs(1, "2", 2, "b"))
+
+    assert index["segments"] == ["seg-00000.log.gz"]
+    raw = gzip.decompress((tmp_path / "78" / "seg-00000.log.gz").read_bytes()).decode()
+    assert raw.count("\n") == 4
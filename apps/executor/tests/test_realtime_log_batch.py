@@ -0,0 +1,55 @@
+from utils.realtime_logs import RealtimeLogService
+
+
+class FakePipeline:
+    def __init__(self, owner):
+        self.owner = owner
+        self.ops = []
+
+    def xadd(self, key, fields, **kwargs):
+        self.ops.append(("xadd", key, dict(fields), kwargs))
+
+    def expire(self, key, seconds):
+        self.ops.append(("expire", key, seconds, {}))
+
+    def execute(self):
+        self.owner.round_trips += 1
+        self.owner.ops.extend(self.ops)
+        return [f"{i}-0" if op[0] == "xadd" else True for i, op in enumerate(self.ops)]
+
+
+class FakeRedis:
+    def __init__(self):
+        self.ops = []
+        self.round_trips = 0
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+    def ping(self):
+        raise AssertionError("push path should not ping per call")
+
+
+def _service(monkeypatch, **overrides):
+    service = RealtimeLogService()
+    fake = FakeRedis()
+    monkeypatch.setattr(service, "redis_client", fake)
+    for key, value in overrides.items():
+        setattr(service, key, value)
+    return service, fake
+
+
+def test_push_logs_batch_uses_single_pipelined_round_trip(monkeypatch):
+    service, fake = _service(monkeypatch)
+
+    written = service.push_logs_batch("42", "7", [{"content": f"line-{i}"} for i in range(5)])
+
+    assert written == 5
+    assert fake.round_trips == 1
+    unified = [op for op in fake.ops if op[0] == "xadd" and op[1] == service.log_stream_key]
+    shard = [op for op in fake.ops if op[0] == "xadd" and op[1] == service.execution_log_stream_key("42")]
+    assert [op[2]["content"] for op in unified] == [f"line-{i}" for i in range(5)]
+    assert len(shard) == 5
+    assert all(op[3].get("approximate") for op in unified + shard)
+    assert sum(1 for op in fake.ops if op[0] == "expire") == 1
+
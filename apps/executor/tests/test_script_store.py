@@ -0,0 +1,80 @@
+from types import SimpleNamespace
+
+import pytest
+
+from apps.agents.execution_service import AgentExecutionService
+from apps.executor.models import ScriptBlob
+from apps.executor.script_store import (
+    ScriptStore,
+    compact_script_params,
+    inline_script,
+    resolve_script_content,
+    script_digest,
+)
+
+
+class _CachingAgentServer:
+    """模拟 Agent-Server 的脚本缓存：未缓存且未随请求发送的脚本返回 missing_scripts"""
+
+    def __init__(self):
+        self.known_scripts = set()
+        self.cache = {}
+        self.sent_scripts = []
+
+    def dispatch_tasks(self, base_url, items, timeout=None, scripts=None):
+        self.sent_scripts.append(dict(scripts or {}))
+        self.cache.update(scripts or {})
+        results, missing = [], []
+        for item in items:
+            sha = item["task"]["script_sha256"]
+            if sha in self.cache:
+                results.append({"task_id": item["task"]["id"], "status": "dispatched"})
+            else:
+                results.append({"task_id": item["task"]["id"], "error": "script not cached"})
+                missing.append(sha)
+        body = {"results": results, "missing_scripts": sorted(set(missing))}
+        return SimpleNamespace(status_code=200, json=lambda: body, text="")
+
+
+@pytest.mark.django_db
+def test_identical_scripts_are_stored_once():
+    store = ScriptStore()
+    sha = store.put("echo hi")
+
+    assert sha == script_digest("echo hi")
+    assert ScriptStore().put("echo hi") == sha
+    assert ScriptBlob.objects.count() == 1
+    # 新进程（空缓存）从数据库读回
+    assert ScriptStore().get(sha) == "echo hi"
+
+
+@pytest.mark.django_db
+def test_params_keep_only_the_hash():
+    params = compact_script_params({"script_content": "uptime", "timeout": 10})
+
+    assert params == {"script_sha256": script_digest("uptime"), "timeout": 10}
+    assert resolve_script_content(params) == "uptime"
+    assert resolve_script_content({"script_content": "legacy"}) == "legacy"
+    assert inline_script({"id": "t", "command": "", "script_sha256": params["script_sha256"]})["command"] == "uptime"
+
+
+@pytest.mark.django_db
+def test_bulk_dispatch_sends_each_script_once_and_resends_on_cache_miss():
+    sha = ScriptStore().put("date")
+    payload = [
+        {"agent_id": str(i), "task": {"id": f"t{i}", "command": "", "script_sha256": sha}}
+        for i in range(3)
+    ]
+    client = _CachingAgentServer()
+    server = SimpleNamespace(base_url="http://agent-server")
+
+    first = AgentExecutionService._send_bulk_chunk(client, server, payload)
+    second = AgentExecutionService._send_bulk_chunk(client, server, payload)
+    assert all(r["success"] for r in {**first, **second}.values())
+    assert client.sent_scripts == [{sha: "date"}, {}]
+
+    # Agent-Server 重启丢失缓存后补发一次脚本
+    client.cache.clear()
+    third = AgentExecutionService._send_bulk_chunk(client, server, payload)
+    assert all(r["success"] for r in third.values())
+    assert client.sent_scripts[2:] == [{}, {sha: "date"}]
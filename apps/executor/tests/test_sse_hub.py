@@ -0,0 +1,59 @@
+import asyncio
+
+from utils.sse_hub import SSEFanoutHub, StreamSubscription
+
+
+def _register(hub, sub):
+    for key in sub.streams:
+        hub._cursors.setdefault(key, "0-0")
+        hub._subs.setdefault(key, {}).setdefault(sub.execution_id, set()).add(sub)
+
+
+def test_dispatch_routes_unified_stream_by_execution_id():
+    async def run():
+        hub = SSEFanoutHub()
+        mine = StreamSubscription("1", {"agent_logs": None}, ["agent_logs"], maxsize=10)
+        other = StreamSubscription("2", {"agent_logs": None}, ["agent_logs"], maxsize=10)
+        _register(hub, mine)
+        _register(hub, other)
+
+        hub._dispatch("agent_logs", "1-0", {"execution_id": "1", "content": "a"})
+        hub._dispatch("agent_logs", "2-0", {"execution_id": "2", "content": "b"})
+
+        item = await mine.get(timeout=0.1)
+        assert item == ("agent_logs", "1-0", {"execution_id": "1", "content": "a"})
+        assert await mine.get(timeout=0.05) is None
+        assert (await other.get(timeout=0.1))[1] == "2-0"
+
+    asyncio.run(run())
+
+
+def test_subscription_skips_already_delivered_ids():
+    async def run():
+        sub = StreamSubscription("1", {"agent_logs:1": "5-0"}, [], maxsize=10)
+        sub._backlog.append(("agent_logs:1", "6-0", {"content": "catch-up"}))
+        sub.offer("agent_logs:1", "6-0", {"content": "catch-up"})
+        sub.offer("agent_logs:1", "7-0", {"content": "live"})
+
+        assert (await sub.get(timeout=0.1))[1] == "6-0"
+        assert (await sub.get(timeout=0.1))[1] == "7-0"
+        assert await sub.get(timeout=0.05) is None
+        assert sub.last_ids["agent_logs:1"] == "7-0"
+
+    asyncio.run(run())
+
+
+def test_slow_subscriber_is_evicted():
+    async def run():
+        hub = SSEFanoutHub()
+        sub = StreamSubscription("1", {"agent_logs:1": None}, [], maxsize=2)
+        _register(hub, sub)
+
+        for i in range(3):
+            hub._dispatch("agent_logs:1", f"{i + 1}-0", {"execution_id": "1"})
+
+        assert sub.evicted
+        assert not hub._subs["agent_logs:1"]["1"]
+        assert await sub.get(timeout=0.05) is None
+
+    asyncio.run(run())
@@ -7,6 +7,7 @@ from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import Q
+from django.http import StreamingHttpResponse
 from django.contrib.contenttypes.models import ContentType
 from utils.pagination import CustomPagination
 from utils.responses import SycResponse
@@ -20,7 +21,8 @@ from .serializers import (
 )
 from .filters import ExecutionRecordFilter
 from apps.permissions.permissions import ExecutionRecordPermission
-from apps.executor.services import ExecutionRecordService
+from apps.executor.progress import get_progress_counter, summarize_counts
+from apps.executor.services import ExecutionLogSearchService, ExecutionLogService, ExecutionRecordService
 from apps.agents.execution_service import AgentExecutionService
 from apps.hosts.models import Host
 from apps.permissions.models import AuditLog
@@ -106,6 +108,21 @@ class ExecutionRecordViewSet(viewsets.ReadOnlyModelViewSet):
             message='执行记录详情获取成功'
         )
 
+    @action(detail=True, methods=['get'])
+    def progress(self, request, pk=None):
+        """获取执行进度（优先读取 Redis 实时计数，计数过期后回退到数据库中的计数列）"""
+        execution_record = self.get_object()
+        content = get_progress_counter().get(execution_record.execution_id)
+        if content is None:
+            content = summarize_counts({
+                'total': execution_record.total_hosts,
+                'success': execution_record.success_hosts,
+                'failed': execution_record.failed_hosts,
+                'running': execution_record.running_hosts,
+            })
+        content['status'] = execution_record.status
+        return SycResponse.success(content=content, message='执行进度获取成功')
+
     @action(detail=True, methods=['get'])
     def logs(self, request, pk=None):
         """基于 log_pointer 获取历史日志（聚合后的 step_logs）"""
@@ -117,26 +134,100 @@ class ExecutionRecordViewSet(viewsets.ReadOnlyModelViewSet):
         except Exception:
             limit = 500
 
-        pointer = request.query_params.get('pointer')
+        cursor = request.query_params.get('cursor')
+        explicit_pointer = request.query_params.get('pointer')
+        pointer = explicit_pointer
         logs_meta = {}
         if isinstance(execution_record.execution_results, dict):
             logs_meta = execution_record.execution_results.get('logs_meta', {}) or {}
             pointer = pointer or logs_meta.get('log_pointer')
 
-        if not pointer:
-            return SycResponse.error(message='缺少日志指针，无法回源')
+        result = {'success': False, 'message': '缺少日志指针，无法回源'}
+        if pointer and not cursor:
+            result = log_archive_service.get_execution_logs_by_pointer(pointer, limit=limit)
+            if result.get('success'):
+                content = result['data']
+                content['logs_meta'] = {**logs_meta, 'log_pointer': pointer}
+                return SycResponse.success(
+                    content=content,
+                    message='历史日志获取成功'
+                )
 
-        result = log_archive_service.get_execution_logs_by_pointer(pointer, limit=limit)
-        if result.get('success'):
-            content = result['data']
-            content['logs_meta'] = {**logs_meta, 'log_pointer': pointer}
-            return SycResponse.success(
-                content=content,
-                message='历史日志获取成功'
-            )
+        # Redis 日志已过期/裁剪，或客户端使用游标翻页：从 ExecutionLog 表按游标读取
+        if cursor or not explicit_pointer:
+            page = ExecutionLogService.get_execution_logs(execution_record.execution_id, cursor=cursor, limit=limit)
+            if page['logs'] or cursor:
+                step_logs, summary = log_archive_service.aggregate_log_entries(page['logs'])
+                return SycResponse.success(
+                    content={
+                        'step_logs': step_logs,
+                        'summary': summary,
+                        'log_size': len(page['logs']),
+                        'next_cursor': page['next_cursor'],
+                        'logs_meta': logs_meta,
+                    },
+                    message='历史日志获取成功'
+                )
 
         return SycResponse.error(message=result.get('message', '历史日志获取失败'))
 
+    @action(detail=True, methods=['get'], url_path='logs/download')
+    def download_logs(self, request, pk=None):
+        """流式下载完整执行日志（gzip），可按 step_order / host_id 过滤"""
+        execution_record = self.get_object()
+        step_order = request.query_params.get('step_order') or None
+        host_id = request.query_params.get('host_id') or None
+        if step_order is not None and _maybe_int_id(step_order) is None:
+            return SycResponse.error(message='step_order 参数无效')
+        if host_id is not None and _maybe_int_id(host_id) is None:
+            return SycResponse.error(message='host_id 参数无效')
+
+        entries = ExecutionLogService.iter_download_logs(
+            execution_record,
+            step_order=_maybe_int_id(step_order) if step_order is not None else None,
+            host_id=_maybe_int_id(host_id) if host_id is not None else None,
+        )
+        response = StreamingHttpResponse(ExecutionLogService.stream_gzip(entries), content_type='application/gzip')
+        filename = f"execution-{execution_record.execution_id}"
+        if step_order is not None:
+            filename += f"-step{step_order}"
+        if host_id is not None:
+            filename += f"-host{host_id}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}.log.gz"'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    @action(detail=True, methods=['get'], url_path='logs/search')
+    def search_logs(self, request, pk=None):
+        """搜索执行日志（关键字/正则），按主机聚合命中行与上下文"""
+        execution_record = self.get_object()
+        query = request.query_params.get('q', '')
+        regex = request.query_params.get('regex') in ('1', 'true', 'True')
+        ignore_case = request.query_params.get('ignore_case', '1') in ('1', 'true', 'True')
+        step_order = request.query_params.get('step_order') or None
+        if step_order is not None and _maybe_int_id(step_order) is None:
+            return SycResponse.error(message='step_order 参数无效')
+        context = _maybe_int_id(request.query_params.get('context', 2))
+        if context is None:
+            context = 2
+
+        try:
+            result = ExecutionLogSearchService.search(
+                execution_record,
+                query,
+                regex=regex,
+                ignore_case=ignore_case,
+                context=context,
+                step_order=_maybe_int_id(step_order) if step_order is not None else None,
+            )
+        except ValueError as e:
+            return SycResponse.error(message=str(e))
+        except Exception as e:
+            logger.error(f"搜索执行日志失败: execution_id={execution_record.execution_id} - {e}", exc_info=True)
+            return SycResponse.error(message='日志搜索失败')
+
+        return SycResponse.success(content=result, message='日志搜索完成')
+
     @action(detail=True, methods=['get'], url_path='steps/(?P<step_id>[^/.]+)/content')
     def step_content(self, request, pk=None, step_id=None):
         """获取单个步骤的脚本/参数内容（懒加载，默认掩码敏感字段）"""
@@ -181,7 +272,7 @@ class ExecutionRecordViewSet(viewsets.ReadOnlyModelViewSet):
 
     @action(detail=True, methods=['get'], url_path='steps/(?P<step_id>[^/.]+)/hosts/(?P<host_id>[^/.]+)/logs')
     def host_logs(self, request, pk=None, step_id=None, host_id=None):
-        """获取步骤内单主机日志（pointer+limit 分页）"""
+        """获取步骤内单主机日志（pointer 或 cursor + limit 分页）"""
         execution_record = self.get_object()
         try:
             step = execution_record.steps.get(id=step_id)
@@ -193,13 +284,35 @@ class ExecutionRecordViewSet(viewsets.ReadOnlyModelViewSet):
         except Exception:
             limit = 500
 
-        pointer = request.query_params.get('pointer')
+        cursor = request.query_params.get('cursor')
+        explicit_pointer = request.query_params.get('pointer')
+        pointer = explicit_pointer
         if not pointer:
             logs_meta = {}
             if isinstance(execution_record.execution_results, dict):
                 logs_meta = execution_record.execution_results.get('logs_meta', {}) or {}
             pointer = logs_meta.get('log_pointer')
 
+        def db_logs_response(page):
+            log_context = "".join([
+                f"[{log.get('timestamp')}] {log.get('content')}\n" for log in page['logs'] if log.get('content')
+            ])
+            return SycResponse.success(
+                content={
+                    'log_context': log_context,
+                    'finished': page['next_cursor'] is None,
+                    'next_pointer': None,
+                    'next_cursor': page['next_cursor'],
+                },
+                message='日志获取成功'
+            )
+
+        db_host_id = _maybe_int_id(host_id)
+        if cursor and db_host_id is not None:
+            return db_logs_response(ExecutionLogService.get_host_logs(
+                execution_record.execution_id, step.step_order, db_host_id, cursor=cursor, limit=limit
+            ))
+
         if pointer:
             from utils.realtime_logs import realtime_log_service
             result = realtime_log_service.get_logs_by_pointer_filtered(
@@ -210,6 +323,39 @@ class ExecutionRecordViewSet(viewsets.ReadOnlyModelViewSet):
                 host_id=host_id,
             )
             logs = result.get('logs', [])
+            if logs or explicit_pointer:
+                log_context = "".join([
+                    f"[{log.get('timestamp')}] {log.get('content')}\n" for log in logs if log.get('content')
+                ])
+                return SycResponse.success(
+                    content={
+                        'log_context': log_context,
+                        'finished': True,
+                        'next_pointer': result.get('next_pointer'),
+                    },
+                    message='日志获取成功'
+                )
+
+        # Redis 中已无该主机日志：从 ExecutionLog 表按游标读取首页
+        if db_host_id is not None:
+            page = ExecutionLogService.get_host_logs(
+                execution_record.execution_id, step.step_order, db_host_id, limit=limit
+            )
+            if page['logs']:
+                return db_logs_response(page)
+
+        results = execution_record.execution_results or {}
+        archive_index = results.get('log_archive') if isinstance(results, dict) else None
+        if archive_index:
+            # 分段归档：只解压该 (步骤, 主机) 的切片
+            from utils.log_segment_archive import log_segment_archive
+            try:
+                logs = log_segment_archive.read_host_logs(
+                    archive_index, host_id, step_order=step.step_order, step_name=step.step_name
+                )
+            except Exception as e:
+                logger.error(f"读取归档日志失败: execution_id={execution_record.execution_id}, host_id={host_id} - {e}")
+                return SycResponse.error(message='归档日志读取失败')
             log_context = "".join([
                 f"[{log.get('timestamp')}] {log.get('content')}\n" for log in logs if log.get('content')
             ])
@@ -217,13 +363,12 @@ class ExecutionRecordViewSet(viewsets.ReadOnlyModelViewSet):
                 content={
                     'log_context': log_context,
                     'finished': True,
-                    'next_pointer': result.get('next_pointer'),
+                    'next_pointer': None,
                 },
                 message='日志获取成功'
             )
 
-        # fallback: 从归档 step_logs 中读取
-        results = execution_record.execution_results or {}
+        # fallback: 从旧格式内联的 step_logs 中读取
         step_logs = results.get('step_logs', {}) if isinstance(results, dict) else {}
         log_context = ''
         if isinstance(step_logs, dict):
@@ -399,18 +544,20 @@ class ExecutionRecordViewSet(viewsets.ReadOnlyModelViewSet):
             # 检查执行方式
             execution_mode = execution_record.execution_parameters.get('execution_mode', 'ssh')
             agent_server_url = execution_record.execution_parameters.get('agent_server_url')
+            agent_server_id = execution_record.execution_parameters.get('agent_server_id')
             extra_data = {
                 'execution_mode': execution_mode,
                 'agent_server_url': agent_server_url,
             }
             
-            if execution_mode == 'agent' or agent_server_url:
-                # Agent方式：调用Agent取消服务
+            if execution_mode == 'agent' or agent_server_url or agent_server_id:
+                # Agent方式：先设置取消标志，执行策略不再下发尚未开始的主机，再取消已下发的任务
                 from apps.agents.execution_service import AgentExecutionService
-                
+
+                cache.set(f"cancel:{execution_record.execution_id}", "1", timeout=3600)
                 cancel_result = AgentExecutionService.cancel_task_via_agent(
                     execution_record=execution_record,
-                    agent_server_url=agent_server_url,
+                    agent_server_id=agent_server_id,
                 )
                 
                 if cancel_result['success']:
@@ -796,3 +943,10 @@ class ExecutionRecordViewSet(viewsets.ReadOnlyModelViewSet):
         except Exception as e:
             logger.error(f"获取执行链路失败: {str(e)}", exc_info=True)
             return SycResponse.error(message=f'获取执行链路失败: {str(e)}')
+
+
+def _maybe_int_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,383 @@
+"""
+基于 asyncssh 的批量 SSH 执行引擎
+
+FabricSSHManager 基于 Paramiko，每个主机会话占用一个线程，批量安装/卸载 Agent、采集系统信息
+等场景的并发受线程数限制。本引擎在单个事件循环内并发运行大量 SSH 会话：
+ - execute_script 与 FabricSSHManager.execute_script 参数、返回结构一致
+ - 实时输出仍交给 RealTimeOutputHandler，日志格式不变
+ - 全局并发上限（ASYNC_SSH_MAX_CONCURRENCY）+ 每个主机分组（可用区/地域）的并发上限（ASYNC_SSH_GROUP_CONCURRENCY）
+ - 非 shell 脚本通过 SFTP 上传到远端临时文件后执行
+
+asyncssh 已列入项目依赖；导入失败的环境中 async_ssh_engine 为 None，调用方回退到 fabric_ssh_manager。
+批量场景（Agent 安装/卸载、批量连接测试/状态检查）走本引擎；单台主机的连接测试、系统信息收集仍用
+fabric_ssh_manager 复用连接池中的会话。
+
+对外接口：
+ - SSHJob
+ - AsyncSSHEngine.execute_script(host, script_content, ...) -> dict
+ - AsyncSSHEngine.execute_many(jobs) -> List[dict]
+ - AsyncSSHEngine.upload_file(host, local_path, remote_path, ...) -> dict
+ - async_ssh_engine
+"""
+import asyncio
+import logging
+import os
+import shlex
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from django.conf import settings
+
+try:
+    import asyncssh
+    ASYNCSSH_AVAILABLE = True
+except ImportError:
+    asyncssh = None
+    ASYNCSSH_AVAILABLE = False
+
+from .fabric_ssh_manager import get_connection_info
+from .realtime_output import RealTimeOutputHandler
+from utils.async_runner import run_coroutine
+from utils.realtime_logs import realtime_log_service
+
+logger = logging.getLogger(__name__)
+
+# 上传后执行的脚本类型：(文件后缀, 执行命令)
+UPLOADED_SCRIPTS = {
+    'python': ('.py', 'python3 -u {path}'),
+    'perl': ('.pl', 'perl {path}'),
+    'javascript': ('.js', 'node {path}'),
+    'js': ('.js', 'node {path}'),
+    'node': ('.js', 'node {path}'),
+    'go': ('.go', 'go run {path}'),
+}
+
+UTF8_ENV = {
+    'PYTHONUNBUFFERED': '1',
+    'LC_ALL': 'zh_CN.UTF-8',
+    'LANG': 'zh_CN.UTF-8',
+    'PYTHONIOENCODING': 'utf-8',
+}
+
+
+def default_group_key(host) -> str:
+    return getattr(host, 'zone', None) or getattr(host, 'region', None) or ''
+
+
+@dataclass
+class SSHJob:
+    """单台主机的脚本执行参数（与 FabricSSHManager.execute_script 一致）"""
+    host: Any
+    script_content: str
+    script_type: str = 'shell'
+    timeout: Optional[int] = None
+    task_id: Optional[str] = None
+    account_id: Optional[int] = None
+    connection_timeout: Optional[int] = None
+    log_stream_key: Optional[str] = None
+    # 进入事件循环前解析（需要访问数据库）
+    conn_info: Dict[str, Any] = field(default_factory=dict)
+
+
+class AsyncSSHEngine:
+    """
+    asyncssh 批量执行引擎
+    - max_concurrency: 同时进行的 SSH 会话上限
+    - group_limit: 每个主机分组同时进行的会话上限（0 为不限）
+    - group_key: 主机分组函数，默认按可用区/地域
+    """
+
+    READ_SIZE = 65536
+
+    def __init__(self, max_concurrency: Optional[int] = None, group_limit: Optional[int] = None,
+                 group_key: Optional[Callable[[Any], str]] = None):
+        if not ASYNCSSH_AVAILABLE:
+            raise ImportError("asyncssh未安装，请运行: uv add asyncssh")
+        if max_concurrency is None:
+            max_concurrency = getattr(settings, 'ASYNC_SSH_MAX_CONCURRENCY', 500)
+        if group_limit is None:
+            group_limit = getattr(settings, 'ASYNC_SSH_GROUP_CONCURRENCY', 0)
+        self.max_concurrency = max(1, max_concurrency)
+        self.group_limit = max(0, group_limit or 0)
+        self.group_key = group_key or default_group_key
+        self.keepalive_interval = getattr(settings, 'ASYNC_SSH_KEEPALIVE_INTERVAL', 30)
+
+    # ------------------------------------------------------------------ 同步接口
+
+    def execute_script(self, host, script_content: str, script_type: str = 'shell',
+                       timeout: int = None, task_id: Optional[str] = None,
+                       account_id: Optional[int] = None, connection_timeout: int = None,
+                       log_stream_key: Optional[str] = None) -> Dict[str, Any]:
+        """在单台主机上执行脚本（参数与返回结构同 FabricSSHManager.execute_script）"""
+        return self.execute_many([SSHJob(
+            host=host,
+            script_content=script_content,
+            script_type=script_type,
+            timeout=timeout,
+            task_id=task_id,
+            account_id=account_id,
+            connection_timeout=connection_timeout,
+            log_stream_key=log_stream_key,
+        )])[0]
+
+    def execute_many(self, jobs: List[SSHJob],
+                     on_result: Optional[Callable[[int, Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+        """
+        在一个事件循环中并发执行多台主机的脚本，返回与 jobs 顺序一致的结果
+        on_result(index, result) 在每台主机结束时于工作线程中回调（用于推送进度）
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(jobs)
+        prepared = list(self._prepare(jobs, results))
+        if on_result:
+            for index, result in enumerate(results):
+                if result is not None:
+                    on_result(index, result)
+        if prepared:
+            started = time.time()
+            notify = (lambda position, result: on_result(prepared[position][0], result)) if on_result else None
+            outputs = run_coroutine(self._run_all([job for _, job in prepared], notify), thread_name="async-ssh")
+            for (index, _), result in zip(prepared, outputs):
+                results[index] = result
+            logger.info(
+                f"asyncssh 批量执行完成: hosts={len(prepared)}, "
+                f"success={sum(1 for r in outputs if r.get('success'))}, elapsed={time.time() - started:.2f}s"
+            )
+        return results
+
+    def upload_file(self, host, local_path: str, remote_path: str, account_id: Optional[int] = None,
+                    connection_timeout: int = None) -> Dict[str, Any]:
+        """通过 SFTP 上传本地文件到远程主机"""
+        job = SSHJob(host=host, script_content='', account_id=account_id, connection_timeout=connection_timeout)
+        results: List[Optional[Dict[str, Any]]] = [None]
+        for _, job in self._prepare([job], results):
+            results[0] = run_coroutine(self._upload(job, local_path, remote_path), thread_name="async-ssh")
+        return results[0]
+
+    def _prepare(self, jobs: List[SSHJob], results: List[Optional[Dict[str, Any]]]):
+        """补齐默认超时并解析连接信息；解析失败的主机直接写入失败结果"""
+        from apps.system_config.models import ConfigManager
+
+        default_timeout = ConfigManager.get('fabric.command_timeout', 300)
+        default_connection_timeout = ConfigManager.get('fabric.connection_timeout', 30)
+        for index, job in enumerate(jobs):
+            job.timeout = job.timeout or default_timeout
+            job.connection_timeout = job.connection_timeout or default_connection_timeout
+            try:
+                job.conn_info = get_connection_info(job.host, account_id=job.account_id)
+            except Exception as e:
+                results[index] = self._result(job, False, '', str(e), -1, f'执行失败: {e}')
+                continue
+            yield index, job
+
+    # ------------------------------------------------------------------ 调度
+
+    async def _run_all(self, jobs: List[SSHJob],
+                       on_result: Optional[Callable[[int, Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+        limiter = asyncio.Semaphore(self.max_concurrency)
+        groups = defaultdict(lambda: asyncio.Semaphore(self.group_limit)) if self.group_limit else None
+
+        async def run(position: int, job: SSHJob) -> Dict[str, Any]:
+            # 先占分组名额再占全局名额，等待分组的主机不占用全局并发
+            group = groups[self.group_key(job.host)] if groups is not None else None
+            if group is not None:
+                await group.acquire()
+            try:
+                async with limiter:
+                    result = await self._run_job(job)
+            finally:
+                if group is not None:
+                    group.release()
+            if on_result:
+                await asyncio.to_thread(on_result, position, result)
+            return result
+
+        return await asyncio.gather(*(run(position, job) for position, job in enumerate(jobs)))
+
+    async def _run_job(self, job: SSHJob) -> Dict[str, Any]:
+        host = job.host
+        start_time = time.time()
+        start_datetime = datetime.now()
+        try:
+            conn = await self._connect(job)
+            async with conn:
+                await self._push_log(job, 'info', f'开始执行{job.script_type}脚本')
+                result = await self._run_script(conn, job)
+        except Exception as e:
+            error_msg = f"SSH认证失败: {e}" if asyncssh and isinstance(e, asyncssh.PermissionDenied) else str(e) or type(e).__name__
+            logger.error(f"asyncssh执行脚本失败 - 主机: {host.name}, 错误: {error_msg}")
+            await self._push_log(job, 'error', f'脚本执行异常: {error_msg}')
+            result = self._result(job, False, '', error_msg, -1, f'执行失败: {error_msg}')
+        else:
+            status = '成功' if result['success'] else '失败'
+            await self._push_log(job, 'info' if result['success'] else 'error',
+                                 f'脚本执行{status}，耗时: {time.time() - start_time:.2f}秒')
+        finally:
+            self._remove_key_file(job)
+
+        result['execution_time'] = time.time() - start_time
+        result['start_time'] = start_datetime.isoformat()
+        result['end_time'] = datetime.now().isoformat()
+        return result
+
+    async def _connect(self, job: SSHJob):
+        conn_info = job.conn_info
+        options = {
+            'host': conn_info['host'],
+            'port': conn_info['port'],
+            'username': conn_info['user'],
+            # 与 Fabric 的使用方式一致，不校验 known_hosts
+            'known_hosts': None,
+            'keepalive_interval': self.keepalive_interval,
+            'login_timeout': job.connection_timeout,
+        }
+        if conn_info.get('password'):
+            options['password'] = conn_info['password']
+        if conn_info.get('key_filename'):
+            options['client_keys'] = [conn_info['key_filename']]
+        try:
+            return await asyncio.wait_for(asyncssh.connect(**options), timeout=job.connection_timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"SSH连接超时（{job.connection_timeout}秒）: {conn_info['host']}:{conn_info['port']}")
+
+    # ------------------------------------------------------------------ 执行
+
+    async def _run_script(self, conn, job: SSHJob) -> Dict[str, Any]:
+        script_type = (job.script_type or 'shell').lower()
+        if script_type in UPLOADED_SCRIPTS:
+            suffix, runner = UPLOADED_SCRIPTS[script_type]
+            # 同一主机可能并发执行多个脚本，文件名不能只用时间戳
+            remote_path = f'/tmp/script_{uuid.uuid4().hex}{suffix}'
+            await self._put(conn, job.script_content.encode('utf-8'), remote_path)
+            try:
+                return await self._run_command(conn, runner.format(path=shlex.quote(remote_path)), job)
+            finally:
+                try:
+                    await asyncio.wait_for(conn.run(f'rm -f {shlex.quote(remote_path)}'), timeout=10)
+                except Exception:
+                    pass
+        if script_type == 'powershell':
+            return await self._run_command(conn, f'powershell -Command "{job.script_content}"', job)
+
+        escaped_script = job.script_content.replace("'", "'\"'\"'")
+        command = f"export LC_ALL=zh_CN.UTF-8 LANG=zh_CN.UTF-8 PYTHONIOENCODING=utf-8; bash -c '{escaped_script}'"
+        return await self._run_command(conn, command, job)
+
+    async def _run_command(self, conn, command: str, job: SSHJob) -> Dict[str, Any]:
+        handlers = self._output_handlers(job)
+        stdout_parts: List[str] = []
+        stderr_parts: List[str] = []
+        process = await conn.create_process(command, env=UTF8_ENV, encoding='utf-8', errors='replace')
+
+        async def drive():
+            await asyncio.gather(
+                self._pump(process.stdout, handlers[0], stdout_parts),
+                self._pump(process.stderr, handlers[1], stderr_parts),
+            )
+            await process.wait_closed()
+
+        timed_out = False
+        try:
+            await asyncio.wait_for(drive(), timeout=job.timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            process.close()
+        finally:
+            for handler in handlers:
+                if handler is not None:
+                    await asyncio.to_thread(handler.close)
+
+        exit_code = -1 if timed_out or process.exit_status is None else process.exit_status
+        if timed_out:
+            message = f'执行超时（{job.timeout}秒）'
+        elif exit_code == 0:
+            message = '执行成功'
+        else:
+            message = f'执行失败，退出码: {exit_code}'
+        return self._result(job, exit_code == 0, ''.join(stdout_parts), ''.join(stderr_parts), exit_code, message)
+
+    async def _pump(self, reader, handler: Optional[RealTimeOutputHandler], parts: List[str]):
+        while True:
+            chunk = await reader.read(self.READ_SIZE)
+            if not chunk:
+                break
+            parts.append(chunk)
+            if handler is not None:
+                # write 只写内存缓冲，推送由后台发布线程完成，可直接在事件循环中调用
+                handler.write(chunk)
+
+    async def _put(self, conn, data: bytes, remote_path: str):
+        async with conn.start_sftp_client() as sftp:
+            async with sftp.open(remote_path, 'wb') as remote_file:
+                await remote_file.write(data)
+
+    async def _upload(self, job: SSHJob, local_path: str, remote_path: str) -> Dict[str, Any]:
+        host = job.host
+        try:
+            conn = await self._connect(job)
+            async with conn:
+                async with conn.start_sftp_client() as sftp:
+                    await sftp.put(local_path, remote_path)
+        except Exception as e:
+            logger.error(f"asyncssh上传文件失败 - 主机: {host.name}, 文件: {local_path}, 错误: {e}")
+            return {'success': False, 'host_id': host.id, 'host_name': host.name, 'message': f'上传失败: {e}'}
+        finally:
+            self._remove_key_file(job)
+        return {'success': True, 'host_id': host.id, 'host_name': host.name, 'remote_path': remote_path, 'message': '上传成功'}
+
+    # ------------------------------------------------------------------ 工具
+
+    @staticmethod
+    def _output_handlers(job: SSHJob):
+        if not job.task_id:
+            return None, None
+        host = job.host
+        return tuple(
+            RealTimeOutputHandler(job.task_id, host.id, host.name, host.ip_address, stream, stream_key=job.log_stream_key)
+            for stream in ('stdout', 'stderr')
+        )
+
+    @staticmethod
+    async def _push_log(job: SSHJob, log_type: str, content: str):
+        if not job.task_id:
+            return
+        host = job.host
+        await asyncio.to_thread(realtime_log_service.push_log, job.task_id, host.id, {
+            'host_name': host.name,
+            'host_ip': host.ip_address,
+            'log_type': log_type,
+            'content': content,
+            'step_name': '脚本执行',
+            'step_order': 1
+        }, stream_key=job.log_stream_key)
+
+    @staticmethod
+    def _remove_key_file(job: SSHJob):
+        # get_connection_info 为私钥认证写出的临时文件，会话结束后删除
+        key_filename = job.conn_info.get('key_filename')
+        if key_filename:
+            try:
+                os.unlink(key_filename)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _result(job: SSHJob, success: bool, stdout: str, stderr: str, exit_code: int, message: str) -> Dict[str, Any]:
+        host = job.host
+        return {
+            'success': success,
+            'host_id': host.id,
+            'host_name': host.name,
+            'host_ip': host.ip_address,
+            'stdout': stdout,
+            'stderr': stderr,
+            'exit_code': exit_code,
+            'message': message,
+        }
+
+
+# 全局实例
+async_ssh_engine = AsyncSSHEngine() if ASYNCSSH_AVAILABLE else None
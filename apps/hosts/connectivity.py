@@ -0,0 +1,290 @@
+"""
+批量主机连通性/状态检查
+
+batch_test_connections / batch_check_status 原先逐台建立完整的 Fabric SSH 会话并逐台 save，
+1000 台主机在超时场景下要跑一个多小时。本模块：
+ - 线程池并发检查（HOST_CHECK_CONCURRENCY）
+ - 先做 TCP 端口预检（HOST_CHECK_TCP_TIMEOUT），端口不通的 IP 不再尝试 SSH
+ - 端口可达时才执行 SSH 探测命令（内网 IP 优先，失败再试外网 IP）；已安装 asyncssh 时
+   探测命令在 AsyncSSHEngine 的一个事件循环内并发执行，否则在线程池中通过 fabric_ssh_manager 执行
+ - 结束后一次 bulk_update 写回主机状态
+ - 通过实时状态流推送进度（batch_task_id）
+
+对外接口：
+ - tcp_probe(ip, port, timeout) -> str | None
+ - HostConnectivityChecker.check(hosts, mode, batch_task_id) -> List[Dict]
+"""
+import copy
+import logging
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .async_ssh_engine import SSHJob, async_ssh_engine
+from .fabric_ssh_manager import fabric_ssh_manager
+from .models import Host
+from utils.realtime_logs import realtime_log_service
+
+logger = logging.getLogger(__name__)
+
+
+def tcp_probe(ip: str, port: int, timeout: float) -> Optional[str]:
+    """TCP 端口预检，可达返回 None，否则返回错误描述"""
+    try:
+        with socket.create_connection((ip, port), timeout=timeout):
+            return None
+    except socket.timeout:
+        return f'{ip}:{port} 连接超时'
+    except OSError as e:
+        return f'{ip}:{port} 不可达: {e.strerror or e}'
+
+
+class HostConnectivityChecker:
+    """
+    并发主机检查器
+    - mode='connection': 连接测试（返回与 HostService.test_host_connection 相同结构的结果）
+    - mode='status': 状态检查
+    """
+
+    # 连接测试/状态检查使用的 SSH 探测命令与超时
+    PROBES = {
+        'connection': ('echo "connection_test"', 10),
+        'status': ('echo "status_check"', 10),
+    }
+
+    def __init__(self, max_workers: Optional[int] = None, tcp_timeout: Optional[float] = None,
+                 ssh_timeout: Optional[int] = None, progress_interval: float = 0.5):
+        self.max_workers = max(1, max_workers or getattr(settings, 'HOST_CHECK_CONCURRENCY', 50))
+        self.tcp_timeout = tcp_timeout or getattr(settings, 'HOST_CHECK_TCP_TIMEOUT', 3)
+        self.ssh_timeout = ssh_timeout or getattr(settings, 'HOST_CHECK_SSH_TIMEOUT', 5)
+        self.progress_interval = progress_interval
+
+    def check(self, hosts: List[Host], mode: str = 'connection', batch_task_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """并发检查主机并批量写回状态，返回与 hosts 顺序一致的逐台结果"""
+        results: List[Optional[Dict[str, Any]]] = [None] * len(hosts)
+        if not hosts:
+            return []
+
+        progress = _ProgressReporter(batch_task_id, len(hosts), mode, self.progress_interval)
+        progress.push('running', force=True)
+        started = time.time()
+
+        if async_ssh_engine is not None:
+            self._check_async(hosts, mode, results, progress)
+        else:
+            self._check_threaded(hosts, mode, results, progress)
+
+        self._save_statuses(hosts, results)
+        progress.push('completed', force=True)
+        logger.info(
+            f"批量主机检查完成: mode={mode}, hosts={len(hosts)}, online={progress.success}, "
+            f"elapsed={time.time() - started:.2f}s"
+        )
+        return results
+
+    def _check_threaded(self, hosts: List[Host], mode: str, results: List[Optional[Dict[str, Any]]],
+                        progress: "_ProgressReporter"):
+        """线程池逐台执行 TCP 预检 + fabric SSH 探测"""
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(hosts)), thread_name_prefix="host-check") as pool:
+            futures = {pool.submit(self._check_one, host, mode): index for index, host in enumerate(hosts)}
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"检查主机异常: {hosts[index].name} - {e}")
+                    result = {'success': False, 'message': f'检查异常: {e}', 'error_type': 'connection_error', 'error_details': str(e)}
+                results[index] = result
+                progress.record(result['success'])
+
+    def _check_async(self, hosts: List[Host], mode: str, results: List[Optional[Dict[str, Any]]],
+                     progress: "_ProgressReporter"):
+        """线程池并发做 TCP 预检，端口可达的主机交给 AsyncSSHEngine 批量执行探测命令"""
+        command, timeout = self.PROBES[mode]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(hosts)), thread_name_prefix="host-check") as pool:
+            probes = list(pool.map(self._tcp_check, hosts))
+
+        # (主机下标, 端口可达的候选 IP)；内网 IP 探测失败的主机下一轮改用外网 IP
+        attempts = []
+        for index, (host, (reachable, last_error)) in enumerate(zip(hosts, probes)):
+            candidates = self._candidates(host)
+            if not candidates:
+                results[index] = self._no_ip_result()
+            elif not reachable:
+                ip_type, ip = candidates[-1]
+                results[index] = self._failure_result(last_error, ip, ip_type)
+            else:
+                attempts.append((index, reachable))
+                continue
+            progress.record(False)
+
+        while attempts:
+            retry = []
+            jobs = [
+                SSHJob(host=self._target(hosts[index], reachable[0][1]), script_content=command,
+                       timeout=timeout, connection_timeout=self.ssh_timeout)
+                for index, reachable in attempts
+            ]
+
+            def on_result(position: int, result: Dict[str, Any]):
+                index, reachable = attempts[position]
+                ip_type, ip = reachable[0]
+                if result.get('success'):
+                    results[index] = self._success_result(ip_type, ip, result)
+                elif len(reachable) > 1:
+                    retry.append((index, reachable[1:]))
+                    return
+                else:
+                    last_error = result.get('message') or result.get('error') or 'SSH 连接失败'
+                    results[index] = self._failure_result(last_error, ip, ip_type)
+                progress.record(results[index]['success'])
+
+            async_ssh_engine.execute_many(jobs, on_result=on_result)
+            attempts = retry
+
+    def _check_one(self, host: Host, mode: str) -> Dict[str, Any]:
+        try:
+            return self._probe(host, mode)
+        finally:
+            close_old_connections()
+
+    def _probe(self, host: Host, mode: str) -> Dict[str, Any]:
+        candidates = self._candidates(host)
+        if not candidates:
+            return self._no_ip_result()
+
+        command, timeout = self.PROBES[mode]
+        port = host.port or 22
+        last_error = None
+        used_ip_type, used_ip = candidates[0]
+        for ip_type, ip in candidates:
+            used_ip_type, used_ip = ip_type, ip
+            last_error = tcp_probe(ip, port, self.tcp_timeout)
+            if last_error:
+                continue
+
+            result = fabric_ssh_manager.execute_script(
+                host=self._target(host, ip),
+                script_content=command,
+                script_type='shell',
+                timeout=timeout,
+                connection_timeout=self.ssh_timeout,
+            )
+            if result.get('success'):
+                return self._success_result(ip_type, ip, result)
+            last_error = result.get('message') or result.get('error') or 'SSH 连接失败'
+
+        return self._failure_result(last_error, used_ip, used_ip_type)
+
+    def _tcp_check(self, host: Host):
+        """对主机的全部候选 IP 做 TCP 预检，返回 (可达的候选 IP, 最后一个预检错误)"""
+        port = host.port or 22
+        reachable = []
+        last_error = None
+        for ip_type, ip in self._candidates(host):
+            error = tcp_probe(ip, port, self.tcp_timeout)
+            if error:
+                last_error = error
+            else:
+                reachable.append((ip_type, ip))
+        return reachable, last_error
+
+    @staticmethod
+    def _candidates(host: Host):
+        candidates = []
+        if host.internal_ip:
+            candidates.append(('internal', host.internal_ip))
+        if host.public_ip and host.public_ip != host.internal_ip:
+            candidates.append(('public', host.public_ip))
+        return candidates
+
+    @staticmethod
+    def _target(host: Host, ip: str) -> Host:
+        # 只替换 IP 的副本，不修改调用方的主机对象
+        target = copy.copy(host)
+        target.internal_ip, target.public_ip = ip, None
+        return target
+
+    @staticmethod
+    def _success_result(ip_type: str, ip: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        ip_label = '内网' if ip_type == 'internal' else '外网'
+        return {
+            'success': True,
+            'message': f'连接测试完成（使用{ip_label}IP: {ip}）',
+            'stdout': result.get('stdout', ''),
+            'stderr': result.get('stderr', ''),
+            'used_ip': ip,
+            'used_ip_type': ip_type,
+            'error_details': '',
+            'connection_info': result.get('connection_info', {}),
+        }
+
+    @staticmethod
+    def _failure_result(last_error: Optional[str], used_ip: Optional[str] = None,
+                        used_ip_type: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            'success': False,
+            'message': f'连接失败: {last_error}',
+            'error_type': 'connection_error',
+            'error_details': last_error or '',
+            'connection_info': {'used_ip': used_ip, 'used_ip_type': used_ip_type},
+        }
+
+    @staticmethod
+    def _no_ip_result() -> Dict[str, Any]:
+        return {'success': False, 'message': '主机没有配置IP地址（内网IP或外网IP）', 'error_type': 'no_ip_address'}
+
+    @staticmethod
+    def _save_statuses(hosts: List[Host], results: List[Dict[str, Any]]):
+        now = timezone.now()
+        for host, result in zip(hosts, results):
+            host.status = 'online' if result['success'] else 'offline'
+            host.last_check_time = now
+        Host.objects.bulk_update(hosts, ['status', 'last_check_time'], batch_size=500)
+
+
+class _ProgressReporter:
+    """按时间间隔节流推送批量检查进度"""
+
+    MESSAGES = {'connection': '批量连接测试', 'status': '批量状态检查'}
+
+    def __init__(self, batch_task_id: Optional[str], total: int, mode: str, interval: float):
+        self.batch_task_id = batch_task_id
+        self.total = total
+        self.label = self.MESSAGES.get(mode, '批量主机检查')
+        self.interval = interval
+        self.completed = 0
+        self.success = 0
+        self._last_push = 0.0
+        # AsyncSSHEngine 在工作线程中回调结果
+        self._lock = threading.Lock()
+
+    def record(self, success: bool):
+        with self._lock:
+            self.completed += 1
+            self.success += int(success)
+            self.push('running')
+
+    def push(self, status: str, force: bool = False):
+        if not self.batch_task_id:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_push < self.interval:
+            return
+        self._last_push = now
+        failed = self.completed - self.success
+        realtime_log_service.push_status(self.batch_task_id, {
+            'status': status,
+            'total': self.total,
+            'completed': self.completed,
+            'success_count': self.success,
+            'failed_count': failed,
+            'progress': int(self.completed * 100 / self.total) if self.total else 100,
+            'message': f'{self.label}: 已完成 {self.completed}/{self.total}，在线 {self.success}，离线 {failed}',
+        })
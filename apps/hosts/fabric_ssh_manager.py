@@ -2,11 +2,11 @@
 基于Fabric的SSH管理器
 提供更稳定的SSH连接和命令执行功能
 """
+import hashlib
 import logging
 import time
 import tempfile
 import os
-import threading
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from io import StringIO
@@ -29,6 +29,8 @@ except ImportError:
     NoValidConnectionsError = Exception
 
 from utils.realtime_logs import realtime_log_service
+from .realtime_output import RealTimeOutputHandler
+from .ssh_pool import SSHConnectionPool
 
 logger = logging.getLogger(__name__)
 
@@ -211,204 +213,80 @@ class SimpleOutputHandler:
         print(f"[{self.name}] close() 调用")
 
 
-class RealTimeOutputHandler:
-    """实时输出处理器，用于捕获并推送命令执行过程中的实时输出"""
+def get_connection_info(host, account_id: Optional[int] = None) -> Dict[str, Any]:
+    """
+    获取主机连接信息（Fabric 与 asyncssh 引擎共用）
 
-    def __init__(self, task_id: str, host_id: int, host_name: str, host_ip: str, stream_type: str = "stdout", stream_key: str = None):
-        self.task_id = task_id
-        self.host_id = host_id
-        self.host_name = host_name
-        self.host_ip = host_ip
-        self.stream_type = stream_type
-        self.stream_key = stream_key
-        self.buffer = ""
-        self.lock = threading.Lock()
-        self.closed = False
+    Args:
+        host: 主机对象
+        account_id: 可选的账号ID，如果提供则使用该账号，否则使用主机配置的账号
 
-    def write(self, data):
-        """处理写入的数据"""
-        if not data or self.closed:
-            return
+    Returns:
+        连接信息字典
+    """
+    from .models import ServerAccount
+    from .utils import decrypt_password
 
+    # 确定使用哪个账号
+    account = None
+    if account_id:
+        # 如果提供了account_id，使用指定的账号
         try:
-            # 处理编码问题
-            if isinstance(data, bytes):
-                try:
-                    data = data.decode('utf-8')
-                except UnicodeDecodeError:
-                    try:
-                        data = data.decode('gbk')
-                    except UnicodeDecodeError:
-                        data = data.decode('utf-8', errors='replace')
-
-            # 使用线程锁保护缓冲区操作
-            with self.lock:
-                if self.closed:
-                    return
-
-                # 将数据添加到缓冲区
-                self.buffer += data
-
-                # 处理完整的行
-                while '\n' in self.buffer:
-                    line, self.buffer = self.buffer.split('\n', 1)
-                    line = line.rstrip('\r')  # 移除回车符
-
-                    if line.strip():
-                        self._push_log_safe(line.strip())
-
-        except Exception as e:
-            logger.error(f"RealTimeOutputHandler.write失败: {e}")
-
-    def _push_log_safe(self, content):
-        """安全地推送日志，避免阻塞"""
+            account = ServerAccount.objects.get(id=account_id)
+        except ServerAccount.DoesNotExist:
+            raise FabricSSHError(f"账号ID {account_id} 不存在")
+    elif host.account:
+        # 使用主机配置的账号
+        account = host.account
+    else:
+        raise FabricSSHError(f"主机 {host.name} 没有配置服务器账号，请在主机设置中指定账号或在执行时提供账号ID")
+
+    # 获取IP地址（优先使用内网IP）
+    host_ip = host.internal_ip or host.public_ip
+    if not host_ip:
+        raise FabricSSHError(f"主机 {host.name} 没有配置IP地址（内网IP或外网IP）")
+
+    username = account.username
+
+    # 解密密码（如果使用密码认证）
+    password = None
+    if account.password:
         try:
-            # 临时改为同步推送，确保日志能正常推送
-            logger.info(f"[实时日志] 推送: {self.host_name} - {content[:50]}...")
-            realtime_log_service.push_log(self.task_id, self.host_id, {
-                'host_name': self.host_name,
-                'host_ip': self.host_ip,
-                'log_type': self.stream_type,
-                'content': content,
-                'step_name': '脚本执行',
-                'step_order': 1
-            }, stream_key=self.stream_key)
-            logger.info(f"[实时日志] 推送成功: {self.host_name}")
+            password = decrypt_password(account.password)
         except Exception as e:
-            logger.error(f"推送日志失败: {e}")
+            logger.warning(f"解密账号 {account.name} 密码失败: {e}")
+            password = account.password  # 如果解密失败，使用原始值
 
-    def flush(self):
-        """刷新缓冲区"""
+    # 处理私钥（如果使用密钥认证）
+    key_filename = None
+    if account.private_key:
+        # 创建临时私钥文件
         try:
-            with self.lock:
-                if self.buffer.strip() and not self.closed:
-                    self._push_log_safe(self.buffer.strip())
-                    self.buffer = ""
+            import tempfile
+            with tempfile.NamedTemporaryFile(mode='w', suffix='.pem', delete=False) as f:
+                f.write(account.private_key)
+                key_filename = f.name
+            # 设置私钥文件权限
+            os.chmod(key_filename, 0o600)
         except Exception as e:
-            logger.error(f"RealTimeOutputHandler.flush失败: {e}")
+            logger.error(f"创建账号私钥文件失败: {e}")
+            raise FabricSSHError(f"账号私钥处理失败: {str(e)}")
 
-    def close(self):
-        """关闭处理器"""
-        try:
-            with self.lock:
-                self.closed = True
-                # 推送剩余的缓冲区内容
-                if self.buffer.strip():
-                    self._push_log_safe(self.buffer.strip())
-                    self.buffer = ""
-        except Exception as e:
-            logger.error(f"RealTimeOutputHandler.close失败: {e}")
+    logger.info(f"使用账号认证信息: 账号={account.name}, 用户名={username}, 主机={host.name}, IP={host_ip}")
 
+    # 认证信息指纹：连接池按它区分会话，账号密码/私钥变更后不会复用旧连接
+    auth_fingerprint = hashlib.sha256(
+        f"{account.id}\0{password or ''}\0{account.private_key or ''}".encode('utf-8')
+    ).hexdigest()[:16]
 
-class ConnectionPool:
-    """SSH连接池管理器"""
-    
-    def __init__(self, max_size: int = 10):
-        self.max_size = max_size
-        self.pool: Dict[str, list] = {}  # key: connection_key, value: list of connections
-        self.lock = threading.Lock()
-        self._enabled = False
-    
-    def enable(self):
-        """启用连接池"""
-        self._enabled = True
-    
-    def disable(self):
-        """禁用连接池"""
-        self._enabled = False
-    
-    def is_enabled(self) -> bool:
-        """检查连接池是否启用"""
-        return self._enabled
-    
-    def _get_connection_key(self, conn_info: Dict[str, Any]) -> str:
-        """生成连接键"""
-        return f"{conn_info['host']}:{conn_info['port']}:{conn_info['user']}"
-    
-    def get_connection(self, conn_info: Dict[str, Any], create_func):
-        """从连接池获取连接，如果没有则创建"""
-        if not self._enabled:
-            return None
-        
-        connection_key = self._get_connection_key(conn_info)
-        
-        with self.lock:
-            if connection_key not in self.pool:
-                self.pool[connection_key] = []
-            
-            pool = self.pool[connection_key]
-            
-            # 尝试从池中获取可用连接
-            while pool:
-                conn = pool.pop()
-                try:
-                    # 检查连接是否仍然有效（通过检查底层transport）
-                    if hasattr(conn, 'client') and conn.client and hasattr(conn.client, 'get_transport'):
-                        transport = conn.client.get_transport()
-                        if transport and transport.is_active():
-                            return conn
-                    # 连接无效，关闭它
-                    try:
-                        conn.close()
-                    except:
-                        pass
-                except:
-                    # 连接无效，继续尝试下一个
-                    try:
-                        conn.close()
-                    except:
-                        pass
-                    continue
-            
-            # 池中没有可用连接，返回None让调用者创建新连接
-            return None
-    
-    def return_connection(self, conn_info: Dict[str, Any], conn):
-        """归还连接到池中"""
-        if not self._enabled or not conn:
-            if conn:
-                try:
-                    conn.close()
-                except:
-                    pass
-            return
-        
-        connection_key = self._get_connection_key(conn_info)
-        
-        with self.lock:
-            if connection_key not in self.pool:
-                self.pool[connection_key] = []
-            
-            pool = self.pool[connection_key]
-            
-            # 检查池是否已满
-            if len(pool) < self.max_size:
-                try:
-                    # 检查连接是否仍然有效（通过检查底层transport）
-                    if hasattr(conn, 'client') and conn.client and hasattr(conn.client, 'get_transport'):
-                        transport = conn.client.get_transport()
-                        if transport and transport.is_active():
-                            pool.append(conn)
-                            return
-                except:
-                    pass
-            
-            # 池已满或连接无效，关闭连接
-            try:
-                conn.close()
-            except:
-                pass
-    
-    def clear(self):
-        """清空连接池"""
-        with self.lock:
-            for pool in self.pool.values():
-                for conn in pool:
-                    try:
-                        conn.close()
-                    except:
-                        pass
-            self.pool.clear()
+    return {
+        'host': host_ip,
+        'port': host.port or 22,
+        'user': username,
+        'password': password,
+        'key_filename': key_filename,
+        'auth_fingerprint': auth_fingerprint,
+    }
 
 
 class FabricSSHManager:
@@ -419,7 +297,7 @@ class FabricSSHManager:
             raise ImportError("Fabric未安装，请运行: uv add fabric")
 
         # 初始化连接池（延迟到第一次使用时）
-        self.connection_pool = ConnectionPool(max_size=10)
+        self.connection_pool = SSHConnectionPool()
         self._connection_pool_initialized = False
 
     def _ensure_connection_pool_initialized(self):
@@ -558,72 +436,8 @@ class FabricSSHManager:
             }
     
     def _get_connection_info(self, host, account_id: Optional[int] = None) -> Dict[str, Any]:
-        """
-        获取主机连接信息
-        
-        Args:
-            host: 主机对象
-            account_id: 可选的账号ID，如果提供则使用该账号，否则使用主机配置的账号
-        
-        Returns:
-            连接信息字典
-        """
-        from .models import ServerAccount
-        
-        # 确定使用哪个账号
-        account = None
-        if account_id:
-            # 如果提供了account_id，使用指定的账号
-            try:
-                account = ServerAccount.objects.get(id=account_id)
-            except ServerAccount.DoesNotExist:
-                raise FabricSSHError(f"账号ID {account_id} 不存在")
-        elif host.account:
-            # 使用主机配置的账号
-            account = host.account
-        else:
-            raise FabricSSHError(f"主机 {host.name} 没有配置服务器账号，请在主机设置中指定账号或在执行时提供账号ID")
-        
-        # 获取IP地址（优先使用内网IP）
-        host_ip = host.internal_ip or host.public_ip
-        if not host_ip:
-            raise FabricSSHError(f"主机 {host.name} 没有配置IP地址（内网IP或外网IP）")
-        
-        username = account.username
-        
-        # 解密密码（如果使用密码认证）
-        password = None
-        if account.password:
-            try:
-                password = self._decrypt_password(account.password)
-            except Exception as e:
-                logger.warning(f"解密账号 {account.name} 密码失败: {e}")
-                password = account.password  # 如果解密失败，使用原始值
-        
-        # 处理私钥（如果使用密钥认证）
-        key_filename = None
-        if account.private_key:
-            # 创建临时私钥文件
-            try:
-                import tempfile
-                with tempfile.NamedTemporaryFile(mode='w', suffix='.pem', delete=False) as f:
-                    f.write(account.private_key)
-                    key_filename = f.name
-                # 设置私钥文件权限
-                os.chmod(key_filename, 0o600)
-            except Exception as e:
-                logger.error(f"创建账号私钥文件失败: {e}")
-                raise FabricSSHError(f"账号私钥处理失败: {str(e)}")
-        
-        logger.info(f"使用账号认证信息: 账号={account.name}, 用户名={username}, 主机={host.name}, IP={host_ip}")
-        
-        return {
-            'host': host_ip,
-            'port': host.port or 22,
-            'user': username,
-            'password': password,
-            'key_filename': key_filename,
-        }
+        """获取主机连接信息"""
+        return get_connection_info(host, account_id=account_id)
 
     def _decrypt_password(self, encrypted_password: str) -> str:
         """解密密码"""
@@ -705,44 +519,36 @@ class FabricSSHManager:
 
         # 动态检查连接池是否启用
         pool_enabled = self._is_connection_pool_enabled()
-        
-        # 尝试从连接池获取连接
-        conn = None
-        from_pool = False
-        
-        if pool_enabled:
-            conn = self.connection_pool.get_connection(conn_info, self._create_new_connection)
-            if conn:
-                from_pool = True
-                logger.debug(f"从连接池获取连接: {conn_info['host']}:{conn_info['port']}")
-        
-        # 如果连接池中没有可用连接，创建新连接
-        if not conn:
+        # 配置切换后同步连接池状态，关闭时一并释放空闲连接
+        if pool_enabled and not self.connection_pool.is_enabled():
+            self.connection_pool.enable()
+        elif not pool_enabled and self.connection_pool.is_enabled():
+            self.connection_pool.disable()
+
+        if not pool_enabled:
+            conn = self._open_connection(conn_info, config)
             try:
-                conn = self._create_new_connection(conn_info, config)
-            except (AuthenticationException, NoValidConnectionsError) as e:
-                raise FabricSSHError(f"SSH认证失败: {str(e)}")
-            except Exception as e:
-                raise FabricSSHError(f"SSH连接失败: {str(e)}")
-        
-        try:
+                yield conn
+            finally:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            return
+
+        # 连接池：复用空闲会话，未命中时新建；with 块内异常时连接被关闭而不归还
+        with self.connection_pool.connection(conn_info, lambda: self._open_connection(conn_info, config)) as conn:
             yield conn
-        finally:
-            # 归还连接到池中或关闭连接
-            if pool_enabled and from_pool:
-                # 从池中获取的连接，归还到池中
-                self.connection_pool.return_connection(conn_info, conn)
-            else:
-                # 新创建的连接，如果连接池启用则归还，否则关闭
-                if pool_enabled:
-                    self.connection_pool.return_connection(conn_info, conn)
-                else:
-                    if conn:
-                        try:
-                            conn.close()
-                        except:
-                            pass
-    
+
+    def _open_connection(self, conn_info: Dict[str, Any], config: Config) -> Connection:
+        """新建连接，并把认证/网络错误统一转换为FabricSSHError"""
+        try:
+            return self._create_new_connection(conn_info, config)
+        except (AuthenticationException, NoValidConnectionsError) as e:
+            raise FabricSSHError(f"SSH认证失败: {str(e)}")
+        except Exception as e:
+            raise FabricSSHError(f"SSH连接失败: {str(e)}")
+
     def _render_path_variables(self, path: str, now: Optional[datetime] = None, source_host: Optional[object] = None, target_host: Optional[object] = None) -> str:
         """在服务器端渲染路径中的变量，例如 [date], [date+1], [date:YYYY/MM/DD], [hostname], [timestamp]"""
         if not path:
@@ -0,0 +1,316 @@
+"""
+SSH 命令实时输出缓冲与推送
+
+原 RealTimeOutputHandler 在 write 中反复拼接/切分字符串，每一行在持锁状态下同步写两条 info 日志并
+推送一次 Redis，SSH 通道读取线程被 Redis 延迟拖慢。本模块：
+ - 按行收集输出到 deque，达到行数（REALTIME_OUTPUT_FLUSH_LINES）、字节数（REALTIME_OUTPUT_FLUSH_BYTES）
+   或时间（REALTIME_OUTPUT_FLUSH_INTERVAL）阈值时打包成一批
+ - 批次交给后台发布线程，通过 realtime_log_service.push_logs_batch 一次管道往返写入；
+   write 只做内存操作，不等待 Redis
+ - 发布队列有界（REALTIME_OUTPUT_QUEUE_SIZE），队列满时丢弃批次并计数；单行超过
+   REALTIME_OUTPUT_MAX_LINE_LENGTH 截断，单个输出流超过 REALTIME_OUTPUT_MAX_BYTES 后不再推送
+ - close() 推送剩余内容（含丢弃/截断提示）并等待本处理器的批次发布完成，保证后续的"执行完成"日志排在输出之后
+
+对外接口：
+ - RealTimeOutputHandler(task_id, host_id, host_name, host_ip, stream_type, stream_key)
+"""
+import logging
+import queue
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+from django.conf import settings
+
+from utils.realtime_logs import realtime_log_service
+
+logger = logging.getLogger(__name__)
+
+
+class _OutputPublisher:
+    """后台发布线程：按提交顺序推送各处理器的日志批次，并定时冲刷到期的缓冲"""
+
+    def __init__(self):
+        self.queue_size = getattr(settings, 'REALTIME_OUTPUT_QUEUE_SIZE', 10000)
+        self.interval = getattr(settings, 'REALTIME_OUTPUT_FLUSH_INTERVAL', 0.2)
+        self._queue: "queue.Queue[Tuple[RealTimeOutputHandler, List[str]]]" = queue.Queue(maxsize=self.queue_size)
+        self._handlers: "weakref.WeakSet[RealTimeOutputHandler]" = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.dropped_batches = 0
+        self._last_drop_warning = 0.0
+
+    def register(self, handler: "RealTimeOutputHandler"):
+        with self._lock:
+            self._handlers.add(handler)
+        self._ensure_thread()
+
+    def unregister(self, handler: "RealTimeOutputHandler"):
+        with self._lock:
+            self._handlers.discard(handler)
+
+    def submit(self, handler: "RealTimeOutputHandler", lines: List[str], block: bool = False) -> bool:
+        """提交一批日志；队列已满时非阻塞提交直接丢弃，返回是否入队"""
+        try:
+            if block:
+                self._queue.put((handler, lines), timeout=handler.close_timeout)
+            else:
+                self._queue.put_nowait((handler, lines))
+        except queue.Full:
+            self._on_drop(handler, lines)
+            return False
+        return True
+
+    def _on_drop(self, handler: "RealTimeOutputHandler", lines: List[str]):
+        handler.mark_dropped(len(lines))
+        now = time.monotonic()
+        with self._lock:
+            self.dropped_batches += 1
+            warn = now - self._last_drop_warning >= 10
+            if warn:
+                self._last_drop_warning = now
+        if warn:
+            logger.warning(f"实时输出发布队列已满（{self.queue_size}），丢弃日志批次，累计 {self.dropped_batches} 批")
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="realtime-output-publisher", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                handler, lines = self._queue.get(timeout=self.interval)
+            except queue.Empty:
+                self._flush_due()
+                continue
+            try:
+                handler.publish(lines)
+            except Exception as e:
+                logger.error(f"发布实时输出失败: {e}")
+            finally:
+                handler.batch_done()
+            self._flush_due()
+
+    def _flush_due(self):
+        """没有新输出到达时，由发布线程冲刷超过时间阈值的缓冲"""
+        with self._lock:
+            handlers = list(self._handlers)
+        for handler in handlers:
+            try:
+                handler.flush_if_due()
+            except Exception as e:
+                logger.error(f"冲刷实时输出缓冲失败: {e}")
+
+
+_publisher: Optional[_OutputPublisher] = None
+_publisher_lock = threading.Lock()
+
+
+def get_output_publisher() -> _OutputPublisher:
+    global _publisher
+    if _publisher is None:
+        with _publisher_lock:
+            if _publisher is None:
+                _publisher = _OutputPublisher()
+    return _publisher
+
+
+class RealTimeOutputHandler:
+    """实时输出处理器，用于捕获并推送命令执行过程中的实时输出（按时间/大小窗口批量推送）"""
+
+    TRUNCATED_SUFFIX = ' ...[行过长已截断]'
+
+    def __init__(self, task_id: str, host_id: int, host_name: str, host_ip: str, stream_type: str = "stdout", stream_key: str = None):
+        self.task_id = task_id
+        self.host_id = host_id
+        self.host_name = host_name
+        self.host_ip = host_ip
+        self.stream_type = stream_type
+        self.stream_key = stream_key
+        self.flush_lines = getattr(settings, 'REALTIME_OUTPUT_FLUSH_LINES', 100)
+        self.flush_bytes = getattr(settings, 'REALTIME_OUTPUT_FLUSH_BYTES', 64 * 1024)
+        self.flush_interval = getattr(settings, 'REALTIME_OUTPUT_FLUSH_INTERVAL', 0.2)
+        self.max_line_length = getattr(settings, 'REALTIME_OUTPUT_MAX_LINE_LENGTH', 8192)
+        self.max_bytes = getattr(settings, 'REALTIME_OUTPUT_MAX_BYTES', 10 * 1024 * 1024)
+        self.close_timeout = getattr(settings, 'REALTIME_OUTPUT_CLOSE_TIMEOUT', 5)
+        self.lock = threading.Lock()
+        self.closed = False
+        self._partial: List[str] = []
+        self._partial_len = 0
+        self._lines: Deque[str] = deque()
+        self._buffered_bytes = 0
+        self._buffered_since = 0.0
+        self._total_bytes = 0
+        self._truncated = False
+        self._dropped_lines = 0
+        self._pending = 0
+        self._idle = threading.Condition(threading.Lock())
+        self._publisher = get_output_publisher()
+        self._publisher.register(self)
+
+    def write(self, data):
+        """处理写入的数据（只做内存操作，推送由后台线程完成）"""
+        if not data or self.closed:
+            return
+
+        try:
+            # 处理编码问题
+            if isinstance(data, bytes):
+                try:
+                    data = data.decode('utf-8')
+                except UnicodeDecodeError:
+                    try:
+                        data = data.decode('gbk')
+                    except UnicodeDecodeError:
+                        data = data.decode('utf-8', errors='replace')
+
+            with self.lock:
+                if self.closed:
+                    return
+                pieces = data.split('\n')
+                if len(pieces) > 1:
+                    self._partial.append(pieces[0])
+                    self._add_line(''.join(self._partial))
+                    for line in pieces[1:-1]:
+                        self._add_line(line)
+                    self._partial = []
+                    self._partial_len = 0
+                if pieces[-1]:
+                    self._partial.append(pieces[-1])
+                    self._partial_len += len(pieces[-1])
+                    # 没有换行的超长输出（如进度条）按最大行长度切出
+                    if self._partial_len >= self.max_line_length:
+                        self._add_line(''.join(self._partial))
+                        self._partial = []
+                        self._partial_len = 0
+                batch = self._take_batch_if_full()
+            if batch:
+                self._submit(batch)
+
+        except Exception as e:
+            logger.error(f"RealTimeOutputHandler.write失败: {e}")
+
+    def flush(self):
+        """把已缓冲的内容（含未换行的部分）交给发布线程"""
+        try:
+            with self.lock:
+                if self.closed:
+                    return
+                batch = self._take_all()
+            if batch:
+                self._submit(batch)
+        except Exception as e:
+            logger.error(f"RealTimeOutputHandler.flush失败: {e}")
+
+    def close(self):
+        """关闭处理器：推送剩余内容并等待本处理器的批次发布完成"""
+        try:
+            with self.lock:
+                if self.closed:
+                    return
+                self.closed = True
+                batch = self._take_all()
+                notice = self._overflow_notice()
+                if notice:
+                    batch.append(notice)
+            self._publisher.unregister(self)
+            if batch:
+                self._submit(batch, block=True)
+            with self._idle:
+                self._idle.wait_for(lambda: self._pending == 0, timeout=self.close_timeout)
+        except Exception as e:
+            logger.error(f"RealTimeOutputHandler.close失败: {e}")
+
+    def flush_if_due(self):
+        """发布线程调用：缓冲超过时间阈值时推送"""
+        with self.lock:
+            if not self._lines or time.monotonic() - self._buffered_since < self.flush_interval:
+                return
+            batch = self._take_lines()
+        self._submit(batch)
+
+    # ------------------------------------------------------------------ 发布线程回调
+
+    def publish(self, lines: List[str]):
+        realtime_log_service.push_logs_batch(self.task_id, self.host_id, [
+            {
+                'host_name': self.host_name,
+                'host_ip': self.host_ip,
+                'log_type': self.stream_type,
+                'content': line,
+                'step_name': '脚本执行',
+                'step_order': 1
+            }
+            for line in lines
+        ], stream_key=self.stream_key)
+        logger.debug(f"[实时日志] 推送 {len(lines)} 行: {self.host_name} {self.stream_type}")
+
+    def batch_done(self):
+        with self._idle:
+            self._pending -= 1
+            if self._pending == 0:
+                self._idle.notify_all()
+
+    def mark_dropped(self, count: int):
+        with self.lock:
+            self._dropped_lines += count
+
+    # ------------------------------------------------------------------ 缓冲（调用方持有 self.lock）
+
+    def _add_line(self, line: str):
+        line = line.rstrip('\r').strip()
+        if not line or self._truncated:
+            return
+        if len(line) > self.max_line_length:
+            line = line[:self.max_line_length] + self.TRUNCATED_SUFFIX
+        size = len(line.encode('utf-8'))
+        if self._total_bytes + size > self.max_bytes:
+            self._truncated = True
+            return
+        if not self._lines:
+            self._buffered_since = time.monotonic()
+        self._total_bytes += size
+        self._buffered_bytes += size
+        self._lines.append(line)
+
+    def _take_batch_if_full(self) -> List[str]:
+        if not self._lines:
+            return []
+        if (len(self._lines) >= self.flush_lines or self._buffered_bytes >= self.flush_bytes
+                or time.monotonic() - self._buffered_since >= self.flush_interval):
+            return self._take_lines()
+        return []
+
+    def _take_lines(self) -> List[str]:
+        batch = list(self._lines)
+        self._lines.clear()
+        self._buffered_bytes = 0
+        return batch
+
+    def _take_all(self) -> List[str]:
+        if self._partial:
+            self._add_line(''.join(self._partial))
+            self._partial = []
+            self._partial_len = 0
+        return self._take_lines()
+
+    def _overflow_notice(self) -> str:
+        notes = []
+        if self._truncated:
+            notes.append(f'输出超过 {self.max_bytes} 字节，后续内容未推送')
+        if self._dropped_lines:
+            notes.append(f'日志推送繁忙，丢弃 {self._dropped_lines} 行输出')
+        return f"[实时日志] {'；'.join(notes)}（完整输出见执行结果）" if notes else ''
+
+    def _submit(self, batch: List[str], block: bool = False):
+        with self._idle:
+            self._pending += 1
+        if not self._publisher.submit(self, batch, block=block):
+            self.batch_done()
@@ -246,6 +246,10 @@ class HostConnectionTestSerializer(serializers.Serializer):
         child=serializers.IntegerField(),
         help_text="主机ID列表"
     )
+    batch_task_id = serializers.CharField(
+        required=False,
+        help_text="批量任务ID，用于订阅实时进度（不传则自动生成）"
+    )
 
 
 class HostCommandExecuteSerializer(serializers.Serializer):
@@ -15,6 +15,7 @@ from rest_framework.exceptions import ValidationError as DRFValidationError
 
 from .models import Host, HostGroup
 from .fabric_ssh_manager import fabric_ssh_manager, FabricSSHError
+from .connectivity import HostConnectivityChecker
 from .serializers import HostSerializer
 from utils.audit_service import AuditLogService
 import os
@@ -448,30 +449,25 @@ class HostService:
         return result
     
     @staticmethod
-    def batch_test_connections(hosts: List[Host], user=None) -> Dict[str, Any]:
-        """批量测试主机连接"""
+    def batch_test_connections(hosts: List[Host], user=None, batch_task_id: Optional[str] = None) -> Dict[str, Any]:
+        """批量测试主机连接（并发检查，TCP 预检后再 SSH，状态一次性写回）"""
+        host_results = HostConnectivityChecker().check(hosts, mode='connection', batch_task_id=batch_task_id)
         results = {
             'total': len(hosts),
-            'success': 0,
-            'failed': 0,
-            'details': []
+            'success': sum(1 for result in host_results if result['success']),
+            'failed': sum(1 for result in host_results if not result['success']),
+            'details': [
+                {
+                    'host_id': host.id,
+                    'host_name': host.name,
+                    'ip_address': host.ip_address,
+                    'result': result
+                }
+                for host, result in zip(hosts, host_results)
+            ]
         }
-        
-        for host in hosts:
-            result = HostService.test_host_connection(host, user)
-            
-            if result['success']:
-                results['success'] += 1
-            else:
-                results['failed'] += 1
-            
-            results['details'].append({
-                'host_id': host.id,
-                'host_name': host.name,
-                'ip_address': host.ip_address,
-                'result': result
-            })
-        
+        if batch_task_id:
+            results['batch_task_id'] = batch_task_id
         return results
     
     @staticmethod
@@ -490,22 +486,15 @@ class HostService:
             return 'offline'
     
     @staticmethod
-    def batch_check_status(hosts: List[Host]) -> Dict[str, int]:
-        """批量检查主机状态"""
+    def batch_check_status(hosts: List[Host], batch_task_id: Optional[str] = None) -> Dict[str, int]:
+        """批量检查主机状态（并发检查，状态一次性写回）"""
         status_count = {
             'online': 0,
             'offline': 0,
             'unknown': 0
         }
-        
-        for host in hosts:
-            status = HostService.check_host_status(host)
-            host.status = status
-            host.last_check_time = timezone.now()
-            host.save(update_fields=['status', 'last_check_time'])
-            
-            status_count[status] += 1
-        
+        for result in HostConnectivityChecker().check(hosts, mode='status', batch_task_id=batch_task_id):
+            status_count['online' if result['success'] else 'offline'] += 1
         return status_count
     
     @staticmethod
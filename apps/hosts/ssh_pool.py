@@ -0,0 +1,271 @@
+"""
+SSH 连接池
+
+原 fabric_ssh_manager.ConnectionPool 用一把全局锁保护按 host:port:user 分组的列表，
+没有空闲超时、最大存活时间和 keepalive，键数量也不设上限，且在持锁期间检查连接存活。本模块：
+ - 每个连接键一把锁，全局锁只保护键字典与计数，时间很短
+ - 键数量超过 SSH_POOL_MAX_KEYS 时按 LRU 淘汰最久未使用、且没有借出连接的键
+ - 空闲超过 SSH_POOL_IDLE_TIMEOUT 或存活超过 SSH_POOL_MAX_AGE 的连接被关闭
+ - 新建连接开启传输层 keepalive（SSH_POOL_KEEPALIVE_INTERVAL）
+ - 存活检查与关闭连接都在锁外进行
+ - 连接键包含认证信息指纹，账号凭据变更后不会复用旧会话
+ - stats() 返回命中/未命中/新建/关闭等计数，供监控使用
+
+对外接口：
+ - SSHConnectionPool.connection(conn_info, factory) 上下文管理器
+ - SSHConnectionPool.stats() / clear() / enable() / disable()
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class _PooledConnection:
+    """池中连接及其创建/最近使用时间（monotonic）"""
+
+    __slots__ = ('conn', 'created_at', 'last_used')
+
+    def __init__(self, conn, now: float):
+        self.conn = conn
+        self.created_at = now
+        self.last_used = now
+
+
+class _KeyBucket:
+    """单个连接键的空闲连接栈；in_use 只在全局锁下修改"""
+
+    __slots__ = ('lock', 'idle', 'in_use')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.idle: Deque[_PooledConnection] = deque()
+        self.in_use = 0
+
+
+def _transport(conn):
+    """取 Fabric/Paramiko 连接的底层 transport，不存在时返回 None"""
+    client = getattr(conn, 'client', None)
+    get_transport = getattr(client, 'get_transport', None)
+    return get_transport() if get_transport else None
+
+
+class SSHConnectionPool:
+    """SSH连接池（线程安全）"""
+
+    COUNTERS = ('hits', 'misses', 'opened', 'closed', 'expired', 'broken', 'evicted', 'overflow')
+
+    def __init__(self, max_per_key: Optional[int] = None, max_keys: Optional[int] = None,
+                 idle_timeout: Optional[float] = None, max_age: Optional[float] = None,
+                 keepalive_interval: Optional[int] = None):
+        self.max_per_key = max_per_key or getattr(settings, 'SSH_POOL_MAX_PER_KEY', 10)
+        self.max_keys = max_keys or getattr(settings, 'SSH_POOL_MAX_KEYS', 256)
+        self.idle_timeout = idle_timeout or getattr(settings, 'SSH_POOL_IDLE_TIMEOUT', 300)
+        self.max_age = max_age or getattr(settings, 'SSH_POOL_MAX_AGE', 1800)
+        self.keepalive_interval = (
+            keepalive_interval if keepalive_interval is not None
+            else getattr(settings, 'SSH_POOL_KEEPALIVE_INTERVAL', 30)
+        )
+        self._buckets: "OrderedDict[str, _KeyBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(self.COUNTERS, 0)
+        self._last_sweep = time.monotonic()
+        self._enabled = False
+
+    def enable(self):
+        """启用连接池"""
+        self._enabled = True
+
+    def disable(self):
+        """禁用连接池并关闭空闲连接"""
+        self._enabled = False
+        self.clear()
+
+    def is_enabled(self) -> bool:
+        """检查连接池是否启用"""
+        return self._enabled
+
+    @staticmethod
+    def make_key(conn_info: Dict[str, Any]) -> str:
+        """生成连接键：用户@主机:端口#认证指纹"""
+        return (
+            f"{conn_info['user']}@{conn_info['host']}:{conn_info['port']}"
+            f"#{conn_info.get('auth_fingerprint', '')}"
+        )
+
+    @contextmanager
+    def connection(self, conn_info: Dict[str, Any], factory: Callable[[], Any]):
+        """
+        借出一个连接：优先复用空闲连接，否则调用 factory() 新建
+        正常退出时归还到池中，with 块内抛出异常时关闭连接
+        """
+        self._maybe_sweep()
+        key = self.make_key(conn_info)
+        bucket = self._checkout_bucket(key)
+        entry = None
+        reusable = False
+        try:
+            entry = self._take_idle(bucket)
+            if entry is None:
+                entry = _PooledConnection(factory(), time.monotonic())
+                self._count('misses', 'opened')
+                self._enable_keepalive(entry.conn)
+            else:
+                self._count('hits')
+            yield entry.conn
+            reusable = True
+        finally:
+            if entry is not None:
+                self._give_back(bucket, entry, reusable)
+            with self._lock:
+                bucket.in_use -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """连接池监控数据"""
+        with self._lock:
+            counters = dict(self._counters)
+            buckets = list(self._buckets.values())
+            in_use = sum(bucket.in_use for bucket in buckets)
+        lookups = counters['hits'] + counters['misses']
+        return {
+            'enabled': self._enabled,
+            'keys': len(buckets),
+            'idle': sum(len(bucket.idle) for bucket in buckets),
+            'in_use': in_use,
+            'hit_rate': round(counters['hits'] / lookups, 4) if lookups else 0.0,
+            **counters,
+            'max_per_key': self.max_per_key,
+            'max_keys': self.max_keys,
+            'idle_timeout': self.idle_timeout,
+            'max_age': self.max_age,
+            'keepalive_interval': self.keepalive_interval,
+        }
+
+    def clear(self):
+        """关闭所有空闲连接（借出中的连接归还时按当前状态处理）"""
+        with self._lock:
+            buckets = list(self._buckets.values())
+        for bucket in buckets:
+            with bucket.lock:
+                drained = list(bucket.idle)
+                bucket.idle.clear()
+            for entry in drained:
+                self._close(entry.conn)
+
+    def sweep(self):
+        """关闭所有已过期的空闲连接，并移除空闲且无借出连接的键"""
+        now = time.monotonic()
+        self._last_sweep = now
+        with self._lock:
+            buckets = list(self._buckets.items())
+        expired: List[_PooledConnection] = []
+        for _, bucket in buckets:
+            with bucket.lock:
+                keep: Deque[_PooledConnection] = deque()
+                for entry in bucket.idle:
+                    (expired if self._is_expired(entry, now) else keep).append(entry)
+                bucket.idle = keep
+        with self._lock:
+            for key, bucket in buckets:
+                if bucket.in_use == 0 and not bucket.idle and self._buckets.get(key) is bucket:
+                    del self._buckets[key]
+        for entry in expired:
+            self._count('expired')
+            self._close(entry.conn)
+
+    def _maybe_sweep(self):
+        if time.monotonic() - self._last_sweep >= max(1.0, self.idle_timeout / 2):
+            self.sweep()
+
+    def _checkout_bucket(self, key: str) -> _KeyBucket:
+        """取（或创建）键对应的桶并登记借出；超出键上限时淘汰最久未使用的空闲键"""
+        evicted: List[_KeyBucket] = []
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = _KeyBucket()
+            self._buckets.move_to_end(key)
+            bucket.in_use += 1
+            if len(self._buckets) > self.max_keys:
+                for lru_key in list(self._buckets):
+                    if len(self._buckets) <= self.max_keys:
+                        break
+                    if self._buckets[lru_key].in_use == 0:
+                        evicted.append(self._buckets.pop(lru_key))
+        for victim in evicted:
+            with victim.lock:
+                drained = list(victim.idle)
+                victim.idle.clear()
+            for entry in drained:
+                self._count('evicted')
+                self._close(entry.conn)
+        return bucket
+
+    def _take_idle(self, bucket: _KeyBucket) -> Optional[_PooledConnection]:
+        """取最近归还的空闲连接；过期或已断开的连接在锁外关闭后继续取下一个"""
+        while True:
+            with bucket.lock:
+                if not bucket.idle:
+                    return None
+                entry = bucket.idle.pop()
+            if self._is_expired(entry, time.monotonic()):
+                self._count('expired')
+            elif self._is_alive(entry.conn):
+                return entry
+            else:
+                self._count('broken')
+            self._close(entry.conn)
+
+    def _give_back(self, bucket: _KeyBucket, entry: _PooledConnection, reusable: bool):
+        now = time.monotonic()
+        if not reusable or not self._is_alive(entry.conn):
+            self._count('broken')
+        elif not self._enabled or now - entry.created_at >= self.max_age:
+            self._count('expired')
+        else:
+            entry.last_used = now
+            with bucket.lock:
+                if len(bucket.idle) < self.max_per_key:
+                    bucket.idle.append(entry)
+                    return
+            self._count('overflow')
+        self._close(entry.conn)
+
+    def _is_expired(self, entry: _PooledConnection, now: float) -> bool:
+        return now - entry.last_used >= self.idle_timeout or now - entry.created_at >= self.max_age
+
+    @staticmethod
+    def _is_alive(conn) -> bool:
+        try:
+            transport = _transport(conn)
+            return bool(transport and transport.is_active())
+        except Exception:
+            return False
+
+    def _enable_keepalive(self, conn):
+        if self.keepalive_interval <= 0:
+            return
+        try:
+            transport = _transport(conn)
+            if transport:
+                transport.set_keepalive(self.keepalive_interval)
+        except Exception as e:
+            logger.debug(f"设置SSH keepalive失败: {e}")
+
+    def _close(self, conn):
+        self._count('closed')
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _count(self, *names: str):
+        with self._lock:
+            for name in names:
+                self._counters[name] += 1
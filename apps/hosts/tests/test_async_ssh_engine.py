@@ -0,0 +1,88 @@
+import asyncio
+from collections import Counter
+from types import SimpleNamespace
+
+import pytest
+
+from apps.hosts import async_ssh_engine
+from apps.hosts.async_ssh_engine import AsyncSSHEngine, SSHJob
+from utils.realtime_logs import realtime_log_service
+
+
+@pytest.fixture()
+def engine_class(monkeypatch):
+    # asyncssh 为可选依赖，调度与输出处理不依赖真实连接
+    monkeypatch.setattr(async_ssh_engine, "ASYNCSSH_AVAILABLE", True)
+    monkeypatch.setattr(async_ssh_engine, "get_connection_info", lambda host, account_id=None: {"host": host.name})
+    monkeypatch.setattr(AsyncSSHEngine, "_prepare", lambda self, jobs, results: (
+        (index, job) for index, job in enumerate(jobs)
+    ))
+    return AsyncSSHEngine
+
+
+def _host(i, zone=""):
+    return SimpleNamespace(id=i, name=f"h{i}", zone=zone, region="", ip_address=f"10.0.0.{i}")
+
+
+def test_group_limit_caps_sessions_per_zone(engine_class, monkeypatch):
+    running = Counter()
+    peak = Counter()
+
+    async def fake_run_job(self, job):
+        zone = job.host.zone
+        running[zone] += 1
+        running["all"] += 1
+        peak[zone] = max(peak[zone], running[zone])
+        peak["all"] = max(peak["all"], running["all"])
+        await asyncio.sleep(0.01)
+        running[zone] -= 1
+        running["all"] -= 1
+        return {"success": True, "host_id": job.host.id}
+
+    monkeypatch.setattr(engine_class, "_run_job", fake_run_job)
+    engine = engine_class(max_concurrency=6, group_limit=2)
+    hosts = [_host(i, zone="az-a" if i % 2 else "az-b") for i in range(20)]
+
+    results = engine.execute_many([SSHJob(host=h, script_content="true") for h in hosts])
+
+    assert [r["host_id"] for r in results] == list(range(20))
+    assert peak["az-a"] == 2 and peak["az-b"] == 2 and peak["all"] <= 6
+
+
+def test_command_output_is_collected_and_streamed(engine_class, monkeypatch):
+    pushed = []
+    monkeypatch.setattr(realtime_log_service, "push_logs_batch", lambda task_id, host_id, items, **kwargs: pushed.extend(
+        (data["log_type"], data["content"]) for data in items
+    ))
+
+    class _Reader:
+        def __init__(self, chunks):
+            self.chunks = list(chunks)
+
+        async def read(self, size):
+            return self.chunks.pop(0) if self.chunks else ""
+
+    class _Process:
+        stdout = _Reader(["line 1\nli", "ne 2\n"])
+        stderr = _Reader(["oops\n"])
+        exit_status = 3
+
+        async def wait_closed(self):
+            pass
+
+        def close(self):
+            pass
+
+    class _Conn:
+        async def create_process(self, command, **kwargs):
+            self.command = command
+            return _Process()
+
+    job = SSHJob(host=_host(1), script_content="echo 'hi'", timeout=5, task_id="t1")
+    conn = _Conn()
+    result = asyncio.run(engine_class(max_concurrency=1)._run_script(conn, job))
+
+    assert "bash -c 'echo '\"'\"'hi'\"'\"''" in conn.command
+    assert result["stdout"] == "line 1\nline 2\n" and result["stderr"] == "oops\n"
+    assert (result["success"], result["exit_code"], result["message"]) == (False, 3, "执行失败，退出码: 3")
+    assert sorted(pushed) == [("stderr", "oops"), ("stdout", "line 1"), ("stdout", "line 2")]
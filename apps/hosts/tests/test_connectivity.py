@@ -0,0 +1,125 @@
+import socket
+import time
+
+import pytest
+from django.contrib.auth.models import User
+
+from apps.hosts import connectivity
+from apps.hosts.models import Host
+from apps.hosts.services import HostService
+from utils.realtime_logs import realtime_log_service
+
+
+@pytest.fixture()
+def listening_port():
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(16)
+    yield server.getsockname()[1]
+    server.close()
+
+
+@pytest.fixture()
+def closed_port():
+    probe = socket.socket()
+    probe.bind(("127.0.0.1", 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    return port
+
+
+@pytest.mark.django_db
+def test_unreachable_hosts_skip_ssh_and_statuses_are_written(monkeypatch, listening_port, closed_port):
+    monkeypatch.setattr(connectivity, "async_ssh_engine", None)
+    user = User.objects.create_user(username="check-user", password="pass")
+    up = Host.objects.create(name="up", internal_ip="127.0.0.1", port=listening_port, os_type="linux",
+                             device_type="physical", created_by=user)
+    down = Host.objects.create(name="down", internal_ip="127.0.0.1", port=closed_port, os_type="linux",
+                               device_type="physical", created_by=user, status="online")
+    ssh_calls = []
+    monkeypatch.setattr(
+        connectivity.fabric_ssh_manager, "execute_script",
+        lambda host, **kwargs: ssh_calls.append(host.name) or {"success": True, "stdout": "connection_test"},
+    )
+    pushed = []
+    monkeypatch.setattr(realtime_log_service, "push_status", lambda task_id, data, **kwargs: pushed.append(data))
+
+    result = HostService.batch_test_connections([up, down], batch_task_id="batch-1")
+
+    assert (result["success"], result["failed"], result["batch_task_id"]) == (1, 1, "batch-1")
+    assert ssh_calls == ["up"]
+    assert result["details"][0]["result"]["used_ip_type"] == "internal"
+    assert "不可达" in result["details"][1]["result"]["error_details"]
+    up.refresh_from_db()
+    down.refresh_from_db()
+    assert (up.status, down.status) == ("online", "offline")
+    assert pushed[-1]["status"] == "completed" and pushed[-1]["completed"] == 2
+
+
+@pytest.mark.django_db
+def test_hosts_are_checked_concurrently(monkeypatch, settings):
+    settings.HOST_CHECK_CONCURRENCY = 20
+    user = User.objects.create_user(username="check-user-2", password="pass")
+    hosts = [
+        Host.objects.create(name=f"h{i}", internal_ip=f"10.0.0.{i + 1}", os_type="linux",
+                            device_type="physical", created_by=user)
+        for i in range(20)
+    ]
+
+    def slow_probe(ip, port, timeout):
+        time.sleep(0.2)
+        return f"{ip}:{port} 连接超时"
+
+    monkeypatch.setattr(connectivity, "tcp_probe", slow_probe)
+
+    started = time.monotonic()
+    counts = HostService.batch_check_status(hosts)
+
+    assert counts == {"online": 0, "offline": 20, "unknown": 0}
+    assert time.monotonic() - started < 2
+
+
+class _FakeEngine:
+    """记录每轮探测的 IP；10.0.0.x 内网 IP 一律 SSH 失败"""
+
+    def __init__(self):
+        self.rounds = []
+
+    def execute_many(self, jobs, on_result=None):
+        self.rounds.append([job.host.internal_ip for job in jobs])
+        for index, job in enumerate(jobs):
+            if job.host.internal_ip.startswith("10."):
+                result = {"success": False, "exit_code": -1, "message": "执行失败: Authentication failed"}
+            else:
+                result = {"success": True, "stdout": "connection_test"}
+            on_result(index, result)
+
+
+@pytest.mark.django_db
+def test_async_engine_probes_reachable_hosts_in_rounds(monkeypatch):
+    engine = _FakeEngine()
+    monkeypatch.setattr(connectivity, "async_ssh_engine", engine)
+    monkeypatch.setattr(connectivity, "tcp_probe",
+                        lambda ip, port, timeout: f"{ip}:{port} 连接超时" if ip.endswith(".9") else None)
+    monkeypatch.setattr(realtime_log_service, "push_status", lambda *args, **kwargs: None)
+    user = User.objects.create_user(username="check-user-3", password="pass")
+
+    def host(name, internal_ip, public_ip=None):
+        return Host.objects.create(name=name, internal_ip=internal_ip, public_ip=public_ip, os_type="linux",
+                                   device_type="physical", created_by=user)
+
+    fallback = host("fallback", "10.0.0.1", "1.1.1.1")
+    internal_only = host("internal-only", "10.0.0.2")
+    unreachable = host("unreachable", "10.0.0.9")
+    direct = host("direct", "192.168.0.1")
+
+    result = HostService.batch_test_connections([fallback, internal_only, unreachable, direct])
+
+    assert engine.rounds == [["10.0.0.1", "10.0.0.2", "192.168.0.1"], ["1.1.1.1"]]
+    details = [detail["result"] for detail in result["details"]]
+    assert (details[0]["success"], details[0]["used_ip_type"]) == (True, "public")
+    assert "Authentication failed" in details[1]["error_details"]
+    assert "连接超时" in details[2]["error_details"]
+    assert details[3]["used_ip"] == "192.168.0.1"
+    assert (result["success"], result["failed"]) == (2, 2)
+    assert Host.objects.get(id=fallback.id).status == "online"
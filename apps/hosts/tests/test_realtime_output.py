@@ -0,0 +1,101 @@
+import threading
+import time
+
+import pytest
+
+from apps.hosts import realtime_output
+from apps.hosts.realtime_output import RealTimeOutputHandler, _OutputPublisher
+from utils.realtime_logs import realtime_log_service
+
+
+class _SlowRedis:
+    """记录批量推送，并模拟 Redis 往返延迟"""
+
+    def __init__(self, delay=0.0, gate=None):
+        self.delay = delay
+        self.gate = gate
+        self.batches = []
+
+    def push_logs_batch(self, execution_id, host_id, items, stream_key=None, **kwargs):
+        if self.gate is not None:
+            self.gate.wait()
+        time.sleep(self.delay)
+        self.batches.append((stream_key, [item["content"] for item in items]))
+        return len(items)
+
+    @property
+    def lines(self):
+        return [line for _, batch in self.batches for line in batch]
+
+
+@pytest.fixture()
+def redis_stub(monkeypatch, settings):
+    settings.REALTIME_OUTPUT_FLUSH_LINES = 50
+    settings.REALTIME_OUTPUT_FLUSH_INTERVAL = 0.05
+    settings.REALTIME_OUTPUT_QUEUE_SIZE = 4
+    stub = _SlowRedis()
+    monkeypatch.setattr(realtime_log_service, "push_logs_batch", stub.push_logs_batch)
+    monkeypatch.setattr(realtime_output, "_publisher", _OutputPublisher())
+    return stub
+
+
+def _handler():
+    return RealTimeOutputHandler("task-1", 1, "h1", "10.0.0.1", "stdout", stream_key="logs")
+
+
+def test_lines_are_batched_across_chunk_boundaries(redis_stub):
+    redis_stub.delay = 0.05
+    handler = _handler()
+    chunks = ["li", "ne 0\nline 1\r\n\nline", " 2\n"] + [f"line {i}\n" for i in range(3, 120)] + ["tail"]
+
+    started = time.monotonic()
+    for chunk in chunks:
+        handler.write(chunk.encode("utf-8"))
+    # 写入不等待 Redis 往返
+    assert time.monotonic() - started < 0.05
+    handler.close()
+
+    assert redis_stub.lines == [f"line {i}" for i in range(120)] + ["tail"]
+    assert len(redis_stub.batches) <= 4
+    assert {key for key, _ in redis_stub.batches} == {"logs"}
+
+
+def test_buffered_lines_are_flushed_by_time(redis_stub):
+    handler = _handler()
+    handler.write("only line\n")
+    time.sleep(0.3)
+    assert redis_stub.lines == ["only line"]
+    handler.close()
+
+
+def test_runaway_output_is_truncated(redis_stub, settings):
+    settings.REALTIME_OUTPUT_MAX_LINE_LENGTH = 10
+    settings.REALTIME_OUTPUT_MAX_BYTES = 40
+    handler = _handler()
+    handler.write("x" * 25 + "\n")
+    for i in range(20):
+        handler.write(f"row {i}\n")
+    handler.close()
+
+    lines = redis_stub.lines
+    assert lines[0] == "x" * 10 + RealTimeOutputHandler.TRUNCATED_SUFFIX
+    assert "row 19" not in lines
+    assert "后续内容未推送" in lines[-1]
+
+
+def test_full_queue_drops_batches_instead_of_blocking(redis_stub, settings):
+    settings.REALTIME_OUTPUT_FLUSH_LINES = 1
+    gate = threading.Event()
+    redis_stub.gate = gate
+    handler = _handler()
+
+    started = time.monotonic()
+    for i in range(20):
+        handler.write(f"line {i}\n")
+    assert time.monotonic() - started < 0.1
+    gate.set()
+    handler.close()
+
+    lines = redis_stub.lines
+    assert len(lines) < 21
+    assert "丢弃" in lines[-1]
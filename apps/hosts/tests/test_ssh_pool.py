@@ -0,0 +1,134 @@
+import pytest
+
+from apps.hosts import ssh_pool
+from apps.hosts.ssh_pool import SSHConnectionPool
+
+
+class _Transport:
+    def __init__(self):
+        self.active = True
+        self.keepalive = None
+
+    def is_active(self):
+        return self.active
+
+    def set_keepalive(self, interval):
+        self.keepalive = interval
+
+
+class _Client:
+    def __init__(self, transport):
+        self.transport = transport
+
+    def get_transport(self):
+        return self.transport
+
+
+class _Conn:
+    def __init__(self):
+        self.transport = _Transport()
+        self.client = _Client(self.transport)
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(ssh_pool.time, "monotonic", clock)
+    return clock
+
+
+def _info(host, fingerprint="a"):
+    return {"host": host, "port": 22, "user": "root", "auth_fingerprint": fingerprint}
+
+
+def _pool(**kwargs):
+    pool = SSHConnectionPool(**{"idle_timeout": 60, "max_age": 600, "keepalive_interval": 15, **kwargs})
+    pool.enable()
+    return pool
+
+
+def _use(pool, info):
+    with pool.connection(info, _Conn) as conn:
+        return conn
+
+
+def test_sessions_are_reused_and_counted(clock):
+    pool = _pool()
+    first = _use(pool, _info("10.0.0.1"))
+    second = _use(pool, _info("10.0.0.1"))
+    other_account = _use(pool, _info("10.0.0.1", fingerprint="b"))
+
+    assert second is first and other_account is not first
+    assert first.transport.keepalive == 15
+    stats = pool.stats()
+    assert (stats["hits"], stats["misses"], stats["opened"], stats["idle"], stats["in_use"]) == (1, 2, 2, 2, 0)
+
+
+def test_idle_and_max_age_connections_are_closed(clock):
+    pool = _pool()
+    first = _use(pool, _info("10.0.0.1"))
+    clock.now += 61
+    second = _use(pool, _info("10.0.0.1"))
+    assert first.closed and second is not first
+
+    # 持续使用也不能超过最大存活时间
+    for _ in range(11):
+        clock.now += 50
+        assert _use(pool, _info("10.0.0.1")) is second
+    clock.now += 50
+    assert _use(pool, _info("10.0.0.1")) is not second
+    assert second.closed and pool.stats()["expired"] == 2
+
+
+def test_broken_and_failed_sessions_are_not_reused(clock):
+    pool = _pool()
+    first = _use(pool, _info("10.0.0.1"))
+    first.transport.active = False
+    assert _use(pool, _info("10.0.0.1")) is not first
+
+    with pytest.raises(RuntimeError):
+        with pool.connection(_info("10.0.0.2"), _Conn) as conn:
+            raise RuntimeError("command failed")
+    assert conn.closed and pool.stats()["broken"] == 2
+
+
+def test_least_recently_used_keys_are_evicted(clock):
+    pool = _pool(max_keys=2)
+    a = _use(pool, _info("10.0.0.1"))
+    _use(pool, _info("10.0.0.2"))
+    with pool.connection(_info("10.0.0.1"), _Conn):
+        # 借出中的键不会被淘汰，10.0.0.2 是最久未使用的空闲键
+        _use(pool, _info("10.0.0.3"))
+
+    stats = pool.stats()
+    assert stats["keys"] == 2 and stats["evicted"] == 1
+    assert _use(pool, _info("10.0.0.1")) is a
+
+
+def test_per_key_limit_closes_surplus_connections(clock):
+    pool = _pool(max_per_key=1)
+    with pool.connection(_info("10.0.0.1"), _Conn) as a:
+        with pool.connection(_info("10.0.0.1"), _Conn) as b:
+            pass
+    assert not b.closed and a.closed
+    assert pool.stats()["overflow"] == 1
+
+
+def test_sweep_closes_expired_connections_of_unused_keys(clock):
+    pool = _pool()
+    stale = _use(pool, _info("10.0.0.1"))
+    clock.now += 61
+    _use(pool, _info("10.0.0.2"))
+    assert stale.closed and pool.stats()["keys"] == 1
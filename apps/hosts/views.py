@@ -1,3 +1,5 @@
+import uuid
+
 from django.http.response import HttpResponse
 from django.db.models.deletion import ProtectedError
 from rest_framework import viewsets
@@ -13,6 +15,7 @@ from utils.audit_mixin import AuditLogMixin
 from .models import Host, HostGroup, ServerAccount
 from .services import HostService, HostGroupService
 from .cloud_sync_service import CloudSyncService
+from .fabric_ssh_manager import fabric_ssh_manager
 from .serializers import (
     HostSerializer,
     HostListSerializer,
@@ -302,6 +305,13 @@ class HostViewSet(AuditLogMixin, viewsets.ModelViewSet):
         system_info = HostService.get_host_system_info(host)
         return SycResponse.success(content=system_info, message="获取系统信息成功")
 
+    @action(detail=False, methods=['get'])
+    def ssh_pool_stats(self, request):
+        """SSH连接池监控数据（命中/未命中/新建/关闭计数等）"""
+        if fabric_ssh_manager is None:
+            return SycResponse.error(message="Fabric未安装，SSH连接池不可用")
+        return SycResponse.success(content=fabric_ssh_manager.connection_pool.stats(), message="获取SSH连接池状态成功")
+
     @action(detail=False, methods=['post'])
     def batch_test(self, request):
         """批量测试主机连接"""
@@ -310,12 +320,13 @@ class HostViewSet(AuditLogMixin, viewsets.ModelViewSet):
             return SycResponse.validation_error(errors=serializer.errors)
 
         host_ids = serializer.validated_data['host_ids']
-        hosts = Host.objects.filter(id__in=host_ids)
-        result = HostService.batch_test_connections(list(hosts), request.user)
+        batch_task_id = serializer.validated_data.get('batch_task_id') or str(uuid.uuid4())
+        hosts = Host.objects.filter(id__in=host_ids).select_related('account')
+        result = HostService.batch_test_connections(list(hosts), request.user, batch_task_id=batch_task_id)
         self.audit_log_action(
             action='test_connection',
             description="批量测试主机连接",
-            extra_data={'host_count': len(host_ids)}
+            extra_data={'host_count': len(host_ids), 'success': result['success'], 'failed': result['failed']}
         )
         return SycResponse.success(content=result, message="批量连接测试完成")
 
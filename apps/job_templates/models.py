@@ -134,6 +134,8 @@ class JobStep(models.Model):
     # 执行配置
     timeout = models.IntegerField(default=300, verbose_name="超时时间(秒)")
     ignore_error = models.BooleanField(default=False, verbose_name="忽略错误继续执行")
+    depends_on = models.JSONField(null=True, blank=True, default=None, verbose_name="依赖步骤",
+                                  help_text="依赖的步骤顺序数组，如 [1, 2]；为空数组时与其他步骤并行，未设置时依赖上一步")
 
     class Meta:
         verbose_name = "作业步骤"
@@ -277,6 +279,7 @@ class PlanStep(models.Model):
     step_parameters = models.JSONField(default=list, verbose_name="位置参数快照")
     step_timeout = models.IntegerField(default=300, verbose_name="超时时间快照")
     step_ignore_error = models.BooleanField(default=False, verbose_name="忽略错误快照")
+    step_depends_on = models.JSONField(null=True, blank=True, default=None, verbose_name="依赖步骤快照")
     step_target_host_ids = models.JSONField(default=list, verbose_name="目标主机ID快照")
     step_target_group_ids = models.JSONField(default=list, verbose_name="目标分组ID快照")
     step_targets = models.JSONField(default=list, verbose_name="目标快照（统一格式）", 
@@ -337,6 +340,7 @@ class PlanStep(models.Model):
             self.step_parameters = self.step.step_parameters
             self.step_timeout = self.step.timeout
             self.step_ignore_error = self.step.ignore_error
+            self.step_depends_on = self.step.depends_on
             self.step_target_host_ids = sorted(list(self.step.target_hosts.values_list('id', flat=True)))
             self.step_target_group_ids = sorted(list(self.step.target_groups.values_list('id', flat=True)))
             
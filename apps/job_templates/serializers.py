@@ -51,7 +51,7 @@ class JobStepSerializer(serializers.ModelSerializer):
         model = JobStep
         fields = [
             'id', 'name', 'description', 'step_type', 'step_type_display',
-            'order', 'step_parameters', 'timeout', 'ignore_error',
+            'order', 'step_parameters', 'timeout', 'ignore_error', 'depends_on',
             # 脚本相关字段
             'script_type', 'script_content', 'script_template', 'account_id', 'account_name',
             # 文件传输相关字段
@@ -137,6 +137,13 @@ class JobStepCreateSerializer(serializers.Serializer):
     )
     timeout = serializers.IntegerField(required=False, min_value=1, default=300, help_text="超时时间(秒)")
     ignore_error = serializers.BooleanField(required=False, default=False, help_text="是否忽略错误")
+    depends_on = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        allow_null=True,
+        default=None,
+        help_text="依赖的步骤顺序，如 [1, 2]；空数组表示无依赖（可并行），不传表示依赖上一步"
+    )
 
     # 脚本相关字段
     script_type = serializers.CharField(required=False, allow_blank=True, help_text="脚本类型")
@@ -280,7 +287,7 @@ class PlanStepSerializer(serializers.ModelSerializer):
             # 快照数据（执行方案创建时的模板状态）
             'step_name', 'step_description', 'step_type',
             'step_script_content', 'step_script_type',
-            'step_parameters', 'step_timeout', 'step_ignore_error',
+            'step_parameters', 'step_timeout', 'step_ignore_error', 'step_depends_on',
             'step_target_host_ids', 'step_target_group_ids', 'step_targets',
             'target_hosts', 'target_groups',
             'step_account_name',
@@ -466,6 +473,21 @@ class JobTemplateListSerializer(JobTemplateSerializer):
         ]
 
 
+def _validate_step_dependencies(steps, use_declared_order):
+    """校验模板步骤的 depends_on，order 规则与视图中创建 JobStep 时一致"""
+    from apps.agents.workflow_dag import validate_step_dependencies
+
+    ordered = [
+        (step.get('order', i + 1) if use_declared_order else i + 1, step)
+        for i, step in enumerate(steps)
+    ]
+    try:
+        validate_step_dependencies(ordered)
+    except ValueError as e:
+        raise serializers.ValidationError(str(e))
+    return steps
+
+
 class JobTemplateCreateSerializer(serializers.Serializer):
     """作业模板创建序列化器"""
 
@@ -493,6 +515,10 @@ class JobTemplateCreateSerializer(serializers.Serializer):
         help_text="步骤列表，每个步骤包含name、step_type、step_parameters、target_host_ids等字段"
     )
 
+    def validate_steps(self, value):
+        """校验步骤依赖：引用的步骤须存在且不能形成循环"""
+        return _validate_step_dependencies(value, use_declared_order=True)
+
     def validate_global_parameters(self, value):
         """
         规范全局变量结构：
@@ -552,6 +578,10 @@ class JobTemplateUpdateSerializer(serializers.Serializer):
         help_text="步骤列表，用于完整更新步骤"
     )
 
+    def validate_steps(self, value):
+        """校验步骤依赖（更新时步骤顺序按列表位置重新编号）"""
+        return _validate_step_dependencies(value, use_declared_order=False)
+
     def validate_name(self, value):
         """验证名称唯一性（排除当前实例）"""
         if self.instance and value != self.instance.name:
@@ -787,6 +817,7 @@ class ExecutionPlanExecuteSerializer(serializers.Serializer):
             ('parallel', '并行执行'),
             ('serial', '串行执行'),
             ('rolling', '滚动执行'),
+            ('sliding', '滑动窗口滚动执行'),
         ],
         default='parallel',
         help_text="执行模式"
@@ -794,13 +825,26 @@ class ExecutionPlanExecuteSerializer(serializers.Serializer):
     rolling_batch_size = serializers.IntegerField(
         default=1,
         min_value=1,
-        help_text="滚动批次大小"
+        help_text="滚动批次大小（滑动窗口模式为同时在途的主机数）"
     )
     rolling_batch_delay = serializers.IntegerField(
         default=0,
         min_value=0,
         help_text="批次间延迟(秒)"
     )
+    rolling_max_fail_percent = serializers.FloatField(
+        required=False,
+        allow_null=True,
+        default=None,
+        min_value=0,
+        max_value=100,
+        help_text="滑动窗口模式：失败主机超过该百分比时停止（为空时首个失败即停止，忽略错误的步骤除外）"
+    )
+    rolling_group_limit = serializers.IntegerField(
+        default=0,
+        min_value=0,
+        help_text="滑动窗口模式：每个可用区（无可用区时按地域）同时在途的主机上限，0 为不限制"
+    )
 
     # 触发类型
     trigger_type = serializers.ChoiceField(
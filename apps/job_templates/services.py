@@ -85,6 +85,7 @@ class ExecutionPlanService:
                     'script_content': step.script_content,
                     'timeout': step.timeout,
                     'ignore_error': step.ignore_error,
+                    'depends_on': step.depends_on,
                     'execution_parameters': {},  # 模板步骤没有覆盖参数
                     'target_hosts': [{
                         'id': host.id,
@@ -144,6 +145,8 @@ class ExecutionPlanService:
                         execution_mode=execution_mode,
                         rolling_batch_size=kwargs.get('rolling_batch_size', 1),
                         rolling_batch_delay=kwargs.get('rolling_batch_delay', 0),
+                        rolling_max_fail_percent=kwargs.get('rolling_max_fail_percent'),
+                        rolling_group_limit=kwargs.get('rolling_group_limit', 0),
                         start_step_order=1,
                         agent_server_id=agent_server_id,
                     )
@@ -160,6 +163,22 @@ class ExecutionPlanService:
             run_inline = os.getenv("E2E_CONTROL_PLANE") == "1" or getattr(settings, "TESTING", False)
             if run_inline:
                 execute_workflow_debug()
+            elif getattr(settings, 'WORKFLOW_RUNNER_ENABLED', False):
+                # 交由 run_workflows 进程执行，不占用 Web worker
+                from apps.agents.workflow_runner import enqueue_workflow
+                enqueue_workflow(
+                    execution_record,
+                    plan_steps=serializable_template_steps,
+                    target_hosts=all_target_hosts,
+                    global_parameters=global_parameters,
+                    execution_mode=execution_mode,
+                    rolling_batch_size=kwargs.get('rolling_batch_size', 1),
+                    rolling_batch_delay=kwargs.get('rolling_batch_delay', 0),
+                    rolling_max_fail_percent=kwargs.get('rolling_max_fail_percent'),
+                    rolling_group_limit=kwargs.get('rolling_group_limit', 0),
+                    start_step_order=1,
+                    agent_server_id=agent_server_id,
+                )
             else:
                 pool = get_global_thread_pool()
                 pool.submit(execute_workflow_debug)
@@ -254,45 +273,57 @@ class ExecutionPlanService:
 
                 # 准备可序列化的步骤数据
                 serializable_plan_steps = []
+                # 步骤依赖取方案快照（模板变更需同步后生效），按模板步骤顺序声明，
+                # 执行时换算为方案中的顺序（未纳入方案的步骤忽略）
+                plan_order_by_step_order = {
+                    plan_step.step.order: plan_step.order for plan_step in plan_steps if plan_step.step
+                }
                 for plan_step in plan_steps:
                     step = plan_step.step
-                step_data = {
-                    'id': plan_step.id,
-                    'order': plan_step.order,
-                    'step_id': step.id,
-                    'step_name': step.name,
-                    'step_type': step.step_type,
-                    'step_parameters': step.step_parameters,
-                    'script_content': step.script_content,
-                    'timeout': plan_step.get_effective_timeout(),
-                    'ignore_error': step.ignore_error,
-                    'execution_parameters': plan_step.get_effective_parameters(),
-                    # 支持 file_sources（从模板步骤迁移过来）
-                    'file_sources': getattr(step, 'file_sources', []) or [],
-                    'target_hosts': [{
-                        'id': host.id,
-                        'name': host.name,
-                        'ip_address': host.ip_address
-                    } for host in step.target_hosts.all()],
-                    'target_groups': [{
-                        'id': group.id,
-                        'name': group.name,
-                        'hosts': [{
+                    depends_on = plan_step.step_depends_on
+                    if depends_on is not None:
+                        depends_on = [
+                            plan_order_by_step_order[order] for order in depends_on
+                            if order in plan_order_by_step_order
+                        ]
+                    step_data = {
+                        'id': plan_step.id,
+                        'order': plan_step.order,
+                        'step_id': step.id,
+                        'step_name': step.name,
+                        'step_type': step.step_type,
+                        'step_parameters': step.step_parameters,
+                        'script_content': step.script_content,
+                        'timeout': plan_step.get_effective_timeout(),
+                        'ignore_error': step.ignore_error,
+                        'depends_on': depends_on,
+                        'execution_parameters': plan_step.get_effective_parameters(),
+                        # 支持 file_sources（从模板步骤迁移过来）
+                        'file_sources': getattr(step, 'file_sources', []) or [],
+                        'target_hosts': [{
                             'id': host.id,
                             'name': host.name,
                             'ip_address': host.ip_address
-                        } for host in group.host_set.all()]
-                    } for group in step.target_groups.all()]
-                }
-                # 添加account_id
-                if step.step_type == 'script' and step.account_id:
-                    step_data['account_id'] = step.account_id
-                elif step.step_type == 'file_transfer' and step.account_id:
-                    step_data['account_id'] = step.account_id
-                # 如果使用快照数据，也检查step_account_id
-                if hasattr(plan_step, 'step_account_id') and plan_step.step_account_id:
-                    step_data['account_id'] = plan_step.step_account_id
-                serializable_plan_steps.append(step_data)
+                        } for host in step.target_hosts.all()],
+                        'target_groups': [{
+                            'id': group.id,
+                            'name': group.name,
+                            'hosts': [{
+                                'id': host.id,
+                                'name': host.name,
+                                'ip_address': host.ip_address
+                            } for host in group.host_set.all()]
+                        } for group in step.target_groups.all()]
+                    }
+                    # 添加account_id
+                    if step.step_type == 'script' and step.account_id:
+                        step_data['account_id'] = step.account_id
+                    elif step.step_type == 'file_transfer' and step.account_id:
+                        step_data['account_id'] = step.account_id
+                    # 如果使用快照数据，也检查step_account_id
+                    if hasattr(plan_step, 'step_account_id') and plan_step.step_account_id:
+                        step_data['account_id'] = plan_step.step_account_id
+                    serializable_plan_steps.append(step_data)
 
                 # 只支持Agent方式执行
                 agent_server_id = kwargs.get('agent_server_id')
@@ -325,6 +356,8 @@ class ExecutionPlanService:
                             execution_mode=kwargs.get('execution_mode', 'parallel'),
                             rolling_batch_size=kwargs.get('rolling_batch_size', 1),
                             rolling_batch_delay=kwargs.get('rolling_batch_delay', 0),
+                            rolling_max_fail_percent=kwargs.get('rolling_max_fail_percent'),
+                            rolling_group_limit=kwargs.get('rolling_group_limit', 0),
                             start_step_order=kwargs.get('start_step_order', 1),
                             agent_server_id=agent_server_id,
                         )
@@ -341,6 +374,22 @@ class ExecutionPlanService:
                 run_inline = os.getenv("E2E_CONTROL_PLANE") == "1" or getattr(settings, "TESTING", False)
                 if run_inline:
                     execute_workflow()
+                elif getattr(settings, 'WORKFLOW_RUNNER_ENABLED', False):
+                    # 交由 run_workflows 进程执行，不占用 Web worker；事务提交后执行器才可见
+                    from apps.agents.workflow_runner import enqueue_workflow
+                    enqueue_workflow(
+                        execution_record,
+                        plan_steps=serializable_plan_steps,
+                        target_hosts=all_target_hosts,
+                        global_parameters=global_parameters,
+                        execution_mode=kwargs.get('execution_mode', 'parallel'),
+                        rolling_batch_size=kwargs.get('rolling_batch_size', 1),
+                        rolling_batch_delay=kwargs.get('rolling_batch_delay', 0),
+                        rolling_max_fail_percent=kwargs.get('rolling_max_fail_percent'),
+                        rolling_group_limit=kwargs.get('rolling_group_limit', 0),
+                        start_step_order=kwargs.get('start_step_order', 1),
+                        agent_server_id=agent_server_id,
+                    )
                 else:
                     pool = get_global_thread_pool()
                     pool.submit(execute_workflow)
@@ -31,6 +31,9 @@ class TemplateChangeDetector:
             'target_host_ids': sorted(list(step.target_hosts.values_list('id', flat=True))),
             'target_group_ids': sorted(list(step.target_groups.values_list('id', flat=True))),
         }
+        # 未声明依赖的步骤不计入，保持已有方案的哈希不变
+        if step.depends_on is not None:
+            step_data['depends_on'] = step.depends_on
 
         # 根据步骤类型添加特定字段
         if step.step_type == 'script':
@@ -102,6 +105,7 @@ class TemplateChangeDetector:
                         'step_parameters': plan_step.step_parameters,
                         'timeout': plan_step.step_timeout,
                         'ignore_error': plan_step.step_ignore_error,
+                        'depends_on': plan_step.step_depends_on,
                         'target_host_ids': plan_step.step_target_host_ids,
                         'target_group_ids': plan_step.step_target_group_ids,
                         'account_id': plan_step.step_account_id,
@@ -192,6 +196,9 @@ class TemplateChangeDetector:
         
         if old_step.ignore_error != new_step.ignore_error:
             changes.append(f'忽略错误: {old_step.ignore_error} → {new_step.ignore_error}')
+
+        if old_step.depends_on != new_step.depends_on:
+            changes.append(f'依赖步骤: {old_step.depends_on} → {new_step.depends_on}')
         
         # 检查目标主机变更
         old_hosts = set(old_step.target_hosts.values_list('id', flat=True))
@@ -284,6 +291,15 @@ class TemplateChangeDetector:
                 'change_type': 'text'
             })
 
+        if snapshot.get('depends_on') != new_step.depends_on:
+            changes.append({
+                'field': 'depends_on',
+                'field_name': '依赖步骤',
+                'old_value': snapshot.get('depends_on'),
+                'new_value': new_step.depends_on,
+                'change_type': 'json'
+            })
+
         # 检查目标主机变化
         current_host_ids = sorted(list(new_step.target_hosts.values_list('id', flat=True)))
         if snapshot['target_host_ids'] != current_host_ids:
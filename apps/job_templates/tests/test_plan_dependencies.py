@@ -0,0 +1,39 @@
+import pytest
+from django.contrib.auth.models import User
+
+from apps.job_templates.models import ExecutionPlan, JobStep, JobTemplate, PlanStep
+from apps.job_templates.sync_service import TemplateChangeDetector, TemplateSyncService
+
+
+@pytest.fixture()
+def plan(db):
+    user = User.objects.create_user(username="plan-deps", password="pass")
+    template = JobTemplate.objects.create(name="deps", created_by=user)
+    plan = ExecutionPlan.objects.create(template=template, name="p", created_by=user)
+    for order, depends_on in [(1, None), (2, None), (3, [1])]:
+        step = JobStep.objects.create(
+            template=template, name=f"s{order}", step_type="script", order=order,
+            script_type="shell", script_content="true", depends_on=depends_on,
+        )
+        plan_step = PlanStep(plan=plan, step=step, order=order)
+        plan_step.copy_from_template_step()
+        plan_step.step_hash = TemplateChangeDetector.calculate_step_hash(step)
+        plan_step.save()
+    return plan
+
+
+def test_dependency_change_is_reported_and_synced(plan):
+    assert TemplateChangeDetector.detect_changes(plan)["has_changes"] is False
+
+    step = plan.template.steps.get(order=3)
+    step.depends_on = [2]
+    step.save()
+
+    changes = TemplateChangeDetector.detect_changes(plan)
+    assert [m["changes"] for m in changes["modified_steps"]] == [["依赖步骤已修改"]]
+    # 同步前方案仍按快照执行
+    assert plan.planstep_set.get(step=step).step_depends_on == [1]
+
+    assert TemplateSyncService.sync_plan_from_template(plan)["success"] is True
+    assert plan.planstep_set.get(step=step).step_depends_on == [2]
+    assert TemplateChangeDetector.detect_changes(plan)["has_changes"] is False
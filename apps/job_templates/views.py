@@ -157,6 +157,7 @@ class JobTemplateViewSet(AuditLogMixin, TemplateSyncMixin, viewsets.ModelViewSet
                     'step_parameters': step_data.get('step_parameters', []),
                     'timeout': step_data.get('timeout', 300),
                     'ignore_error': step_data.get('ignore_error', False),
+                    'depends_on': step_data.get('depends_on'),
                 }
 
                 # 添加脚本相关字段
@@ -350,6 +351,7 @@ class JobTemplateViewSet(AuditLogMixin, TemplateSyncMixin, viewsets.ModelViewSet
                         'step_parameters': step_data.get('step_parameters', []),
                         'timeout': step_data.get('timeout', 300),
                         'ignore_error': step_data.get('ignore_error', False),
+                        'depends_on': step_data.get('depends_on'),
                     }
 
                     # 添加脚本相关字段
@@ -595,6 +597,8 @@ class JobTemplateViewSet(AuditLogMixin, TemplateSyncMixin, viewsets.ModelViewSet
                 execution_mode=data.get('execution_mode', 'parallel'),
                 rolling_batch_size=data.get('rolling_batch_size', 1),
                 rolling_batch_delay=data.get('rolling_batch_delay', 0),
+                rolling_max_fail_percent=data.get('rolling_max_fail_percent'),
+                rolling_group_limit=data.get('rolling_group_limit', 0),
                 agent_server_id=data.get('agent_server_id'),
                 client_ip=client_ip,
                 user_agent=user_agent
@@ -922,6 +926,8 @@ class ExecutionPlanViewSet(AuditLogMixin, ExecutionPlanSyncMixin, viewsets.Model
             execution_mode=data.get('execution_mode', 'parallel'),
             rolling_batch_size=data.get('rolling_batch_size', 1),
             rolling_batch_delay=data.get('rolling_batch_delay', 0),
+            rolling_max_fail_percent=data.get('rolling_max_fail_percent'),
+            rolling_group_limit=data.get('rolling_group_limit', 0),
             agent_server_id=data.get('agent_server_id'),
             client_ip=client_ip,
             user_agent=user_agent
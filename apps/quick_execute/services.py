@@ -2,11 +2,13 @@
 快速执行服务层
 """
 import logging
+from django.conf import settings
 from django.db.models import Q
 from django.utils import timezone
 from apps.hosts.models import Host, HostGroup
 from apps.agents.execution_service import AgentExecutionService
 from apps.executor.services import ExecutionRecordService
+from apps.executor.script_store import get_script_store
 from apps.agents.storage_service import StorageService
 from apps.system_config.models import ConfigManager
 import hashlib, uuid, os
@@ -110,7 +112,7 @@ class QuickExecuteService:
                 execution_type='quick_script',
                 name=f"快速脚本执行 - {script_data.get('script_name', '未命名')}",
                 execution_parameters={
-                    'script_content': script_data.get('script_content'),
+                    'script_sha256': get_script_store().put(script_data.get('script_content')),
                     'script_type': script_data.get('script_type', 'shell'),
                     'timeout': execution_params['timeout'],  # 使用统一提取的timeout
                     'execution_mode': script_data.get('execution_mode', 'parallel'),
@@ -130,11 +132,19 @@ class QuickExecuteService:
             # 只支持Agent方式执行
             agent_server_id = script_data.get('agent_server_id')
 
+            # 仅推送模式：请求不等待主机结果，记录由结果消费者在全部主机结束后收尾
+            wait_for_results = not getattr(settings, 'QUICK_EXECUTE_ASYNC', True)
+
             # 更新执行参数，添加执行方式标识
             execution_record.execution_parameters.update({
                 'execution_mode': 'agent',
                 'agent_server_id': agent_server_id,
+                'async_dispatch': not wait_for_results,
             })
+            if not wait_for_results:
+                # 推送前置为运行中，避免先到的结果收尾后又被覆盖
+                execution_record.status = 'running'
+                execution_record.started_at = timezone.now()
             execution_record.save()
 
             # 通过Agent执行脚本
@@ -148,8 +158,30 @@ class QuickExecuteService:
                 step_id=None,  # 快速执行没有步骤ID
                 agent_server_id=agent_server_id,
                 account_id=account_id,
+                wait_for_results=wait_for_results,
             )
 
+            if result.get('pending'):
+                # 推送失败的主机已记为失败，记录状态由结果消费者收尾，这里不再更新
+                if not result['success']:
+                    return {
+                        'success': False,
+                        'error': result.get('error', '脚本执行启动失败')
+                    }
+
+                logger.info(f"快速脚本执行已提交: {execution_record.execution_id} pending={result.get('pending_count', 0)}")
+                return {
+                    'success': True,
+                    'execution_id': execution_record.execution_id,
+                    'execution_record_id': execution_record.id,
+                    'task_id': str(execution_record.execution_id),  # 用于实时日志的task_id
+                    'message': '脚本已下发（Agent方式），结果通过实时日志推送',
+                    'target_host_count': len(target_hosts),
+                    'pending_count': result.get('pending_count', 0),
+                    'failed_count': result.get('failed_count', 0),
+                    'status': 'running',
+                }
+
             if result['success']:
                 success_count = result.get('success_count', 0)
                 failed_count = result.get('failed_count', 0)
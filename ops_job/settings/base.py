@@ -168,6 +168,87 @@ REDIS_DB_SESSION = 1  # 用于会话存储
 REDIS_DB_CELERY = 2  # 用于 Celery
 REDIS_DB_REALTIME = 3  # 用于实时日志 (Redis Stream)
 
+# 日志流按执行分片：除统一流 agent_logs 外，同时写入 agent_logs:<execution_id>
+# 历史/SSE/归档读取只扫描当前执行的分片，需与 agent-server 的 log_stream.shard_by_execution 保持一致
+LOG_STREAM_SHARDED = os.getenv('LOG_STREAM_SHARDED', 'True').lower() == 'true'
+LOG_SHARD_STREAM_MAXLEN = int(os.getenv('LOG_SHARD_STREAM_MAXLEN', '200000'))
+LOG_SHARD_STREAM_TTL = int(os.getenv('LOG_SHARD_STREAM_TTL', str(7 * 24 * 60 * 60)))
+# 统一日志流近似最大长度（MAXLEN ~），0 表示不裁剪
+LOG_STREAM_MAXLEN = int(os.getenv('LOG_STREAM_MAXLEN', '1000000'))
+# SSH 实时输出缓冲：按行数/字节数/时间窗口打包推送；发布队列容量（批次）、单行最大长度、
+# 单个输出流最多推送的字节数（超出截断，完整输出仍保存在执行结果中）、关闭时等待推送完成的秒数
+REALTIME_OUTPUT_FLUSH_LINES = int(os.getenv('REALTIME_OUTPUT_FLUSH_LINES', '100'))
+REALTIME_OUTPUT_FLUSH_BYTES = int(os.getenv('REALTIME_OUTPUT_FLUSH_BYTES', str(64 * 1024)))
+REALTIME_OUTPUT_FLUSH_INTERVAL = float(os.getenv('REALTIME_OUTPUT_FLUSH_INTERVAL', '0.2'))
+REALTIME_OUTPUT_QUEUE_SIZE = int(os.getenv('REALTIME_OUTPUT_QUEUE_SIZE', '10000'))
+REALTIME_OUTPUT_MAX_LINE_LENGTH = int(os.getenv('REALTIME_OUTPUT_MAX_LINE_LENGTH', '8192'))
+REALTIME_OUTPUT_MAX_BYTES = int(os.getenv('REALTIME_OUTPUT_MAX_BYTES', str(10 * 1024 * 1024)))
+REALTIME_OUTPUT_CLOSE_TIMEOUT = float(os.getenv('REALTIME_OUTPUT_CLOSE_TIMEOUT', '5'))
+# Agent 心跳合并写入窗口（秒）
+AGENT_HEARTBEAT_FLUSH_INTERVAL = float(os.getenv('AGENT_HEARTBEAT_FLUSH_INTERVAL', '5'))
+# 执行日志分段归档：为空时写入本地日志目录，否则为 StorageService 后端类型（local/oss/s3/cos/minio/rustfs）
+EXECUTION_LOG_ARCHIVE_STORAGE = os.getenv('EXECUTION_LOG_ARCHIVE_STORAGE', '')
+EXECUTION_LOG_SEGMENT_MAX_BYTES = int(os.getenv('EXECUTION_LOG_SEGMENT_MAX_BYTES', str(64 * 1024 * 1024)))
+# 执行日志搜索：结果缓存时间（秒）、每主机命中上限、查询串长度上限、是否允许正则、专用线程数、超时（秒）
+LOG_SEARCH_CACHE_TTL = int(os.getenv('LOG_SEARCH_CACHE_TTL', '600'))
+LOG_SEARCH_MAX_HITS_PER_HOST = int(os.getenv('LOG_SEARCH_MAX_HITS_PER_HOST', '20'))
+LOG_SEARCH_MAX_QUERY_LENGTH = int(os.getenv('LOG_SEARCH_MAX_QUERY_LENGTH', '200'))
+LOG_SEARCH_REGEX_ENABLED = os.getenv('LOG_SEARCH_REGEX_ENABLED', 'False').lower() == 'true'
+LOG_SEARCH_WORKERS = int(os.getenv('LOG_SEARCH_WORKERS', '4'))
+LOG_SEARCH_TIMEOUT = float(os.getenv('LOG_SEARCH_TIMEOUT', '30'))
+# 任务结果分发器：启动补读窗口（秒）与最近结果缓存
+RESULT_DISPATCHER_CATCHUP_SECONDS = int(os.getenv('RESULT_DISPATCHER_CATCHUP_SECONDS', '300'))
+RESULT_DISPATCHER_CACHE_SIZE = int(os.getenv('RESULT_DISPATCHER_CACHE_SIZE', '10000'))
+RESULT_DISPATCHER_CACHE_TTL = int(os.getenv('RESULT_DISPATCHER_CACHE_TTL', '600'))
+# Agent-Server 推送：每个 Agent-Server 的长连接池大小、批量下发单次请求的任务数
+AGENT_SERVER_POOL_MAXSIZE = int(os.getenv('AGENT_SERVER_POOL_MAXSIZE', '32'))
+AGENT_SERVER_BULK_DISPATCH_SIZE = int(os.getenv('AGENT_SERVER_BULK_DISPATCH_SIZE', '500'))
+# 取消任务：同时发往 Agent-Server 的批量取消请求数
+AGENT_SERVER_CANCEL_CONCURRENCY = int(os.getenv('AGENT_SERVER_CANCEL_CONCURRENCY', '16'))
+# 并行策略推送引擎：bulk（批量接口）/ asyncio（aiohttp 逐任务并发，在途上限 + 每个 Agent-Server 每秒请求上限，0 为不限）
+AGENT_DISPATCH_ENGINE = os.getenv('AGENT_DISPATCH_ENGINE', 'bulk')
+AGENT_ASYNC_DISPATCH_MAX_IN_FLIGHT = int(os.getenv('AGENT_ASYNC_DISPATCH_MAX_IN_FLIGHT', '1000'))
+AGENT_ASYNC_DISPATCH_RATE_PER_SERVER = float(os.getenv('AGENT_ASYNC_DISPATCH_RATE_PER_SERVER', '0'))
+# 工作流执行器：开启后执行方案入队，由 run_workflows 进程领取执行（并发数、租约秒数、轮询间隔）
+WORKFLOW_RUNNER_ENABLED = os.getenv('WORKFLOW_RUNNER_ENABLED', 'False').lower() == 'true'
+WORKFLOW_RUNNER_CONCURRENCY = int(os.getenv('WORKFLOW_RUNNER_CONCURRENCY', '4'))
+WORKFLOW_RUNNER_LEASE_SECONDS = int(os.getenv('WORKFLOW_RUNNER_LEASE_SECONDS', '60'))
+WORKFLOW_RUNNER_POLL_INTERVAL = float(os.getenv('WORKFLOW_RUNNER_POLL_INTERVAL', '2'))
+# 工作流步骤声明依赖后按 DAG 并发执行：最大并行步骤数、全局在途主机数预算
+WORKFLOW_MAX_PARALLEL_STEPS = int(os.getenv('WORKFLOW_MAX_PARALLEL_STEPS', '4'))
+WORKFLOW_HOST_BUDGET = int(os.getenv('WORKFLOW_HOST_BUDGET', '5000'))
+
+# 执行进度计数：Redis 计数写回数据库的间隔（秒）与计数键过期时间（秒）
+EXECUTION_PROGRESS_FLUSH_INTERVAL = float(os.getenv('EXECUTION_PROGRESS_FLUSH_INTERVAL', '2'))
+EXECUTION_PROGRESS_TTL = int(os.getenv('EXECUTION_PROGRESS_TTL', '86400'))
+
+# 脚本按 SHA-256 去重存储：进程内缓存的脚本数
+SCRIPT_STORE_CACHE_SIZE = int(os.getenv('SCRIPT_STORE_CACHE_SIZE', '256'))
+
+# 批量主机连接测试/状态检查：并发数、TCP 端口预检超时与 SSH 连接超时（秒）
+HOST_CHECK_CONCURRENCY = int(os.getenv('HOST_CHECK_CONCURRENCY', '50'))
+HOST_CHECK_TCP_TIMEOUT = float(os.getenv('HOST_CHECK_TCP_TIMEOUT', '3'))
+HOST_CHECK_SSH_TIMEOUT = int(os.getenv('HOST_CHECK_SSH_TIMEOUT', '5'))
+
+# asyncssh 批量 SSH 引擎（可选依赖）：全局会话并发、每个主机分组（可用区/地域）的并发上限（0 为不限）、keepalive 间隔（秒）
+ASYNC_SSH_MAX_CONCURRENCY = int(os.getenv('ASYNC_SSH_MAX_CONCURRENCY', '500'))
+ASYNC_SSH_GROUP_CONCURRENCY = int(os.getenv('ASYNC_SSH_GROUP_CONCURRENCY', '0'))
+ASYNC_SSH_KEEPALIVE_INTERVAL = int(os.getenv('ASYNC_SSH_KEEPALIVE_INTERVAL', '30'))
+
+# Fabric SSH 连接池（system_config 中 fabric.enable_connection_pool 开启时生效）：每个连接键的空闲连接上限、
+# 连接键上限（LRU 淘汰）、空闲超时与最大存活时间（秒）、transport keepalive 间隔（秒，0 为关闭）
+SSH_POOL_MAX_PER_KEY = int(os.getenv('SSH_POOL_MAX_PER_KEY', '10'))
+SSH_POOL_MAX_KEYS = int(os.getenv('SSH_POOL_MAX_KEYS', '256'))
+SSH_POOL_IDLE_TIMEOUT = float(os.getenv('SSH_POOL_IDLE_TIMEOUT', '300'))
+SSH_POOL_MAX_AGE = float(os.getenv('SSH_POOL_MAX_AGE', '1800'))
+SSH_POOL_KEEPALIVE_INTERVAL = int(os.getenv('SSH_POOL_KEEPALIVE_INTERVAL', '30'))
+
+# 批量安装 Agent：同时进行的 SSH 安装数（请求参数 install_concurrency 可覆盖）
+AGENT_INSTALL_CONCURRENCY = int(os.getenv('AGENT_INSTALL_CONCURRENCY', '50'))
+
+# 快速执行脚本只推送不等待结果（请求立即返回 execution_id，记录由结果消费者收尾）
+QUICK_EXECUTE_ASYNC = os.getenv('QUICK_EXECUTE_ASYNC', 'True').lower() == 'true'
+
 # 控制面 URL（用于生成 Agent-Server 配置）
 CONTROL_PLANE_URL = os.getenv('CONTROL_PLANE_URL', '')
 
@@ -1,12 +1,24 @@
+import threading
 import time
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 
 import requests
 from django.conf import settings
+from requests.adapters import HTTPAdapter
 
 from utils.agent_server_auth import compute_agent_server_hmac
 
 
+def sign_headers(shared_secret: str, method: str, url: str, body: bytes = b"", headers: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """返回附加了 X-Timestamp / X-Signature 的请求头副本（同步与异步客户端共用）"""
+    headers = headers.copy() if headers else {}
+    ts = str(int(time.time()))
+    headers["X-Timestamp"] = ts
+    if shared_secret:
+        headers["X-Signature"] = compute_agent_server_hmac(shared_secret, method, url, ts, body)
+    return headers
+
+
 class AgentServerClient:
     """
     封装对 agent-server 的 HTTP 调用，统一附加 HMAC 签名。
@@ -26,6 +38,8 @@ class AgentServerClient:
         self.shared_secret = shared_secret or ""
         self.session = session or requests.Session()
         self.timeout = timeout
+        # 该 Agent-Server 已缓存的脚本哈希，批量下发时不再重复发送脚本内容
+        self.known_scripts = set()
 
     @classmethod
     def from_settings(cls) -> "AgentServerClient":
@@ -40,16 +54,9 @@ class AgentServerClient:
 
             data = _json.dumps(json, separators=(",", ":")).encode("utf-8")
 
-        headers = headers.copy() if headers else {}
+        headers = sign_headers(self.shared_secret, "POST", url, data, headers)
         headers.setdefault("Content-Type", "application/json")
 
-        ts = str(int(time.time()))
-        headers["X-Timestamp"] = ts
-
-        if self.shared_secret:
-            sig = compute_agent_server_hmac(self.shared_secret, "POST", url, ts, data)
-            headers["X-Signature"] = sig
-
         return self.session.post(url, data=data, headers=headers, timeout=timeout or self.timeout)
 
     def get(self, url: str, params: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None, timeout: int = None):
@@ -65,14 +72,78 @@ class AgentServerClient:
         Returns:
             requests.Response: 响应对象
         """
-        headers = headers.copy() if headers else {}
-
-        ts = str(int(time.time()))
-        headers["X-Timestamp"] = ts
-
         # GET 请求的 body 为空
-        if self.shared_secret:
-            sig = compute_agent_server_hmac(self.shared_secret, "GET", url, ts, b"")
-            headers["X-Signature"] = sig
+        headers = sign_headers(self.shared_secret, "GET", url, b"", headers)
 
         return self.session.get(url, params=params, headers=headers, timeout=timeout or self.timeout)
+
+    def dispatch_tasks(self, base_url: str, items, timeout: int = None, scripts: Optional[Dict[str, str]] = None):
+        """
+        跨 Agent 批量下发任务（一次签名请求）
+
+        Args:
+            base_url: Agent-Server 基础URL
+            items: [{"agent_id": str, "task": task_spec}, ...]
+            scripts: 任务引用的脚本内容 {sha256: content}，Agent-Server 已缓存的可省略
+
+        Returns:
+            requests.Response: 响应体为 {"results": [{task_id, agent_id, status, error}], "missing_scripts": [...], ...}
+        """
+        payload = {"tasks": list(items)}
+        if scripts:
+            payload["scripts"] = scripts
+        return self.post(f"{base_url.rstrip('/')}/api/tasks/batch", json=payload, timeout=timeout)
+
+    def cancel_tasks(self, base_url: str, items, timeout: int = None):
+        """
+        跨 Agent 批量取消任务（一次签名请求）
+
+        Args:
+            base_url: Agent-Server 基础URL
+            items: [{"agent_id": str, "task_id": str}, ...]
+
+        Returns:
+            requests.Response: 响应体为 {"results": [{task_id, agent_id, status, source, error}], ...}
+        """
+        return self.post(f"{base_url.rstrip('/')}/api/tasks/cancel/batch", json={"tasks": list(items)}, timeout=timeout)
+
+
+def build_session(pool_maxsize: Optional[int] = None) -> requests.Session:
+    """创建 keep-alive 会话，连接池大小由 AGENT_SERVER_POOL_MAXSIZE 控制"""
+    if pool_maxsize is None:
+        pool_maxsize = getattr(settings, "AGENT_SERVER_POOL_MAXSIZE", 32)
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+_clients: Dict[Tuple[str, str], AgentServerClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_agent_server_client(server) -> AgentServerClient:
+    """
+    获取指定 Agent-Server 的长连接客户端（进程内按 base_url + 密钥缓存）
+
+    requests.Session 的连接池是线程安全的，同一 Agent-Server 的所有推送复用
+    已建立的 TCP/TLS 连接；密钥轮换后自动换用新客户端。
+    """
+    key = (server.base_url, server.shared_secret or "")
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            # 同一 base_url 的旧密钥客户端不再使用
+            for stale in [k for k in _clients if k[0] == server.base_url]:
+                _clients.pop(stale).session.close()
+            client = AgentServerClient(
+                shared_secret=server.shared_secret,
+                session=build_session(),
+                timeout=getattr(settings, "AGENT_SERVER_TIMEOUT", 10),
+            )
+            _clients[key] = client
+    return client
@@ -0,0 +1,32 @@
+"""
+在同步代码中运行协程
+
+Django 视图/服务是同步代码，批量推送、批量 SSH 等引擎在单个事件循环内并发执行。
+当前线程已有运行中的事件循环（如 ASGI）时，asyncio.run 不可用，改在独立线程中运行。
+"""
+import asyncio
+import threading
+from typing import Any, Dict
+
+
+def run_coroutine(coro, thread_name: str = "async-runner"):
+    """在同步上下文中运行协程；当前线程已有事件循环（如 ASGI）时转到独立线程运行"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+
+    box: Dict[str, Any] = {}
+
+    def runner():
+        try:
+            box['result'] = asyncio.run(coro)
+        except BaseException as e:
+            box['error'] = e
+
+    thread = threading.Thread(target=runner, name=thread_name, daemon=True)
+    thread.start()
+    thread.join()
+    if 'error' in box:
+        raise box['error']
+    return box['result']
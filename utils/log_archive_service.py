@@ -5,9 +5,10 @@ import json
 import logging
 import os
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 from django.conf import settings
 from django.utils import timezone
+from .log_segment_archive import log_segment_archive
 from .realtime_logs import realtime_log_service
 
 logger = logging.getLogger(__name__)
@@ -25,7 +26,7 @@ class LogArchiveService:
 
     @staticmethod
     def archive_execution_logs(execution_id: int, task_id: str):
-        """归档执行日志 - 从Redis Stream保存到ExecutionRecord"""
+        """归档执行日志 - 从Redis Stream保存到压缩段文件，索引写入ExecutionRecord"""
         try:
             from apps.executor.models import ExecutionRecord
 
@@ -65,17 +66,21 @@ class LogArchiveService:
 
             log_summary = LogArchiveService._create_step_log_summary(execution_id, task_id, step_logs, status_data)
 
-            # 将step_logs转换为logs格式，保持向后兼容
-            logs_list = LogArchiveService._convert_step_logs_to_logs_list(step_logs, logs_data)
-            
-            # 更新执行记录的结果字段
-            execution_record.execution_results.update({
-                'logs': logs_list,  # 向后兼容的日志格式
-                'step_logs': step_logs,  # 按步骤和主机聚合的日志
-                'status_updates': status_data,
+            # 日志正文写入压缩段文件，执行记录只保存 (步骤, 主机) 偏移索引
+            final_status = status_data[-1].get('status') if status_data else None
+            archive_index = log_segment_archive.write(execution_id, logs_data, step_logs, final_status=final_status)
+
+            # 更新执行记录的结果字段（移除旧格式内联的日志正文）
+            execution_results = {
+                key: value for key, value in (execution_record.execution_results or {}).items()
+                if key not in ('logs', 'step_logs', 'status_updates')
+            }
+            execution_results.update({
+                'log_archive': archive_index,
                 'log_summary': log_summary,
                 'archived_at': timezone.now().isoformat()
             })
+            execution_record.execution_results = execution_results
             execution_record.save(update_fields=['execution_results'])
 
             logger.info(f"归档完成: execution_id={execution_id}, 日志条数={len(logs_data)}")
@@ -307,14 +312,13 @@ class LogArchiveService:
                         logger.error(f"Redis连接最终失败，无法获取日志: task_id={task_id}")
                         return []
 
-                stream_key = realtime_log_service.log_stream_key
-
-                # 获取所有消息并按 execution_id 过滤
+                # 优先读取执行分片流，仅在分片不存在时扫描统一流并按 execution_id 过滤
+                stream_key, sharded = realtime_log_service.resolve_log_stream(task_id)
                 messages = realtime_log_service.redis_client.xrange(stream_key)
 
                 logs = []
                 for msg_id, fields in messages:
-                    if fields.get("execution_id") != str(task_id):
+                    if not sharded and fields.get("execution_id") != str(task_id):
                         continue
                     logs.append(fields)
 
@@ -821,6 +825,12 @@ class LogArchiveService:
             'failed_hosts': failed_hosts,
         }
 
+    @staticmethod
+    def aggregate_log_entries(logs: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, int]]:
+        """将日志条目（Redis Stream 或 ExecutionLog 表）聚合为 (step_logs, summary)"""
+        step_logs = LogArchiveService._aggregate_logs_from_entries(logs)
+        return step_logs, LogArchiveService._build_summary_from_step_logs(step_logs)
+
     @staticmethod
     def get_execution_logs_by_pointer(log_pointer: str, limit: int = 500) -> Dict[str, Any]:
         """
@@ -834,8 +844,7 @@ class LogArchiveService:
             if not logs:
                 return {'success': False, 'message': '未找到日志'}
 
-            step_logs = LogArchiveService._aggregate_logs_from_entries(logs)
-            summary = LogArchiveService._build_summary_from_step_logs(step_logs)
+            step_logs, summary = LogArchiveService.aggregate_log_entries(logs)
 
             return {
                 'success': True,
@@ -871,6 +880,10 @@ class LogArchiveService:
             # 先获取日志数据（日志列表 + 已聚合的step_logs）
             logs_data = execution_results.get('logs', [])
             step_logs = execution_results.get('step_logs', {})
+            archive_index = execution_results.get('log_archive')
+            if not step_logs and isinstance(archive_index, dict):
+                # 分段归档只返回步骤/主机索引，正文按主机通过 log_segment_archive 读取
+                step_logs = archive_index.get('steps', {})
             
             # 然后移除execution_results中的日志字段，避免重复
             if 'logs' in execution_results:
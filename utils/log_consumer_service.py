@@ -5,27 +5,26 @@ from dataclasses import dataclass
 import logging
 import threading
 import time
-from typing import Callable, List, Optional
+from typing import List, Optional
 
-from utils.redis_stream_consumer import RedisStreamConsumer
+from utils.redis_stream_consumer import BatchHandler, Handler, RedisStreamConsumer, build_redis_client
 
 logger = logging.getLogger(__name__)
 
 
-Handler = Callable[[str, dict], bool]
-
-
 @dataclass
 class StreamConfig:
     stream_key: str
     group: str
     consumer_name: str
-    handler: Handler
+    handler: Optional[Handler] = None
     dead_letter_key: Optional[str] = None
     block_ms: int = 1000
     count: int = 100
     reclaim_idle_ms: int = 60000
     reclaim_count: int = 50
+    # 批量处理函数：整批消息一次处理，优先于 handler
+    batch_handler: Optional[BatchHandler] = None
 
 
 class StreamConsumerService:
@@ -42,6 +41,8 @@ class StreamConsumerService:
         self.sleep_on_error_sec = sleep_on_error_sec
         self._stop_event = threading.Event()
         self._threads: List[threading.Thread] = []
+        # 所有消费线程共享一个连接池（每个线程的阻塞 XREADGROUP 占用一个连接）
+        self.redis_client = build_redis_client(max_connections=len(configs) * 2 + 10)
 
     def start(self):
         """Start consuming all configured streams."""
@@ -82,13 +83,14 @@ class StreamConsumerService:
             dead_letter_key=cfg.dead_letter_key,
             block_ms=cfg.block_ms,
             count=cfg.count,
+            redis_client=self.redis_client,
         )
         consumer.ensure_group()
         last_reclaim = time.time()
 
         while not self._stop_event.is_set():
             try:
-                consumer.read_and_process(cfg.handler)
+                consumer.read_and_process(cfg.handler, batch_handler=cfg.batch_handler)
             except Exception as exc:  # noqa: BLE001
                 logger.exception(
                     "Stream consume error",
@@ -108,6 +110,7 @@ class StreamConsumerService:
                         handler=cfg.handler,
                         idle_ms=cfg.reclaim_idle_ms,
                         count=cfg.reclaim_count,
+                        batch_handler=cfg.batch_handler,
                     )
                     logger.info(
                         "pending reclaim",
@@ -0,0 +1,299 @@
+"""
+执行日志分段归档 - 压缩段文件 + (步骤, 主机) 偏移索引
+
+归档格式（segment-v1）：
+- 段文件：<execution_id>/seg-00000.log.gz，由多个独立的 gzip member 拼接而成，
+  每个 member 是一个 (步骤, 主机) 的日志切片（JSON Lines），整段可直接 zcat 查看
+- 索引：{step_id: {..., hosts: {host_id: {segment, offset, length, lines, ...}}}}，
+  体积只与步骤数 × 主机数相关，保存在 ExecutionRecord.execution_results['log_archive']
+
+读取单个主机日志时只 seek 到对应偏移并解压该切片，执行记录本身不再携带日志正文。
+"""
+import gzip
+import json
+import logging
+import os
+import zlib
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FORMAT = 'segment-v1'
+
+
+def step_key(step_order, step_name) -> str:
+    """与 LogArchiveService 聚合使用相同的步骤键"""
+    return f"step_{step_order}_{(step_name or '').replace(' ', '_')}"
+
+
+class LogSegmentArchive:
+    """
+    日志分段归档读写
+
+    配置项:
+        - EXECUTION_LOG_ARCHIVE_STORAGE: 为空时写入 get_logs_directory()，
+          否则为 StorageService 后端类型（local/oss/s3/cos/minio/rustfs）
+        - EXECUTION_LOG_SEGMENT_MAX_BYTES: 单个段文件的最大字节数，超过后滚动到新段
+        - EXECUTION_LOG_ARCHIVE_COMPRESSLEVEL: gzip 压缩级别
+    """
+
+    def __init__(self, base_dir: Optional[str] = None, storage_type: Optional[str] = None):
+        self._base_dir = base_dir
+        self.storage_type = storage_type if storage_type is not None else getattr(settings, 'EXECUTION_LOG_ARCHIVE_STORAGE', '')
+        self.segment_max_bytes = getattr(settings, 'EXECUTION_LOG_SEGMENT_MAX_BYTES', 64 * 1024 * 1024)
+        self.compresslevel = getattr(settings, 'EXECUTION_LOG_ARCHIVE_COMPRESSLEVEL', 6)
+
+    @property
+    def base_dir(self) -> str:
+        if self._base_dir is None:
+            from utils.log_archive_service import LogArchiveService
+            return LogArchiveService.get_logs_directory()
+        return self._base_dir
+
+    @staticmethod
+    def storage_path(execution_id, segment: str) -> str:
+        return f"execution_logs/{execution_id}/{segment}"
+
+    # ------------------------------------------------------------------ 写入
+
+    def write(self, execution_id, logs_data: Iterable[Dict[str, Any]], step_logs: Optional[Dict[str, Any]] = None,
+              final_status: Optional[str] = None) -> Dict[str, Any]:
+        """
+        写入归档并返回索引
+        Args:
+            execution_id: 执行ID
+            logs_data: 日志条目（按到达顺序）
+            step_logs: LogArchiveService 聚合出的步骤/主机状态，用于填充索引中的状态
+            final_status: 状态流中的最终状态
+        """
+        step_logs = step_logs or {}
+        # (step_id, host_id) -> 切片元数据与行，保持首次出现的顺序
+        slices: Dict[tuple, Dict[str, Any]] = {}
+        for entry in logs_data:
+            step_name = entry.get('step_name') or '执行任务'
+            step_order = entry.get('step_order') or 1
+            host_id = str(entry.get('host_id') or 'unknown')
+            key = (step_key(step_order, step_name), host_id)
+            item = slices.get(key)
+            if item is None:
+                item = slices[key] = {
+                    'step_name': step_name,
+                    'step_order': step_order,
+                    'host_name': entry.get('host_name') or 'unknown',
+                    'host_ip': entry.get('host_ip') or '',
+                    'lines': [],
+                    'log_count': 0,
+                    'error_lines': 0,
+                    'start_time': '',
+                    'end_time': '',
+                }
+            timestamp = entry.get('timestamp') or ''
+            content = entry.get('content') or ''
+            log_type = entry.get('log_type') or 'stdout'
+            item['lines'].append(json.dumps({'t': timestamp, 'k': log_type, 'c': content}, ensure_ascii=False))
+            if content.strip():
+                item['log_count'] += 1
+                if log_type in ('stderr', 'error'):
+                    item['error_lines'] += 1
+            if timestamp:
+                if not item['start_time'] or timestamp < item['start_time']:
+                    item['start_time'] = timestamp
+                if not item['end_time'] or timestamp > item['end_time']:
+                    item['end_time'] = timestamp
+
+        steps: Dict[str, Any] = {}
+        writer = _SegmentWriter(self, execution_id)
+        try:
+            for (sid, host_id), item in slices.items():
+                raw = ('\n'.join(item.pop('lines')) + '\n').encode('utf-8')
+                segment, offset, length = writer.append(gzip.compress(raw, compresslevel=self.compresslevel))
+
+                aggregated_step = step_logs.get(sid, {})
+                aggregated_host = aggregated_step.get('host_logs', {}).get(host_id, {})
+                step = steps.setdefault(sid, {
+                    'step_name': item['step_name'],
+                    'step_order': item['step_order'],
+                    'status': aggregated_step.get('status', 'unknown'),
+                    'hosts': {},
+                })
+                step['hosts'][host_id] = {
+                    'host_id': host_id,
+                    'host_name': item['host_name'],
+                    'host_ip': item['host_ip'],
+                    'status': aggregated_host.get('status', 'unknown'),
+                    'log_count': item['log_count'],
+                    'error_lines': item['error_lines'],
+                    'start_time': item['start_time'],
+                    'end_time': item['end_time'],
+                    'segment': segment,
+                    'offset': offset,
+                    'length': length,
+                    'raw_size': len(raw),
+                }
+            segments = writer.close()
+        except Exception:
+            writer.abort()
+            raise
+
+        return {
+            'format': ARCHIVE_FORMAT,
+            'storage': self.storage_type or 'filesystem',
+            'execution_id': str(execution_id),
+            'segments': segments,
+            'total_lines': sum(h['log_count'] for s in steps.values() for h in s['hosts'].values()),
+            'total_size': sum(h['raw_size'] for s in steps.values() for h in s['hosts'].values()),
+            'final_status': final_status,
+            'steps': steps,
+        }
+
+    # ------------------------------------------------------------------ 读取
+
+    @staticmethod
+    def find_host_entry(index: Dict[str, Any], host_id, step_order=None, step_name=None) -> Optional[Dict[str, Any]]:
+        """在索引中定位 (步骤, 主机) 切片"""
+        if not isinstance(index, dict):
+            return None
+        for step in (index.get('steps') or {}).values():
+            if step_order is not None or step_name is not None:
+                # 流中的 step_order 为字符串，统一按字符串比较
+                if str(step.get('step_order')) != str(step_order) and step.get('step_name') != step_name:
+                    continue
+            host = (step.get('hosts') or {}).get(str(host_id))
+            if host:
+                return host
+        return None
+
+    def read_entries(self, index: Dict[str, Any], host_entry: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """只解压单个切片，返回 [{timestamp, log_type, content}, ...]"""
+        return list(self.iter_entries(index, host_entry))
+
+    def iter_entries(self, index: Dict[str, Any], host_entry: Dict[str, Any], chunk_size: int = 64 * 1024) -> Iterator[Dict[str, Any]]:
+        """流式解压单个切片，内存占用与切片大小无关"""
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        pending = b''
+        fh = self._open_at(index, host_entry['segment'], host_entry['offset'])
+        try:
+            remaining = host_entry['length']
+            while remaining > 0:
+                chunk = fh.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                pending += decompressor.decompress(chunk)
+                *lines, pending = pending.split(b'\n')
+                for line in lines:
+                    entry = self._parse_line(line)
+                    if entry is not None:
+                        yield entry
+        finally:
+            fh.close()
+        pending += decompressor.flush()
+        for line in pending.split(b'\n'):
+            entry = self._parse_line(line)
+            if entry is not None:
+                yield entry
+
+    @staticmethod
+    def _parse_line(line: bytes) -> Optional[Dict[str, Any]]:
+        if not line:
+            return None
+        item = json.loads(line)
+        return {'timestamp': item.get('t', ''), 'log_type': item.get('k', 'stdout'), 'content': item.get('c', '')}
+
+    def read_host_logs(self, index: Dict[str, Any], host_id, step_order=None, step_name=None) -> List[Dict[str, Any]]:
+        host_entry = self.find_host_entry(index, host_id, step_order=step_order, step_name=step_name)
+        if not host_entry:
+            return []
+        return self.read_entries(index, host_entry)
+
+    def _open_at(self, index: Dict[str, Any], segment: str, offset: int) -> BinaryIO:
+        """打开段文件并定位到切片偏移"""
+        storage = index.get('storage') or 'filesystem'
+        if storage == 'filesystem':
+            fh = open(os.path.join(self.base_dir, str(index.get('execution_id')), segment), 'rb')
+            fh.seek(offset)
+            return fh
+
+        from apps.agents.storage_service import StorageService
+        backend = StorageService.get_backend(storage)
+        fh = backend.get_file(self.storage_path(index.get('execution_id'), segment)) if backend else None
+        if fh is None:
+            raise FileNotFoundError(f"归档段不存在: {storage}:{segment}")
+        if hasattr(fh, 'seekable') and fh.seekable():
+            fh.seek(offset)
+        else:
+            # 对象存储的流式响应无法 seek，跳过偏移之前的数据
+            remaining = offset
+            while remaining > 0:
+                chunk = fh.read(min(remaining, 1024 * 1024))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+        return fh
+
+
+class _SegmentWriter:
+    """顺序写入段文件，超过上限时滚动"""
+
+    def __init__(self, archive: LogSegmentArchive, execution_id):
+        self.archive = archive
+        self.execution_id = execution_id
+        self.directory = os.path.join(archive.base_dir, str(execution_id))
+        os.makedirs(self.directory, exist_ok=True)
+        self.segments: List[str] = []
+        self._fh = None
+        self._size = 0
+
+    def _open_next(self):
+        self._finish_current()
+        name = f"seg-{len(self.segments):05d}.log.gz"
+        self.segments.append(name)
+        self._fh = open(os.path.join(self.directory, name), 'wb')
+        self._size = 0
+
+    def append(self, member: bytes):
+        if self._fh is None or (self._size and self._size + len(member) > self.archive.segment_max_bytes):
+            self._open_next()
+        offset = self._size
+        self._fh.write(member)
+        self._size += len(member)
+        return self.segments[-1], offset, len(member)
+
+    def _finish_current(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def close(self) -> List[str]:
+        self._finish_current()
+        if self.archive.storage_type:
+            self._upload()
+        return self.segments
+
+    def _upload(self):
+        from django.core.files import File
+        from apps.agents.storage_service import StorageService
+
+        backend = StorageService.get_backend(self.archive.storage_type)
+        if backend is None:
+            raise RuntimeError(f"不支持的归档存储类型: {self.archive.storage_type}")
+        for name in self.segments:
+            local_path = os.path.join(self.directory, name)
+            with open(local_path, 'rb') as fh:
+                ok, error = backend.upload_file(File(fh, name=name), LogSegmentArchive.storage_path(self.execution_id, name))
+            if not ok:
+                raise RuntimeError(f"上传归档段失败: {name} - {error}")
+            os.remove(local_path)
+
+    def abort(self):
+        self._finish_current()
+        for name in self.segments:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+
+log_segment_archive = LogSegmentArchive()
@@ -2,7 +2,7 @@
 实时日志服务 - 基于redis stream的实时日志推送
 """
 import logging
-from typing import Any, Dict, Generator
+from typing import Any, Dict, Generator, List
 
 import redis
 from django.conf import settings
@@ -51,6 +51,12 @@ class RealtimeLogService:
         self.redis_client = redis.Redis(connection_pool=self.connection_pool)
         self.log_stream_key = getattr(settings, "LOG_STREAM_KEY", "agent_logs")
         self.status_stream_key = getattr(settings, "STATUS_STREAM_KEY", "agent_status")
+        # 按执行分片的日志流：<log_stream_key>:<execution_id>，读取侧只扫描当前执行的条目
+        self.log_shard_enabled = getattr(settings, "LOG_STREAM_SHARDED", True)
+        self.log_shard_maxlen = getattr(settings, "LOG_SHARD_STREAM_MAXLEN", 200000)
+        self.log_shard_ttl = getattr(settings, "LOG_SHARD_STREAM_TTL", 7 * 24 * 60 * 60)
+        # 统一日志流近似最大长度（MAXLEN ~），0 表示不裁剪
+        self.log_stream_maxlen = getattr(settings, "LOG_STREAM_MAXLEN", 1000000)
         self._connection_pool = None
 
     @retry(**_REDIS_RETRY)
@@ -68,7 +74,95 @@ class RealtimeLogService:
     def _expire(self, key, seconds):
         """包装 expire 以提供重试"""
         return self.redis_client.expire(key, seconds)
+
+    @retry(**_REDIS_RETRY)
+    def _xadd_sharded(self, execution_id, fields):
+        """同一次往返写入统一流和执行分片流，返回统一流的消息ID"""
+        shard_key = self.execution_log_stream_key(execution_id)
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.xadd(self.log_stream_key, fields, **self._unified_trim_kwargs())
+        pipe.xadd(shard_key, fields, maxlen=self.log_shard_maxlen, approximate=True)
+        pipe.expire(shard_key, self.log_shard_ttl)
+        return pipe.execute()[0]
+
+    def _unified_trim_kwargs(self) -> Dict[str, Any]:
+        if self.log_stream_maxlen:
+            return {'maxlen': self.log_stream_maxlen, 'approximate': True}
+        return {}
+
+    @retry(**_REDIS_RETRY)
+    def _xadd_batch(self, execution_id, messages: List[Dict[str, Any]], log_stream: str) -> List[str]:
+        """一次管道往返写入多条日志（默认流同时写入执行分片），返回写入流的消息ID列表"""
+        sharded = log_stream == self.log_stream_key and self.log_shard_enabled
+        shard_key = self.execution_log_stream_key(execution_id) if sharded else None
+        trim = self._unified_trim_kwargs() if log_stream == self.log_stream_key else {}
+
+        pipe = self.redis_client.pipeline(transaction=False)
+        for message in messages:
+            pipe.xadd(log_stream, message, **trim)
+            if sharded:
+                pipe.xadd(shard_key, message, maxlen=self.log_shard_maxlen, approximate=True)
+        if sharded:
+            pipe.expire(shard_key, self.log_shard_ttl)
+        results = pipe.execute()
+        step = 2 if sharded else 1
+        return results[0:len(messages) * step:step]
+
+    def execution_log_stream_key(self, execution_id) -> str:
+        """单个执行的日志分片流 key"""
+        return f"{self.log_stream_key}:{execution_id}"
+
+    def live_log_stream_key(self, execution_id) -> str:
+        """实时跟随使用的日志流：开启分片时直接读执行分片（可能尚未创建，XREAD 会阻塞等待）"""
+        if self.log_shard_enabled:
+            return self.execution_log_stream_key(execution_id)
+        return self.log_stream_key
+
+    def resolve_log_stream(self, execution_id, stream_key: str = None):
+        """
+        解析历史日志读取的流。
+        返回 (stream_key, sharded)：分片流存在时只读该执行的分片；
+        否则回退到统一流并按 execution_id 过滤（兼容分片之前写入的日志）。
+        """
+        if stream_key and stream_key != self.log_stream_key:
+            return stream_key, False
+        if not self.log_shard_enabled:
+            return self.log_stream_key, False
+
+        shard_key = self.execution_log_stream_key(execution_id)
+        try:
+            if self.redis_client.exists(shard_key):
+                return shard_key, True
+        except Exception as e:
+            logger.debug(f"检查日志分片流失败，回退统一流: {shard_key} - {e}")
+        return self.log_stream_key, False
     
+    def _build_log_message(self, execution_id, host_id, log_data: Dict[str, Any], task_id: str = None, vars_ctx=None) -> Dict[str, Any]:
+        """构建日志消息 - 统一字段名"""
+        message = {
+            'timestamp': timezone.now().isoformat(),
+            'execution_id': str(execution_id),  # 主要执行标识
+            'host_id': str(host_id),
+            'host_name': log_data.get('host_name', ''),
+            'host_ip': log_data.get('host_ip', ''),
+            'log_type': log_data.get('log_type', log_data.get('stream', 'stdout')),  # 统一使用log_type
+            'content': log_data.get('content', ''),
+            'step_name': log_data.get('step_name', ''),
+            'step_order': log_data.get('step_order', 0),
+            'step_id': log_data.get('step_id', ''),
+            'agent_id': log_data.get('agent_id', '')
+        }
+
+        # 如果提供了task_id，添加到消息中（用于复杂工作流）
+        if task_id:
+            message['task_id'] = str(task_id)
+
+        message['received_at'] = timezone.now().timestamp() * 1000  # 毫秒时间戳
+
+        if vars_ctx and message.get('content'):
+            message['content'] = mask_secrets(message['content'], vars_ctx)
+        return message
+
     def push_log(self, execution_id: str, host_id: str, log_data: Dict[str, Any], task_id: str = None, stream_key: str = None, variables: Dict[str, Any] = None):
         """推送日志到redis stream
         Args:
@@ -79,48 +173,48 @@ class RealtimeLogService:
             stream_key: 可选，覆盖默认日志流
         """
         log_stream = stream_key or self.log_stream_key
-        logger.info(f"push_log 开始: execution_id={execution_id}, task_id={task_id}, host_id={host_id}, stream_key={log_stream}")
-        try:
-            self._ensure_connection()
-        except Exception as e:
-            logger.error(f"redis连接不可用，跳过日志推送: {execution_id} - {e}")
-            return
-
+        # 连接可用性由连接池 health_check_interval 和重试策略保证，不再逐条 PING
         try:
-            # 构建日志消息 - 统一字段名
-            message = {
-                'timestamp': timezone.now().isoformat(),
-                'execution_id': str(execution_id),  # 主要执行标识
-                'host_id': str(host_id),
-                'host_name': log_data.get('host_name', ''),
-                'host_ip': log_data.get('host_ip', ''),
-                'log_type': log_data.get('log_type', log_data.get('stream', 'stdout')),  # 统一使用log_type
-                'content': log_data.get('content', ''),
-                'step_name': log_data.get('step_name', ''),
-                'step_order': log_data.get('step_order', 0),
-                'step_id': log_data.get('step_id', ''),
-                'agent_id': log_data.get('agent_id', '')
-            }
-
-            # 如果提供了task_id，添加到消息中（用于复杂工作流）
-            if task_id:
-                message['task_id'] = str(task_id)
+            vars_ctx = normalize_user_vars(variables) if variables else None
+            message = self._build_log_message(execution_id, host_id, log_data, task_id, vars_ctx)
 
-            # 同时写入统一日志流（agent_logs），便于consume_agent_logs处理
-            unified_message = message.copy()
-            unified_message['received_at'] = timezone.now().timestamp() * 1000  # 毫秒时间戳
+            # 写入统一日志流（消费组依赖），默认流同时写入执行分片
+            if log_stream == self.log_stream_key and self.log_shard_enabled:
+                msg_id = self._xadd_sharded(execution_id, message)
+            else:
+                msg_id = self._xadd(log_stream, message)
 
-            if variables:
-                vars_ctx = normalize_user_vars(variables)
-                if unified_message.get('content'):
-                    unified_message['content'] = mask_secrets(unified_message['content'], vars_ctx)
+            logger.debug(f"push_log 成功: execution_id={execution_id}, task_id={task_id}, host_id={host_id}, stream={log_stream}, msg_id={msg_id}")
+        except Exception as e:
+            logger.error(f"推送日志失败: {execution_id} - {e}")
 
-            # 仅写入统一日志流
-            msg_id = self._xadd(log_stream, unified_message)
+    def push_logs_batch(self, execution_id: str, host_id: str, log_items: List[Dict[str, Any]], task_id: str = None, stream_key: str = None, variables: Dict[str, Any] = None) -> int:
+        """批量推送同一执行同一主机的日志，一次管道往返写入
+        Args:
+            execution_id: 执行ID
+            host_id: 主机ID
+            log_items: 日志数据列表，字段同 push_log 的 log_data
+            task_id: 可选，任务ID
+            stream_key: 可选，覆盖默认日志流
+        Returns:
+            int: 成功写入的条数
+        """
+        if not log_items:
+            return 0
 
-            logger.info(f"push_log 成功: execution_id={execution_id}, stream={log_stream}, msg_id={msg_id}")
+        log_stream = stream_key or self.log_stream_key
+        try:
+            vars_ctx = normalize_user_vars(variables) if variables else None
+            messages = [
+                self._build_log_message(execution_id, host_id, log_data, task_id, vars_ctx)
+                for log_data in log_items
+            ]
+            self._xadd_batch(execution_id, messages, log_stream)
+            logger.debug(f"push_logs_batch 成功: execution_id={execution_id}, host_id={host_id}, count={len(messages)}")
+            return len(messages)
         except Exception as e:
-            logger.error(f"推送日志失败: {execution_id} - {e}")
+            logger.error(f"批量推送日志失败: {execution_id} - {len(log_items)} 条 - {e}")
+            return 0
 
     def push_log_async(self, execution_id: str, host_id: str, log_data: Dict[str, Any], task_id: str = None):
         """
@@ -180,8 +274,9 @@ class RealtimeLogService:
             logger.error(f"推送状态失败: {execution_id} - {e}")
 
     def get_logs_stream(self, execution_id: str, last_id: str = '0') -> Generator[Dict[str, Any], None, None]:
-        """获取日志流 - 用于SSE，直接读取统一流 agent_logs 并按 execution_id 过滤"""
-        stream_key = self.log_stream_key
+        """获取日志流 - 用于SSE，开启分片时读取执行分片，否则读取统一流并按 execution_id 过滤"""
+        stream_key = self.live_log_stream_key(execution_id)
+        sharded = stream_key != self.log_stream_key
         consecutive_errors = 0
         max_consecutive_errors = 5
 
@@ -212,9 +307,8 @@ class RealtimeLogService:
                         for stream, msgs in messages:
                             for msg_id, fields in msgs:
                                 last_id = msg_id
-                                # 使用execution_id进行过滤，不再有fallback逻辑
-                                exec_id = fields.get("execution_id")
-                                if exec_id != execution_id:
+                                # 统一流需按 execution_id 过滤，分片流中均为本执行日志
+                                if not sharded and fields.get("execution_id") != execution_id:
                                     continue
                                 yield {
                                     'id': msg_id,
@@ -291,19 +385,18 @@ class RealtimeLogService:
             }
     
     def get_historical_logs(self, execution_id: str, limit: int = 100, stream_key: str = None) -> list:
-        """获取历史日志（从指定流过滤 execution_id）"""
-        stream_key = stream_key or self.log_stream_key
+        """获取历史日志（优先读取执行分片，否则从指定流过滤 execution_id）"""
+        stream_key, sharded = self.resolve_log_stream(execution_id, stream_key)
+        count = limit if sharded else limit * 10
         logger.info(f"get_historical_logs: execution_id={execution_id}, stream_key={stream_key}, limit={limit}")
 
         try:
-            messages = self.redis_client.xrevrange(stream_key, count=limit * 10)
-            logger.info(f"redis xrevrange: stream_key={stream_key}, count={limit * 10}, messages_count={len(messages)}")
+            messages = self.redis_client.xrevrange(stream_key, count=count)
+            logger.info(f"redis xrevrange: stream_key={stream_key}, count={count}, messages_count={len(messages)}")
 
             logs = []
             for msg_id, fields in messages:
-                # 使用execution_id进行过滤，不再有fallback逻辑
-                exec_id = fields.get("execution_id")
-                if exec_id != execution_id:
+                if not sharded and fields.get("execution_id") != execution_id:
                     continue
                 logs.append({
                     'id': msg_id,
@@ -361,16 +454,16 @@ class RealtimeLogService:
         if not task_id:
             return []
 
-        stream_key = self.log_stream_key
+        stream_key, sharded = self.resolve_log_stream(task_id)
         try:
             messages = self.redis_client.xrevrange(
                 stream_key,
                 max=max_id or "+",
-                count=limit * 10,
+                count=limit if sharded else limit * 10,
             )
             logs = []
             for msg_id, fields in messages:
-                if fields.get("execution_id") != str(task_id):
+                if not sharded and fields.get("execution_id") != str(task_id):
                     continue
                 logs.append(
                     {
@@ -409,23 +502,24 @@ class RealtimeLogService:
         if not task_id:
             return {"logs": [], "next_pointer": None}
 
-        stream_key = self.log_stream_key
+        stream_key, sharded = self.resolve_log_stream(task_id)
         try:
             logs = []
             next_pointer = None
             cursor = max_id or "+"
+            page_size = limit * 10
 
             while len(logs) < limit:
                 messages = self.redis_client.xrevrange(
                     stream_key,
                     max=cursor,
-                    count=limit * 10,
+                    count=page_size,
                 )
                 if not messages:
                     break
 
                 for msg_id, fields in messages:
-                    if fields.get("execution_id") != str(task_id):
+                    if not sharded and fields.get("execution_id") != str(task_id):
                         continue
                     if host_id is not None and str(fields.get("host_id")) != str(host_id):
                         continue
@@ -461,7 +555,7 @@ class RealtimeLogService:
                     break
                 cursor = last_id
 
-                if len(messages) < limit * 10:
+                if len(messages) < page_size:
                     break
 
             logs.reverse()
@@ -1,5 +1,5 @@
 """Redis Stream 消费工具：支持消费组、ACK、DLQ 的简单封装。"""
-from typing import Callable, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 import logging
 import redis
 from django.conf import settings
@@ -7,6 +7,28 @@ from django.conf import settings
 
 logger = logging.getLogger(__name__)
 
+# 单条处理：handler(msg_id, fields) -> bool
+Handler = Callable[[str, dict], bool]
+# 批量处理：batch_handler([(msg_id, fields), ...]) -> {msg_id: bool}，缺失的消息视为失败
+BatchHandler = Callable[[List[Tuple[str, dict]]], Dict[str, bool]]
+
+
+def build_redis_client(max_connections: Optional[int] = None) -> redis.Redis:
+    """创建带连接池的 redis 客户端（线程安全，可在多个消费者间共享）"""
+    pool = redis.ConnectionPool(
+        host=getattr(settings, "REDIS_HOST", "localhost"),
+        port=getattr(settings, "REDIS_PORT", 6379),
+        password=getattr(settings, "REDIS_PASSWORD", None),
+        db=getattr(settings, "REDIS_DB_REALTIME", 3),
+        decode_responses=True,
+        socket_connect_timeout=5,
+        socket_timeout=5,
+        retry_on_timeout=True,
+        health_check_interval=30,
+        max_connections=max_connections,
+    )
+    return redis.Redis(connection_pool=pool)
+
 
 class RedisStreamConsumer:
     def __init__(
@@ -17,6 +39,7 @@ class RedisStreamConsumer:
         dead_letter_key: Optional[str] = None,
         block_ms: int = 1000,
         count: int = 10,
+        redis_client: Optional[redis.Redis] = None,
     ):
         self.stream_key = stream_key
         self.group = group
@@ -25,16 +48,7 @@ class RedisStreamConsumer:
         self.block_ms = block_ms
         self.count = count
 
-        self.redis_client = redis.Redis(
-            host=getattr(settings, "REDIS_HOST", "localhost"),
-            port=getattr(settings, "REDIS_PORT", 6379),
-            password=getattr(settings, "REDIS_PASSWORD", None),
-            db=getattr(settings, "REDIS_DB_REALTIME", 3),
-            decode_responses=True,
-            socket_connect_timeout=5,
-            socket_timeout=5,
-            retry_on_timeout=True,
-        )
+        self.redis_client = redis_client or build_redis_client()
 
     def ensure_group(self):
         """创建消费组（不存在时）。"""
@@ -55,22 +69,92 @@ class RedisStreamConsumer:
                 return
             raise
 
-    def _move_to_dead_letter(self, msg_id: str, fields: dict, error: str):
-        if not self.dead_letter_key:
-            return
+    def _dead_letter_fields(self, msg_id: str, fields: dict, error: str) -> dict:
         data = dict(fields)
         data["error"] = error
         data["origin_stream"] = self.stream_key
         data["origin_id"] = msg_id
+        return data
+
+    def _move_to_dead_letter(self, msg_id: str, fields: dict, error: str):
+        if not self.dead_letter_key:
+            return
         try:
-            self.redis_client.xadd(self.dead_letter_key, data)
+            self.redis_client.xadd(self.dead_letter_key, self._dead_letter_fields(msg_id, fields, error))
         except Exception:  # noqa: BLE001
             logger.exception("failed to write dead-letter", extra={"id": msg_id})
 
-    def read_and_process(self, handler: Callable[[str, dict], bool]):
+    def _run_handlers(
+        self,
+        msgs: List[Tuple[str, dict]],
+        handler: Optional[Handler],
+        batch_handler: Optional[BatchHandler],
+    ) -> Dict[str, Tuple[bool, str]]:
+        """
+        执行处理函数，返回 {msg_id: (ok, error)}。
+        批量处理函数整体抛异常时，本批消息全部视为失败。
+        """
+        outcomes: Dict[str, Tuple[bool, str]] = {}
+        if batch_handler is not None:
+            try:
+                results = batch_handler(msgs) or {}
+            except Exception as exc:  # noqa: BLE001
+                logger.exception(
+                    "batch handler error",
+                    extra={"stream": self.stream_key, "count": len(msgs)},
+                )
+                return {msg_id: (False, str(exc)) for msg_id, _ in msgs}
+            for msg_id, _ in msgs:
+                ok = bool(results.get(msg_id, False))
+                outcomes[msg_id] = (ok, "" if ok else "handler returned False")
+            return outcomes
+
+        for msg_id, fields in msgs:
+            try:
+                ok = bool(handler(msg_id, fields))
+                outcomes[msg_id] = (ok, "" if ok else "handler returned False")
+            except Exception as exc:  # noqa: BLE001
+                logger.exception(
+                    "handler error",
+                    extra={"id": msg_id, "stream": self.stream_key},
+                )
+                outcomes[msg_id] = (False, str(exc))
+        return outcomes
+
+    def _settle(self, msgs: List[Tuple[str, dict]], outcomes: Dict[str, Tuple[bool, str]], suffix: str = "") -> Tuple[int, int]:
+        """
+        一次管道往返提交本批结果：成功的消息合并为一条 XACK，失败的写入 DLQ 并保持未 ACK
+        返回 (acked, failed)
+        """
+        ack_ids = [msg_id for msg_id, _ in msgs if outcomes.get(msg_id, (False, ""))[0]]
+        failed = [(msg_id, fields) for msg_id, fields in msgs if not outcomes.get(msg_id, (False, ""))[0]]
+        if not ack_ids and not (failed and self.dead_letter_key):
+            return 0, len(failed)
+
+        pipe = self.redis_client.pipeline(transaction=False)
+        if ack_ids:
+            pipe.xack(self.stream_key, self.group, *ack_ids)
+        if self.dead_letter_key:
+            for msg_id, fields in failed:
+                error = outcomes.get(msg_id, (False, "handler returned False"))[1] + suffix
+                pipe.xadd(self.dead_letter_key, self._dead_letter_fields(msg_id, fields, error))
+        try:
+            pipe.execute()
+        except Exception:  # noqa: BLE001
+            # 未 ACK 的消息会在 reclaim 时重新投递
+            logger.exception(
+                "ack/dead-letter pipeline failed",
+                extra={"stream": self.stream_key, "acks": len(ack_ids), "failed": len(failed)},
+            )
+            return 0, len(failed)
+        return len(ack_ids), len(failed)
+
+    def read_and_process(self, handler: Optional[Handler] = None, batch_handler: Optional[BatchHandler] = None):
         """
         读取并处理消息。handler 返回 True 则 ACK；
         返回 False 或抛异常则写入 dead-letter 并保持未 ACK（由上层重试或超时重投）。
+        提供 batch_handler 时整批交给它处理，按返回的 {msg_id: bool} 结果 ACK。
+        ACK 与 dead-letter 写入在同一个管道中提交。
         """
         resp = self.redis_client.xreadgroup(
             groupname=self.group,
@@ -83,34 +167,24 @@ class RedisStreamConsumer:
         if not resp:
             return
 
-        for _, msgs in resp:
-            for msg_id, fields in msgs:
-                try:
-                    ok = handler(msg_id, fields)
-                    if ok:
-                        self.redis_client.xack(self.stream_key, self.group, msg_id)
-                    else:
-                        self._move_to_dead_letter(msg_id, fields, "handler returned False")
-                        # 保持未 ACK，交由重试
-                except Exception as exc:  # noqa: BLE001
-                    logger.exception(
-                        "handler error",
-                        extra={"id": msg_id, "stream": self.stream_key},
-                    )
-                    self._move_to_dead_letter(msg_id, fields, str(exc))
-                    # 不 ACK，留待后续重试
+        msgs = [(msg_id, fields) for _, stream_msgs in resp for msg_id, fields in stream_msgs]
+        if not msgs:
+            return
+        outcomes = self._run_handlers(msgs, handler, batch_handler)
+        self._settle(msgs, outcomes)
 
     def reclaim_pending(
         self,
-        handler: Callable[[str, dict], bool],
+        handler: Optional[Handler] = None,
         idle_ms: int = 60000,
         count: int = 50,
+        batch_handler: Optional[BatchHandler] = None,
     ) -> dict:
         """
         回收 pending 消息：
         - 读取 pending 列表（按 idle_ms 和 count 限制）
         - XCLAIM 到当前 consumer
-        - 逐条调用 handler，成功 ACK，失败写 DLQ 并不 ACK（保留以便后续再 claim）
+        - 调用处理函数，成功 ACK，失败写 DLQ 并不 ACK（保留以便后续再 claim）
         """
         stats = {"total": 0, "claimed": 0, "acked": 0, "failed": 0}
         try:
@@ -127,7 +201,11 @@ class RedisStreamConsumer:
         msgs_to_claim = []
         for item in pending:
             try:
-                msg_id, consumer, last_deliver_ms, deliveries = item
+                if isinstance(item, dict):
+                    msg_id = item["message_id"]
+                    last_deliver_ms = item["time_since_delivered"]
+                else:
+                    msg_id, consumer, last_deliver_ms, deliveries = item
                 if last_deliver_ms < idle_ms:
                     continue
                 msgs_to_claim.append(msg_id)
@@ -154,23 +232,14 @@ class RedisStreamConsumer:
             )
             return stats
 
+        # 已被删除/裁剪的消息 XCLAIM 会返回空字段
+        claimed = [(msg_id, fields) for msg_id, fields in claimed if fields is not None]
         stats["claimed"] = len(claimed)
-        for msg_id, fields in claimed:
-            try:
-                ok = handler(msg_id, fields)
-                if ok:
-                    self.redis_client.xack(self.stream_key, self.group, msg_id)
-                    stats["acked"] += 1
-                else:
-                    self._move_to_dead_letter(msg_id, fields, "handler returned False (reclaim)")
-                    # 不 ACK，留待后续重试
-            except Exception as exc:  # noqa: BLE001
-                logger.exception(
-                    "handler error (reclaim)",
-                    extra={"id": msg_id, "stream": self.stream_key},
-                )
-                self._move_to_dead_letter(msg_id, fields, str(exc))
-                # 不 ACK
-                stats["failed"] += 1
+        if not claimed:
+            return stats
 
+        outcomes = self._run_handlers(claimed, handler, batch_handler)
+        acked, failed = self._settle(claimed, outcomes, suffix=" (reclaim)")
+        stats["acked"] = acked
+        stats["failed"] = failed
         return stats
@@ -0,0 +1,279 @@
+"""
+SSE 扇出中心 - 进程内共享的 redis.asyncio 读取任务
+每个事件循环只运行一个 XREAD 任务，跟随有订阅者的流，按 execution_id 分发到各连接的有界队列，
+避免每个浏览器连接各自通过 sync_to_async 阻塞轮询 redis。
+"""
+import asyncio
+import logging
+import weakref
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _stream_id_key(msg_id) -> Tuple[int, int]:
+    """将 stream ID（<ms>-<seq>）转换为可比较的元组"""
+    ms, _, seq = str(msg_id).partition('-')
+    try:
+        return int(ms), int(seq or 0)
+    except ValueError:
+        return 0, 0
+
+
+class StreamSubscription:
+    """
+    单个 SSE 连接的订阅
+    - streams: {stream_key: last_id}，last_id 为空表示只接收订阅之后的新消息
+    - filtered_keys: 需要按 execution_id 过滤的流（统一流/结果流），分片流无需过滤
+    """
+
+    def __init__(self, execution_id: str, streams: Dict[str, Optional[str]], filtered_keys: Iterable[str], maxsize: int):
+        self.execution_id = str(execution_id)
+        self.streams = dict(streams)
+        self.filtered_keys = set(filtered_keys)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.evicted = False
+        # 每个流已投递的最大ID，用于断点续传和去重
+        self.last_ids: Dict[str, Optional[str]] = dict(streams)
+        self._backlog: List[Tuple[str, str, dict]] = []
+
+    def offer(self, stream_key: str, msg_id: str, fields: dict) -> bool:
+        """由读取任务调用，队列满时标记为慢消费者"""
+        if self.evicted:
+            return False
+        try:
+            self.queue.put_nowait((stream_key, msg_id, fields))
+            return True
+        except asyncio.QueueFull:
+            self.evicted = True
+            # 唤醒等待中的 get，让连接尽快感知驱逐
+            self.queue.get_nowait()
+            self.queue.put_nowait(None)
+            return False
+
+    def _is_new(self, stream_key: str, msg_id: str) -> bool:
+        last_id = self.last_ids.get(stream_key)
+        if last_id and _stream_id_key(msg_id) <= _stream_id_key(last_id):
+            return False
+        self.last_ids[stream_key] = msg_id
+        return True
+
+    async def get(self, timeout: float) -> Optional[Tuple[str, str, dict]]:
+        """获取下一条消息 (stream_key, msg_id, fields)，超时或被驱逐时返回 None"""
+        while self._backlog:
+            stream_key, msg_id, fields = self._backlog.pop(0)
+            if self._is_new(stream_key, msg_id):
+                return stream_key, msg_id, fields
+
+        deadline = asyncio.get_running_loop().time() + timeout
+        while not self.evicted:
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                return None
+            try:
+                item = await asyncio.wait_for(self.queue.get(), timeout=remaining)
+            except asyncio.TimeoutError:
+                return None
+            if item is None:
+                break
+            stream_key, msg_id, fields = item
+            if self._is_new(stream_key, msg_id):
+                return item
+        return None
+
+
+class SSEFanoutHub:
+    """
+    单事件循环内的流扇出中心
+    - 只 XREAD 当前有订阅者的流，一次读取服务所有连接
+    - 订阅者队列有界，写满即驱逐，由客户端携带 last_id 重连续传
+    """
+
+    def __init__(self):
+        self.queue_size = getattr(settings, 'SSE_HUB_QUEUE_SIZE', 1000)
+        self.block_ms = getattr(settings, 'SSE_HUB_BLOCK_MS', 1000)
+        self.read_count = getattr(settings, 'SSE_HUB_READ_COUNT', 500)
+        self.catchup_limit = getattr(settings, 'SSE_HUB_CATCHUP_LIMIT', 5000)
+        self.idle_timeout = getattr(settings, 'SSE_HUB_IDLE_TIMEOUT', 60)
+
+        # stream_key -> execution_id -> 订阅集合
+        self._subs: Dict[str, Dict[str, Set[StreamSubscription]]] = {}
+        self._cursors: Dict[str, str] = {}
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._client: Optional[aioredis.Redis] = None
+
+    @property
+    def client(self) -> aioredis.Redis:
+        if self._client is None:
+            self._client = aioredis.Redis(
+                host=getattr(settings, 'REDIS_HOST', 'localhost'),
+                port=getattr(settings, 'REDIS_PORT', 6379),
+                password=getattr(settings, 'REDIS_PASSWORD', None),
+                db=getattr(settings, 'REDIS_DB_REALTIME', 3),
+                decode_responses=True,
+                socket_connect_timeout=5,
+                socket_timeout=max(5, self.block_ms / 1000 + 5),
+                health_check_interval=30,
+            )
+        return self._client
+
+    def subscriber_count(self) -> int:
+        return sum(len(subs) for by_exec in self._subs.values() for subs in by_exec.values())
+
+    async def subscribe(
+        self,
+        execution_id: str,
+        streams: Dict[str, Optional[str]],
+        filtered_keys: Iterable[str] = (),
+    ) -> StreamSubscription:
+        """
+        注册订阅并补齐 last_id 之后的消息
+        先登记再补读，读取任务与补读之间的重叠由订阅者按消息ID去重。
+        """
+        sub = StreamSubscription(execution_id, streams, filtered_keys, self.queue_size)
+
+        for stream_key in sub.streams:
+            if stream_key not in self._cursors:
+                latest = await self.client.xrevrange(stream_key, count=1)
+                if stream_key not in self._cursors:
+                    self._cursors[stream_key] = latest[0][0] if latest else '0-0'
+            self._subs.setdefault(stream_key, {}).setdefault(sub.execution_id, set()).add(sub)
+
+        self._changed.set()
+        self._ensure_reader()
+
+        for stream_key, last_id in sub.streams.items():
+            if not last_id or last_id == '$':
+                continue
+            # 统一流从 0 补读等于全量扫描，只有分片流允许
+            if stream_key in sub.filtered_keys and last_id == '0':
+                continue
+            sub._backlog.extend(await self._catch_up(sub, stream_key, last_id))
+
+        return sub
+
+    async def _catch_up(self, sub: StreamSubscription, stream_key: str, last_id: str) -> List[Tuple[str, str, dict]]:
+        """补读 last_id 之后的消息（受 catchup_limit 限制）"""
+        items = []
+        try:
+            messages = await self.client.xrange(stream_key, min=last_id, max='+', count=self.catchup_limit)
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            logger.warning(f"SSE补读失败: stream={stream_key}, last_id={last_id} - {e}")
+            return items
+
+        for msg_id, fields in messages:
+            if msg_id == last_id:
+                continue
+            if stream_key in sub.filtered_keys and str(fields.get('execution_id')) != sub.execution_id:
+                continue
+            items.append((stream_key, msg_id, fields))
+        return items
+
+    async def unsubscribe(self, sub: StreamSubscription):
+        for stream_key in sub.streams:
+            by_exec = self._subs.get(stream_key)
+            if not by_exec:
+                continue
+            subs = by_exec.get(sub.execution_id)
+            if subs:
+                subs.discard(sub)
+                if not subs:
+                    del by_exec[sub.execution_id]
+            if not by_exec:
+                # 无订阅者的流不再跟随，下次订阅重新取游标
+                del self._subs[stream_key]
+                self._cursors.pop(stream_key, None)
+        self._changed.set()
+
+    def _ensure_reader(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def _dispatch(self, stream_key: str, msg_id: str, fields: dict):
+        by_exec = self._subs.get(stream_key)
+        if not by_exec:
+            return
+        exec_id = fields.get('execution_id')
+        subs = by_exec.get(str(exec_id)) if exec_id is not None else None
+        if subs is None and len(by_exec) == 1:
+            # 分片流只有一个执行，条目缺少 execution_id 时仍归属该执行
+            only_subs = next(iter(by_exec.values()))
+            subs = {s for s in only_subs if stream_key not in s.filtered_keys}
+        targets = list(subs or ())
+
+        for sub in targets:
+            if not sub.offer(stream_key, msg_id, fields):
+                logger.warning(
+                    f"SSE订阅者消费过慢，已驱逐: execution_id={sub.execution_id}, "
+                    f"stream={stream_key}, queue_size={self.queue_size}"
+                )
+                # 同步移除，避免继续向已驱逐的订阅者投递
+                for key in sub.streams:
+                    subs = self._subs.get(key, {}).get(sub.execution_id)
+                    if subs:
+                        subs.discard(sub)
+
+    async def _run(self):
+        """读取任务：一次 XREAD 跟随所有活跃流"""
+        logger.info("SSE扇出读取任务启动")
+        try:
+            while True:
+                streams = {
+                    key: self._cursors[key]
+                    for key, by_exec in self._subs.items()
+                    if any(by_exec.values()) and key in self._cursors
+                }
+                if not streams:
+                    self._changed.clear()
+                    try:
+                        await asyncio.wait_for(self._changed.wait(), timeout=self.idle_timeout)
+                    except asyncio.TimeoutError:
+                        if not self._subs:
+                            break
+                    continue
+
+                try:
+                    resp = await self.client.xread(streams, count=self.read_count, block=self.block_ms)
+                except (redis.ConnectionError, redis.TimeoutError) as e:
+                    logger.warning(f"SSE扇出读取失败，稍后重试: {e}")
+                    await asyncio.sleep(1)
+                    continue
+
+                for stream_key, msgs in resp or []:
+                    for msg_id, fields in msgs:
+                        if stream_key in self._cursors:
+                            self._cursors[stream_key] = msg_id
+                        self._dispatch(stream_key, msg_id, fields)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"SSE扇出读取任务异常退出: {e}")
+        finally:
+            logger.info("SSE扇出读取任务结束")
+            # 异常退出时唤醒所有订阅者，由连接侧提示重连
+            for by_exec in self._subs.values():
+                for subs in by_exec.values():
+                    for sub in subs:
+                        sub.evicted = True
+                        try:
+                            sub.queue.put_nowait(None)
+                        except asyncio.QueueFull:
+                            pass
+
+
+_hubs: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, SSEFanoutHub]" = weakref.WeakKeyDictionary()
+
+
+def get_sse_hub() -> SSEFanoutHub:
+    """获取当前事件循环的扇出中心（ASGI 进程内共享一个）"""
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        hub = SSEFanoutHub()
+        _hubs[loop] = hub
+    return hub
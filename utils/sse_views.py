@@ -2,7 +2,6 @@
 Server-Sent Events (SSE) 视图 - 实时日志推送
 基于 redis stream 实时日志服务，完全异步实现以支持 ASGI 环境
 """
-import asyncio
 import json
 import logging
 from django.http import StreamingHttpResponse, HttpResponse, JsonResponse
@@ -15,6 +14,8 @@ from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from asgiref.sync import sync_to_async
 from .realtime_logs import realtime_log_service
+from .sse_hub import get_sse_hub
+from apps.executor.progress import get_progress_counter
 
 logger = logging.getLogger(__name__)
 
@@ -92,6 +93,24 @@ class SSEBaseView(View):
         data['structured'] = not data['structure_missing']
         return data
 
+    @staticmethod
+    def build_progress_message(fields, execution_id: str, counters=None):
+        """从 agent_results 消息中提取进度信息；有 Redis 进度计数时以计数为准"""
+        message = {
+            'type': 'status',
+            'execution_id': execution_id,
+            'progress': fields.get('progress'),
+            'total_hosts': fields.get('total_hosts'),
+            'success_hosts': fields.get('success_hosts'),
+            'failed_hosts': fields.get('failed_hosts'),
+            'running_hosts': fields.get('running_hosts'),
+            'pending_hosts': fields.get('pending_hosts'),
+            'timestamp': fields.get('received_at') or fields.get('timestamp'),
+        }
+        if counters:
+            message.update(counters)
+        return message
+
     # ==================== 认证方法 ====================
 
     def authenticate_user(self, request):
@@ -219,6 +238,50 @@ class SSEBaseView(View):
             headers['Access-Control-Allow-Credentials'] = 'true'
         return headers
 
+    # ==================== 扇出订阅 ====================
+
+    async def iter_hub_messages(self, execution_id, streams, filtered_keys=()):
+        """
+        通过进程内扇出中心订阅流消息
+        产出 (msg_id, fields)；心跳/错误等控制消息以 (None, 已编码的SSE消息) 产出。
+        多流订阅时 fields 中附带 _stream 标识来源流。
+        """
+        hub = get_sse_hub()
+        try:
+            sub = await hub.subscribe(execution_id, streams, filtered_keys)
+        except Exception as e:
+            logger.error(f"SSE订阅失败: {execution_id} - {e}")
+            yield None, self.format_sse_message({
+                'type': 'error', 'message': f'redis连接失败: {e}'
+            }).encode('utf-8')
+            return
+
+        try:
+            while True:
+                item = await sub.get(timeout=self.heartbeat_interval)
+                if sub.evicted:
+                    # 消费过慢或读取任务中断，告知客户端携带 last_id 重连续传
+                    yield None, self.format_sse_message({
+                        'type': 'error',
+                        'code': 'resync',
+                        'message': '日志推送积压，请重新连接',
+                        'last_ids': sub.last_ids,
+                    }).encode('utf-8')
+                    break
+                if item is None:
+                    yield None, self.format_sse_message({
+                        'type': 'heartbeat',
+                        'timestamp': timezone.now().isoformat()
+                    }).encode('utf-8')
+                    continue
+                stream_key, msg_id, fields = item
+                fields = dict(fields)
+                if len(streams) > 1:
+                    fields['_stream'] = stream_key
+                yield msg_id, fields
+        finally:
+            await hub.unsubscribe(sub)
+
     # ==================== 异步 redis 操作 ====================
 
     @staticmethod
@@ -242,6 +305,11 @@ class SSEBaseView(View):
             realtime_log_service._ensure_connection
         )()
 
+    @staticmethod
+    async def get_progress_async(execution_id):
+        """异步读取执行进度计数（一次 HGETALL）"""
+        return await sync_to_async(get_progress_counter().get)(execution_id)
+
     @staticmethod
     async def get_historical_logs_async(execution_id, limit=50, stream_key=None):
         """异步获取历史日志"""
@@ -313,64 +381,30 @@ class JobLogsSSEView(SSEBaseView):
                             continue
                         if filter_step_id and normalized.get('step_id') != filter_step_id:
                             continue
-                        last_id = normalized.get('id') or log.get('id', '0')
                         yield self.format_sse_message({
                             'type': 'log', **normalized
-                        }, event_id=last_id).encode('utf-8')
+                        }, event_id=normalized.get('id')).encode('utf-8')
+                    if historical_logs:
+                        last_id = historical_logs[-1].get('id') or last_id
 
-                # 实时日志流
+                # 实时日志流：由进程内扇出中心统一读取，按 last_id 续传
                 logger.info(f"开始实时日志流: execution_id={execution_id}")
-                stream_key = realtime_log_service.log_stream_key
-                consecutive_errors = 0
-
-                while True:
-                    try:
-                        if not await self.redis_ensure_connection():
-                            consecutive_errors += 1
-                            if consecutive_errors >= self.max_consecutive_errors:
-                                yield self.format_sse_message({
-                                    'type': 'error', 'message': 'redis连接失败'
-                                }).encode('utf-8')
-                                break
-                            await asyncio.sleep(2)
-                            continue
-
-                        consecutive_errors = 0
-                        messages = await self.redis_xread({stream_key: last_id}, count=200, block=2000)
-
-                        if messages:
-                            for stream, msgs in messages:
-                                for msg_id, fields in msgs:
-                                    # 使用execution_id进行过滤，不再有fallback逻辑
-                                    exec_id = fields.get('execution_id')
-                                    if str(exec_id) != execution_id:
-                                        continue
-                                    last_id = msg_id
-                                    normalized = self.normalize_log_message(fields, execution_id)
-                                    # 应用过滤器
-                                    if filter_host_id and normalized.get('host_id') != filter_host_id:
-                                        continue
-                                    if filter_step_id and normalized.get('step_id') != filter_step_id:
-                                        continue
-                                    yield self.format_sse_message({
-                                        'type': 'log', **normalized
-                                    }, event_id=msg_id).encode('utf-8')
-                        else:
-                            # 心跳
-                            yield self.format_sse_message({
-                                'type': 'heartbeat',
-                                'timestamp': timezone.now().isoformat()
-                            }).encode('utf-8')
-
-                    except Exception as e:
-                        consecutive_errors += 1
-                        logger.error(f"日志流异常 ({consecutive_errors}): {e}")
-                        if consecutive_errors >= self.max_consecutive_errors:
-                            yield self.format_sse_message({
-                                'type': 'error', 'message': str(e)
-                            }).encode('utf-8')
-                            break
-                        await asyncio.sleep(1)
+                stream_key = realtime_log_service.live_log_stream_key(execution_id)
+                filtered_keys = [] if stream_key != realtime_log_service.log_stream_key else [stream_key]
+
+                async for msg_id, fields in self.iter_hub_messages(execution_id, {stream_key: last_id}, filtered_keys):
+                    if msg_id is None:
+                        yield fields
+                        continue
+                    normalized = self.normalize_log_message(fields, execution_id)
+                    # 应用过滤器
+                    if filter_host_id and normalized.get('host_id') != filter_host_id:
+                        continue
+                    if filter_step_id and normalized.get('step_id') != filter_step_id:
+                        continue
+                    yield self.format_sse_message({
+                        'type': 'log', **normalized
+                    }, event_id=msg_id).encode('utf-8')
 
             except Exception as e:
                 logger.error(f"SSE日志流异常: {execution_id} - {e}")
@@ -396,7 +430,6 @@ class JobStatusSSEView(SSEBaseView):
         last_id = request.GET.get('last_id', '0')
 
         async def event_stream():
-            nonlocal last_id
             try:
                 # 连接建立消息
                 yield self.format_sse_message({
@@ -405,58 +438,19 @@ class JobStatusSSEView(SSEBaseView):
                     'execution_id': execution_id
                 }).encode('utf-8')
 
-                # 从 agent_results stream 读取进度
+                # 从 agent_results stream 读取进度（只接收本执行的结果消息）
                 logger.info(f"开始实时状态流: execution_id={execution_id}")
                 result_stream_key = getattr(settings, "RESULT_STREAM_KEY", "agent_results")
-                consecutive_errors = 0
-
-                while True:
-                    try:
-                        if not await self.redis_ensure_connection():
-                            consecutive_errors += 1
-                            if consecutive_errors >= self.max_consecutive_errors:
-                                yield self.format_sse_message({
-                                    'type': 'error', 'message': 'redis连接失败'
-                                }).encode('utf-8')
-                                break
-                            await asyncio.sleep(2)
-                            continue
+                streams = {result_stream_key: last_id if last_id != '0' else None}
 
-                        consecutive_errors = 0
-                        messages = await self.redis_xread({result_stream_key: last_id}, count=100, block=2000)
-
-                        if messages:
-                            for stream, msgs in messages:
-                                for msg_id, fields in msgs:
-                                    last_id = msg_id
-                                    # 从 agent_results 中提取进度信息
-                                    progress_fields = {
-                                        'type': 'status',
-                                        'execution_id': execution_id,
-                                        'progress': fields.get('progress'),
-                                        'total_hosts': fields.get('total_hosts'),
-                                        'success_hosts': fields.get('success_hosts'),
-                                        'failed_hosts': fields.get('failed_hosts'),
-                                        'running_hosts': fields.get('running_hosts'),
-                                        'pending_hosts': fields.get('pending_hosts'),
-                                        'timestamp': fields.get('received_at') or fields.get('timestamp'),
-                                    }
-                                    yield self.format_sse_message(progress_fields, event_id=msg_id).encode('utf-8')
-                        else:
-                            yield self.format_sse_message({
-                                'type': 'heartbeat',
-                                'timestamp': timezone.now().isoformat()
-                            }).encode('utf-8')
-
-                    except Exception as e:
-                        consecutive_errors += 1
-                        logger.error(f"状态流异常 ({consecutive_errors}): {e}")
-                        if consecutive_errors >= self.max_consecutive_errors:
-                            yield self.format_sse_message({
-                                'type': 'error', 'message': str(e)
-                            }).encode('utf-8')
-                            break
-                        await asyncio.sleep(1)
+                async for msg_id, fields in self.iter_hub_messages(execution_id, streams, [result_stream_key]):
+                    if msg_id is None:
+                        yield fields
+                        continue
+                    counters = await self.get_progress_async(execution_id)
+                    yield self.format_sse_message(
+                        self.build_progress_message(fields, execution_id, counters), event_id=msg_id
+                    ).encode('utf-8')
 
             except Exception as e:
                 logger.error(f"SSE状态流异常: {execution_id} - {e}")
@@ -483,7 +477,6 @@ class JobCombinedSSEView(SSEBaseView):
 
         async def event_stream():
             log_last_id = last_id
-            result_last_id = last_id
 
             try:
                 # 连接建立消息
@@ -505,78 +498,29 @@ class JobCombinedSSEView(SSEBaseView):
                             'type': 'log', **normalized
                         }, event_id=log_last_id).encode('utf-8')
 
-                # 实时合并流
+                # 实时合并流：日志按 last_id 续传，进度只推送新结果
                 logger.info(f"开始实时合并流: execution_id={execution_id}")
-                log_stream_key = realtime_log_service.log_stream_key
+                log_stream_key = realtime_log_service.live_log_stream_key(execution_id)
                 result_stream_key = getattr(settings, "RESULT_STREAM_KEY", "agent_results")
-                consecutive_errors = 0
-
-                while True:
-                    try:
-                        if not await self.redis_ensure_connection():
-                            consecutive_errors += 1
-                            if consecutive_errors >= self.max_consecutive_errors:
-                                yield self.format_sse_message({
-                                    'type': 'error', 'message': 'redis连接失败'
-                                }).encode('utf-8')
-                                break
-                            await asyncio.sleep(2)
-                            continue
-
-                        consecutive_errors = 0
-
-                        # 同时监听日志流和结果流
-                        messages = await self.redis_xread({
-                            log_stream_key: log_last_id,
-                            result_stream_key: result_last_id
-                        }, count=200, block=2000)
-
-                        if messages:
-                            for stream, msgs in messages:
-                                for msg_id, fields in msgs:
-                                    if stream == result_stream_key:
-                                        # 从 agent_results 读取进度状态
-                                        msg_exec_id = fields.get('execution_id')
-                                        if str(msg_exec_id) != execution_id:
-                                            continue
-                                        result_last_id = msg_id
-                                        progress_fields = {
-                                            'type': 'status',
-                                            'execution_id': execution_id,
-                                            'progress': fields.get('progress'),
-                                            'total_hosts': fields.get('total_hosts'),
-                                            'success_hosts': fields.get('success_hosts'),
-                                            'failed_hosts': fields.get('failed_hosts'),
-                                            'running_hosts': fields.get('running_hosts'),
-                                            'pending_hosts': fields.get('pending_hosts'),
-                                            'timestamp': fields.get('received_at') or fields.get('timestamp'),
-                                        }
-                                        yield self.format_sse_message(progress_fields, event_id=msg_id).encode('utf-8')
-                                    elif stream == log_stream_key:
-                                        # 使用execution_id进行过滤
-                                        exec_id = fields.get('execution_id')
-                                        if str(exec_id) != execution_id:
-                                            continue
-                                        log_last_id = msg_id
-                                        normalized = self.normalize_log_message(fields, execution_id)
-                                        yield self.format_sse_message({
-                                            'type': 'log', **normalized
-                                        }, event_id=msg_id).encode('utf-8')
-                        else:
-                            yield self.format_sse_message({
-                                'type': 'heartbeat',
-                                'timestamp': timezone.now().isoformat()
-                            }).encode('utf-8')
-
-                    except Exception as e:
-                        consecutive_errors += 1
-                        logger.error(f"合并流异常 ({consecutive_errors}): {e}")
-                        if consecutive_errors >= self.max_consecutive_errors:
-                            yield self.format_sse_message({
-                                'type': 'error', 'message': str(e)
-                            }).encode('utf-8')
-                            break
-                        await asyncio.sleep(1)
+                filtered_keys = [result_stream_key]
+                if log_stream_key == realtime_log_service.log_stream_key:
+                    filtered_keys.append(log_stream_key)
+                streams = {log_stream_key: log_last_id, result_stream_key: None}
+
+                async for msg_id, fields in self.iter_hub_messages(execution_id, streams, filtered_keys):
+                    if msg_id is None:
+                        yield fields
+                        continue
+                    if fields.pop('_stream', None) == result_stream_key:
+                        counters = await self.get_progress_async(execution_id)
+                        yield self.format_sse_message(
+                            self.build_progress_message(fields, execution_id, counters), event_id=msg_id
+                        ).encode('utf-8')
+                    else:
+                        normalized = self.normalize_log_message(fields, execution_id)
+                        yield self.format_sse_message({
+                            'type': 'log', **normalized
+                        }, event_id=msg_id).encode('utf-8')
 
             except Exception as e:
                 logger.error(f"SSE合并流异常: {execution_id} - {e}")
@@ -5,7 +5,11 @@
 基于 Redis Stream 订阅任务结果。
 """
 import logging
+import os
+import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError, as_completed, wait
 from typing import Any, Dict, List, Optional, Set, Callable
 
 import redis
@@ -14,6 +18,128 @@ from django.conf import settings
 logger = logging.getLogger(__name__)
 
 
+class ResultDispatcher:
+    """
+    任务结果分发器
+
+    每个进程一个后台线程，从 "当前时间 - 补读窗口" 开始跟随结果流，
+    按 task_id 唤醒已登记的 Future，等待者无需各自从头扫描整个结果流。
+    最近收到的结果保存在有界缓存中，覆盖 "结果先于登记到达" 的情况。
+
+    配置项:
+        - RESULT_DISPATCHER_CATCHUP_SECONDS: 启动时补读的时间窗口，默认 300 秒
+        - RESULT_DISPATCHER_CACHE_SIZE: 最近结果缓存条数，默认 10000
+        - RESULT_DISPATCHER_CACHE_TTL: 最近结果缓存有效期，默认 600 秒
+    """
+
+    def __init__(self, redis_client: redis.Redis, stream_key: str, block_ms: int = 1000):
+        self.redis_client = redis_client
+        self.stream_key = stream_key
+        self.block_ms = block_ms
+        self.catchup_seconds = getattr(settings, 'RESULT_DISPATCHER_CATCHUP_SECONDS', 300)
+        self.cache_size = getattr(settings, 'RESULT_DISPATCHER_CACHE_SIZE', 10000)
+        self.cache_ttl = getattr(settings, 'RESULT_DISPATCHER_CACHE_TTL', 600)
+
+        self._lock = threading.Lock()
+        self._waiters: Dict[str, List[Future]] = {}
+        self._recent: "OrderedDict[str, tuple]" = OrderedDict()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._stop_event = threading.Event()
+        self.last_id: Optional[str] = None
+
+    def ensure_started(self) -> None:
+        """启动后台读取线程（fork 后的子进程会重新启动）"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop_event.clear()
+            if self.last_id is None:
+                start_ms = int(time.time() * 1000) - int(self.catchup_seconds * 1000)
+                self.last_id = f"{max(start_ms, 0)}-0"
+            self._thread = threading.Thread(
+                target=self._run, name=f"result-dispatcher-{self.stream_key}", daemon=True
+            )
+            self._thread.start()
+            logger.info(f"结果分发器启动: stream={self.stream_key}, from={self.last_id}")
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def register(self, task_ids: List[str]) -> Dict[str, Future]:
+        """登记等待的任务，已在缓存中的结果立即完成"""
+        futures: Dict[str, Future] = {}
+        now = time.time()
+        with self._lock:
+            for task_id in task_ids:
+                future: Future = Future()
+                cached = self._recent.get(task_id)
+                if cached and now - cached[1] <= self.cache_ttl:
+                    future.set_result(cached[0])
+                else:
+                    self._waiters.setdefault(task_id, []).append(future)
+                futures[task_id] = future
+        return futures
+
+    def unregister(self, futures: Dict[str, Future]) -> None:
+        """移除未完成的等待（超时后调用）"""
+        with self._lock:
+            for task_id, future in futures.items():
+                waiting = self._waiters.get(task_id)
+                if not waiting:
+                    continue
+                if future in waiting:
+                    waiting.remove(future)
+                if not waiting:
+                    del self._waiters[task_id]
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return sum(len(v) for v in self._waiters.values())
+
+    def dispatch(self, data: Dict[str, Any]) -> None:
+        """处理一条结果消息：写入缓存并唤醒对应等待者"""
+        task_id = data.get('task_id')
+        if not task_id:
+            return
+        result = TaskResultWaiter._parse_result(data)
+        with self._lock:
+            self._recent[task_id] = (result, time.time())
+            self._recent.move_to_end(task_id)
+            while len(self._recent) > self.cache_size:
+                self._recent.popitem(last=False)
+            waiting = self._waiters.pop(task_id, [])
+        for future in waiting:
+            if not future.done():
+                future.set_result(result)
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                response = self.redis_client.xread(
+                    {self.stream_key: self.last_id},
+                    count=500,
+                    block=self.block_ms
+                )
+            except (redis.ConnectionError, redis.TimeoutError) as e:
+                logger.warning(f"结果分发器读取失败，稍后重试: {e}")
+                time.sleep(1)
+                continue
+            except Exception as e:
+                logger.error(f"结果分发器读取异常: {e}", exc_info=True)
+                time.sleep(1)
+                continue
+
+            for _, messages in response or []:
+                for message_id, data in messages:
+                    self.last_id = message_id
+                    try:
+                        self.dispatch(data)
+                    except Exception as e:
+                        logger.error(f"分发任务结果失败: id={message_id}, error={e}")
+
+
 class TaskResultWaiter:
     """
     任务结果等待器
@@ -48,6 +174,8 @@ class TaskResultWaiter:
             self._init_redis_client()
 
         self.stream_key = stream_key or self._get_stream_key()
+        self._dispatcher: Optional[ResultDispatcher] = None
+        self._dispatcher_lock = threading.Lock()
 
     def _init_redis_client(self) -> None:
         """初始化 Redis 客户端"""
@@ -88,6 +216,18 @@ class TaskResultWaiter:
             logger.warning(f"Redis 连接不可用: {e}")
             return False
 
+    def _get_dispatcher(self, poll_interval: float) -> ResultDispatcher:
+        """获取（必要时启动）共享的结果分发器"""
+        with self._dispatcher_lock:
+            if self._dispatcher is None:
+                self._dispatcher = ResultDispatcher(
+                    self.redis_client,
+                    self.stream_key,
+                    block_ms=max(int(poll_interval * 1000), 100),
+                )
+        self._dispatcher.ensure_started()
+        return self._dispatcher
+
     def wait_for_result(
         self,
         task_id: str,
@@ -152,10 +292,8 @@ class TaskResultWaiter:
                 for task_id in task_ids
             }
 
-        pending_tasks: Set[str] = set(task_ids)
         results: Dict[str, Dict[str, Any]] = {}
         start_time = time.time()
-        last_id = '0'  # 从流的开头开始读取
 
         # 获取轮询间隔配置
         try:
@@ -166,44 +304,17 @@ class TaskResultWaiter:
 
         logger.info(f"开始等待 {len(task_ids)} 个任务结果: {task_ids[:5]}{'...' if len(task_ids) > 5 else ''}")
 
-        while pending_tasks and (time.time() - start_time) < timeout:
-            try:
-                # 使用 XREAD 阻塞读取，但设置较短的阻塞时间以便检查超时
-                block_ms = int(poll_interval * 1000)
-                response = self.redis_client.xread(
-                    {self.stream_key: last_id},
-                    count=100,
-                    block=block_ms
-                )
+        dispatcher = self._get_dispatcher(poll_interval)
+        futures = dispatcher.register(list(dict.fromkeys(task_ids)))
+        wait(futures.values(), timeout=timeout)
 
-                if response:
-                    for stream_name, messages in response:
-                        for message_id, data in messages:
-                            last_id = message_id
-                            task_id = data.get('task_id')
-
-                            if task_id and task_id in pending_tasks:
-                                result = self._parse_result(data)
-                                results[task_id] = result
-                                pending_tasks.discard(task_id)
-
-                                logger.debug(
-                                    f"收到任务结果: task_id={task_id}, "
-                                    f"status={result.get('status')}, "
-                                    f"剩余 {len(pending_tasks)} 个任务"
-                                )
-
-                                if not pending_tasks:
-                                    break
-
-            except redis.ConnectionError as e:
-                logger.warning(f"Redis 连接错误，尝试重连: {e}")
-                time.sleep(poll_interval)
-                continue
-            except Exception as e:
-                logger.error(f"等待任务结果时出错: {e}", exc_info=True)
-                time.sleep(poll_interval)
-                continue
+        pending_tasks: Set[str] = set()
+        for task_id, future in futures.items():
+            if future.done():
+                results[task_id] = future.result()
+            else:
+                pending_tasks.add(task_id)
+        dispatcher.unregister({task_id: futures[task_id] for task_id in pending_tasks})
 
         # 处理超时的任务
         for task_id in pending_tasks:
@@ -224,7 +335,27 @@ class TaskResultWaiter:
 
         return results
 
-    def _parse_result(self, data: Dict[str, Any]) -> Dict[str, Any]:
+    def watch_results(self, task_ids: List[str], poll_interval: float = 0.5) -> Optional[Dict[str, Future]]:
+        """
+        登记等待多个任务的结果，由调用方自行决定等待方式（如滑动窗口按完成顺序逐个补位）
+
+        Returns:
+            {task_id: Future}，Redis 不可用时返回 None；超时未完成的 Future 需通过 unwatch_results 移除
+        """
+        if not task_ids:
+            return {}
+        if not self._ensure_connection():
+            logger.error("Redis 连接不可用，无法等待任务结果")
+            return None
+        return self._get_dispatcher(poll_interval).register(list(dict.fromkeys(task_ids)))
+
+    def unwatch_results(self, futures: Dict[str, Future]) -> None:
+        """移除 watch_results 登记但不再等待的任务"""
+        if self._dispatcher is not None and futures:
+            self._dispatcher.unregister(futures)
+
+    @staticmethod
+    def _parse_result(data: Dict[str, Any]) -> Dict[str, Any]:
         """
         解析 Redis Stream 中的任务结果
 
@@ -298,39 +429,23 @@ class TaskResultWaiter:
             return task_ids
 
         pending_tasks = set(task_ids)
-        start_time = time.time()
-        last_id = '0'
-
-        while pending_tasks and (time.time() - start_time) < timeout:
-            try:
-                block_ms = int(poll_interval * 1000)
-                response = self.redis_client.xread(
-                    {self.stream_key: last_id},
-                    count=100,
-                    block=block_ms
-                )
-
-                if response:
-                    for stream_name, messages in response:
-                        for message_id, data in messages:
-                            last_id = message_id
-                            task_id = data.get('task_id')
+        dispatcher = self._get_dispatcher(poll_interval)
+        futures = dispatcher.register(list(pending_tasks))
+        task_by_future = {future: task_id for task_id, future in futures.items()}
 
-                            if task_id and task_id in pending_tasks:
-                                result = self._parse_result(data)
-                                pending_tasks.discard(task_id)
-
-                                try:
-                                    callback(task_id, result)
-                                except Exception as e:
-                                    logger.error(f"结果回调执行失败: task_id={task_id}, error={e}")
-
-            except redis.ConnectionError as e:
-                logger.warning(f"Redis 连接错误: {e}")
-                time.sleep(poll_interval)
-            except Exception as e:
-                logger.error(f"订阅任务结果时出错: {e}", exc_info=True)
-                time.sleep(poll_interval)
+        try:
+            # 回调在调用方线程中执行，避免阻塞分发线程
+            for future in as_completed(task_by_future, timeout=timeout):
+                task_id = task_by_future[future]
+                pending_tasks.discard(task_id)
+                try:
+                    callback(task_id, future.result())
+                except Exception as e:
+                    logger.error(f"结果回调执行失败: task_id={task_id}, error={e}")
+        except FutureTimeoutError:
+            pass
+        finally:
+            dispatcher.unregister({task_id: futures[task_id] for task_id in pending_tasks})
 
         return pending_tasks
 